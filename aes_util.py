@@ -3,6 +3,9 @@ AES解密工具模块
 实现与Java AESUtil.mysqlAdapterDecrypt方法兼容的AES解密功能
 """
 import logging
+import threading
+from functools import lru_cache
+from typing import Iterable, Iterator, Union
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import unpad
 from Crypto.Util.Padding import pad
@@ -10,6 +13,21 @@ import binascii
 
 logger = logging.getLogger(__name__)
 
+# 每个线程最多缓存的加解密器数量（密钥通常是固定配置，数量很少）
+_MAX_CACHED_CIPHERS = 32
+
+# 线程本地的 ECB 加解密器缓存：(key, encoding) -> cipher
+_cipher_cache = threading.local()
+
+# 流式解密每次从输入流读取的字节数
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# 流式加密时每次输出的明文字节数（输出的十六进制字符数为其两倍）
+ENCRYPT_CHUNK_SIZE = 64 * 1024
+
+# 一个 AES 分组对应的十六进制字符数
+_HEX_BLOCK_SIZE = AES.block_size * 2
+
 
 def generate_mysql_aes_key(key: str, encoding: str = "UTF-8") -> bytes:
     """
@@ -25,9 +43,12 @@ def generate_mysql_aes_key(key: str, encoding: str = "UTF-8") -> bytes:
     """
     if not key:
         raise ValueError("加密Key配置异常")
-    
-    logger.debug(f"加密KEY: {key}")
-    
+    return _derive_mysql_aes_key(key, encoding)
+
+
+@lru_cache(maxsize=_MAX_CACHED_CIPHERS)
+def _derive_mysql_aes_key(key: str, encoding: str) -> bytes:
+    """派生MySQL AES密钥（结果按 key、encoding 缓存，密钥为固定配置时只计算一次）"""
     # 创建16字节的finalKey数组，初始化为0
     final_key = bytearray(16)
     
@@ -39,6 +60,24 @@ def generate_mysql_aes_key(key: str, encoding: str = "UTF-8") -> bytes:
     return bytes(final_key)
 
 
+def _get_ecb_cipher(key: str, encoding: str):
+    """
+    获取当前线程复用的 AES/ECB 加解密器
+    
+    ECB 模式没有链式状态，同一个加解密器可以反复使用；按线程缓存，避免多线程共享同一对象。
+    """
+    ciphers = getattr(_cipher_cache, "ciphers", None)
+    if ciphers is None:
+        ciphers = _cipher_cache.ciphers = {}
+    cipher = ciphers.get((key, encoding))
+    if cipher is None:
+        if len(ciphers) >= _MAX_CACHED_CIPHERS:
+            ciphers.clear()
+        cipher = AES.new(generate_mysql_aes_key(key, encoding), AES.MODE_ECB)
+        ciphers[(key, encoding)] = cipher
+    return cipher
+
+
 def mysql_adapter_decrypt(key: str, ciphertext: str, encoding: str = "UTF-8") -> str:
     """
     MySQL适配器解密方法
@@ -59,14 +98,11 @@ def mysql_adapter_decrypt(key: str, ciphertext: str, encoding: str = "UTF-8") ->
     if ciphertext is None:
         return None
     
-    logger.debug(f"解密前 <{ciphertext}>")
+    logger.debug("解密前，密文长度=%d", len(ciphertext))
     
     try:
-        # 生成MySQL AES密钥
-        secret_key = generate_mysql_aes_key(key, encoding)
-        
-        # 创建AES解密器（ECB模式，PKCS5填充）
-        cipher = AES.new(secret_key, AES.MODE_ECB)
+        # 获取AES解密器（ECB模式，PKCS5填充；密钥与解密器均已缓存）
+        cipher = _get_ecb_cipher(key, encoding)
         
         # 将十六进制字符串解码为字节数组
         ciphertext_bytes = binascii.unhexlify(ciphertext)
@@ -80,7 +116,7 @@ def mysql_adapter_decrypt(key: str, ciphertext: str, encoding: str = "UTF-8") ->
         # 转换为UTF-8字符串
         result = decrypted_bytes.decode(encoding)
         
-        logger.debug(f"解密后 <{result}>")
+        logger.debug("解密后，明文长度=%d", len(result))
         return result
         
     except Exception as e:
@@ -88,20 +124,132 @@ def mysql_adapter_decrypt(key: str, ciphertext: str, encoding: str = "UTF-8") ->
         raise Exception(f"解密失败: {str(e)}")
 
 
-def mysql_adapter_encrypt(key: str, plaintext: str, encoding: str = "UTF-8") -> str:
+def mysql_adapter_decrypt_stream(key: str, stream, length: int, encoding: str = "UTF-8",
+                                 chunk_size: int = STREAM_CHUNK_SIZE) -> bytearray:
+    """
+    MySQL适配器流式解密方法（与 mysql_adapter_decrypt 结果一致，适用于大请求体）
+    
+    从输入流中分块读取十六进制密文，边解码边按 16 字节分组解密，
+    直接写入一块预分配的缓冲区，不在内存中保留完整的密文及其中间副本。
+    与 mysql_adapter_decrypt 一样忽略密文首尾的空白字符。
+    
+    Args:
+        key: AES解密密钥
+        stream: 可读的二进制流（例如 WSGI 输入流）
+        length: 需要从流中读取的字节数（请求体长度）
+        encoding: 密钥的字符编码，默认为UTF-8
+        chunk_size: 每次读取的字节数
+        
+    Returns:
+        去除PKCS5填充后的明文字节
+        
+    Raises:
+        Exception: 解密失败时
+    """
+    try:
+        cipher = _get_ecb_cipher(key, encoding)
+        buffer = bytearray(length // 2)
+        pos = 0
+        carry = b""
+        remaining = length
+        started = False
+        trailing_space = False
+        with memoryview(buffer) as view:
+            while remaining > 0:
+                chunk = stream.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                if not started:
+                    chunk = chunk.lstrip()
+                    if not chunk:
+                        continue
+                    started = True
+                body = chunk.rstrip()
+                if trailing_space and body:
+                    raise ValueError("密文中包含空白字符")
+                if len(body) < len(chunk):
+                    trailing_space = True
+                
+                # 只解码完整的分组，剩余的十六进制字符留到下一块
+                hex_data = carry + body if carry else body
+                usable = len(hex_data) - len(hex_data) % _HEX_BLOCK_SIZE
+                carry = hex_data[usable:]
+                if usable:
+                    block = binascii.unhexlify(hex_data[:usable])
+                    cipher.decrypt(block, output=view[pos:pos + len(block)])
+                    pos += len(block)
+            
+            if carry:
+                raise ValueError("密文长度不是16字节的整数倍")
+            if pos == 0:
+                raise ValueError("密文为空")
+            
+            # 去除PKCS5填充
+            padding = view[pos - 1]
+            if not 1 <= padding <= AES.block_size or view[pos - padding:pos] != bytes([padding]) * padding:
+                raise ValueError("Padding is incorrect.")
+            pos -= padding
+        
+        del buffer[pos:]
+        logger.debug("流式解密完成，明文长度=%d", pos)
+        return buffer
+        
+    except Exception as e:
+        logger.error(f"解密失败: {e}", exc_info=True)
+        raise Exception(f"解密失败: {str(e)}")
+
+
+def mysql_adapter_encrypt(key: str, plaintext: Union[str, bytes], encoding: str = "UTF-8") -> str:
     """
     MySQL适配器加密方法（输出十六进制字符串，与Java mysqlAdapterEncrypt兼容）
+    plaintext 为 bytes 时视为已按 encoding 编码的明文，不再重复编码
     """
     if plaintext is None:
         return None
 
     try:
-        secret_key = generate_mysql_aes_key(key, encoding)
-        cipher = AES.new(secret_key, AES.MODE_ECB)
-        padded = pad(plaintext.encode(encoding), AES.block_size)
+        cipher = _get_ecb_cipher(key, encoding)
+        padded = pad(plaintext.encode(encoding) if isinstance(plaintext, str) else plaintext, AES.block_size)
         encrypted = cipher.encrypt(padded)
         return binascii.hexlify(encrypted).decode("ascii").upper()
     except Exception as e:
         logger.error(f"加密失败: {e}", exc_info=True)
         raise Exception(f"加密失败: {str(e)}")
 
+
+def mysql_adapter_encrypt_stream(key: str, chunks: Iterable[Union[str, bytes]], encoding: str = "UTF-8",
+                                 chunk_size: int = ENCRYPT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    MySQL适配器流式加密方法（拼接全部输出与 mysql_adapter_encrypt 的结果一致，适用于大响应）
+    
+    逐块读取明文，凑满整数个 16 字节分组后立即加密并输出大写十六进制，
+    最后一块补 PKCS5 填充；内存中只保留不超过 chunk_size 的明文。
+    
+    Args:
+        key: AES加密密钥
+        chunks: 明文片段（str 按 encoding 编码，bytes 原样使用）
+        encoding: 字符编码，默认为UTF-8
+        chunk_size: 每次加密输出的明文字节数（会向下取整到分组大小）
+        
+    Yields:
+        十六进制密文片段
+    """
+    # 生成器可能在不同线程中恢复执行（例如 ASGI 流式响应），每块都取当前线程的加解密器
+    chunk_size = max(AES.block_size, chunk_size - chunk_size % AES.block_size)
+    buffer = bytearray()
+    total = 0
+    for chunk in chunks:
+        buffer += chunk.encode(encoding) if isinstance(chunk, str) else chunk
+        if len(buffer) < chunk_size:
+            continue
+        usable = len(buffer) - len(buffer) % AES.block_size
+        encrypted = _get_ecb_cipher(key, encoding).encrypt(bytes(buffer[:usable]))
+        del buffer[:usable]
+        total += usable
+        yield binascii.hexlify(encrypted).decode("ascii").upper()
+    
+    encrypted = _get_ecb_cipher(key, encoding).encrypt(pad(bytes(buffer), AES.block_size))
+    total += len(encrypted)
+    logger.debug("流式加密完成，密文字节数=%d", total)
+    yield binascii.hexlify(encrypted).decode("ascii").upper()
@@ -4,38 +4,79 @@ Flask Web应用主文件
 同时提供基于 WebSocket 签名服务的 getCode 接口
 """
 import logging
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 import config
-from services.xml_service import (
-    decrypt_request_body,
-    extract_directory,
-    validate_request_data,
-    save_xml_file,
-    list_xml_files,
-    delete_xml_file,
-    encrypt_response_data,
-    ensure_directory_exists,
+import json_util
+from log_util import setup_logging
+import metrics_util
+from metrics_util import stage_timer, timed
+from services.xml_service import ensure_directory_exists
+from services.http_handlers import (
+    ApiResponse,
+    handle_list_files,
+    handle_add_file,
+    handle_delete_file,
+    handle_get_file,
+    handle_changes,
+    handle_add_files_batch,
+    handle_delete_files_batch,
+    handle_root,
+    handle_health,
+    handle_metrics,
+    check_sign_service,
+    parse_getcode_request,
+    build_getcode_response,
+    parse_getcode_batch_request,
+    build_getcode_batch_response,
+    sign_error_response,
 )
-from websocket_wrapper import WebSocketWrapper, WebSocketError
+from services.sign_service import create_sign_service
+from services.xml_changes import close_change_feeds
 
-# 配置日志
-logging.basicConfig(
-    level=getattr(logging, config.LOG_LEVEL),
-    format=config.LOG_FORMAT
-)
+# 配置日志（队列式异步输出，请求线程不阻塞在日志 I/O 上）
+setup_logging(config.LOG_LEVEL, config.LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
+
+class JsonProvider(DefaultJSONProvider):
+    """
+    jsonify 与请求 JSON 解析使用 json_util（可用时由 orjson / msgspec 加速），
+    输出与默认实现逐字节一致（紧凑格式、按键排序、末尾换行）
+    """
+
+    ensure_ascii = False
+
+    def loads(self, s, **kwargs):
+        return json_util.loads(s)
+
+    def response(self, *args, **kwargs) -> Response:
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = json_util.dumps_compact(obj, sort_keys=self.sort_keys, default=self.default) + b"\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
 app = Flask(__name__)
 # 返回JSON时禁用ASCII转义，保证中文直出
 app.config["JSON_AS_ASCII"] = False
-# 兼容Flask新版 JSON provider 的设置
-try:
-    app.json.ensure_ascii = False  # type: ignore
-except Exception:
-    pass
+app.json = JsonProvider(app)
 
-# 初始化 WebSocket 签名服务封装
-sign_service = WebSocketWrapper()
+# 初始化签名服务：本进程内的 WebSocketWrapper，或启用签名守护进程时连接守护进程的客户端（接口一致）
+sign_service = create_sign_service()
+metrics_util.register_sign_service_metrics(sign_service)
+
+
+def _respond(response: ApiResponse):
+    """把 services.http_handlers 的处理结果转换为 Flask 响应"""
+    if response.stream is not None:
+        return Response(response.stream, status=response.status, mimetype=response.media_type,
+                        headers=response.headers)
+    if isinstance(response.body, str):
+        return Response(response.body, status=response.status, mimetype=response.media_type,
+                        headers=response.headers)
+    return jsonify(response.body), response.status, response.headers or {}
 
 
 @app.route('/xml-files/list', methods=['POST'])
@@ -43,30 +84,11 @@ def list_files():
     """
     获取指定目录下的所有XML文件（文件名 + 内容）
     请求体：密文 -> 解密后JSON，可包含字段 目录
+    可选分页/过滤字段：offset、limit、cursor、prefix、pattern、mtimeFrom、mtimeTo（毫秒时间戳）、
+    fields（name / meta / full）；使用任一字段时 data 为 {"files", "total", "nextCursor"}
     返回：data 为对象时加密后返回
     """
-    try:
-        raw_body = request.get_data()
-        logger.info("收到 xml-files/list 请求")
-        request_data = decrypt_request_body(raw_body, config.AES_KEY, encoding="UTF-8")
-        directory = extract_directory(request_data, config.SAVE_FOLDER)
-
-        files = list_xml_files(directory)
-        logger.info("xml-files/list 查询成功，文件数量=%d", len(files))
-        resp_data = encrypt_response_data(files, config.AES_KEY)
-
-        return jsonify({
-            "code": 200,
-            "msg": "查询成功",
-            "data": resp_data
-        }), 200
-    except Exception as e:
-        logger.error(f"查询XML文件列表失败: {e}", exc_info=True)
-        return jsonify({
-            "code": 500,
-            "msg": f"查询失败: {str(e)}",
-            "data": False
-        }), 500
+    return _respond(handle_list_files(request.get_data()))
 
 
 @app.route('/xml-files/add', methods=['POST'])
@@ -75,42 +97,7 @@ def add_file():
     新增XML文件
     请求体：密文 -> 解密后JSON，需要 文件名、xml报文，可选 目录
     """
-    try:
-        raw_body = request.get_data()
-        logger.info("收到 xml-files/add 请求")
-        request_data = decrypt_request_body(raw_body, config.AES_KEY, encoding="UTF-8")
-
-        try:
-            filename, xml_content = validate_request_data(request_data)
-            directory = extract_directory(request_data, config.SAVE_FOLDER)
-        except ValueError as e:
-            return jsonify({
-                "code": 500,
-                "msg": str(e),
-                "data": False
-            }), 400
-
-        try:
-            save_xml_file(filename, xml_content, directory)
-        except Exception as e:
-            return jsonify({
-                "code": 500,
-                "msg": str(e),
-                "data": False
-            }), 500
-
-        return jsonify({
-            "code": 200,
-            "msg": "新增成功",
-            "data": True
-        }), 200
-    except Exception as e:
-        logger.error(f"新增XML文件失败: {e}", exc_info=True)
-        return jsonify({
-            "code": 500,
-            "msg": f"服务器内部错误: {str(e)}",
-            "data": False
-        }), 500
+    return _respond(handle_add_file(request.stream, request.content_length))
 
 
 @app.route('/xml-files/delete', methods=['POST'])
@@ -119,55 +106,52 @@ def delete_file():
     删除指定XML文件
     请求体：密文 -> 解密后JSON，需要 文件名，可选 目录
     """
-    try:
-        raw_body = request.get_data()
-        logger.info("收到 xml-files/delete 请求")
-        request_data = decrypt_request_body(raw_body, config.AES_KEY, encoding="UTF-8")
-
-        if not isinstance(request_data, dict):
-            return jsonify({
-                "code": 500,
-                "msg": "请求数据必须是JSON对象",
-                "data": False
-            }), 400
-
-        filename = request_data.get("filename")
-        if not filename or not isinstance(filename, str):
-            return jsonify({
-                "code": 500,
-                "msg": "filename不能为空且必须是字符串",
-                "data": False
-            }), 400
-
-        directory = extract_directory(request_data, config.SAVE_FOLDER)
-
-        try:
-            delete_xml_file(filename, directory)
-        except FileNotFoundError as e:
-            return jsonify({
-                "code": 500,
-                "msg": str(e),
-                "data": False
-            }), 404
-        except Exception as e:
-            return jsonify({
-                "code": 500,
-                "msg": str(e),
-                "data": False
-            }), 500
-
-        return jsonify({
-            "code": 200,
-            "msg": "删除成功",
-            "data": True
-        }), 200
-    except Exception as e:
-        logger.error(f"删除XML文件失败: {e}", exc_info=True)
-        return jsonify({
-            "code": 500,
-            "msg": f"服务器内部错误: {str(e)}",
-            "data": False
-        }), 500
+    return _respond(handle_delete_file(request.get_data()))
+
+
+@app.route('/xml-files/get', methods=['POST'])
+def get_file():
+    """
+    获取单个XML文件
+    请求体：密文 -> 解密后JSON，需要 文件名，可选 目录、ifNoneMatch（上次返回的 etag，也可用请求头 If-None-Match）
+    返回：data 为加密后的 {"filename", "xml", "size", "mtime", "etag"}，响应头 ETag；
+    ifNoneMatch 与当前 ETag 相同时返回 code 304、data 为 false（不读取、不加密文件内容）
+    """
+    return _respond(handle_get_file(request.get_data(), request.headers.get("If-None-Match")))
+
+
+@app.route('/xml-files/changes', methods=['POST'])
+def xml_changes():
+    """
+    XML文件变更订阅（长轮询）
+    请求体：密文 -> 解密后JSON，可选 目录、cursor（上次返回的 cursor，不传时只返回当前 cursor）、
+    limit（最多返回的事件数）、wait（没有新事件时最多等待的秒数）
+    返回：data 为加密后的 {"events": [{"seq", "op": "save"/"delete", "filename", "size", "mtime"}],
+    "cursor", "more", "reset"}；reset 为 true 时客户端需要用 /xml-files/list 重新同步
+    """
+    return _respond(handle_changes(request.get_data()))
+
+
+@app.route('/xml-files/add-batch', methods=['POST'])
+def add_files_batch():
+    """
+    批量新增XML文件
+    请求体：密文 -> 解密后JSON数组 [{"filename", "xml", 可选 "directory"}, ...]，
+    或 {"items": [...], "directory": 默认目录}
+    响应：data 为加密后的数组，与请求一一对应，每项为 {"filename", "code": 200} 或 {"filename", "code": 400/500, "msg"}
+    """
+    return _respond(handle_add_files_batch(request.stream, request.content_length))
+
+
+@app.route('/xml-files/delete-batch', methods=['POST'])
+def delete_files_batch():
+    """
+    批量删除XML文件
+    请求体：密文 -> 解密后JSON数组 [{"filename", 可选 "directory"} 或文件名, ...]，
+    或 {"items": [...], "directory": 默认目录}
+    响应：data 为加密后的数组，与请求一一对应，每项为 {"filename", "code": 200} 或 {"filename", "code": 400/404/500, "msg"}
+    """
+    return _respond(handle_delete_files_batch(request.get_data()))
 
 
 @app.route('/', methods=['GET'])
@@ -175,22 +159,7 @@ def root():
     """
     根路径，返回服务信息
     """
-    return jsonify({
-        "service": "Sign Server",
-        "version": "1.0.0",
-        "status": "running" if sign_service.is_available() else "websocket_not_available",
-        "endpoints": {
-            "xml_files": {
-                "list": {"method": "POST", "path": "/xml-files/list"},
-                "add": {"method": "POST", "path": "/xml-files/add"},
-                "delete": {"method": "POST", "path": "/xml-files/delete"},
-            },
-            "sign": {
-                "getCode": {"method": "POST", "path": "/getCode"},
-            },
-            "health": {"method": "GET", "path": "/health"},
-        }
-    }), 200
+    return _respond(handle_root(sign_service))
 
 
 @app.route('/health', methods=['GET'])
@@ -198,16 +167,19 @@ def health_check():
     """
     健康检查接口
     """
-    sign_status = "healthy" if sign_service.is_available() else "websocket_not_available"
-    return jsonify({
-        "code": 200,
-        "msg": "服务运行正常",
-        "data": True,
-        "sign_status": sign_status
-    }), 200
+    return _respond(handle_health(sign_service))
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    监控指标接口（Prometheus 文本格式）：分阶段耗时直方图、重连次数、排队数等
+    """
+    return _respond(handle_metrics())
 
 
 @app.route('/getCode', methods=['POST'])
+@timed("getcode")
 def getcode():
     """
     基于 WebSocket 签名服务的 getCode 接口
@@ -225,121 +197,45 @@ def getcode():
         "data": "加密后的密文（包含 getCodeResult）"
     }
     """
-    if not sign_service.is_available():
-        msg = "WebSocket 签名服务未正确初始化"
-        logger.error(msg)
-        return jsonify({
-            "code": 500,
-            "msg": msg,
-            "data": False
-        }), 500
+    unavailable = check_sign_service(sign_service)
+    if unavailable is not None:
+        return _respond(unavailable)
+    
+    try:
+        str_data, pwdstr, priority, timeout = parse_getcode_request(request.get_data())
+        with stage_timer("getcode.sign"):
+            result = sign_service.get_code(str_data, pwdstr, priority, timeout)
+        return _respond(build_getcode_response(result))
+    except Exception as e:
+        return _respond(sign_error_response(e))
+
+
+@app.route('/getCode/batch', methods=['POST'])
+@timed("getcode_batch")
+def getcode_batch():
+    """
+    批量签名接口：一次请求签名多条数据，所有签名请求一次性提交到 WebSocket 连接上流水线发送
+    
+    请求体：密文 -> 解密后JSON数组：
+    [
+        {"str": "数据字符串", "pwdstr": "密码字符串"},
+        ...
+    ]
+    
+    响应：data 为加密后的数组，与请求一一对应，每项为
+    {"code": 200, "sign": "...", "certNo": "..."} 或 {"code": 400/500, "msg": "错误信息"}
+    """
+    unavailable = check_sign_service(sign_service)
+    if unavailable is not None:
+        return _respond(unavailable)
     
     try:
-        # 获取并解密请求数据（与 XML 接口保持一致）
-        raw_body = request.get_data()
-        logger.info("收到 getCode 请求")
-        request_data = decrypt_request_body(raw_body, config.AES_KEY, encoding="UTF-8")
-        if not isinstance(request_data, dict):
-            return jsonify({
-                "code": 400,
-                "msg": "请求数据必须是JSON对象",
-                "data": False
-            }), 400
-        
-        str_data = request_data.get("str")
-        pwdstr = request_data.get("pwdstr")
-        
-        if str_data is None or pwdstr is None:
-            return jsonify({
-                "code": 400,
-                "msg": "请求体必须包含 'str' 和 'pwdstr' 字段",
-                "data": False
-            }), 400
-        
-        if not isinstance(str_data, str) or not isinstance(pwdstr, str):
-            return jsonify({
-                "code": 400,
-                "msg": "'str' 和 'pwdstr' 必须是字符串类型",
-                "data": False
-            }), 400
-
-        
-        result = sign_service.get_code(str_data, pwdstr)
-        
-        logger.info("WebSocket.getCode 调用成功，结果长度=%d", len(result))
-        logger.debug("WebSocket.getCode 返回结果: %r", result[:200])
-        
-        # 拆分结果：如果符合 "签名字符串||证书号字符串" 格式，且两部分都有值，则拆分
-        # 如果无法拆分，返回错误并将结果放到msg中
-        if "||" in result:
-            parts = result.split("||", 1)  # 只分割一次，防止证书号中包含 ||
-            if len(parts) == 2:
-                sign = parts[0].strip()
-                cert_no = parts[1].strip()
-                # 检查两部分是否都有值
-                if sign and cert_no:
-                    response_data = {
-                        "sign": sign,
-                        "certNo": cert_no
-                    }
-                    logger.info("结果已拆分为 sign 和 certNo")
-                    
-                    # 加密响应数据（与 XML 接口保持一致）
-                    resp_data = encrypt_response_data(response_data, config.AES_KEY)
-                    
-                    return jsonify({
-                        "code": 200,
-                        "msg": "成功",
-                        "data": resp_data
-                    }), 200
-                else:
-                    # 如果拆分后有空值，返回错误
-                    logger.error("结果拆分后存在空值: sign=%r, certNo=%r", sign, cert_no)
-                    return jsonify({
-                        "code": 500,
-                        "msg": result,
-                        "data": False
-                    }), 500
-            else:
-                # 如果拆分失败，返回错误
-                logger.error("结果格式不符合预期，拆分后部分数量=%d", len(parts))
-                return jsonify({
-                    "code": 500,
-                    "msg": result,
-                    "data": False
-                }), 500
-        else:
-            # 如果不包含 ||，返回错误
-            logger.error("结果不包含分隔符 ||，无法拆分")
-            return jsonify({
-                "code": 500,
-                "msg": result,
-                "data": False
-            }), 500
-        
-    except ValueError as e:
-        # 解密失败或数据格式错误
-        logger.error(f"请求数据解析失败: {e}", exc_info=True)
-        return jsonify({
-            "code": 400,
-            "msg": str(e),
-            "data": False
-        }), 400
-    except WebSocketError as e:
-        logger.error("WebSocketError: %s", e, exc_info=True)
-        return jsonify({
-            "code": 500,
-            "msg": str(e),
-            "data": False
-        }), 500
+        params, valid, priority, timeout = parse_getcode_batch_request(request.get_data())
+        with stage_timer("getcode_batch.sign"):
+            results = sign_service.get_codes(valid, priority, timeout)
+        return _respond(build_getcode_batch_response(params, results))
     except Exception as e:
-        msg = f"调用 WebSocket.getCode 失败: {e}"
-        logger.error(msg, exc_info=True)
-        return jsonify({
-            "code": 500,
-            "msg": msg,
-            "data": False
-        }), 500
+        return _respond(sign_error_response(e, action="WebSocket.getCode 批量签名"))
 
 
 if __name__ == '__main__':
@@ -358,8 +254,11 @@ if __name__ == '__main__':
         logger.error(f"启动 WebSocket 连接失败: {e}", exc_info=True)
     
     try:
-        app.run(host=config.HOST, port=config.PORT, debug=True)
+        # 开发服务器，生产环境请使用 serve.py（waitress / gunicorn）
+        # 关闭自动重载：重载器会再启动一个进程，重复连接操作员卡
+        app.run(host=config.HOST, port=config.PORT, debug=config.DEBUG, use_reloader=False)
     finally:
-        # 停止 WebSocket 连接
+        # 停止 WebSocket 连接与变更订阅的后台扫描
         sign_service.stop()
+        close_change_feeds()
 
@@ -0,0 +1,294 @@
+"""
+ASGI 应用（app.py 的异步版本）
+提供与 app.py 相同的 /getCode、/getCode/batch、/xml-files/*、/health 与 /metrics 接口，
+各接口的处理逻辑与 app.py 共用 services/http_handlers.py，这里只做异步适配。
+
+签名请求以协程方式等待 WebSocketWrapper.get_code_async，大量并发调用方共享一个事件循环，
+而不是在 Flask 线程模式下各占一个线程；XML 文件读写仍为阻塞 I/O，放到线程池中执行。
+
+依赖 starlette，运行方式：
+    uvicorn asgi_app:app --host 0.0.0.0 --port 8801
+或：
+    python asgi_app.py
+"""
+import contextlib
+import logging
+import time
+from typing import Optional
+
+from anyio import from_thread
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse as StarletteJSONResponse
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+import config
+import json_util
+from log_util import setup_logging
+import metrics_util
+from metrics_util import stage_timer, timed
+from services.xml_changes import close_change_feeds
+from services.xml_service import (
+    POLL_SECONDS,
+    changes_ready,
+    ensure_directory_exists,
+    open_change_feed,
+    read_xml_changes,
+)
+from services.http_handlers import (
+    ApiResponse,
+    handle_list_files,
+    handle_add_file,
+    handle_delete_file,
+    handle_get_file,
+    check_change_feed,
+    parse_changes_request,
+    build_changes_response,
+    changes_error_response,
+    handle_add_files_batch,
+    handle_delete_files_batch,
+    handle_root,
+    handle_health,
+    handle_metrics,
+    check_sign_service,
+    parse_getcode_request,
+    build_getcode_response,
+    parse_getcode_batch_request,
+    build_getcode_batch_response,
+    sign_error_response,
+)
+from services.sign_service import create_sign_service
+
+# 配置日志（队列式异步输出，请求线程不阻塞在日志 I/O 上）
+setup_logging(config.LOG_LEVEL, config.LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+
+class JSONResponse(StarletteJSONResponse):
+    """JSON 响应使用 json_util 序列化（可用时由 orjson / msgspec 加速），输出与 Starlette 默认实现逐字节一致"""
+
+    def render(self, content) -> bytes:
+        return json_util.dumps_compact(content, allow_nan=False)
+
+
+# 初始化签名服务：本进程内的 WebSocketWrapper，或启用签名守护进程时连接守护进程的客户端（接口一致）
+sign_service = create_sign_service()
+metrics_util.register_sign_service_metrics(sign_service)
+
+
+def _respond(response: ApiResponse) -> Response:
+    """把 services.http_handlers 的处理结果转换为 Starlette 响应"""
+    if response.stream is not None:
+        # 同步迭代器由 StreamingResponse 放到线程池中逐块迭代
+        return StreamingResponse(response.stream, status_code=response.status, media_type=response.media_type,
+                                 headers=response.headers)
+    if isinstance(response.body, str):
+        return Response(response.body, response.status, headers=response.headers, media_type=response.media_type)
+    return JSONResponse(response.body, response.status, headers=response.headers)
+
+
+class _RequestBodyReader:
+    """
+    把 ASGI 请求体（在事件循环中分块接收）包装成同步可读流，供线程池中的流式解密使用：
+    每次 read() 回到事件循环取下一块数据，请求体不会整体读入内存
+    """
+
+    def __init__(self, request: Request) -> None:
+        self._chunks = request.stream().__aiter__()
+        self._buffer = b""
+        self._eof = False
+
+    async def _next_chunk(self) -> bytes:
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return b""
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            chunks = [self._buffer]
+            while not self._eof:
+                chunk = from_thread.run(self._next_chunk)
+                self._eof = not chunk
+                chunks.append(chunk)
+            self._buffer = b""
+            return b"".join(chunks)
+        if not self._buffer and not self._eof:
+            self._buffer = from_thread.run(self._next_chunk)
+            self._eof = not self._buffer
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _content_length(request: Request) -> Optional[int]:
+    """请求体长度（分块传输等未知长度时返回 None）"""
+    value = request.headers.get("content-length")
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+async def list_files(request: Request) -> Response:
+    """获取指定目录下的所有XML文件（文件名 + 内容），与 app.py 一致"""
+    raw_body = await request.body()
+    return _respond(await run_in_threadpool(handle_list_files, raw_body))
+
+
+async def add_file(request: Request) -> JSONResponse:
+    """新增XML文件，与 app.py 一致（请求体在线程池中流式解密）"""
+    reader = _RequestBodyReader(request)
+    return _respond(await run_in_threadpool(handle_add_file, reader, _content_length(request)))
+
+
+async def delete_file(request: Request) -> JSONResponse:
+    """删除指定XML文件，与 app.py 一致"""
+    raw_body = await request.body()
+    return _respond(await run_in_threadpool(handle_delete_file, raw_body))
+
+
+async def get_file(request: Request) -> JSONResponse:
+    """获取单个XML文件（支持 ETag 条件请求），与 app.py 一致"""
+    raw_body = await request.body()
+    return _respond(await run_in_threadpool(handle_get_file, raw_body, request.headers.get("if-none-match")))
+
+
+async def xml_changes(request: Request) -> JSONResponse:
+    """XML文件变更订阅（长轮询），与 app.py 一致；等待新事件时不占用线程"""
+    unavailable = check_change_feed()
+    if unavailable is not None:
+        return _respond(unavailable)
+    try:
+        raw_body = await request.body()
+        params = await run_in_threadpool(parse_changes_request, raw_body)
+        if isinstance(params, ApiResponse):
+            return _respond(params)
+        directory, cursor, limit, wait = params
+
+        feed = await run_in_threadpool(open_change_feed, directory)
+        deadline = time.monotonic() + wait
+        while True:
+            version = feed.version
+            result = await run_in_threadpool(read_xml_changes, directory, cursor, limit)
+            remaining = deadline - time.monotonic()
+            if changes_ready(result, cursor) or remaining <= 0 or feed.closed:
+                break
+            await feed.wait_async(version, min(remaining, POLL_SECONDS))
+
+        return _respond(await run_in_threadpool(build_changes_response, result))
+    except Exception as e:
+        return _respond(changes_error_response(e))
+
+
+async def add_files_batch(request: Request) -> JSONResponse:
+    """批量新增XML文件，与 app.py 一致（请求体在线程池中流式解密）"""
+    reader = _RequestBodyReader(request)
+    return _respond(await run_in_threadpool(handle_add_files_batch, reader, _content_length(request)))
+
+
+async def delete_files_batch(request: Request) -> JSONResponse:
+    """批量删除XML文件，与 app.py 一致"""
+    raw_body = await request.body()
+    return _respond(await run_in_threadpool(handle_delete_files_batch, raw_body))
+
+
+async def root(request: Request) -> JSONResponse:
+    """根路径，返回服务信息"""
+    return _respond(handle_root(sign_service))
+
+
+async def health_check(request: Request) -> JSONResponse:
+    """健康检查接口（签名守护进程模式下状态需要一次 IPC 往返，在线程池中读取）"""
+    return _respond(await run_in_threadpool(handle_health, sign_service))
+
+
+async def metrics(request: Request) -> Response:
+    """
+    监控指标接口（Prometheus 文本格式），与 app.py 一致
+    签名守护进程模式下排队数等状态需要一次 IPC 往返，在线程池中输出
+    """
+    return _respond(await run_in_threadpool(handle_metrics))
+
+
+@timed("getcode")
+async def getcode(request: Request) -> JSONResponse:
+    """
+    基于 WebSocket 签名服务的 getCode 接口（异步版本），请求与响应格式与 app.py 一致
+    """
+    unavailable = check_sign_service(sign_service)
+    if unavailable is not None:
+        return _respond(unavailable)
+
+    try:
+        raw_body = await request.body()
+        # 解密与加密都在线程池中执行，不占用事件循环
+        str_data, pwdstr, priority, timeout = await run_in_threadpool(parse_getcode_request, raw_body)
+        with stage_timer("getcode.sign"):
+            result = await sign_service.get_code_async(str_data, pwdstr, priority, timeout)
+        return _respond(await run_in_threadpool(build_getcode_response, result))
+    except Exception as e:
+        return _respond(sign_error_response(e))
+
+
+@timed("getcode_batch")
+async def getcode_batch(request: Request) -> JSONResponse:
+    """
+    批量签名接口（异步版本），请求与响应格式与 app.py 一致
+    """
+    unavailable = check_sign_service(sign_service)
+    if unavailable is not None:
+        return _respond(unavailable)
+
+    try:
+        raw_body = await request.body()
+        params, valid, priority, timeout = await run_in_threadpool(parse_getcode_batch_request, raw_body)
+        with stage_timer("getcode_batch.sign"):
+            results = await sign_service.get_codes_async(valid, priority, timeout)
+        return _respond(await run_in_threadpool(build_getcode_batch_response, params, results))
+    except Exception as e:
+        return _respond(sign_error_response(e, action="WebSocket.getCode 批量签名"))
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: Starlette):
+    """应用生命周期：启动时建立签名服务，退出时关闭"""
+    ensure_directory_exists(config.SAVE_FOLDER)
+    try:
+        # start() 会同步建立连接，放到线程池中执行，避免启动期间阻塞事件循环
+        await run_in_threadpool(sign_service.start)
+    except Exception as e:
+        logger.error(f"启动 WebSocket 连接失败: {e}", exc_info=True)
+    try:
+        yield
+    finally:
+        await run_in_threadpool(sign_service.stop)
+        await run_in_threadpool(close_change_feeds)
+
+
+app = Starlette(
+    routes=[
+        Route('/xml-files/list', list_files, methods=['POST']),
+        Route('/xml-files/add', add_file, methods=['POST']),
+        Route('/xml-files/get', get_file, methods=['POST']),
+        Route('/xml-files/delete', delete_file, methods=['POST']),
+        Route('/xml-files/changes', xml_changes, methods=['POST']),
+        Route('/xml-files/add-batch', add_files_batch, methods=['POST']),
+        Route('/xml-files/delete-batch', delete_files_batch, methods=['POST']),
+        Route('/', root, methods=['GET']),
+        Route('/health', health_check, methods=['GET']),
+        Route('/metrics', metrics, methods=['GET']),
+        Route('/getCode', getcode, methods=['POST']),
+        Route('/getCode/batch', getcode_batch, methods=['POST']),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    logger.info("ASGI应用启动")
+    logger.info(f"服务地址: http://{config.HOST}:{config.PORT}")
+    uvicorn.run(app, host=config.HOST, port=config.PORT)
@@ -0,0 +1,6 @@
+"""
+性能基准与本地测试工具
+
+在项目根目录下以模块方式运行，例如：
+    python -m benchmarks.bench_websocket_sign
+"""
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+AES 加解密单次调用耗时基准测试
+
+对比每次调用都重新派生密钥、新建 AES.new 加解密器（缓存前的做法）
+与 aes_util 中缓存密钥和 ECB 加解密器之后的单次调用耗时。
+
+用法：
+    python -m benchmarks.bench_aes_util --size 256 --number 20000
+"""
+import argparse
+import binascii
+import json
+import timeit
+
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad, unpad
+
+import config
+from aes_util import mysql_adapter_decrypt, mysql_adapter_encrypt
+
+
+def _uncached_key(key: str, encoding: str = "UTF-8") -> bytes:
+    """缓存前的密钥派生：每次调用都执行 Python 层的 XOR 循环"""
+    final_key = bytearray(16)
+    for i, b in enumerate(key.encode(encoding)):
+        final_key[i % 16] ^= b
+    return bytes(final_key)
+
+
+def uncached_encrypt(key: str, plaintext: str, encoding: str = "UTF-8") -> str:
+    cipher = AES.new(_uncached_key(key, encoding), AES.MODE_ECB)
+    encrypted = cipher.encrypt(pad(plaintext.encode(encoding), AES.block_size))
+    return binascii.hexlify(encrypted).decode("ascii").upper()
+
+
+def uncached_decrypt(key: str, ciphertext: str, encoding: str = "UTF-8") -> str:
+    cipher = AES.new(_uncached_key(key, encoding), AES.MODE_ECB)
+    decrypted = unpad(cipher.decrypt(binascii.unhexlify(ciphertext)), AES.block_size)
+    return decrypted.decode(encoding)
+
+
+def per_call_us(func, number: int) -> float:
+    """返回单次调用的平均耗时（微秒），取多轮中的最小值"""
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="AES 加解密单次调用耗时基准测试")
+    parser.add_argument("--size", type=int, default=256, help="明文大小（字节，近似）")
+    parser.add_argument("--number", type=int, default=20000, help="每轮调用次数")
+    args = parser.parse_args()
+
+    key = config.AES_KEY
+    plaintext = json.dumps({"str": "x" * max(args.size - 32, 1), "pwdstr": "00000000"})
+    ciphertext = mysql_adapter_encrypt(key, plaintext)
+    assert uncached_encrypt(key, plaintext) == ciphertext
+    assert uncached_decrypt(key, ciphertext) == plaintext
+
+    rows = [
+        ("加密", lambda: uncached_encrypt(key, plaintext), lambda: mysql_adapter_encrypt(key, plaintext)),
+        ("解密", lambda: uncached_decrypt(key, ciphertext), lambda: mysql_adapter_decrypt(key, ciphertext)),
+    ]
+    print(f"明文长度 {len(plaintext)} 字节，每轮 {args.number} 次")
+    for name, before, after in rows:
+        before_us = per_call_us(before, args.number)
+        after_us = per_call_us(after, args.number)
+        print(f"{name}: 缓存前 {before_us:7.2f} us/次，缓存后 {after_us:7.2f} us/次，"
+              f"节省 {before_us - after_us:6.2f} us/次")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+JSON 编解码基准测试（标准库 json / orjson / msgspec）
+
+对每种编解码实现分别测量：
+- 内层报文序列化（encrypt_response_data 加密前的 json_util.dumps，文件列表）
+- 外层响应序列化（{"code", "msg", "data": 密文} 的紧凑格式，即 jsonify）
+- 请求体解析（签名请求、单个 XML 新增请求）
+- 完整的 /xml-files/list 请求（Flask 测试客户端，不经过网络）
+
+并校验各实现的输出与标准库逐字节一致。
+
+用法：
+    python -m benchmarks.bench_json --files 1000 --size 8192
+"""
+import argparse
+import json
+import logging
+import tempfile
+import time
+
+import config
+import json_util
+from aes_util import mysql_adapter_encrypt
+
+
+def best_of(func, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="JSON 编解码基准测试")
+    parser.add_argument("--files", type=int, default=1000, help="文件列表中的文件数")
+    parser.add_argument("--size", type=int, default=8192, help="每个 XML 文件的大致大小（字符）")
+    parser.add_argument("--repeat", type=int, default=5, help="每项取最好的几次")
+    parser.add_argument("--codecs", nargs="+", default=["json", "orjson", "msgspec"], help="要对比的编解码实现")
+    args = parser.parse_args()
+
+    line = "<ceb:OrderList><ceb:itemName>婴儿奶粉</ceb:itemName><ceb:price>199.00</ceb:price></ceb:OrderList>\n"
+    xml = '<?xml version="1.0" encoding="UTF-8"?>\n<ceb:CEB311Message>' + line * max(args.size // len(line), 1) \
+        + "</ceb:CEB311Message>"
+    files = [{"filename": f"CEB311_{i:06d}.xml", "xml": xml} for i in range(args.files)]
+    expected = json.dumps(files, ensure_ascii=False).encode("utf-8")
+    cipher_text = mysql_adapter_encrypt(config.AES_KEY, expected)
+    envelope = {"code": 200, "msg": "查询成功", "data": cipher_text}
+    sign_body = json.dumps({"inData": "<ceb:CEB311Message>" + "x" * 400 + "</ceb:CEB311Message>", "passwd": "88888888"})
+    add_body = json.dumps({"filename": "CEB311_000001", "xml": xml}, ensure_ascii=False)
+
+    config.SAVE_FOLDER = tempfile.mkdtemp(prefix="bench_json_")
+    config.XML_LIST_STREAM_THRESHOLD = 0
+    import app as app_module
+    from services.xml_service import _encrypted_listing_cache, save_xml_files
+    logging.disable(logging.INFO)
+    save_xml_files([(item["filename"], item["xml"], config.SAVE_FOLDER) for item in files])
+    client = app_module.app.test_client()
+    list_request = mysql_adapter_encrypt(config.AES_KEY, "{}").encode("utf-8")
+
+    def list_files() -> None:
+        # 每次都重新序列化与加密（不使用加密结果缓存）
+        _encrypted_listing_cache.clear()
+        assert client.post("/xml-files/list", data=list_request).status_code == 200
+
+    print(f"文件数={args.files}，报文 {len(expected) / 1024 / 1024:.1f} MB，外层响应 {len(cipher_text) / 1024 / 1024:.1f} MB")
+    try:
+        for name in args.codecs:
+            json_util._codec = None
+            config.JSON_CODEC = name
+            logging.disable(logging.NOTSET)
+            actual = json_util.codec_name()
+            logging.disable(logging.INFO)
+            if actual != name:
+                print(f"{name:>8}: 不可用（使用 {actual}），跳过")
+                continue
+            assert json_util.dumps(files) == expected
+            assert json_util.dumps_compact(envelope, sort_keys=True) == json.dumps(
+                envelope, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+            results = {
+                "内层报文": best_of(lambda: json_util.dumps(files), args.repeat),
+                "外层响应": best_of(lambda: json_util.dumps_compact(envelope, sort_keys=True), args.repeat),
+                "签名请求解析": best_of(lambda: json_util.loads(sign_body), args.repeat * 100),
+                "新增请求解析": best_of(lambda: json_util.loads(add_body), args.repeat * 10),
+                "list 请求": best_of(list_files, args.repeat),
+            }
+            print(f"{name:>8}: " + "，".join(
+                f"{label} {seconds * 1000:.3f} 毫秒" for label, seconds in results.items()))
+    finally:
+        app_module.sign_service.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+请求日志开销基准测试
+
+通过 Flask 测试客户端反复调用 /getCode（签名由本地模拟签名服务完成，不产生签名耗时），
+对比以下日志配置下的单次请求耗时：
+- 关闭：日志级别 WARNING
+- 同步全量：直接写文件，且每个请求都记录报文
+- 异步全量：队列式异步写文件，且每个请求都记录报文
+- 异步采样：队列式异步写文件，按 config.LOG_PAYLOAD_SAMPLE_RATE 采样记录报文
+
+用法：
+    python -m benchmarks.bench_logging --requests 500 --size 4096
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+import config
+from aes_util import mysql_adapter_encrypt
+from benchmarks.fake_signer_server import FakeSignerServer
+from log_util import setup_logging, stop_logging
+
+
+def _reset_logging() -> None:
+    stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def configure(mode: str, log_path: str, sample_rate: float) -> None:
+    """按模式配置日志"""
+    _reset_logging()
+    if mode == "关闭":
+        logging.getLogger().setLevel(logging.WARNING)
+        return
+    if mode == "同步全量":
+        config.LOG_PAYLOAD_SAMPLE_RATE = 1.0
+        handler = logging.FileHandler(log_path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter(config.LOG_FORMAT))
+        root = logging.getLogger()
+        root.setLevel(logging.INFO)
+        root.addHandler(handler)
+        return
+    config.LOG_PAYLOAD_SAMPLE_RATE = 1.0 if mode == "异步全量" else sample_rate
+    setup_logging("INFO", config.LOG_FORMAT, logging.FileHandler(log_path, encoding="utf-8"))
+
+
+def run(client, body: bytes, total: int) -> list:
+    """返回每个请求的耗时（毫秒）"""
+    latencies = []
+    for _ in range(total):
+        started = time.perf_counter()
+        response = client.post("/getCode", data=body)
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="请求日志开销基准测试")
+    parser.add_argument("--requests", type=int, default=500, help="每种配置的请求数")
+    parser.add_argument("--size", type=int, default=4096, help="待签名数据大小（字节）")
+    args = parser.parse_args()
+
+    sample_rate = config.LOG_PAYLOAD_SAMPLE_RATE
+    server = FakeSignerServer(latency=0, workers=8).start()
+    config.WS_URL = server.url
+    import app as app_module
+    app_module.sign_service.start()
+
+    plaintext = json.dumps({"str": "x" * args.size, "pwdstr": "00000000"})
+    body = mysql_adapter_encrypt(config.AES_KEY, plaintext).encode("utf-8")
+    client = app_module.app.test_client()
+    log_dir = tempfile.mkdtemp()
+    try:
+        print(f"请求数 {args.requests}，待签名数据 {args.size} 字节")
+        for mode in ["关闭", "同步全量", "异步全量", "异步采样"]:
+            log_path = os.path.join(log_dir, f"{mode}.log")
+            configure(mode, log_path, sample_rate)
+            run(client, body, 20)
+            latencies = run(client, body, args.requests)
+            _reset_logging()
+            size_kb = os.path.getsize(log_path) / 1024 if os.path.exists(log_path) else 0
+            print(f"{mode}: 平均 {statistics.mean(latencies):6.3f} ms，"
+                  f"P99 {statistics.quantiles(latencies, n=100)[98]:6.3f} ms，日志 {size_kb:8.1f} KB")
+    finally:
+        app_module.sign_service.stop()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
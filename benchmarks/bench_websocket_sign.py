@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+WebSocket 签名吞吐量基准测试
+
+启动若干本地模拟签名服务（每个代表一张操作员卡），用多个线程并发调用 WebSocketWrapper.get_code，
+对比不同 max_in_flight（1 即串行）和不同端点数量下的吞吐量；
+加 --batch 时同时测试 get_codes 一次性提交全部请求（/getCode/batch）的吞吐量。
+
+用法：
+    python -m benchmarks.bench_websocket_sign --requests 200 --threads 16 --latency 0.05 --workers 8
+    python -m benchmarks.bench_websocket_sign --servers 1 2 4 --workers 1 --in-flight 4
+    python -m benchmarks.bench_websocket_sign --batch
+"""
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_signer_server import FakeSignerServer
+from websocket_wrapper import WebSocketWrapper
+
+
+def run_once(urls: list, max_in_flight: int, total: int, threads: int, batch: bool = False) -> float:
+    """执行一轮测试，返回每秒签名数（batch 为 True 时用 get_codes 一次性提交全部请求）"""
+    wrapper = WebSocketWrapper(urls, max_in_flight=max_in_flight)
+    wrapper.start()
+    try:
+        wrapper.get_code("warm-up", "00000000")
+        started = time.perf_counter()
+        if batch:
+            results = wrapper.get_codes([(f"data-{i}", "00000000") for i in range(total)])
+        else:
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                results = list(pool.map(lambda i: wrapper.get_code(f"data-{i}", "00000000"), range(total)))
+        elapsed = time.perf_counter() - started
+        assert all(isinstance(r, str) and "||" in r for r in results)
+        return total / elapsed
+    finally:
+        wrapper.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="WebSocket 签名吞吐量基准测试")
+    parser.add_argument("--requests", type=int, default=200, help="签名请求总数")
+    parser.add_argument("--threads", type=int, default=16, help="并发调用线程数")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟单次签名耗时（秒）")
+    parser.add_argument("--workers", type=int, default=8, help="每个模拟签名服务的并行能力")
+    parser.add_argument("--servers", type=int, nargs="+", default=[1],
+                        help="要对比的签名端点数量")
+    parser.add_argument("--in-flight", type=int, nargs="+", default=[1, 4, 8, 16],
+                        help="要对比的 max_in_flight 取值")
+    parser.add_argument("--batch", action="store_true", help="同时测试批量签名（get_codes）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    servers = [
+        FakeSignerServer(latency=args.latency, workers=args.workers).start()
+        for _ in range(max(args.servers))
+    ]
+    try:
+        print(f"模拟签名服务: 耗时 {args.latency}s，每个端点并行 {args.workers}")
+        print(f"请求总数 {args.requests}，调用线程 {args.threads}")
+        for count in args.servers:
+            urls = [server.url for server in servers[:count]]
+            for max_in_flight in args.in_flight:
+                rate = run_once(urls, max_in_flight, args.requests, args.threads)
+                print(f"端点数={count:>2}  max_in_flight={max_in_flight:>3}: {rate:8.1f} 次/秒")
+                if args.batch:
+                    rate = run_once(urls, max_in_flight, args.requests, args.threads, batch=True)
+                    print(f"端点数={count:>2}  max_in_flight={max_in_flight:>3}: {rate:8.1f} 次/秒（批量）")
+    finally:
+        for server in servers:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
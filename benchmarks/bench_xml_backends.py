@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+XML 存储后端基准测试（文件存储 / SQLite 存储）
+
+对每个文档数量分别用两种后端批量新增同一批报文（/xml-files/add-batch 的处理逻辑，每批 --batch 个），对比：
+- 批量新增吞吐量与磁盘占用
+- 冷查询：新建存储实例后按文件名分页查询第一页（文件存储需扫描目录建立索引）
+- 热查询：分页 + 前缀 + 修改时间过滤（fields=meta）
+- 深分页：用游标查询最后一页附近
+- 增量查询：保存一个文档后再查询第一页
+
+用法：
+    python -m benchmarks.bench_xml_backends --sizes 10000 100000 1000000
+    python -m benchmarks.bench_xml_backends --sizes 100000 --backends sqlite --dir D:\\xml_bench
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import config
+from services import xml_index, xml_storage
+from services.xml_service import (
+    extract_batch_xml_items,
+    list_xml_files_page,
+    save_xml_file,
+    save_xml_files,
+)
+
+
+def disk_usage(directory: str) -> int:
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def timed(func, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def reset_caches() -> None:
+    """丢弃进程内的目录索引与存储实例（模拟服务重启后的第一次查询）"""
+    xml_index._indexes.clear()
+    xml_storage._storages.clear()
+
+
+def run(backend: str, directory: str, documents: int, batch: int, content: str, repeat: int) -> dict:
+    config.XML_STORAGE_BACKEND = backend
+    reset_caches()
+    started = time.perf_counter()
+    for begin in range(0, documents, batch):
+        items = [{"filename": f"CEB311_{i:08d}", "xml": content} for i in range(begin, min(begin + batch, documents))]
+        save_xml_files(extract_batch_xml_items(items, directory, max_items=batch))
+    add_rate = documents / (time.perf_counter() - started)
+
+    def cold() -> None:
+        reset_caches()
+        list_xml_files_page(directory, fields="name", limit=100)
+
+    midpoint = f"CEB311_{documents // 2:08d}"
+    now_ms = time.time_ns() // 1_000_000
+    last_cursor = f"CEB311_{max(documents - 150, 0):08d}.xml"
+    return {
+        "add": add_rate,
+        "disk": disk_usage(directory),
+        "cold": timed(cold, repeat),
+        "filtered": timed(lambda: list_xml_files_page(
+            directory, prefix=midpoint[:-2], mtime_from_ns=0, mtime_to_ns=now_ms * 1_000_000, fields="meta", limit=100,
+        ), repeat),
+        "deep": timed(lambda: list_xml_files_page(directory, cursor=last_cursor, fields="full", limit=100), repeat),
+        "incremental": timed(lambda: (save_xml_file("CEB311_extra", content, directory),
+                                      list_xml_files_page(directory, fields="name", limit=100)), repeat),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="XML 存储后端基准测试（文件 / SQLite）")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000], help="文档数量")
+    parser.add_argument("--backends", nargs="+", default=list(xml_storage.BACKENDS), help="要对比的存储后端")
+    parser.add_argument("--batch", type=int, default=1000, help="每次批量新增的文档数")
+    parser.add_argument("--size", type=int, default=2048, help="每个文档的大致大小（字节）")
+    parser.add_argument("--repeat", type=int, default=3, help="查询耗时取最好的几次")
+    parser.add_argument("--dir", default=None, help="测试目录（默认使用系统临时目录）")
+    args = parser.parse_args()
+
+    content = ('<?xml version="1.0" encoding="UTF-8"?>\n<ceb:CEB311Message>'
+               + "x" * max(args.size - 80, 0) + "</ceb:CEB311Message>\n")
+    original = getattr(config, "XML_STORAGE_BACKEND", "filesystem")
+    try:
+        for documents in args.sizes:
+            print(f"文档数={documents}，文档大小={len(content)} 字节")
+            for backend in args.backends:
+                base = tempfile.mkdtemp(prefix="bench_xml_backends_", dir=args.dir)
+                try:
+                    result = run(backend, os.path.join(base, backend), documents, args.batch, content, args.repeat)
+                finally:
+                    reset_caches()
+                    shutil.rmtree(base, ignore_errors=True)
+                print(
+                    f"  {backend:>10}: 新增 {result['add']:8.0f} 文档/秒，磁盘 {result['disk'] / 1024 / 1024:8.1f} MB，"
+                    f"冷查询 {result['cold'] * 1000:8.1f} 毫秒，过滤分页 {result['filtered'] * 1000:7.2f} 毫秒，"
+                    f"深分页 {result['deep'] * 1000:7.2f} 毫秒，保存后查询 {result['incremental'] * 1000:7.2f} 毫秒"
+                )
+    finally:
+        config.XML_STORAGE_BACKEND = original
+
+
+if __name__ == "__main__":
+    main()
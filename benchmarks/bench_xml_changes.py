@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+XML 文件变更订阅基准测试
+
+通过 Flask 测试客户端（不经过网络）对比下游系统轮询新文件的单次耗时：
+- /xml-files/list：每次读取、序列化并加密整个目录
+- /xml-files/changes：只返回上次 cursor 之后的事件（每轮新增 --churn 个文件）
+
+用法：
+    python -m benchmarks.bench_xml_changes --files 1000 10000 --churn 5
+    python -m benchmarks.bench_xml_changes --files 10000 --backend sqlite
+"""
+import argparse
+import json
+import logging
+import statistics
+import tempfile
+import time
+
+import config
+from aes_util import mysql_adapter_decrypt, mysql_adapter_encrypt
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="XML 文件变更订阅基准测试")
+    parser.add_argument("--files", type=int, nargs="+", default=[1000, 10000], help="目录中的文件数")
+    parser.add_argument("--size", type=int, default=4096, help="每个文件的大小（字节）")
+    parser.add_argument("--churn", type=int, default=5, help="每轮轮询之间新增的文件数")
+    parser.add_argument("--rounds", type=int, default=20, help="轮询次数")
+    parser.add_argument("--backend", default=getattr(config, "XML_STORAGE_BACKEND", "filesystem"),
+                        help="存储后端（filesystem / sqlite）")
+    args = parser.parse_args()
+
+    config.XML_STORAGE_BACKEND = args.backend
+    config.XML_CHANGE_FEED = True
+    config.XML_LIST_STREAM_THRESHOLD = 0
+    import app as app_module
+    logging.disable(logging.INFO)
+    client = app_module.app.test_client()
+
+    def post(path: str, payload: dict) -> dict:
+        body = mysql_adapter_encrypt(config.AES_KEY, json.dumps(payload), encoding="UTF-8")
+        response = client.post(path, data=body.encode("utf-8"))
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()
+
+    content = "<root>" + "x" * max(args.size - 13, 0) + "</root>"
+    print(f"后端={args.backend}，文件大小={len(content)} 字节，每轮新增 {args.churn} 个文件")
+    try:
+        for files in args.files:
+            directory = tempfile.mkdtemp(prefix="bench_xml_changes_")
+            for begin in range(0, files, 1000):
+                post("/xml-files/add-batch", {"directory": directory, "items": [
+                    {"filename": f"doc_{i:07d}", "xml": content} for i in range(begin, min(begin + 1000, files))
+                ]})
+            data = post("/xml-files/changes", {"directory": directory})["data"]
+            cursor = json.loads(mysql_adapter_decrypt(config.AES_KEY, data, encoding="UTF-8"))["cursor"]
+
+            list_latencies, changes_latencies = [], []
+            added = files
+            for _ in range(args.rounds):
+                post("/xml-files/add-batch", {"directory": directory, "items": [
+                    {"filename": f"doc_{i:07d}", "xml": content} for i in range(added, added + args.churn)
+                ]})
+                added += args.churn
+
+                started = time.perf_counter()
+                post("/xml-files/list", {"directory": directory})
+                list_latencies.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                data = post("/xml-files/changes", {"directory": directory, "cursor": cursor})["data"]
+                result = json.loads(mysql_adapter_decrypt(config.AES_KEY, data, encoding="UTF-8"))
+                changes_latencies.append(time.perf_counter() - started)
+                # 外部写入扫描与写入同时进行时可能有重复的事件
+                assert len({event["filename"] for event in result["events"]}) == args.churn, result
+                cursor = result["cursor"]
+
+            print(f"  文件数={files:>7}: list 中位数 {statistics.median(list_latencies) * 1000:9.2f} 毫秒，"
+                  f"changes 中位数 {statistics.median(changes_latencies) * 1000:7.3f} 毫秒")
+    finally:
+        app_module.sign_service.stop()
+
+
+if __name__ == "__main__":
+    main()
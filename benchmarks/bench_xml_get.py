@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+单个 XML 文件获取基准测试
+
+通过 Flask 测试客户端（不经过网络）对比轮询一个文件的单次耗时：
+- /xml-files/list：返回整个目录（原先只能这样获取单个文件）
+- /xml-files/get：读取、序列化并加密一个文件
+- /xml-files/get + ifNoneMatch：文件未修改，只 stat 一次
+
+用法：
+    python -m benchmarks.bench_xml_get --files 1000 --size 8192
+"""
+import argparse
+import json
+import logging
+import statistics
+import tempfile
+import time
+
+import config
+from aes_util import mysql_adapter_encrypt
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="单个 XML 文件获取基准测试")
+    parser.add_argument("--files", type=int, default=1000, help="目录中的文件数")
+    parser.add_argument("--size", type=int, default=8192, help="每个文件的大小（字节）")
+    parser.add_argument("--requests", type=int, default=200, help="每种方式的请求次数")
+    parser.add_argument("--backend", default=getattr(config, "XML_STORAGE_BACKEND", "filesystem"),
+                        help="存储后端（filesystem / sqlite）")
+    args = parser.parse_args()
+
+    config.SAVE_FOLDER = tempfile.mkdtemp(prefix="bench_xml_get_")
+    config.XML_STORAGE_BACKEND = args.backend
+    config.XML_LIST_STREAM_THRESHOLD = 0
+    import app as app_module
+    logging.disable(logging.INFO)
+    client = app_module.app.test_client()
+
+    def post(path: str, payload: dict):
+        body = mysql_adapter_encrypt(config.AES_KEY, json.dumps(payload), encoding="UTF-8")
+        response = client.post(path, data=body.encode("utf-8"))
+        assert response.status_code == 200, response.get_json()
+        return response
+
+    content = "<root>" + "x" * max(args.size - 13, 0) + "</root>"
+    for i in range(args.files):
+        post("/xml-files/add", {"filename": f"doc_{i:06d}", "xml": content})
+    etag = post("/xml-files/get", {"filename": "doc_000000"}).headers["ETag"]
+
+    cases = [
+        ("list（整个目录）", "/xml-files/list", {}),
+        ("get（读取并加密）", "/xml-files/get", {"filename": "doc_000000"}),
+        ("get（未修改）", "/xml-files/get", {"filename": "doc_000000", "ifNoneMatch": etag}),
+    ]
+    print(f"后端={args.backend}，文件数={args.files}，文件大小={len(content)} 字节")
+    try:
+        for label, path, payload in cases:
+            latencies = []
+            for _ in range(args.requests):
+                started = time.perf_counter()
+                post(path, payload)
+                latencies.append(time.perf_counter() - started)
+            print(f"{label:>16}: 中位数 {statistics.median(latencies) * 1000:8.3f} 毫秒")
+    finally:
+        app_module.sign_service.stop()
+
+
+if __name__ == "__main__":
+    main()
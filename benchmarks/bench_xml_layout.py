@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+XML 目录布局基准测试
+
+分别以平铺（flat）和分片（sharded）布局保存同一批文件，对比：
+- 保存、删除吞吐量
+- 冷查询：新建目录索引后按文件名分页查询（平铺布局扫描整个目录，分片布局读取名称日志）
+- 保存一个文件后的增量查询（平铺布局重新扫描目录，分片布局只读取名称日志新增的记录）
+
+用法：
+    python -m benchmarks.bench_xml_layout --files 100000
+    python -m benchmarks.bench_xml_layout --dir D:\\xml_bench   # 在实际保存目录所在的磁盘上测试
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import config
+from services import xml_index
+from services.xml_service import delete_xml_file, list_xml_files_page, save_xml_file
+
+
+def timed_query(directory: str, cold: bool) -> float:
+    if cold:
+        xml_index._indexes.clear()
+    started = time.perf_counter()
+    list_xml_files_page(directory, fields="name", limit=100)
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="XML 目录布局基准测试")
+    parser.add_argument("--files", type=int, default=20000, help="文件数量")
+    parser.add_argument("--deletes", type=int, default=1000, help="删除的文件数量")
+    parser.add_argument("--repeat", type=int, default=3, help="查询耗时取最好的几次")
+    parser.add_argument("--dir", default=None, help="测试目录（默认使用系统临时目录）")
+    args = parser.parse_args()
+
+    content = '<?xml version="1.0" encoding="UTF-8"?>\n<ceb:CEB311Message>' + "x" * 1024 + "</ceb:CEB311Message>\n"
+    base = tempfile.mkdtemp(prefix="bench_xml_layout_", dir=args.dir)
+    original = getattr(config, "XML_STORAGE_LAYOUT", "flat")
+    try:
+        print(f"文件数={args.files}，目录={base}")
+        for layout in ("flat", "sharded"):
+            config.XML_STORAGE_LAYOUT = layout
+            directory = os.path.join(base, layout)
+
+            started = time.perf_counter()
+            for i in range(args.files):
+                save_xml_file(f"CEB311_{i:08d}", content, directory)
+            save_rate = args.files / (time.perf_counter() - started)
+
+            cold = min(timed_query(directory, cold=True) for _ in range(args.repeat))
+            incremental = []
+            for i in range(args.repeat):
+                save_xml_file(f"CEB311_extra_{i}", content, directory)
+                incremental.append(timed_query(directory, cold=False))
+
+            started = time.perf_counter()
+            for i in range(args.deletes):
+                delete_xml_file(f"CEB311_{i:08d}", directory)
+            delete_rate = args.deletes / (time.perf_counter() - started)
+
+            print(
+                f"{layout:>7}: 保存 {save_rate:7.0f} 文件/秒，删除 {delete_rate:7.0f} 文件/秒，"
+                f"冷查询 {cold * 1000:8.1f} 毫秒，增量查询 {min(incremental) * 1000:7.2f} 毫秒"
+            )
+    finally:
+        config.XML_STORAGE_LAYOUT = original
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+XML 压缩存储基准测试
+
+分别以明文、gzip、zstd（需要 zstandard）保存同一批模拟报文，对比：
+- 磁盘占用（文件字节数与实际占用的块）
+- 保存耗时
+- /xml-files/list 的查询耗时：冷查询（新建目录索引，逐个读取并解压全部文件）与热查询（索引已缓存内容）
+
+用法：
+    python -m benchmarks.bench_xml_storage --files 2000 --size 8192
+    python -m benchmarks.bench_xml_storage --dir D:\\xml_bench   # 在实际保存目录所在的磁盘上测试
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import config
+from services import xml_compression, xml_index
+from services.xml_service import list_xml_files, save_xml_file
+
+
+def make_declaration(i: int, size: int, rng: random.Random) -> str:
+    """生成一份模拟的跨境电商报文（重复的标签结构 + 随机的编号、金额）"""
+    head = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<ceb:CEB311Message guid="%032x" version="1.0" xmlns:ceb="http://www.chinaport.gov.cn/ceb">\n'
+        "  <ceb:Order>\n"
+        "    <ceb:OrderHead>\n"
+        "      <ceb:orderNo>ORDER%012d</ceb:orderNo>\n"
+        "      <ceb:ebpCode>3301%06d</ceb:ebpCode>\n"
+        "      <ceb:buyerName>测试买家</ceb:buyerName>\n"
+        "    </ceb:OrderHead>\n"
+    ) % (rng.getrandbits(128), i, rng.randrange(10 ** 6))
+    parts = [head]
+    length = len(head)
+    item = 0
+    while length < size:
+        item += 1
+        part = (
+            "    <ceb:OrderList>\n"
+            "      <ceb:gnum>%d</ceb:gnum>\n"
+            "      <ceb:itemNo>SKU%08d</ceb:itemNo>\n"
+            "      <ceb:itemName>商品名称%d</ceb:itemName>\n"
+            "      <ceb:qty>%d</ceb:qty>\n"
+            "      <ceb:price>%.2f</ceb:price>\n"
+            "      <ceb:currency>142</ceb:currency>\n"
+            "    </ceb:OrderList>\n"
+        ) % (item, rng.randrange(10 ** 8), item, rng.randrange(1, 20), rng.uniform(1, 999))
+        parts.append(part)
+        length += len(part)
+    parts.append("  </ceb:Order>\n</ceb:CEB311Message>\n")
+    return "".join(parts)
+
+
+def disk_usage(directory: str) -> tuple:
+    """返回 (文件字节数, 实际占用字节数)"""
+    apparent = allocated = 0
+    with os.scandir(directory) as it:
+        for entry in it:
+            stat = entry.stat()
+            apparent += stat.st_size
+            allocated += getattr(stat, "st_blocks", 0) * 512 or stat.st_size
+    return apparent, allocated
+
+
+def timed_list(directory: str, cold: bool) -> float:
+    if cold:
+        xml_index._indexes.clear()
+    started = time.perf_counter()
+    list_xml_files(directory)
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="XML 压缩存储基准测试")
+    parser.add_argument("--files", type=int, default=2000, help="报文数量")
+    parser.add_argument("--size", type=int, default=8192, help="每份报文的大致大小（字节）")
+    parser.add_argument("--repeat", type=int, default=3, help="查询耗时取最好的几次")
+    parser.add_argument("--dir", default=None, help="测试目录（默认使用系统临时目录）")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    documents = [(f"CEB311_{i:07d}", make_declaration(i, args.size, rng)) for i in range(args.files)]
+    total_chars = sum(len(content.encode("utf-8")) for _, content in documents)
+
+    formats = ["", "gzip"]
+    if xml_compression._zstd_module() is not None:
+        formats.append("zstd")
+    else:
+        print("未安装 zstandard，跳过 zstd")
+
+    base = tempfile.mkdtemp(prefix="bench_xml_storage_", dir=args.dir)
+    original = getattr(config, "XML_STORAGE_COMPRESSION", "")
+    try:
+        print(f"报文数={args.files}，原始大小合计 {total_chars / 1024 / 1024:.1f} MB，目录={base}")
+        for fmt in formats:
+            config.XML_STORAGE_COMPRESSION = fmt
+            directory = os.path.join(base, fmt or "plain")
+            os.makedirs(directory)
+
+            started = time.perf_counter()
+            for filename, content in documents:
+                save_xml_file(filename, content, directory)
+            save_seconds = time.perf_counter() - started
+
+            apparent, allocated = disk_usage(directory)
+            cold = min(timed_list(directory, cold=True) for _ in range(args.repeat))
+            warm = min(timed_list(directory, cold=False) for _ in range(args.repeat))
+            print(
+                f"{fmt or 'plain':>5}: 磁盘 {apparent / 1024 / 1024:7.2f} MB（占用 {allocated / 1024 / 1024:7.2f} MB，"
+                f"压缩比 {total_chars / max(apparent, 1):5.1f}x），保存 {args.files / save_seconds:7.0f} 文件/秒，"
+                f"冷查询 {cold * 1000:8.1f} 毫秒，热查询 {warm * 1000:7.1f} 毫秒"
+            )
+    finally:
+        config.XML_STORAGE_COMPRESSION = original
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+XML 文件写入吞吐量基准测试
+
+对比各写入持久化模式（none / fsync / group）下 save_xml_file 的吞吐量和单次耗时，
+以及原先直接 open(path, "w") 写入（非原子）的基线，用于选择 config.XML_WRITE_DURABILITY。
+
+用法：
+    python -m benchmarks.bench_xml_write --files 2000 --threads 1 16 --size 4096
+    python -m benchmarks.bench_xml_write --dir D:\\xml_bench   # 在实际保存目录所在的磁盘上测试
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services import xml_writer
+from services.xml_service import save_xml_file
+
+
+def direct_write(file_path: str, content: str, durability: str) -> None:
+    """原先的写入方式：直接覆盖目标文件"""
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def run(mode: str, directory: str, files: int, threads: int, content: str) -> tuple:
+    """返回 (每秒写入文件数, 单次耗时中位数毫秒, 单次耗时 p99 毫秒)"""
+    if mode == "direct":
+        write = direct_write
+    else:
+        write = xml_writer.write_text_atomic
+    xml_writer._group_committer = None
+    latencies = []
+
+    def one(i: int) -> None:
+        started = time.perf_counter()
+        write(os.path.join(directory, f"bench_{i:07d}.xml"), content, mode)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(files)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return files / elapsed, statistics.median(latencies) * 1000, p99 * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="XML 文件写入吞吐量基准测试")
+    parser.add_argument("--files", type=int, default=2000, help="每轮写入的文件数")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 16], help="要对比的并发写入线程数")
+    parser.add_argument("--size", type=int, default=4096, help="每个文件的大小（字节）")
+    parser.add_argument("--modes", nargs="+", default=["direct"] + list(xml_writer.DURABILITY_MODES),
+                        help="要对比的写入方式（direct 为原先的直接写入）")
+    parser.add_argument("--dir", default=None, help="测试目录（默认使用系统临时目录）")
+    args = parser.parse_args()
+
+    content = "<root>" + "x" * max(args.size - 13, 0) + "</root>"
+    # 预热：确认 save_xml_file 可以正常写入
+    base = tempfile.mkdtemp(prefix="bench_xml_write_", dir=args.dir)
+    try:
+        save_xml_file("warm_up.xml", content, base)
+        print(f"文件数={args.files}，文件大小={len(content)} 字节，目录={base}")
+        for threads in args.threads:
+            for mode in args.modes:
+                directory = os.path.join(base, f"{mode}_{threads}")
+                os.makedirs(directory)
+                rate, median, p99 = run(mode, directory, args.files, threads, content)
+                print(f"线程数={threads:>2} {mode:>6}: {rate:9.0f} 文件/秒，中位数 {median:7.3f} 毫秒，p99 {p99:7.3f} 毫秒")
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+本地模拟签名服务（用于基准测试，不需要海关卡驱动和操作员卡）
+
+行为与海关程序的 WebSocket 签名接口保持一致：
+- 连接建立后先发送 {"_method": "open"} 握手消息
+- 收到 cus-sec_SpcSignDataAsPEM 请求后，模拟签名耗时，再以嵌套格式返回，并回显 _id
+
+用法：
+    python -m benchmarks.fake_signer_server --port 61299 --latency 0.05 --workers 4
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from typing import Optional
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+
+class FakeSignerServer:
+    """模拟签名服务"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.05, workers: int = 1) -> None:
+        """
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示自动分配
+            latency: 单次签名的模拟耗时（秒）
+            workers: 可同时进行的签名数量（模拟卡的并行能力）
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.workers = workers
+        self.requests_handled = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._ready = threading.Event()
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def _sign(self, websocket, request: dict) -> None:
+        async with self._semaphore:
+            await asyncio.sleep(self.latency)
+        in_data = request.get("args", {}).get("inData", "")
+        sign = hashlib.sha256(in_data.encode("utf-8")).hexdigest()
+        response = {
+            "_id": request.get("_id"),
+            "_method": request.get("_method"),
+            "_status": "00",
+            "_args": {"Result": True, "Data": [sign, "FAKE-CERT-0001"], "Error": []},
+        }
+        self.requests_handled += 1
+        try:
+            await websocket.send(json.dumps(response))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def _handler(self, websocket) -> None:
+        await websocket.send(json.dumps({"_id": 0, "_method": "open", "_status": "00", "_args": {}}))
+        tasks = set()
+        try:
+            async for message in websocket:
+                request = json.loads(message)
+                # 每个请求独立处理，响应可能乱序返回
+                task = asyncio.ensure_future(self._sign(websocket, request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def _serve(self) -> None:
+        self._semaphore = asyncio.Semaphore(self.workers)
+        self._stop_event = asyncio.Event()
+        async with websockets.serve(self._handler, self.host, self.port) as server:
+            if self.port == 0:
+                self.port = next(iter(server.sockets)).getsockname()[1]
+            self._ready.set()
+            await self._stop_event.wait()
+
+    def start(self) -> "FakeSignerServer":
+        """在后台线程中启动服务，返回后即可连接"""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_until_complete, args=(self._serve(),), daemon=True
+        )
+        self._thread.start()
+        self._ready.wait(timeout=5)
+        return self
+
+    def stop(self) -> None:
+        """停止服务"""
+        if self._loop is not None and self._stop_event is not None:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地模拟签名服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=61299)
+    parser.add_argument("--latency", type=float, default=0.05, help="单次签名耗时（秒）")
+    parser.add_argument("--workers", type=int, default=1, help="可同时进行的签名数量")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = FakeSignerServer(args.host, args.port, args.latency, args.workers)
+    logger.info("模拟签名服务已启动: %s", server.url)
+    asyncio.run(server._serve())
+
+
+if __name__ == "__main__":
+    main()
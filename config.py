@@ -11,12 +11,135 @@ SAVE_FOLDER = "./xml_files/"
 HOST = "0.0.0.0"
 PORT = 8801
 
+# 生产环境启动入口（serve.py）配置
+# WSGI 服务器："auto"（Windows 使用 waitress，其他系统使用 gunicorn）、"waitress" 或 "gunicorn"
+SERVER = "auto"
+# 请求处理线程数（签名请求在同一连接上多路复用，并发能力通过线程数扩展）
+SERVER_THREADS = 16
+# 工作进程数（操作员卡连接只能由一个进程持有：未启用签名守护进程时固定为 1）
+SERVER_WORKERS = 1
+# HTTP keep-alive 空闲超时（秒）
+SERVER_KEEPALIVE = 75
+
+# python app.py 启动开发服务器时是否开启调试模式（调试模式的自动重载会再启动一个进程连接操作员卡）
+DEBUG = False
+
 # 日志配置
 LOG_LEVEL = "INFO"
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
+# 报文日志：按采样率记录请求/响应报文内容（截断并对密码等字段脱敏）
+# 采样率 0 表示从不记录报文内容，1 表示每次都记录
+LOG_PAYLOAD_SAMPLE_RATE = 0.01
+LOG_PAYLOAD_MAX_CHARS = 200
+
 # WebSocket 签名服务配置
 # WebSocket 接口来源于海关程序，需要先安装海关卡驱动并插入操作员卡
 # 优先使用本地地址
 WS_URL = "ws://127.0.0.1:61232"
 
+# 多个签名端点（多台主机 / 多张操作员卡），配置后优先于 WS_URL
+# 签名请求会分发给最空闲的健康端点，例如：
+# WS_URLS = ["ws://127.0.0.1:61232", "ws://192.168.1.20:61232"]
+WS_URLS = []
+
+# 签名端点连接失败后被剔除的冷却时间（秒），冷却结束后自动重新接纳
+WS_EJECT_SECONDS = 10
+
+# 每个签名端点连接上最多同时在途的签名请求数（多路复用）
+# 设置为 1 时退化为逐个请求串行签名
+WS_MAX_IN_FLIGHT = 8
+
+# WebSocket 心跳（ping）间隔与超时时间（秒），用于在请求间隙发现失效连接
+WS_PING_INTERVAL = 20
+WS_PING_TIMEOUT = 20
+
+# 后台健康检查间隔（秒）：定期 ping 已有连接、替换失效连接、重连空闲断开的端点
+# 设置为 0 时关闭后台健康检查（连接仍会在 start() 时预先建立）
+WS_HEARTBEAT_INTERVAL = 10
+
+# 签名守护进程（signer_daemon.py）：由一个独立进程持有 WebSocket 连接，
+# HTTP 工作进程通过本机 IPC（Linux 为 Unix 域套接字，Windows 为命名管道）调用签名，此时可以运行多个工作进程
+# 启用后需先运行 python signer_daemon.py，再启动 HTTP 服务
+SIGNER_DAEMON = False
+# IPC 地址：Unix 域套接字路径或命名管道名（如 r"\\.\pipe\sign-server-signer"），为空时使用默认地址
+SIGNER_ADDRESS = ""
+# 连接认证密钥（HMAC 质询），为空时不认证；Windows 命名管道建议配置
+SIGNER_AUTHKEY = ""
+# HTTP 工作进程等待守护进程响应的超时时间（秒）
+SIGNER_CALL_TIMEOUT = 60
+
+# 签名排队（所有端点都满载时）：最多排队的请求数与最长等待时间（秒），0 表示不限；
+# 超过时请求立即失败（HTTP 503），请求中可通过 priority（越大越优先）和 timeout（秒）调整
+WS_QUEUE_MAX_DEPTH = 256
+WS_QUEUE_MAX_WAIT = 10
+
+# /getCode/batch 单次请求最多包含的签名条数
+SIGN_BATCH_MAX_ITEMS = 500
+
+# 签名结果缓存：以 (数据的 SHA-256, 证书号) 为键缓存签名结果，相同数据的并发请求合并为一次签名；
+# 不保存密码。最大条目数为 0 时关闭（默认关闭）
+SIGN_CACHE_MAX_ENTRIES = 0
+# 签名结果缓存有效期（秒）
+SIGN_CACHE_TTL_SECONDS = 300
+
+# JSON 编解码："auto" 安装了 orjson / msgspec 时用于加速请求解析与响应序列化（输出与标准库逐字节一致），
+# "orjson" / "msgspec" 指定加速库，"json" 只使用标准库
+JSON_CODEC = "auto"
+
+# 监控指标（/metrics，Prometheus 文本格式）：分阶段耗时直方图、重连次数、排队数等，开销很小，可在生产环境常开
+METRICS_ENABLED = True
+
+# XML 目录索引：/xml-files/list 只重新读取新增或变化的文件
+# 重新校验间隔（秒）：0 表示每次查询都用 os.scandir 校验目录；
+# 大于 0 时在该时间内直接使用索引（本服务自身的新增/删除会立即更新索引，外部写入最多延迟该时间可见）
+XML_INDEX_REVALIDATE_SECONDS = 0
+# 最多缓存的 XML 内容总字节数，超过后其余文件查询时直接读取磁盘
+XML_INDEX_MAX_CACHED_BYTES = 256 * 1024 * 1024
+# 最多保留索引的目录数：目录来自请求参数，超过后淘汰最久未使用的目录索引及其加密列表缓存
+XML_INDEX_MAX_DIRECTORIES = 64
+
+# /xml-files/list 流式响应阈值（字节）：目录下 XML 文件总大小超过该值时逐个文件读取、分块加密并流式返回，
+# 内存占用不随目录大小增长；设置为 0 时只在请求中 stream 为 true 时使用流式响应
+XML_LIST_STREAM_THRESHOLD = 32 * 1024 * 1024
+
+# XML 文件写入持久化模式（写入总是先写临时文件再原子重命名，崩溃不会留下半截文件）：
+# "none"：不调用 fsync（最快，断电可能丢失最近的写入）；"fsync"：每个文件写入后 fsync；
+# "group"：组提交，各请求 fdatasync 自己的文件，XML_GROUP_COMMIT_MS 毫秒窗口内并发的写入合并为一批重命名，
+# 每个目录只 fsync 一次（返回时已落盘；没有其他写入正在进行时立即提交，不等待窗口）
+XML_WRITE_DURABILITY = "none"
+XML_GROUP_COMMIT_MS = 2
+
+# XML 文件压缩存储："" 表示明文 .xml（默认），"gzip" 写入 .xml.gz，"zstd" 写入 .xml.zst（需要 zstandard，未安装时改用 gzip）；
+# 读取时按文件头自动识别格式，已有的明文 .xml 文件仍可正常读取，API 中的文件名始终为 .xml
+XML_STORAGE_COMPRESSION = ""
+
+# XML 存储后端："filesystem" 每个文档一个文件（默认）；"sqlite" 保存目录下的 .xml-store.sqlite3 数据库（WAL 模式），
+# 文件名、修改时间有索引，列表分页与批量新增为索引查询和单个事务；已有文件可用 python migrate_xml_layout.py to-sqlite 目录 导入
+XML_STORAGE_BACKEND = "filesystem"
+# SQLite 存储的锁等待时间（毫秒）：多个线程 / 进程同时写入时等待对方提交
+XML_SQLITE_BUSY_TIMEOUT_MS = 5000
+
+# XML 目录布局："flat" 所有文件直接放在保存目录下（默认）；"sharded" 按文件名哈希放入 XML_SHARD_DEPTH 级子目录
+# （例如 3f/a2/a.xml），文件名列表记录在目录下的 .xml-names.jsonl 中，查询时不扫描目录，适合几十万以上的文件；
+# 只对新建（没有XML文件）的目录生效，已有文件的目录需停止服务后用 python migrate_xml_layout.py to-sharded 目录 迁移
+XML_STORAGE_LAYOUT = "flat"
+XML_SHARD_DEPTH = 2
+
+# XML 文件变更订阅（/xml-files/changes 长轮询，下游系统只获取新增、修改、删除的文件，不再反复查询整个目录）：
+# 开启后每次新增 / 删除都会记录带递增序号的事件（文件存储追加到目录下的 .xml-changes.jsonl，
+# 超过 XML_CHANGES_MAX_BYTES 时在线压缩，也可用 python migrate_xml_layout.py trim-changes 目录 清空；
+# SQLite 存储写入 changes 表；两者都保留最近 XML_CHANGES_RETAIN 个）
+XML_CHANGE_FEED = False
+# 单次最多返回的事件数，以及长轮询最长等待时间（秒）
+XML_CHANGES_MAX_LIMIT = 1000
+XML_CHANGES_MAX_WAIT = 30
+# 扫描外部程序直接写入目录（不经过本服务）的间隔（秒），0 表示不扫描；只对平铺布局的文件存储生效，
+# 在本进程收到第一个 /xml-files/changes 请求后开始
+XML_CHANGES_WATCH_SECONDS = 2
+XML_CHANGES_RETAIN = 100000
+XML_CHANGES_MAX_BYTES = 64 * 1024 * 1024
+
+# /xml-files/add-batch、/xml-files/delete-batch 单次请求最多包含的文件数，以及并行读写文件的线程数
+XML_BATCH_MAX_ITEMS = 1000
+XML_BATCH_WORKERS = 8
@@ -0,0 +1,247 @@
+"""
+JSON 编解码模块（可选使用 orjson / msgspec 加速，输出与标准库 json 逐字节一致）
+
+- dumps：与 json.dumps(obj, ensure_ascii=False).encode("utf-8") 完全一致（", " / ": " 分隔），直接输出 UTF-8 字节，
+  供 AES 加密使用；包含大段字符串（XML 内容）时字符串转义交给加速库，结构仍按标准库格式拼接
+- dumps_compact：外层响应 {"code", "msg", "data"} 的紧凑格式（"," / ":" 分隔，可按键排序），
+  与 Flask jsonify、Starlette JSONResponse 原来的输出一致（包含浮点数时使用标准库，保证数字格式不变）
+- loads：请求体解析；只有较短的请求体（签名、查询、删除等）使用加速库，携带 XML 内容的大请求体仍用标准库
+  （orjson 解析大段中文字符串并不比标准库快）；加速库不接受的输入（NaN 等）改用标准库解析，
+  结果中有浮点数时也改用标准库（加速库把超过 64 位的整数解析为浮点数）
+
+config.JSON_CODEC 为 "auto"（默认，依次尝试 orjson、msgspec）、"orjson"、"msgspec" 或 "json"（只用标准库）。
+加速库在第一次使用时自检字符串转义结果，与标准库不一致时改用标准库，保证 Java 端解密后看到的报文不变。
+"""
+import json
+import logging
+from typing import Any, Callable, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# 可选的编解码实现
+CODECS = ("auto", "orjson", "msgspec", "json")
+
+# 采样到的字符串总长度达到该值（字符）时，dumps 使用加速库转义字符串；只影响速度，不影响输出
+STRING_HEAVY_CHARS = 1024
+
+# 不超过该长度（字符 / 字节）的请求体由加速库解析
+FAST_LOADS_MAX_CHARS = 4096
+
+# 自检用的字符串：控制字符、引号、反斜杠、非 ASCII（中文、emoji）以及 HTML 相关字符
+_PROBE = "".join(chr(c) for c in range(0x80)) + "\u00e9\u2028\u2029\u4e2d\u6587\ufeff\U0001f600"
+
+_SCALAR_TYPES = (str, int, bool, type(None))
+
+
+class _Fallback(Exception):
+    """遇到加速路径不处理的类型，整体改用标准库"""
+
+
+class _Codec:
+    """一个编解码实现：name、loads(str/bytes)、encode(标量或对象) -> bytes、encode_compact(obj, sort_keys, default)"""
+
+    def __init__(self, name: str, loads: Callable, encode: Callable, encode_compact: Callable, errors: tuple) -> None:
+        self.name = name
+        self.loads = loads
+        self.encode = encode
+        self.encode_compact = encode_compact
+        self.errors = errors
+
+
+def _stdlib_codec() -> _Codec:
+    def encode_compact(obj, sort_keys: bool = False, default: Optional[Callable] = None,
+                       allow_nan: bool = True) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys,
+                          default=default, allow_nan=allow_nan).encode("utf-8")
+
+    return _Codec("json", json.loads,
+                  lambda obj: json.dumps(obj, ensure_ascii=False).encode("utf-8"), encode_compact, ())
+
+
+def _orjson_codec() -> _Codec:
+    import orjson  # type: ignore
+
+    # 日期、dataclass、str/int 子类交给 default（与标准库 / Flask 的处理方式一致）
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS
+
+    def encode_compact(obj, sort_keys: bool = False, default: Optional[Callable] = None) -> bytes:
+        return orjson.dumps(obj, default=default, option=options | (orjson.OPT_SORT_KEYS if sort_keys else 0))
+
+    return _Codec("orjson", orjson.loads, orjson.dumps, encode_compact,
+                  (orjson.JSONEncodeError, orjson.JSONDecodeError))
+
+
+def _msgspec_codec() -> _Codec:
+    import msgspec  # type: ignore
+
+    encoder = msgspec.json.Encoder()
+    sorted_encoder = msgspec.json.Encoder(order="sorted")
+    decoder = msgspec.json.Decoder()
+
+    def encode_compact(obj, sort_keys: bool = False, default: Optional[Callable] = None) -> bytes:
+        if default is not None:
+            return msgspec.json.encode(obj, enc_hook=default, order="sorted" if sort_keys else None)
+        return (sorted_encoder if sort_keys else encoder).encode(obj)
+
+    return _Codec("msgspec", decoder.decode, encoder.encode, encode_compact,
+                  (msgspec.EncodeError, msgspec.DecodeError, OverflowError, TypeError))
+
+
+_FACTORIES = {"orjson": _orjson_codec, "msgspec": _msgspec_codec}
+
+_codec: Optional[_Codec] = None
+
+
+def _config_value(name: str, default):
+    """从 config 模块读取配置项，不存在时返回默认值"""
+    try:
+        import config
+        return getattr(config, name)
+    except (ImportError, AttributeError):
+        return default
+
+
+def _create_codec(name: str) -> _Codec:
+    """按名称创建编解码实现，加速库未安装或自检不通过时返回标准库实现"""
+    if name not in CODECS:
+        raise ValueError(f"不支持的 JSON 编解码实现: {name}（可选 {'/'.join(CODECS)}）")
+    candidates = ("orjson", "msgspec") if name == "auto" else (name,) if name != "json" else ()
+    for candidate in candidates:
+        try:
+            codec = _FACTORIES[candidate]()
+        except ImportError:
+            if name != "auto":
+                logger.warning("未安装 %s，JSON 编解码使用标准库", candidate)
+            continue
+        expected = json.dumps(_PROBE, ensure_ascii=False).encode("utf-8")
+        if codec.encode(_PROBE) != expected:
+            logger.warning("%s 的字符串转义与标准库不一致，JSON 编解码使用标准库", candidate)
+            continue
+        return codec
+    return _stdlib_codec()
+
+
+def get_codec() -> _Codec:
+    """当前使用的编解码实现（第一次调用时按 config.JSON_CODEC 选择）"""
+    global _codec
+    if _codec is None:
+        _codec = _create_codec(_config_value("JSON_CODEC", "auto"))
+        logger.info("JSON 编解码: %s", _codec.name)
+    return _codec
+
+
+def codec_name() -> str:
+    """当前使用的编解码实现名称（orjson / msgspec / json）"""
+    return get_codec().name
+
+
+def _string_chars(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(v) for v in value.values() if isinstance(v, str))
+    return 0
+
+
+def _string_heavy(obj: Any) -> bool:
+    """
+    抽样判断对象是否以大段字符串为主：只看顶层与第一个元素（以及其中列表的第一个元素），
+    例如文件列表 [{"filename", "xml"}, ...]、分页结果 {"items": [...]}、单个文档 {"filename", "xml", ...}
+    """
+    sample = obj[0] if isinstance(obj, list) and obj else obj
+    chars = _string_chars(sample)
+    if isinstance(sample, dict):
+        for value in sample.values():
+            if isinstance(value, list) and value:
+                chars += _string_chars(value[0])
+    return chars >= STRING_HEAVY_CHARS
+
+
+def _encode_spaced(obj: Any, encode: Callable, keys: dict) -> bytes:
+    """按 json.dumps 的默认格式拼接结构，字符串、整数等标量由 encode 输出"""
+    kind = type(obj)
+    if kind is dict:
+        parts = []
+        for key, value in obj.items():
+            prefix = keys.get(key)
+            if prefix is None:
+                if type(key) is not str:
+                    raise _Fallback
+                prefix = keys[key] = encode(key) + b": "
+            if type(value) in _SCALAR_TYPES:
+                parts.append(prefix + encode(value))
+            else:
+                parts.append(prefix + _encode_spaced(value, encode, keys))
+        return b"{" + b", ".join(parts) + b"}"
+    if kind is list or kind is tuple:
+        return b"[" + b", ".join([encode(value) if type(value) in _SCALAR_TYPES else _encode_spaced(value, encode, keys)
+                                  for value in obj]) + b"]"
+    if kind is float:
+        return json.dumps(obj).encode("ascii")
+    if kind in _SCALAR_TYPES:
+        return encode(obj)
+    raise _Fallback
+
+
+def _contains_float(obj: Any) -> bool:
+    if isinstance(obj, float):
+        return True
+    if isinstance(obj, dict):
+        return any(_contains_float(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_contains_float(value) for value in obj)
+    return False
+
+
+def dumps(obj: Any) -> bytes:
+    """序列化为 UTF-8 字节，与 json.dumps(obj, ensure_ascii=False).encode("utf-8") 完全一致"""
+    codec = get_codec()
+    if codec.name != "json" and _string_heavy(obj):
+        try:
+            return _encode_spaced(obj, codec.encode, {})
+        except (_Fallback,) + codec.errors:
+            pass
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def dumps_compact(obj: Any, sort_keys: bool = False, default: Optional[Callable] = None,
+                  allow_nan: bool = True) -> bytes:
+    """紧凑格式（"," / ":" 分隔，不转义非 ASCII）序列化为 UTF-8 字节，用于外层响应；参数含义同 json.dumps"""
+    codec = get_codec()
+    # 加速库的浮点数格式（指数写法、NaN）与标准库不同
+    if codec.name != "json" and not _contains_float(obj):
+        try:
+            return codec.encode_compact(obj, sort_keys, default)
+        except codec.errors:
+            pass
+    return _stdlib_codec().encode_compact(obj, sort_keys, default, allow_nan)
+
+
+def loads(data: Union[str, bytes, bytearray]) -> Any:
+    """
+    解析 JSON（str 或 UTF-8 字节）
+
+    Raises:
+        json.JSONDecodeError: 不是有效的 JSON 时（与标准库相同）
+    """
+    codec = get_codec()
+    if codec.name != "json" and len(data) <= FAST_LOADS_MAX_CHARS:
+        try:
+            result = codec.loads(data)
+        except codec.errors:
+            pass
+        else:
+            # 超过 64 位的整数会被加速库解析为浮点数，丢失精度；请求体中很少有浮点数，直接用标准库重新解析
+            if not _contains_float(result):
+                return result
+    return json.loads(data)
+
+
+__all__ = [
+    "CODECS",
+    "get_codec",
+    "codec_name",
+    "dumps",
+    "dumps_compact",
+    "loads",
+]
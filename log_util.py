@@ -0,0 +1,128 @@
+"""
+日志工具模块
+- 队列式异步日志：请求线程只把日志记录放入队列，由后台线程写出，不会阻塞在磁盘 I/O 上
+- 报文日志：按采样率记录，内容截断并脱敏（密码等字段），只有真正输出时才格式化
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import random
+import re
+from typing import Optional, Union
+
+# 报文日志默认最多记录的字符数
+DEFAULT_PAYLOAD_MAX_CHARS = 200
+
+# 报文日志默认采样率（0 表示从不记录报文内容，1 表示每次都记录）
+DEFAULT_PAYLOAD_SAMPLE_RATE = 0.01
+
+# 需要脱敏的 JSON 字段
+_SENSITIVE_FIELD = re.compile(r'("(?:pwdstr|passwd|password|pwd)"\s*:\s*)"(?:[^"\\]|\\.)*"', re.IGNORECASE)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _config_value(name: str, default):
+    """从 config 模块读取配置项，不存在时返回默认值"""
+    try:
+        import config
+        return getattr(config, name)
+    except (ImportError, AttributeError):
+        return default
+
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None,
+                  handler: Optional[logging.Handler] = None) -> logging.handlers.QueueListener:
+    """
+    配置根日志为队列式异步输出（重复调用时直接返回已有的监听器）
+    
+    Args:
+        level: 日志级别名称，为 None 时使用 config.LOG_LEVEL
+        fmt: 日志格式，为 None 时使用 config.LOG_FORMAT
+        handler: 实际写日志的处理器，为 None 时输出到标准错误
+        
+    Returns:
+        QueueListener: 后台写日志的监听器
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    level = level or _config_value("LOG_LEVEL", "INFO")
+    fmt = fmt or _config_value("LOG_FORMAT", logging.BASIC_FORMAT)
+
+    if handler is None:
+        handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(fmt))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, level))
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging() -> None:
+    """停止后台写日志线程，写出队列中剩余的日志，并移除 setup_logging 添加的队列处理器"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, logging.handlers.QueueHandler) and handler.queue is _listener.queue:
+                root.removeHandler(handler)
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def redact(text: str) -> str:
+    """将报文中的密码类字段替换为 ***"""
+    return _SENSITIVE_FIELD.sub(r'\1"***"', text)
+
+
+class PayloadPreview:
+    """
+    报文预览：作为日志参数传入，只有日志真正输出时才截断并脱敏
+    """
+
+    __slots__ = ("payload", "max_chars")
+
+    def __init__(self, payload: Union[str, bytes], max_chars: Optional[int] = None) -> None:
+        self.payload = payload
+        self.max_chars = max_chars if max_chars is not None else _config_value(
+            "LOG_PAYLOAD_MAX_CHARS", DEFAULT_PAYLOAD_MAX_CHARS
+        )
+
+    def __str__(self) -> str:
+        text = self.payload
+        if isinstance(text, bytes):
+            text = text.decode("utf-8", "ignore")
+        # 先对完整报文脱敏再截断：先截断的话，超长的密码字段被截在中间时正则匹配不到，会原样漏出前半段
+        text = redact(text)
+        if len(text) > self.max_chars:
+            text = text[:self.max_chars] + "...(已截断)"
+        return text
+
+
+def log_payload(log: logging.Logger, label: str, payload: Union[str, bytes], level: int = logging.INFO) -> None:
+    """
+    按采样率记录报文内容（截断并脱敏）；级别未开启或未被采样时不做任何格式化
+    
+    Args:
+        log: 日志记录器
+        label: 日志说明
+        payload: 报文内容（bytes 为 UTF-8 编码的报文，长度按字节计）
+        level: 日志级别
+    """
+    if not log.isEnabledFor(level):
+        return
+    sample_rate = _config_value("LOG_PAYLOAD_SAMPLE_RATE", DEFAULT_PAYLOAD_SAMPLE_RATE)
+    if sample_rate <= 0 or (sample_rate < 1 and random.random() >= sample_rate):
+        return
+    log.log(level, "%s，长度=%d，内容预览: %s", label, len(payload), PayloadPreview(payload))
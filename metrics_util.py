@@ -0,0 +1,291 @@
+"""
+监控指标模块（Prometheus 文本格式，无第三方依赖）
+- 分阶段耗时直方图：sign_server_stage_seconds{stage="..."}，用于定位 /getCode 等接口的时间花在哪里
+- 计数器：WebSocket 建立连接 / 连接失败次数等
+- 回调指标：排队数、在途请求数、缓存命中等由已有的状态方法在输出时读取，平时没有额外开销
+
+记录一次耗时只是一次二分查找加几次整数累加，可以在生产环境中常开；
+config.METRICS_ENABLED 为 False 时所有记录操作直接返回。
+"""
+import bisect
+import functools
+import inspect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# 默认的耗时直方图分桶上界（秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# /metrics 响应的内容类型（Prometheus 文本格式）
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# 分阶段耗时直方图
+STAGE_SECONDS = "sign_server_stage_seconds"
+
+# WebSocket 建立连接（含握手）成功 / 失败次数
+WS_CONNECTS = "sign_server_ws_connects_total"
+WS_CONNECT_FAILURES = "sign_server_ws_connect_failures_total"
+
+_HELP = {
+    STAGE_SECONDS: ("histogram", "各处理阶段耗时（秒）"),
+    WS_CONNECTS: ("counter", "WebSocket 建立连接（含握手）成功次数，首次连接之后的均为重连"),
+    WS_CONNECT_FAILURES: ("counter", "WebSocket 建立连接失败次数"),
+}
+
+
+def _config_value(name: str, default):
+    """从 config 模块读取配置项，不存在时返回默认值"""
+    try:
+        import config
+        return getattr(config, name)
+    except (ImportError, AttributeError):
+        return default
+
+
+_enabled = bool(_config_value("METRICS_ENABLED", True))
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [
+        '%s="%s"' % (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    ]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Histogram:
+    """固定分桶的直方图（各桶单独计数，输出时再累加）"""
+
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def _render(self, name: str, labels: Tuple[Tuple[str, str], ...]) -> List[str]:
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append("%s_bucket%s %d" % (name, _format_labels(labels, 'le="%g"' % bound), cumulative))
+        lines.append("%s_bucket%s %d" % (name, _format_labels(labels, 'le="+Inf"'), count))
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Counter:
+    """单调递增计数器"""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Registry:
+    """指标注册表：按 (指标名, 标签) 惰性创建指标，输出 Prometheus 文本格式"""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Dict[Tuple[Tuple[str, str], ...], object]] = {}
+        self._callbacks: Dict[str, Tuple[str, str, Callable[[], Iterable[Tuple[dict, float]]]]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str, labels: dict, factory):
+        key = tuple(sorted(labels.items()))
+        family = self._metrics.get(name)
+        metric = family.get(key) if family is not None else None
+        if metric is None:
+            with self._lock:
+                family = self._metrics.setdefault(name, {})
+                metric = family.get(key)
+                if metric is None:
+                    metric = family[key] = factory()
+        return metric
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        return self._get(name, labels, Histogram)
+
+    def counter(self, name: str, **labels) -> Counter:
+        return self._get(name, labels, Counter)
+
+    def register_callback(self, name: str, metric_type: str, help_text: str,
+                          callback: Callable[[], Iterable[Tuple[dict, float]]]) -> None:
+        """
+        注册在输出时才读取的指标（gauge / counter）
+
+        Args:
+            callback: 返回 [(标签字典, 数值), ...]
+        """
+        with self._lock:
+            self._callbacks[name] = (metric_type, help_text, callback)
+
+    def render(self) -> str:
+        """输出 Prometheus 文本格式（text/plain; version=0.0.4）"""
+        lines: List[str] = []
+        with self._lock:
+            families = {name: dict(family) for name, family in self._metrics.items()}
+            callbacks = dict(self._callbacks)
+        for name in sorted(families):
+            metric_type, help_text = _HELP.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, metric in sorted(families[name].items()):
+                if isinstance(metric, Histogram):
+                    lines.extend(metric._render(name, labels))
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(metric.value)}")
+        for name in sorted(callbacks):
+            metric_type, help_text, callback = callbacks[name]
+            try:
+                samples = list(callback())
+            except Exception:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(tuple(sorted(labels.items())))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# 阶段名 -> 直方图（避免每次记录都按标签查找注册表）
+_stage_histograms: Dict[str, Histogram] = {}
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """记录一个阶段的耗时（秒）"""
+    if not _enabled:
+        return
+    histogram = _stage_histograms.get(stage)
+    if histogram is None:
+        histogram = _stage_histograms[stage] = REGISTRY.histogram(STAGE_SECONDS, stage=stage)
+    histogram.observe(seconds)
+
+
+def inc(name: str, **labels) -> None:
+    """计数器加一"""
+    if _enabled:
+        REGISTRY.counter(name, **labels).inc()
+
+
+class stage_timer:
+    """
+    记录代码块耗时的上下文管理器（异常退出时同样记录）
+
+        with stage_timer("getcode.sign"):
+            ...
+    """
+
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+        self.started = 0.0
+
+    def __enter__(self) -> "stage_timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        observe_stage(self.stage, time.perf_counter() - self.started)
+
+
+def timed(stage: str):
+    """记录函数（同步或异步）整体耗时的装饰器"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage_timer(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def register_sign_service_metrics(sign_service) -> None:
+    """注册签名服务的状态指标（排队数、在途请求数、缓存命中等），在输出 /metrics 时读取"""
+    REGISTRY.register_callback(
+        "sign_server_sign_queue_depth", "gauge", "等待签名名额的排队请求数",
+        lambda: [({}, sign_service.queue_status()["queued"])],
+    )
+    REGISTRY.register_callback(
+        "sign_server_sign_shed_total", "counter", "因排队已满、超时或截止时间被拒绝的签名请求数",
+        lambda: [({}, sign_service.queue_status()["shed"])],
+    )
+    REGISTRY.register_callback(
+        "sign_server_ws_in_flight", "gauge", "各签名端点上在途的签名请求数",
+        lambda: [({"endpoint": status["url"]}, status["in_flight"]) for status in sign_service.endpoint_status()],
+    )
+    REGISTRY.register_callback(
+        "sign_server_ws_healthy", "gauge", "签名端点是否健康（未被剔除）",
+        lambda: [({"endpoint": status["url"]}, int(status["healthy"])) for status in sign_service.endpoint_status()],
+    )
+
+    def cache_samples():
+        status = sign_service.cache_status()
+        if status is None:
+            return []
+        return [({"result": key}, status[key]) for key in ("hits", "misses", "coalesced")]
+
+    REGISTRY.register_callback(
+        "sign_server_sign_cache_lookups_total", "counter", "签名结果缓存查询次数（按结果）", cache_samples,
+    )
+
+
+def render() -> str:
+    """输出全部指标（Prometheus 文本格式）"""
+    return REGISTRY.render()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+__all__ = [
+    "CONTENT_TYPE",
+    "STAGE_SECONDS",
+    "WS_CONNECTS",
+    "WS_CONNECT_FAILURES",
+    "observe_stage",
+    "inc",
+    "stage_timer",
+    "timed",
+    "register_sign_service_metrics",
+    "render",
+    "is_enabled",
+]
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+XML 目录布局迁移工具
+
+在平铺布局（所有文件直接放在保存目录下）与分片布局（按文件名哈希放入子目录，见 services/xml_layout.py）之间迁移，
+或重建分片目录的名称日志。迁移只移动文件（同一磁盘上为重命名），不改变文件内容与 API 中的文件名。
+也可以在文件存储与 SQLite 存储（config.XML_STORAGE_BACKEND）之间复制文档，复制后源数据保留，确认无误后可手动删除；
+或清空文件存储的变更日志（config.XML_CHANGE_FEED，见 services/xml_changes.py）。
+
+请在服务停止时执行；迁移中断后可以重复执行，已移动的文件不会重复处理。
+
+运行方式：
+    python migrate_xml_layout.py to-sharded ./xml_files/
+    python migrate_xml_layout.py to-sharded ./xml_files/ --depth 3
+    python migrate_xml_layout.py to-flat ./xml_files/
+    python migrate_xml_layout.py rebuild-index ./xml_files/   # 按目录树重写名称日志（同时压缩日志中的历史记录）
+    python migrate_xml_layout.py to-sqlite ./xml_files/       # 把文件复制到 SQLite 存储
+    python migrate_xml_layout.py to-files ./xml_files/        # 把 SQLite 存储中的文档写回文件
+    python migrate_xml_layout.py trim-changes ./xml_files/    # 清空变更日志（序号继续递增，旧 cursor 的客户端收到 reset；服务运行时也可执行）
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import config
+from services.xml_changes import trim_changes
+from services.xml_layout import DEFAULT_SHARD_DEPTH, migrate_to_flat, migrate_to_sharded, rebuild_journal
+from services.xml_storage import copy_documents, create_storage
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="XML 目录布局迁移工具（平铺 / 分片，文件 / SQLite）")
+    parser.add_argument("command", choices=["to-sharded", "to-flat", "rebuild-index", "to-sqlite", "to-files",
+                                            "trim-changes"],
+                        help="操作")
+    parser.add_argument("directories", nargs="*", help="保存目录（默认为 config.SAVE_FOLDER）")
+    parser.add_argument("--depth", type=int, default=getattr(config, "XML_SHARD_DEPTH", DEFAULT_SHARD_DEPTH),
+                        help="分片层数（每层两位十六进制，只在迁移为分片布局时使用）")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    failed = False
+    for directory in args.directories or [config.SAVE_FOLDER]:
+        if not os.path.isdir(directory):
+            logger.error("目录不存在: %s", directory)
+            failed = True
+            continue
+        started = time.perf_counter()
+        try:
+            if args.command == "to-sharded":
+                moved = migrate_to_sharded(directory, args.depth)
+                logger.info("已迁移为分片布局: %s，移动 %d 个文件", directory, moved)
+            elif args.command == "to-flat":
+                moved = migrate_to_flat(directory)
+                logger.info("已恢复为平铺布局: %s，移动 %d 个文件", directory, moved)
+            elif args.command == "rebuild-index":
+                count = rebuild_journal(directory)
+                logger.info("已重建名称日志: %s，共 %d 个文件", directory, count)
+            elif args.command == "trim-changes":
+                size = trim_changes(directory)
+                logger.info("已清空变更日志: %s，释放 %.1f MB", directory, size / 1024 / 1024)
+            else:
+                backends = ("filesystem", "sqlite") if args.command == "to-sqlite" else ("sqlite", "filesystem")
+                count = copy_documents(create_storage(directory, backends[0]), create_storage(directory, backends[1]))
+                logger.info("已复制到 %s 存储: %s，共 %d 个文档", backends[1], directory, count)
+        except (OSError, ValueError) as e:
+            logger.error("处理目录失败: %s - %s", directory, e)
+            failed = True
+            continue
+        logger.info("耗时 %.1f 秒", time.perf_counter() - started)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+生产环境启动入口（替代 app.py 中 Flask 自带的开发服务器）
+
+- Windows：waitress（单进程多线程）
+- Linux：gunicorn（gthread 工作模式，单进程多线程）
+
+操作员卡只能由一个进程持有连接：WebSocketWrapper 在服务进程中只创建一份，
+各请求线程共享它（连接上的请求多路复用，由 WS_MAX_IN_FLIGHT 控制并发），
+因此工作进程数固定为 1，并发能力通过线程数扩展。
+启用签名守护进程（config.SIGNER_DAEMON）时连接由 signer_daemon.py 持有，
+gunicorn 可以运行多个工作进程，解密、JSON 与 XML 读写分散到多个 CPU 核心。
+
+运行方式：
+    python serve.py
+    python serve.py --server gunicorn --threads 32 --keepalive 75
+"""
+import argparse
+import logging
+import sys
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# 默认的请求处理线程数
+DEFAULT_THREADS = 16
+
+# 默认的 HTTP keep-alive 空闲超时（秒）
+DEFAULT_KEEPALIVE = 75
+
+
+def _config_value(name: str, default):
+    """从 config 模块读取配置项，不存在时返回默认值"""
+    return getattr(config, name, default)
+
+
+def _default_server() -> str:
+    server = _config_value("SERVER", "auto")
+    if server == "auto":
+        return "waitress" if sys.platform == "win32" else "gunicorn"
+    return server
+
+
+def _single_owner_workers(workers: int) -> int:
+    """
+    签名连接只能由一个进程持有，多进程会各自连接操作员卡，因此工作进程数固定为 1；
+    启用签名守护进程时各工作进程只是守护进程的客户端，不受此限制
+    """
+    if _config_value("SIGNER_DAEMON", False):
+        return max(workers, 1)
+    if workers > 1:
+        logger.warning("操作员卡连接只能由一个进程持有，工作进程数 %d 已改为 1（请通过线程数提高并发，或启用签名守护进程 SIGNER_DAEMON）", workers)
+    return 1
+
+
+def run_waitress(host: str, port: int, threads: int, keepalive: int) -> None:
+    """使用 waitress 启动（单进程多线程，Windows 推荐）"""
+    from waitress import serve
+    from app import app, sign_service
+    from services.xml_changes import close_change_feeds
+
+    try:
+        sign_service.start()
+    except Exception as e:
+        logger.error(f"启动 WebSocket 连接失败: {e}", exc_info=True)
+    logger.info(f"waitress 启动: http://{host}:{port}，线程数 {threads}，keep-alive {keepalive} 秒")
+    try:
+        # channel_timeout：空闲连接保持时间（HTTP/1.1 默认保持连接）
+        serve(app, host=host, port=port, threads=threads, channel_timeout=keepalive, ident="sign-server")
+    finally:
+        sign_service.stop()
+        close_change_feeds()
+
+
+def run_gunicorn(host: str, port: int, workers: int, threads: int, keepalive: int) -> None:
+    """使用 gunicorn 启动（gthread 工作模式，Linux 推荐）"""
+    from gunicorn.app.base import BaseApplication
+
+    def post_fork(server, worker):
+        # 主进程的后台写日志线程不会随 fork 复制到工作进程，需要在工作进程中重新启动
+        from log_util import setup_logging, stop_logging
+        stop_logging()
+        setup_logging(config.LOG_LEVEL, config.LOG_FORMAT)
+
+    def post_worker_init(worker):
+        # 事件循环线程无法跨 fork 保留，必须在工作进程中启动签名服务
+        from app import sign_service
+        try:
+            sign_service.start()
+        except Exception as e:
+            logger.error(f"启动 WebSocket 连接失败: {e}", exc_info=True)
+
+    def worker_exit(server, worker):
+        from app import sign_service
+        from services.xml_changes import close_change_feeds
+        sign_service.stop()
+        close_change_feeds()
+
+    class SignServerApplication(BaseApplication):
+        def __init__(self, options: dict) -> None:
+            self.options = options
+            super().__init__()
+
+        def load_config(self) -> None:
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import app
+            return app
+
+    options = {
+        "bind": f"{host}:{port}",
+        "workers": _single_owner_workers(workers),
+        "worker_class": "gthread",
+        "threads": threads,
+        "keepalive": keepalive,
+        # 签名请求可能排队等待卡片，工作进程超时需大于签名响应超时
+        "timeout": 120,
+        "post_fork": post_fork,
+        "post_worker_init": post_worker_init,
+        "worker_exit": worker_exit,
+    }
+    logger.info(f"gunicorn 启动: http://{host}:{port}，线程数 {threads}，keep-alive {keepalive} 秒")
+    SignServerApplication(options).run()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="签名服务生产环境启动入口")
+    parser.add_argument("--server", choices=["waitress", "gunicorn"], default=_default_server(),
+                        help="WSGI 服务器（默认 Windows 使用 waitress，其他系统使用 gunicorn）")
+    parser.add_argument("--host", default=config.HOST, help="监听地址")
+    parser.add_argument("--port", type=int, default=config.PORT, help="监听端口")
+    parser.add_argument("--threads", type=int, default=_config_value("SERVER_THREADS", DEFAULT_THREADS),
+                        help="请求处理线程数")
+    parser.add_argument("--workers", type=int, default=_config_value("SERVER_WORKERS", 1),
+                        help="工作进程数（仅 gunicorn；未启用签名守护进程时固定为 1）")
+    parser.add_argument("--keepalive", type=int, default=_config_value("SERVER_KEEPALIVE", DEFAULT_KEEPALIVE),
+                        help="HTTP keep-alive 空闲超时（秒）")
+    args = parser.parse_args()
+
+    from log_util import setup_logging
+    from services.xml_service import ensure_directory_exists
+
+    setup_logging(config.LOG_LEVEL, config.LOG_FORMAT)
+    ensure_directory_exists(config.SAVE_FOLDER)
+    logger.info(f"AES密钥配置: {'已配置' if config.AES_KEY else '未配置'}")
+
+    if args.server == "waitress":
+        run_waitress(args.host, args.port, args.threads, args.keepalive)
+    else:
+        run_gunicorn(args.host, args.port, args.workers, args.threads, args.keepalive)
+
+
+if __name__ == '__main__':
+    main()
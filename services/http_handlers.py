@@ -0,0 +1,472 @@
+"""
+HTTP 接口处理逻辑（与 Web 框架无关）
+
+app.py（Flask）与 asgi_app.py（Starlette）共用这里的实现：每个接口的请求解析、错误映射和响应内容
+只在这里写一次，框架层只负责读取请求、调用签名服务，并把 ApiResponse 转换成各自的响应对象。
+"""
+import logging
+from typing import Dict, Iterator, NamedTuple, Optional, Union
+
+import config
+import metrics_util
+from services.xml_service import (
+    decrypt_request_body,
+    decrypt_request_stream,
+    extract_directory,
+    validate_request_data,
+    save_xml_file,
+    list_xml_files_encrypted,
+    list_xml_files_page,
+    extract_list_options,
+    should_stream_listing,
+    iter_encrypted_listing_response,
+    delete_xml_file,
+    extract_get_params,
+    get_xml_file,
+    change_feed_enabled,
+    extract_changes_params,
+    get_xml_changes,
+    extract_batch_xml_items,
+    save_xml_files,
+    delete_xml_files,
+    encrypt_response_data,
+)
+from services.sign_service import (
+    extract_sign_params,
+    extract_admission_params,
+    split_sign_result,
+    extract_batch_sign_params,
+    build_batch_sign_results,
+)
+from websocket_wrapper import WebSocketError, SignOverloadedError
+
+logger = logging.getLogger(__name__)
+
+
+class ApiResponse(NamedTuple):
+    """
+    接口响应：HTTP 状态码 + JSON 响应体
+    stream 不为 None 时为流式响应，按顺序写出其中的文本片段（拼接后为完整的响应体），忽略 body；
+    body 为 str 时按 media_type 原样输出；headers 为额外的响应头（例如 ETag）
+    """
+    status: int
+    body: Union[dict, str, None]
+    stream: Optional[Iterator[str]] = None
+    media_type: str = "application/json"
+    headers: Optional[Dict[str, str]] = None
+
+
+def _result(code: int, msg: str, data, status: int) -> ApiResponse:
+    return ApiResponse(status, {
+        "code": code,
+        "msg": msg,
+        "data": data
+    })
+
+
+def handle_list_files(raw_body: bytes) -> ApiResponse:
+    """
+    获取指定目录下的所有XML文件（文件名 + 内容）
+    请求体：密文 -> 解密后JSON，可包含字段 目录
+    可选分页/过滤字段：offset、limit、cursor、prefix、pattern、mtimeFrom、mtimeTo（毫秒时间戳）、
+    fields（name / meta / full）；使用任一字段时 data 为 {"files", "total", "nextCursor"}
+    返回：data 为对象时加密后返回
+    """
+    try:
+        logger.info("收到 xml-files/list 请求")
+        request_data = decrypt_request_body(raw_body, config.AES_KEY, encoding="UTF-8")
+        try:
+            directory = extract_directory(request_data, config.SAVE_FOLDER)
+            options = extract_list_options(request_data)
+            stream = options is None and should_stream_listing(directory, request_data)
+        except ValueError as e:
+            return _result(500, str(e), False, 400)
+
+        if stream:
+            # 大目录：逐个读取文件、按分组加密并直接写出十六进制，内存占用与目录大小无关
+            logger.info("xml-files/list 使用流式响应")
+            return ApiResponse(200, None, iter_encrypted_listing_response(directory, config.AES_KEY))
+
+        if options is None:
+            # 目录内容没有变化时直接复用上次的密文，不再重复读取、序列化和加密
+            count, resp_data = list_xml_files_encrypted(directory, config.AES_KEY)
+            logger.info("xml-files/list 查询成功，文件数量=%d", count)
+        else:
+            # 分页/过滤查询：只读取结果页中需要内容的文件
+            page = list_xml_files_page(directory, **options)
+            logger.info("xml-files/list 分页查询成功，符合条件=%d，本页=%d", page["total"], len(page["files"]))
+            resp_data = encrypt_response_data(page, config.AES_KEY)
+
+        return _result(200, "查询成功", resp_data, 200)
+    except Exception as e:
+        logger.error(f"查询XML文件列表失败: {e}", exc_info=True)
+        return _result(500, f"查询失败: {str(e)}", False, 500)
+
+
+def handle_add_file(stream, content_length: Optional[int]) -> ApiResponse:
+    """
+    新增XML文件
+    请求体：密文 -> 解密后JSON，需要 文件名、xml报文，可选 目录
+    stream 为请求体的同步可读流，content_length 为请求体长度（未知时为 None）
+    """
+    try:
+        logger.info("收到 xml-files/add 请求")
+        # XML 报文可能很大，直接从输入流分块解密，不整体读入请求体
+        request_data = decrypt_request_stream(stream, content_length, config.AES_KEY, encoding="UTF-8")
+
+        try:
+            filename, xml_content = validate_request_data(request_data)
+            directory = extract_directory(request_data, config.SAVE_FOLDER)
+        except ValueError as e:
+            return _result(500, str(e), False, 400)
+
+        try:
+            save_xml_file(filename, xml_content, directory)
+        except Exception as e:
+            return _result(500, str(e), False, 500)
+
+        return _result(200, "新增成功", True, 200)
+    except Exception as e:
+        logger.error(f"新增XML文件失败: {e}", exc_info=True)
+        return _result(500, f"服务器内部错误: {str(e)}", False, 500)
+
+
+def handle_delete_file(raw_body: bytes) -> ApiResponse:
+    """
+    删除指定XML文件
+    请求体：密文 -> 解密后JSON，需要 文件名，可选 目录
+    """
+    try:
+        logger.info("收到 xml-files/delete 请求")
+        request_data = decrypt_request_body(raw_body, config.AES_KEY, encoding="UTF-8")
+
+        if not isinstance(request_data, dict):
+            return _result(500, "请求数据必须是JSON对象", False, 400)
+
+        filename = request_data.get("filename")
+        if not filename or not isinstance(filename, str):
+            return _result(500, "filename不能为空且必须是字符串", False, 400)
+
+        directory = extract_directory(request_data, config.SAVE_FOLDER)
+
+        try:
+            delete_xml_file(filename, directory)
+        except FileNotFoundError as e:
+            return _result(500, str(e), False, 404)
+        except Exception as e:
+            return _result(500, str(e), False, 500)
+
+        return _result(200, "删除成功", True, 200)
+    except Exception as e:
+        logger.error(f"删除XML文件失败: {e}", exc_info=True)
+        return _result(500, f"服务器内部错误: {str(e)}", False, 500)
+
+
+def handle_get_file(raw_body: bytes, if_none_match_header: Optional[str] = None) -> ApiResponse:
+    """
+    获取单个XML文件
+    请求体：密文 -> 解密后JSON，需要 文件名，可选 目录、ifNoneMatch（上次返回的 etag，也可用请求头 If-None-Match）
+    返回：data 为加密后的 {"filename", "xml", "size", "mtime", "etag"}，响应头 ETag；
+    ifNoneMatch 与当前 ETag 相同时返回 code 304、data 为 false（不读取、不加密文件内容）
+    """
+    try:
+        logger.info("收到 xml-files/get 请求")
+        request_data = decrypt_request_body(raw_body, config.AES_KEY, encoding="UTF-8")
+
+        try:
+            filename, if_none_match = extract_get_params(request_data, if_none_match_header)
+            directory = extract_directory(request_data, config.SAVE_FOLDER)
+        except ValueError as e:
+            return _result(500, str(e), False, 400)
+
+        try:
+            etag, document = get_xml_file(filename, directory, if_none_match)
+        except FileNotFoundError as e:
+            return _result(500, str(e), False, 404)
+
+        if document is None:
+            response = _result(304, "未修改", False, 200)
+        else:
+            response = _result(200, "查询成功", encrypt_response_data(document, config.AES_KEY), 200)
+        return response._replace(headers={"ETag": etag})
+    except Exception as e:
+        logger.error(f"获取XML文件失败: {e}", exc_info=True)
+        return _result(500, f"查询失败: {str(e)}", False, 500)
+
+
+def check_change_feed() -> Optional[ApiResponse]:
+    """变更订阅未开启时返回 404 响应，开启时返回 None"""
+    if change_feed_enabled():
+        return None
+    return _result(404, "变更订阅未开启", False, 404)
+
+
+def parse_changes_request(raw_body: bytes) -> Union[ApiResponse, tuple]:
+    """
+    解密并校验 /xml-files/changes 请求，返回 (目录, cursor, limit, wait)，参数错误时返回错误响应；
+    解密失败时抛出异常，由 changes_error_response 转换为 500 响应
+    """
+    logger.info("收到 xml-files/changes 请求")
+    request_data = decrypt_request_body(raw_body, config.AES_KEY, encoding="UTF-8")
+    try:
+        cursor, limit, wait = extract_changes_params(request_data)
+        directory = extract_directory(request_data, config.SAVE_FOLDER)
+    except ValueError as e:
+        return _result(500, str(e), False, 400)
+    return directory, cursor, limit, wait
+
+
+def build_changes_response(result: dict) -> ApiResponse:
+    """变更事件加密后返回"""
+    return _result(200, "查询成功", encrypt_response_data(result, config.AES_KEY), 200)
+
+
+def changes_error_response(e: Exception) -> ApiResponse:
+    logger.error(f"查询XML文件变更失败: {e}", exc_info=e)
+    return _result(500, f"查询失败: {str(e)}", False, 500)
+
+
+def handle_changes(raw_body: bytes) -> ApiResponse:
+    """
+    XML文件变更订阅（长轮询，等待期间阻塞当前线程）
+    请求体：密文 -> 解密后JSON，可选 目录、cursor（上次返回的 cursor，不传时只返回当前 cursor）、
+    limit（最多返回的事件数）、wait（没有新事件时最多等待的秒数）
+    返回：data 为加密后的 {"events": [{"seq", "op": "save"/"delete", "filename", "size", "mtime"}],
+    "cursor", "more", "reset"}；reset 为 true 时客户端需要用 /xml-files/list 重新同步
+    """
+    unavailable = check_change_feed()
+    if unavailable is not None:
+        return unavailable
+    try:
+        params = parse_changes_request(raw_body)
+        if isinstance(params, ApiResponse):
+            return params
+        directory, cursor, limit, wait = params
+        return build_changes_response(get_xml_changes(directory, cursor, limit, wait))
+    except Exception as e:
+        return changes_error_response(e)
+
+
+def handle_add_files_batch(stream, content_length: Optional[int]) -> ApiResponse:
+    """
+    批量新增XML文件
+    请求体：密文 -> 解密后JSON数组 [{"filename", "xml", 可选 "directory"}, ...]，
+    或 {"items": [...], "directory": 默认目录}
+    响应：data 为加密后的数组，与请求一一对应，每项为 {"filename", "code": 200} 或 {"filename", "code": 400/500, "msg"}
+    """
+    try:
+        logger.info("收到 xml-files/add-batch 请求")
+        request_data = decrypt_request_stream(stream, content_length, config.AES_KEY, encoding="UTF-8")
+
+        try:
+            items = extract_batch_xml_items(request_data, config.SAVE_FOLDER, config.XML_BATCH_MAX_ITEMS)
+        except ValueError as e:
+            return _result(400, str(e), False, 400)
+
+        resp_data = encrypt_response_data(save_xml_files(items), config.AES_KEY)
+        return _result(200, "成功", resp_data, 200)
+    except Exception as e:
+        logger.error(f"批量新增XML文件失败: {e}", exc_info=True)
+        return _result(500, f"服务器内部错误: {str(e)}", False, 500)
+
+
+def handle_delete_files_batch(raw_body: bytes) -> ApiResponse:
+    """
+    批量删除XML文件
+    请求体：密文 -> 解密后JSON数组 [{"filename", 可选 "directory"} 或文件名, ...]，
+    或 {"items": [...], "directory": 默认目录}
+    响应：data 为加密后的数组，与请求一一对应，每项为 {"filename", "code": 200} 或 {"filename", "code": 400/404/500, "msg"}
+    """
+    try:
+        logger.info("收到 xml-files/delete-batch 请求")
+        request_data = decrypt_request_body(raw_body, config.AES_KEY, encoding="UTF-8")
+
+        try:
+            items = extract_batch_xml_items(
+                request_data, config.SAVE_FOLDER, config.XML_BATCH_MAX_ITEMS, require_xml=False
+            )
+        except ValueError as e:
+            return _result(400, str(e), False, 400)
+
+        resp_data = encrypt_response_data(delete_xml_files(items), config.AES_KEY)
+        return _result(200, "成功", resp_data, 200)
+    except Exception as e:
+        logger.error(f"批量删除XML文件失败: {e}", exc_info=True)
+        return _result(500, f"服务器内部错误: {str(e)}", False, 500)
+
+
+def handle_root(sign_service) -> ApiResponse:
+    """根路径，返回服务信息"""
+    return ApiResponse(200, {
+        "service": "Sign Server",
+        "version": "1.0.0",
+        "status": "running" if sign_service.is_available() else "websocket_not_available",
+        "endpoints": {
+            "xml_files": {
+                "list": {"method": "POST", "path": "/xml-files/list"},
+                "add": {"method": "POST", "path": "/xml-files/add"},
+                "get": {"method": "POST", "path": "/xml-files/get"},
+                "changes": {"method": "POST", "path": "/xml-files/changes"},
+                "delete": {"method": "POST", "path": "/xml-files/delete"},
+                "addBatch": {"method": "POST", "path": "/xml-files/add-batch"},
+                "deleteBatch": {"method": "POST", "path": "/xml-files/delete-batch"},
+            },
+            "sign": {
+                "getCode": {"method": "POST", "path": "/getCode"},
+                "getCodeBatch": {"method": "POST", "path": "/getCode/batch"},
+            },
+            "health": {"method": "GET", "path": "/health"},
+            "metrics": {"method": "GET", "path": "/metrics"},
+        }
+    })
+
+
+def handle_health(sign_service) -> ApiResponse:
+    """健康检查接口"""
+    endpoints = sign_service.endpoint_status()
+    healthy = sign_service.is_available() and any(endpoint["healthy"] for endpoint in endpoints)
+    sign_status = "healthy" if healthy else "websocket_not_available"
+    return ApiResponse(200, {
+        "code": 200,
+        "msg": "服务运行正常",
+        "data": True,
+        "sign_status": sign_status,
+        "endpoints": endpoints,
+        "sign_cache": sign_service.cache_status(),
+        "sign_queue": sign_service.queue_status()
+    })
+
+
+def handle_metrics() -> ApiResponse:
+    """监控指标接口（Prometheus 文本格式）：分阶段耗时直方图、重连次数、排队数等"""
+    if not metrics_util.is_enabled():
+        return _result(404, "监控指标未开启", False, 404)
+    return ApiResponse(200, metrics_util.render(), media_type=metrics_util.CONTENT_TYPE)
+
+
+def check_sign_service(sign_service):
+    """签名服务不可用时返回错误响应，可用时返回 None"""
+    if sign_service.is_available():
+        return None
+    msg = "WebSocket 签名服务未正确初始化"
+    logger.error(msg)
+    return _result(500, msg, False, 500)
+
+
+def parse_getcode_request(raw_body: bytes) -> tuple[str, str, int, Optional[float]]:
+    """
+    解密并校验 getCode 请求（与 XML 接口保持一致），返回 (str, pwdstr, priority, timeout)
+
+    请求体：密文 -> 解密后JSON，需要字段：
+    {
+        "str": "数据字符串",
+        "pwdstr": "密码字符串"
+    }
+    可选排队参数：priority（越大越优先）、timeout（最长排队秒数）
+
+    解密失败或数据格式错误时抛出 ValueError，由 sign_error_response 转换为 400 响应
+    """
+    logger.info("收到 getCode 请求")
+    request_data = decrypt_request_body(raw_body, config.AES_KEY, encoding="UTF-8")
+    str_data, pwdstr = extract_sign_params(request_data)
+    priority, timeout = extract_admission_params(request_data)
+    return str_data, pwdstr, priority, timeout
+
+
+def build_getcode_response(result: str) -> ApiResponse:
+    """
+    根据签名结果构造 getCode 响应：data 为对象时加密后返回
+    {
+        "code": 200,
+        "msg": "成功",
+        "data": "加密后的密文（包含 getCodeResult）"
+    }
+    """
+    logger.info("WebSocket.getCode 调用成功，结果长度=%d", len(result))
+    logger.debug("WebSocket.getCode 返回结果: %r", result[:200])
+
+    # 拆分结果：如果符合 "签名字符串||证书号字符串" 格式，且两部分都有值，则拆分
+    # 如果无法拆分，返回错误并将结果放到msg中
+    response_data = split_sign_result(result)
+    if response_data is None:
+        return _result(500, result, False, 500)
+
+    # 加密响应数据（与 XML 接口保持一致）
+    resp_data = encrypt_response_data(response_data, config.AES_KEY)
+    return _result(200, "成功", resp_data, 200)
+
+
+def parse_getcode_batch_request(raw_body: bytes) -> tuple[list, list, int, Optional[float]]:
+    """
+    解密并校验批量签名请求，返回 (params, valid, priority, timeout)
+
+    请求体：密文 -> 解密后JSON数组：
+    [
+        {"str": "数据字符串", "pwdstr": "密码字符串"},
+        ...
+    ]
+    需要排队参数时可写成 {"items": [...], "priority": 0, "timeout": 5}
+
+    params 与请求数组一一对应（非法项为 ValueError），valid 为需要提交签名的合法项 (str, pwdstr)；
+    整体格式错误时抛出 ValueError
+    """
+    logger.info("收到 getCode/batch 请求")
+    request_data = decrypt_request_body(raw_body, config.AES_KEY, encoding="UTF-8")
+    params = extract_batch_sign_params(request_data, config.SIGN_BATCH_MAX_ITEMS)
+    priority, timeout = extract_admission_params(request_data)
+    return params, [param for param in params if not isinstance(param, ValueError)], priority, timeout
+
+
+def build_getcode_batch_response(params: list, results: list) -> ApiResponse:
+    """
+    根据批量签名结果构造响应：data 为加密后的数组，与请求一一对应，每项为
+    {"code": 200, "sign": "...", "certNo": "..."} 或 {"code": 400/500, "msg": "错误信息"}
+    """
+    items = build_batch_sign_results(params, results)
+    succeeded = sum(1 for item in items if item["code"] == 200)
+    logger.info("WebSocket.getCode 批量调用完成，总数=%d，成功=%d", len(items), succeeded)
+    resp_data = encrypt_response_data(items, config.AES_KEY)
+    return _result(200, "成功", resp_data, 200)
+
+
+def sign_error_response(e: Exception, action: str = "WebSocket.getCode") -> ApiResponse:
+    """把签名接口处理过程中的异常转换为错误响应"""
+    if isinstance(e, ValueError):
+        # 解密失败或数据格式错误
+        logger.error(f"请求数据解析失败: {e}", exc_info=e)
+        return _result(400, str(e), False, 400)
+    if isinstance(e, SignOverloadedError):
+        # 签名服务过载：快速失败，调用方可稍后重试
+        logger.warning("签名服务过载: %s", e)
+        return _result(503, str(e), False, 503)
+    if isinstance(e, WebSocketError):
+        logger.error("WebSocketError: %s", e, exc_info=e)
+        return _result(500, str(e), False, 500)
+    msg = f"调用 {action} 失败: {e}"
+    logger.error(msg, exc_info=e)
+    return _result(500, msg, False, 500)
+
+
+__all__ = [
+    "ApiResponse",
+    "handle_list_files",
+    "handle_add_file",
+    "handle_delete_file",
+    "handle_get_file",
+    "check_change_feed",
+    "parse_changes_request",
+    "build_changes_response",
+    "changes_error_response",
+    "handle_changes",
+    "handle_add_files_batch",
+    "handle_delete_files_batch",
+    "handle_root",
+    "handle_health",
+    "handle_metrics",
+    "check_sign_service",
+    "parse_getcode_request",
+    "build_getcode_response",
+    "parse_getcode_batch_request",
+    "build_getcode_batch_response",
+    "sign_error_response",
+]
@@ -0,0 +1,138 @@
+import logging
+from typing import List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+def extract_sign_params(data: dict) -> tuple[str, str]:
+    """校验并提取 str 与 pwdstr"""
+    if not isinstance(data, dict):
+        raise ValueError("请求数据必须是JSON对象")
+
+    str_data = data.get("str")
+    pwdstr = data.get("pwdstr")
+    if str_data is None or pwdstr is None:
+        raise ValueError("请求体必须包含 'str' 和 'pwdstr' 字段")
+    if not isinstance(str_data, str) or not isinstance(pwdstr, str):
+        raise ValueError("'str' 和 'pwdstr' 必须是字符串类型")
+    return str_data, pwdstr
+
+
+def extract_admission_params(data) -> tuple[int, Optional[float]]:
+    """
+    提取可选的排队参数：priority（整数，越大越优先，默认 0）与 timeout（最长排队秒数，默认不指定）
+    """
+    if not isinstance(data, dict):
+        return 0, None
+    priority = data.get("priority", 0)
+    timeout = data.get("timeout")
+    if isinstance(priority, bool) or not isinstance(priority, int):
+        raise ValueError("'priority' 必须是整数")
+    if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0):
+        raise ValueError("'timeout' 必须是大于 0 的数字（秒）")
+    return priority, timeout
+
+
+def split_sign_result(result: str) -> Optional[dict]:
+    """
+    拆分签名结果："签名字符串||证书号字符串" -> {"sign": ..., "certNo": ...}
+    无法拆分（不含分隔符或任一部分为空）时返回 None，由调用方将原始结果放到 msg 中
+    """
+    if "||" not in result:
+        logger.error("结果不包含分隔符 ||，无法拆分")
+        return None
+
+    parts = result.split("||", 1)  # 只分割一次，防止证书号中包含 ||
+    if len(parts) != 2:
+        logger.error("结果格式不符合预期，拆分后部分数量=%d", len(parts))
+        return None
+
+    sign = parts[0].strip()
+    cert_no = parts[1].strip()
+    # 检查两部分是否都有值
+    if not sign or not cert_no:
+        logger.error("结果拆分后存在空值: sign=%r, certNo=%r", sign, cert_no)
+        return None
+
+    logger.info("结果已拆分为 sign 和 certNo")
+    return {
+        "sign": sign,
+        "certNo": cert_no
+    }
+
+
+def extract_batch_sign_params(data, max_items: int = 0) -> List[Union[tuple, ValueError]]:
+    """
+    校验批量签名请求（JSON数组，每项为 {"str": ..., "pwdstr": ...}；
+    也可以是 {"items": [...], "priority": ..., "timeout": ...}，排队参数由 extract_admission_params 提取）
+
+    整体格式错误时抛出 ValueError；单项格式错误不影响其他项，对应位置返回 ValueError
+
+    Returns:
+        list: 与请求数组一一对应，合法项为 (str, pwdstr)，非法项为 ValueError
+    """
+    if isinstance(data, dict) and "items" in data:
+        data = data["items"]
+    if not isinstance(data, list):
+        raise ValueError("请求数据必须是JSON数组")
+    if not data:
+        raise ValueError("批量签名请求不能为空")
+    if max_items and len(data) > max_items:
+        raise ValueError(f"批量签名请求最多 {max_items} 条，实际 {len(data)} 条")
+
+    params: List[Union[tuple, ValueError]] = []
+    for item in data:
+        try:
+            params.append(extract_sign_params(item))
+        except ValueError as e:
+            params.append(e)
+    return params
+
+
+def build_batch_sign_results(params: list, results: list) -> List[dict]:
+    """
+    合并批量签名结果：每项成功时为 {"code": 200, "sign", "certNo"}，
+    参数错误时为 {"code": 400, "msg"}，签名服务过载时为 {"code": 503, "msg"}，
+    签名失败或结果无法拆分时为 {"code": 500, "msg"}
+
+    Args:
+        params: extract_batch_sign_params 的返回值
+        results: 合法项按顺序对应的签名结果（"签名字符串||证书号字符串" 或异常对象）
+    """
+    it = iter(results)
+    items: List[dict] = []
+    for param in params:
+        if isinstance(param, ValueError):
+            items.append({"code": 400, "msg": str(param)})
+            continue
+        result = next(it)
+        if isinstance(result, Exception):
+            items.append({"code": getattr(result, "code", 500), "msg": str(result)})
+            continue
+        response_data = split_sign_result(result)
+        if response_data is None:
+            items.append({"code": 500, "msg": result})
+        else:
+            items.append({"code": 200, **response_data})
+    return items
+
+
+def create_sign_service(use_daemon: Optional[bool] = None):
+    """
+    创建签名服务：默认在本进程内持有 WebSocket 连接（WebSocketWrapper）；
+    启用签名守护进程（config.SIGNER_DAEMON）时返回连接守护进程的 SignerClient，两者接口一致
+
+    Args:
+        use_daemon: 是否使用签名守护进程，为 None 时读取 config.SIGNER_DAEMON
+    """
+    if use_daemon is None:
+        try:
+            import config
+            use_daemon = bool(getattr(config, "SIGNER_DAEMON", False))
+        except ImportError:
+            use_daemon = False
+    if use_daemon:
+        from signer_client import SignerClient
+        return SignerClient()
+    from websocket_wrapper import WebSocketWrapper
+    return WebSocketWrapper()
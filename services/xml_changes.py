@@ -0,0 +1,514 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from services.xml_index import max_directories
+from services.xml_layout import scan_xml_folder
+from services.xml_writer import write_bytes_atomic
+
+logger = logging.getLogger(__name__)
+
+# 文件存储的变更日志（放在保存目录下，不以 .xml 结尾）：每行一次新增 / 删除，
+# 事件序号为该行结束位置在日志中的字节偏移（多个进程以 O_APPEND 追加，序号单调递增且各进程一致）；
+# 首行可以是 {"base": N}（压缩日志时写入），此后的序号从 N 开始累加；
+# 日志超过 XML_CHANGES_MAX_BYTES 时在线压缩，只保留最近的事件，保留下来的事件序号不变
+CHANGES_NAME = ".xml-changes.jsonl"
+
+# 变更日志的锁文件：追加时共享锁，压缩（替换日志文件）时排他锁，避免其他进程把事件追加到被替换的旧文件中
+LOCK_NAME = ".xml-changes.lock"
+
+# 变更日志的默认大小上限（字节），超过时压缩到一半以内
+DEFAULT_CHANGES_MAX_BYTES = 64 * 1024 * 1024
+
+# 压缩时默认最多保留的事件数（与 SQLite 存储的 XML_CHANGES_RETAIN 相同）
+DEFAULT_CHANGES_RETAIN = 100000
+
+# 单次返回的默认 / 最大事件数
+DEFAULT_CHANGES_LIMIT = 1000
+
+# 长轮询的最长等待时间（秒）
+DEFAULT_MAX_WAIT_SECONDS = 30
+
+# 扫描外部写入的间隔（秒），0 表示不扫描
+DEFAULT_WATCH_SECONDS = 2
+
+# 长轮询等待期间重新读取变更的间隔（秒）：本进程的写入会立即唤醒等待者，其他进程的写入最多延迟该时间
+POLL_SECONDS = 0.5
+
+# 异步等待时检查本进程写入的间隔（秒）
+ASYNC_CHECK_SECONDS = 0.05
+
+# 读取变更日志的块大小
+_READ_CHUNK = 256 * 1024
+
+
+def _config_value(name: str, default):
+    """从 config 模块读取配置项，不存在时返回默认值"""
+    try:
+        import config
+        return getattr(config, name)
+    except (ImportError, AttributeError):
+        return default
+
+
+def _directory_key(directory: str) -> str:
+    return os.path.normcase(os.path.abspath(directory))
+
+
+def change_feed_enabled() -> bool:
+    """是否记录变更事件（config.XML_CHANGE_FEED）"""
+    return bool(_config_value("XML_CHANGE_FEED", False))
+
+
+def make_event(seq: int, name: str, size: Optional[int] = None, mtime_ns: Optional[int] = None) -> dict:
+    """变更事件：size 为 None 表示删除，否则为新增或修改（size 为存储后的字节数，mtime 为毫秒）"""
+    if size is None:
+        return {"seq": seq, "op": "delete", "filename": name}
+    return {"seq": seq, "op": "save", "filename": name, "size": size, "mtime": mtime_ns // 1_000_000}
+
+
+def _change_line(record: list) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+@contextlib.contextmanager
+def _log_lock(directory: str, exclusive: bool):
+    """变更日志的进程间锁（POSIX 为 flock，共享 / 排他；Windows 为 msvcrt.locking，始终排他）"""
+    fd = os.open(os.path.join(directory, LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is None:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
+
+
+def append_changes(directory: str, saved: Iterable[Tuple[str, int, int]] = (), deleted: Iterable[str] = ()) -> None:
+    """
+    在变更日志末尾追加事件（一次 write，多个进程同时追加不会交错），并唤醒本进程中等待该目录的长轮询；
+    日志超过 XML_CHANGES_MAX_BYTES 时随后压缩。未开启变更订阅时不记录
+
+    Args:
+        saved: (文件名, 大小, 修改时间纳秒) 列表
+        deleted: 文件名列表
+    """
+    if not change_feed_enabled():
+        return
+    lines = [_change_line(["+", name, size, mtime_ns]) for name, size, mtime_ns in saved]
+    lines.extend(_change_line(["-", name]) for name in deleted)
+    if not lines:
+        return
+    with _log_lock(directory, exclusive=False):
+        fd = os.open(os.path.join(directory, CHANGES_NAME),
+                     os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            os.write(fd, "".join(lines).encode("utf-8"))
+            if _config_value("XML_WRITE_DURABILITY", "none") != "none":
+                os.fsync(fd)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+    if size > _max_log_bytes():
+        compact_changes(directory)
+    notify_changes(directory)
+
+
+def _max_log_bytes() -> int:
+    return _config_value("XML_CHANGES_MAX_BYTES", DEFAULT_CHANGES_MAX_BYTES)
+
+
+def _read_header(f) -> Tuple[int, int]:
+    """读取变更日志的起始序号，返回 (起始序号, 首行长度)；没有 {"base": N} 首行时为 (0, 0)"""
+    first = f.readline()
+    if first.startswith(b"{") and first.endswith(b"\n"):
+        try:
+            return int(json.loads(first)["base"]), len(first)
+        except (ValueError, KeyError, TypeError):
+            logger.warning("变更日志首行格式错误，按起始序号 0 处理: %r", first[:200])
+    return 0, 0
+
+
+def _parse_records(data: bytes, start: int, limit: Optional[int] = None) -> Tuple[List[Tuple[list, int]], int]:
+    """
+    解析 data 中完整的记录行（start 为 data 在日志中的偏移），最多 limit 条
+
+    Returns:
+        tuple: ([(记录, 该行结束偏移)], 已解析到的偏移)
+    """
+    records = []
+    position = 0
+    while limit is None or len(records) < limit:
+        end = data.find(b"\n", position)
+        if end < 0:
+            break
+        line = data[position:end]
+        position = end + 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            logger.warning("忽略无法解析的变更日志记录: %r", line[:200])
+            continue
+        if isinstance(record, list) and len(record) >= 2 and record[0] in ("+", "-"):
+            records.append((record, start + position))
+    return records, start + position
+
+
+def _last_line_end(f, size: int, floor: int) -> int:
+    """日志中最后一个完整行的结束偏移（末尾正在写入的半行不计入）"""
+    position = size
+    while position > floor:
+        chunk_start = max(floor, position - 4096)
+        f.seek(chunk_start)
+        chunk = f.read(position - chunk_start)
+        index = chunk.rfind(b"\n")
+        if index >= 0:
+            return chunk_start + index + 1
+        position = chunk_start
+    return floor
+
+
+def read_changes(directory: str, since: Optional[int], limit: int = DEFAULT_CHANGES_LIMIT) -> dict:
+    """
+    读取序号大于 since 的变更事件（文件存储）
+
+    Args:
+        since: 客户端上次返回的 cursor；None 表示只返回当前位置（客户端从此时开始订阅）
+        limit: 最多返回的事件数
+
+    Returns:
+        dict: {"events": [...], "cursor": 下次请求的 since, "more": 是否还有未返回的事件,
+               "reset": since 已不在日志范围内（日志被清理），客户端需要重新查询完整列表}
+    """
+    try:
+        f = open(os.path.join(directory, CHANGES_NAME), "rb")
+    except FileNotFoundError:
+        reset = bool(since)
+        return {"events": [], "cursor": 0, "more": False, "reset": reset}
+    with f:
+        base, header = _read_header(f)
+        size = os.fstat(f.fileno()).st_size
+        current = base + _last_line_end(f, size, header) - header
+        if since is None:
+            return {"events": [], "cursor": current, "more": False, "reset": False}
+        offset = since - base + header
+        if since < base or since > current:
+            return {"events": [], "cursor": current, "more": False, "reset": True}
+        if offset > header:
+            # since 必须是某一行的结束位置
+            f.seek(offset - 1)
+            if f.read(1) != b"\n":
+                return {"events": [], "cursor": current, "more": False, "reset": True}
+
+        records: List[Tuple[list, int]] = []
+        position = offset
+        f.seek(position)
+        pending = b""
+        while len(records) <= limit:
+            chunk = f.read(_READ_CHUNK)
+            if not chunk:
+                break
+            data = pending + chunk
+            parsed, parsed_to = _parse_records(data, position, limit + 1 - len(records))
+            records.extend(parsed)
+            pending = data[parsed_to - position:]
+            position = parsed_to
+
+    more = len(records) > limit
+    records = records[:limit]
+    events = []
+    for record, end in records:
+        seq = base + end - header
+        if record[0] == "+":
+            events.append(make_event(seq, record[1], record[2], record[3]))
+        else:
+            events.append(make_event(seq, record[1]))
+    cursor = base + records[-1][1] - header if records else since
+    return {"events": events, "cursor": cursor, "more": more, "reset": False}
+
+
+def _retained_start(f, header: int, end: int, retain: int, max_bytes: int) -> int:
+    """
+    压缩时保留部分的起始偏移（某一行的开头）：最近 retain 行，且不超过 max_bytes 字节
+    """
+    floor = max(header, end - max_bytes)
+    start = end
+    found = 0
+    position = end
+    while position > header:
+        chunk_start = max(header, position - _READ_CHUNK)
+        f.seek(chunk_start)
+        chunk = f.read(position - chunk_start)
+        index = len(chunk)
+        while True:
+            index = chunk.rfind(b"\n", 0, index)
+            if index < 0:
+                break
+            # 从末尾数第 k + 1 个换行之后是最近 k 行的开头
+            line_end = chunk_start + index + 1
+            found += 1
+            if line_end < floor:
+                return start
+            if found > retain:
+                return line_end
+            start = line_end
+        position = chunk_start
+    return header if floor == header else start
+
+
+def compact_changes(directory: str, retain: Optional[int] = None) -> int:
+    """
+    压缩变更日志：只保留最近 retain 个事件（默认 XML_CHANGES_RETAIN，且不超过 XML_CHANGES_MAX_BYTES 的一半），
+    保留的事件序号不变，之后的事件序号继续递增；cursor 早于保留范围的客户端下次请求时收到 reset。
+    retain 为 None 时只在日志超过 XML_CHANGES_MAX_BYTES 时压缩。可以在服务运行时执行
+
+    Returns:
+        int: 释放的字节数
+    """
+    path = os.path.join(directory, CHANGES_NAME)
+    max_bytes = _max_log_bytes()
+    with _log_lock(directory, exclusive=True):
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return 0
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if retain is None:
+                if size <= max_bytes:
+                    # 其他进程刚刚压缩过
+                    return 0
+                retain = _config_value("XML_CHANGES_RETAIN", DEFAULT_CHANGES_RETAIN)
+            base, header = _read_header(f)
+            end = _last_line_end(f, size, header)
+            start = _retained_start(f, header, end, retain, max_bytes // 2)
+            f.seek(start)
+            kept = f.read(end - start)
+        data = (json.dumps({"base": base + start - header}) + "\n").encode("utf-8") + kept
+        write_bytes_atomic(path, data)
+    logger.info("已压缩变更日志: %s，保留 %d 字节", directory, len(data))
+    return size - len(data)
+
+
+def trim_changes(directory: str) -> int:
+    """
+    清空变更日志（保留当前序号，之后的事件序号继续递增），返回释放的字节数；
+    cursor 早于当前序号的客户端下次请求时收到 reset
+    """
+    return compact_changes(directory, retain=0)
+
+
+class ChangeFeed:
+    """
+    一个保存目录在本进程中的变更订阅状态：
+
+    - 本进程写入后 notify 唤醒等待的长轮询（其他进程的写入由等待者每 POLL_SECONDS 秒重新读取发现）
+    - watch_external 为 True 时（平铺布局的文件存储），后台线程定期扫描目录，
+      把不是由本服务写入的新增、修改、删除（外部程序直接写入目录）追加到变更日志
+    """
+
+    def __init__(self, directory: str, watch_external: bool = False) -> None:
+        self.directory = directory
+        self.watch_external = watch_external
+        self.version = 0
+        # close 之后等待中的长轮询立即返回（服务退出时）
+        self.closed = False
+        self._cond = threading.Condition()
+        # 外部写入扫描的状态：已记录的文件 -> (大小, 修改时间纳秒)，以及变更日志已读取到的位置
+        self._known: Optional[Dict[str, Tuple[int, int]]] = None
+        self._offset = 0
+        self._log_id: Optional[tuple] = None
+
+    def notify(self) -> None:
+        with self._cond:
+            self.version += 1
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        self.closed = True
+        self.notify()
+
+    def wait(self, version: int, timeout: float) -> None:
+        """等待到 version 变化（本进程有新的写入）或超时"""
+        with self._cond:
+            if self.version == version and not self.closed:
+                self._cond.wait(timeout)
+
+    async def wait_async(self, version: int, timeout: float) -> None:
+        """wait 的异步版本（不占用线程，每 ASYNC_CHECK_SECONDS 秒检查一次 version）"""
+        deadline = time.monotonic() + timeout
+        while self.version == version and not self.closed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(min(remaining, ASYNC_CHECK_SECONDS))
+
+    def _tail_log(self) -> List[list]:
+        """读取变更日志中新增的记录（包括本进程与其他进程的写入）"""
+        try:
+            f = open(os.path.join(self.directory, CHANGES_NAME), "rb")
+        except FileNotFoundError:
+            return []
+        with f:
+            stat = os.fstat(f.fileno())
+            log_id = (stat.st_dev, stat.st_ino)
+            if log_id != self._log_id:
+                # 日志被清理（重写）后从头读取
+                self._log_id = log_id
+                self._offset = 0
+            if stat.st_size <= self._offset:
+                return []
+            f.seek(self._offset)
+            data = f.read()
+        records, self._offset = _parse_records(data, self._offset)
+        return [record for record, _ in records]
+
+    def scan_external(self) -> int:
+        """
+        扫描目录，把变更日志中没有记录的变化作为事件追加，返回追加的事件数
+
+        本服务先写入文件再追加日志：扫描前读取日志得到已记录的文件，扫描后再读取一次，
+        扫描期间由本服务写入 / 删除的文件以日志为准，不作为外部写入（写入者在扫描期间一直没有追加日志时
+        可能产生重复的事件，对客户端无害，不会漏掉事件或产生错误的删除事件）
+        """
+        self._apply(self._known, self._tail_log())
+        seen: Dict[str, tuple] = {}
+        try:
+            scan_xml_folder(self.directory, seen)
+        except FileNotFoundError:
+            pass
+        current = {name: (size, mtime_ns) for name, (_, size, mtime_ns) in seen.items()}
+        during_scan = self._tail_log()
+        if self._known is None:
+            self._known = self._apply(current, during_scan)
+            return 0
+        saved = {name: stat for name, stat in current.items() if self._known.get(name) != stat}
+        deleted = {name for name in self._known if name not in current}
+        for record in during_scan:
+            deleted.discard(record[1])
+            if record[0] == "-" or current.get(record[1]) == (record[2], record[3]):
+                saved.pop(record[1], None)
+        self._known = self._apply(current, during_scan)
+        if saved or deleted:
+            append_changes(self.directory, saved=[(name, size, mtime_ns) for name, (size, mtime_ns) in saved.items()],
+                           deleted=sorted(deleted))
+            logger.info("发现外部写入: %s，新增/修改 %d 个，删除 %d 个", self.directory, len(saved), len(deleted))
+        return len(saved) + len(deleted)
+
+    @staticmethod
+    def _apply(known: Optional[Dict[str, Tuple[int, int]]], records: List[list]) -> Optional[Dict[str, Tuple[int, int]]]:
+        """把变更日志记录应用到文件状态（known 为 None 时不处理）"""
+        if known is not None:
+            for record in records:
+                if record[0] == "+":
+                    known[record[1]] = (record[2], record[3])
+                else:
+                    known.pop(record[1], None)
+        return known
+
+
+# 保存目录 -> 变更订阅状态，按最近使用顺序排列，与目录索引使用同一个数量上限
+# （被淘汰的目录不再扫描外部写入，等待中的长轮询按 POLL_SECONDS 的间隔继续检查）
+_feeds: "OrderedDict[str, ChangeFeed]" = OrderedDict()
+_feeds_lock = threading.Lock()
+_watcher: Optional[threading.Thread] = None
+_watcher_stop = threading.Event()
+
+
+def _watch_loop(interval: float, stop: threading.Event) -> None:
+    while not stop.wait(interval):
+        with _feeds_lock:
+            feeds = [feed for feed in _feeds.values() if feed.watch_external]
+        for feed in feeds:
+            try:
+                feed.scan_external()
+            except Exception as e:
+                logger.warning("扫描外部写入失败: %s - %s", feed.directory, e)
+
+
+def get_change_feed(directory: str, watch_external: bool = False) -> ChangeFeed:
+    """
+    获取（必要时创建）保存目录的变更订阅状态；watch_external 为 True 时
+    按 config.XML_CHANGES_WATCH_SECONDS 的间隔在后台扫描外部写入（第一次扫描作为基准，不产生事件）
+    """
+    global _watcher
+    key = _directory_key(directory)
+    with _feeds_lock:
+        feed = _feeds.get(key)
+        if feed is not None:
+            _feeds.move_to_end(key)
+            return feed
+        feed = ChangeFeed(directory, watch_external)
+        interval = _config_value("XML_CHANGES_WATCH_SECONDS", DEFAULT_WATCH_SECONDS)
+        if watch_external and interval > 0:
+            feed.scan_external()
+            if _watcher is None:
+                _watcher = threading.Thread(target=_watch_loop, args=(interval, _watcher_stop),
+                                            name="xml-changes-watcher", daemon=True)
+                _watcher.start()
+        _feeds[key] = feed
+        while len(_feeds) > max_directories():
+            _feeds.popitem(last=False)
+    return feed
+
+
+def close_change_feeds(timeout: float = 5.0) -> None:
+    """
+    停止外部写入扫描线程，唤醒并结束所有等待中的长轮询（服务退出时调用）；
+    之后再次订阅时重新建立状态并启动扫描
+    """
+    global _watcher, _watcher_stop
+    with _feeds_lock:
+        watcher, stop = _watcher, _watcher_stop
+        _watcher, _watcher_stop = None, threading.Event()
+        feeds = list(_feeds.values())
+        _feeds.clear()
+    stop.set()
+    for feed in feeds:
+        feed.close()
+    if watcher is not None and watcher is not threading.current_thread():
+        watcher.join(timeout)
+
+
+def notify_changes(directory: str) -> None:
+    """唤醒本进程中等待该目录变更的长轮询"""
+    feed = _feeds.get(_directory_key(directory))
+    if feed is not None:
+        feed.notify()
+
+
+__all__ = [
+    "CHANGES_NAME",
+    "LOCK_NAME",
+    "DEFAULT_CHANGES_LIMIT",
+    "DEFAULT_MAX_WAIT_SECONDS",
+    "POLL_SECONDS",
+    "ChangeFeed",
+    "change_feed_enabled",
+    "make_event",
+    "append_changes",
+    "read_changes",
+    "compact_changes",
+    "trim_changes",
+    "get_change_feed",
+    "close_change_feeds",
+    "notify_changes",
+]
@@ -0,0 +1,189 @@
+import gzip
+import logging
+import os
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# 压缩存储格式 -> 文件扩展名（追加在 .xml 之后，例如 a.xml.zst）
+COMPRESSION_SUFFIXES = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+# 各格式文件开头的魔数：读取时按文件头识别格式，与扩展名无关
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# 默认的压缩级别
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_ZSTD_LEVEL = 3
+
+_fallback_warned = False
+
+# zstandard 的压缩 / 解压对象不能被多个线程同时使用，每个线程复用自己的一份
+# （Python 3.14 的 compression.zstd 直接使用模块级的 compress / decompress）
+_zstd_local = threading.local()
+
+
+def _config_value(name: str, default):
+    """从 config 模块读取配置项，不存在时返回默认值"""
+    try:
+        import config
+        return getattr(config, name)
+    except (ImportError, AttributeError):
+        return default
+
+
+_ZSTD_UNSET = object()
+_zstd = _ZSTD_UNSET
+
+
+def _zstd_module():
+    """返回可用的 zstd 实现（Python 3.14 的 compression.zstd 或第三方 zstandard），都不可用时返回 None"""
+    global _zstd
+    if _zstd is _ZSTD_UNSET:
+        try:
+            from compression import zstd  # type: ignore
+        except ImportError:
+            try:
+                import zstandard as zstd  # type: ignore
+            except ImportError:
+                zstd = None
+        _zstd = zstd
+    return _zstd
+
+
+def storage_format() -> Optional[str]:
+    """
+    新写入文件使用的存储格式：config.XML_STORAGE_COMPRESSION 为 "gzip" / "zstd" 时压缩，为空时明文 .xml
+
+    配置为 zstd 但没有可用的 zstd 实现时改用 gzip（只提示一次）
+    """
+    fmt = _config_value("XML_STORAGE_COMPRESSION", "") or None
+    if fmt is None:
+        return None
+    if fmt not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"不支持的压缩格式: {fmt}（可选 {'/'.join(COMPRESSION_SUFFIXES)}）")
+    if fmt == "zstd" and _zstd_module() is None:
+        global _fallback_warned
+        if not _fallback_warned:
+            _fallback_warned = True
+            logger.warning("未安装 zstandard（Python 3.14 以下需要 pip install zstandard），XML 文件改用 gzip 压缩存储")
+        return "gzip"
+    return fmt
+
+
+def stored_name(name: str, fmt: Optional[str]) -> str:
+    """逻辑文件名（a.xml）在磁盘上的文件名"""
+    return name + COMPRESSION_SUFFIXES[fmt] if fmt else name
+
+
+def stored_names(name: str) -> list:
+    """逻辑文件名在磁盘上所有可能的文件名（明文与各压缩格式）"""
+    return [name] + [name + suffix for suffix in COMPRESSION_SUFFIXES.values()]
+
+
+def logical_name(file_name: str) -> Optional[str]:
+    """磁盘文件名对应的逻辑文件名（a.xml / a.xml.gz / a.xml.zst -> a.xml），不是XML文件时返回 None"""
+    lower = file_name.lower()
+    for suffix in COMPRESSION_SUFFIXES.values():
+        if lower.endswith(suffix):
+            file_name, lower = file_name[:-len(suffix)], lower[:-len(suffix)]
+            break
+    return file_name if lower.endswith(".xml") else None
+
+
+def compress(data: bytes, fmt: str) -> bytes:
+    """按指定格式压缩"""
+    if fmt == "gzip":
+        # mtime=0：相同内容得到相同的压缩结果
+        return gzip.compress(data, compresslevel=_config_value("XML_GZIP_LEVEL", DEFAULT_GZIP_LEVEL), mtime=0)
+    zstd = _zstd_module()
+    if zstd is None:
+        raise IOError("zstd 压缩不可用，请安装 zstandard")
+    level = _config_value("XML_ZSTD_LEVEL", DEFAULT_ZSTD_LEVEL)
+    if zstd.__name__ != "zstandard":
+        return zstd.compress(data, level=level)
+    compressor = getattr(_zstd_local, "compressor", None)
+    if compressor is None or _zstd_local.level != level:
+        compressor = _zstd_local.compressor = zstd.ZstdCompressor(level=level)
+        _zstd_local.level = level
+    return compressor.compress(data)
+
+
+def decompress(data: bytes) -> bytes:
+    """按文件头识别格式并解压；不是压缩数据时原样返回（明文 .xml）"""
+    if data[:2] == _GZIP_MAGIC:
+        return gzip.decompress(data)
+    if data[:4] == _ZSTD_MAGIC:
+        zstd = _zstd_module()
+        if zstd is None:
+            raise IOError("文件为 zstd 压缩格式，请安装 zstandard")
+        if zstd.__name__ != "zstandard":
+            return zstd.decompress(data)
+        decompressor = getattr(_zstd_local, "decompressor", None)
+        if decompressor is None:
+            decompressor = _zstd_local.decompressor = zstd.ZstdDecompressor()
+        try:
+            return decompressor.decompress(data)
+        except zstd.ZstdError:
+            # 流式写入的 zstd 帧可能不带内容长度，改用 decompressobj 解压
+            return decompressor.decompressobj().decompress(data)
+    return data
+
+
+def decode_xml_text(data: bytes) -> str:
+    """
+    解压（如有）并解码XML内容，与 open(path, "r", encoding="utf-8") 一样把换行统一为 \\n
+    """
+    return normalize_newlines(decompress(data).decode("utf-8"))
+
+
+def normalize_newlines(text: str) -> str:
+    """与文本模式读取一样把 \\r\\n、\\r 统一为 \\n（缓存刚写入的内容时使用，保证与从磁盘读取的结果一致）"""
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def read_xml_text(file_path: str) -> str:
+    """读取XML文件内容（明文或压缩存储），换行统一为 \\n"""
+    with open(file_path, "rb") as f:
+        data = f.read()
+    return decode_xml_text(data)
+
+
+def remove_stored_variants(directory: str, name: str, keep: Optional[str] = None) -> int:
+    """
+    删除逻辑文件名在磁盘上的各个存储文件（keep 除外）
+
+    Returns:
+        int: 删除的文件数
+    """
+    removed = 0
+    for candidate in stored_names(name):
+        if candidate == keep:
+            continue
+        try:
+            os.remove(os.path.join(directory, candidate))
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+__all__ = [
+    "COMPRESSION_SUFFIXES",
+    "storage_format",
+    "stored_name",
+    "stored_names",
+    "logical_name",
+    "compress",
+    "decompress",
+    "decode_xml_text",
+    "read_xml_text",
+    "normalize_newlines",
+    "remove_stored_variants",
+]
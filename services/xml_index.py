@@ -0,0 +1,407 @@
+import bisect
+import fnmatch
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from services.xml_compression import normalize_newlines, read_xml_text
+from services.xml_layout import (
+    file_folder,
+    read_journal,
+    scan_sharded_files,
+    scan_xml_folder,
+    shard_depth,
+    write_journal,
+)
+
+logger = logging.getLogger(__name__)
+
+# 默认的目录索引重新校验间隔（秒），0 表示每次查询都重新扫描目录
+DEFAULT_REVALIDATE_SECONDS = 0.0
+
+# 默认最多缓存的XML内容总字节数，超过后其余文件查询时直接读取磁盘
+DEFAULT_MAX_CACHED_BYTES = 256 * 1024 * 1024
+
+# 默认最多保留索引的目录数（目录来自请求参数，超过后淘汰最久未使用的目录索引）
+DEFAULT_MAX_DIRECTORIES = 64
+
+# 文件名是否不区分大小写（Windows）：大小写不同的文件名是同一个文件，索引中只保留最近记录的一个
+_CASE_INSENSITIVE = os.path.normcase("A") == os.path.normcase("a")
+
+
+def _config_value(name: str, default):
+    """从 config 模块读取配置项，不存在时返回默认值"""
+    try:
+        import config
+        return getattr(config, name)
+    except (ImportError, AttributeError):
+        return default
+
+
+class _IndexEntry:
+    """索引中的单个文件：磁盘上的文件名（压缩存储时带 .gz / .zst）、大小、修改时间与（可选的）缓存内容"""
+
+    __slots__ = ("stored", "size", "mtime_ns", "content")
+
+    def __init__(self, stored: str, size: int, mtime_ns: int, content: Optional[str] = None) -> None:
+        self.stored = stored
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.content = content
+
+
+class DirectoryIndex:
+    """
+    单个目录的XML文件索引（文件名、大小、修改时间与缓存的内容）
+
+    - 查询时用 os.scandir 重新校验：只有新增或大小/修改时间变化的文件才会重新读取
+    - 压缩存储的文件（a.xml.gz / a.xml.zst）以逻辑文件名 a.xml 出现，读取时自动解压；
+      size 为磁盘上的字节数，缓存预算按解压后的字符数计算
+    - 分片布局的目录（见 xml_layout）不扫描目录树，改为增量读取名称日志，
+      其他工作进程的新增/删除同样可见；名称日志不存在时遍历目录树重建
+    - save_xml_file / delete_xml_file 直接更新索引
+    - 任何变化都会使 version 递增，调用方可据此缓存基于完整列表计算的结果
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.version = 0
+        self.revalidate_seconds = _config_value("XML_INDEX_REVALIDATE_SECONDS", DEFAULT_REVALIDATE_SECONDS)
+        self.max_cached_bytes = _config_value("XML_INDEX_MAX_CACHED_BYTES", DEFAULT_MAX_CACHED_BYTES)
+        self._entries: Dict[str, _IndexEntry] = {}
+        self._names: List[str] = []
+        # 不区分大小写时：normcase 后的文件名 -> 索引中的文件名
+        self._case_names: Dict[str, str] = {}
+        self._cached_bytes = 0
+        self._loaded = False
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+        # 分片层数（0 为平铺）与名称日志的读取位置
+        self.shard_depth = shard_depth(directory)
+        self._journal_offset = 0
+        self._journal_id: Optional[tuple] = None
+
+    def _path(self, name: str, stored: str) -> str:
+        if self.shard_depth:
+            return os.path.join(file_folder(self.directory, name), stored)
+        return os.path.join(self.directory, stored)
+
+    def _set_entry(self, name: str, entry: _IndexEntry) -> None:
+        old = self._entries.get(name)
+        if old is None:
+            bisect.insort(self._names, name)
+            if _CASE_INSENSITIVE:
+                self._case_names[os.path.normcase(name)] = name
+        elif old.content is not None:
+            self._cached_bytes -= len(old.content)
+        self._entries[name] = entry
+        if entry.content is not None:
+            self._cached_bytes += len(entry.content)
+
+    def _remove_entry(self, name: str) -> None:
+        old = self._entries.pop(name, None)
+        if old is None:
+            return
+        self._names.pop(bisect.bisect_left(self._names, name))
+        if _CASE_INSENSITIVE and self._case_names.get(os.path.normcase(name)) == name:
+            del self._case_names[os.path.normcase(name)]
+        if old.content is not None:
+            self._cached_bytes -= len(old.content)
+
+    def _remove_other_case(self, name: str) -> bool:
+        """不区分大小写时，去掉与 name 只有大小写不同的条目（名称日志与本进程的记录使用调用方给出的文件名）"""
+        if not _CASE_INSENSITIVE:
+            return False
+        existing = self._case_names.get(os.path.normcase(name))
+        if existing is None or existing == name:
+            return False
+        self._remove_entry(existing)
+        return True
+
+    def _can_cache(self, size: int) -> bool:
+        return self._cached_bytes + size <= self.max_cached_bytes
+
+    def revalidate(self, force: bool = False) -> None:
+        """用 os.scandir 校验目录，按大小和修改时间找出新增、变化和删除的文件"""
+        if self.shard_depth:
+            self._replay_journal()
+            return
+        with self._lock:
+            now = time.monotonic()
+            if (not force and self._loaded and self.revalidate_seconds > 0
+                    and now - self._checked_at < self.revalidate_seconds):
+                return
+
+            seen: Dict[str, tuple] = {}
+            scan_xml_folder(self.directory, seen)
+
+            changed = False
+            for name in [name for name in self._entries if name not in seen]:
+                self._remove_entry(name)
+                changed = True
+            for name, (stored, size, mtime_ns) in seen.items():
+                entry = self._entries.get(name)
+                if entry is None or entry.stored != stored or entry.size != size or entry.mtime_ns != mtime_ns:
+                    self._set_entry(name, _IndexEntry(stored, size, mtime_ns))
+                    changed = True
+
+            if changed:
+                self.version += 1
+            self._loaded = True
+            self._checked_at = now
+
+    def _apply(self, name: str, stored: str, size: int, mtime_ns: int) -> bool:
+        entry = self._entries.get(name)
+        if entry is not None and entry.stored == stored and entry.size == size and entry.mtime_ns == mtime_ns:
+            return False
+        self._set_entry(name, _IndexEntry(stored, size, mtime_ns))
+        return True
+
+    def _replay_journal(self) -> None:
+        """读取名称日志中上次之后追加的记录（日志被重写时从头读取）"""
+        with self._lock:
+            try:
+                records, offset, journal_id = read_journal(self.directory, self._journal_offset, self._journal_id)
+            except FileNotFoundError:
+                logger.warning("名称日志不存在，遍历分片目录重建: %s", self.directory)
+                write_journal(self.directory, scan_sharded_files(self.directory, self.shard_depth))
+                records, offset, journal_id = read_journal(self.directory)
+            changed = False
+            if journal_id != self._journal_id:
+                # 首次读取或日志被重写：以日志内容为准，去掉日志中没有的文件
+                live = {}
+                for record in records:
+                    key = os.path.normcase(record[1]) if _CASE_INSENSITIVE else record[1]
+                    if record[0] == "+":
+                        live[key] = record[1:5]
+                    else:
+                        live.pop(key, None)
+                names = {entry[0] for entry in live.values()}
+                for name in [name for name in self._entries if name not in names]:
+                    self._remove_entry(name)
+                    changed = True
+                for name, stored, size, mtime_ns in live.values():
+                    changed = self._apply(name, stored, size, mtime_ns) or changed
+            else:
+                for record in records:
+                    changed = self._remove_other_case(record[1]) or changed
+                    if record[0] == "+":
+                        changed = self._apply(record[1], *record[2:5]) or changed
+                    elif record[1] in self._entries:
+                        self._remove_entry(record[1])
+                        changed = True
+            self._journal_offset, self._journal_id = offset, journal_id
+            if changed:
+                self.version += 1
+            self._loaded = True
+
+    def _read(self, name: str, entry: _IndexEntry) -> str:
+        """返回文件内容，优先使用缓存；未缓存时读取磁盘并在预算内缓存"""
+        if entry.content is not None:
+            return entry.content
+        file_path = self._path(name, entry.stored)
+        try:
+            content = read_xml_text(file_path)
+        except Exception as e:
+            logger.error("读取XML文件失败: %s - %s", file_path, e, exc_info=True)
+            raise IOError(f"读取文件失败: {name}")
+        if self._can_cache(len(content)):
+            entry.content = content
+            self._cached_bytes += len(content)
+        return content
+
+    def current_version(self) -> int:
+        """校验目录后返回当前版本（只看文件名、大小和修改时间，不读取文件内容）"""
+        with self._lock:
+            self.revalidate()
+            return self.version
+
+    def list_files(self, revalidate: bool = True) -> tuple:
+        """
+        列出目录下的XML文件及内容（按文件名排序）
+
+        Args:
+            revalidate: 是否先校验目录（调用方刚校验过时可传 False，避免重复扫描）
+
+        Returns:
+            tuple: (version, [{"filename": ..., "xml": ...}, ...])
+        """
+        with self._lock:
+            if revalidate:
+                self.revalidate()
+            files = [
+                {"filename": name, "xml": self._read(name, self._entries[name])}
+                for name in self._names
+            ]
+            return self.version, files
+
+    def total_size(self) -> int:
+        """返回目录下XML文件的总字节数（只使用索引中的大小，不读取文件）"""
+        with self._lock:
+            self.revalidate()
+            return sum(entry.size for entry in self._entries.values())
+
+    def iter_files(self) -> Iterator[dict]:
+        """
+        逐个产出 {"filename": ..., "xml": ...}（按文件名排序）
+
+        文件名在开始迭代时取快照，内容在产出时才读取；迭代期间被删除的文件直接跳过，
+        不会一次性把整个目录的内容放进内存。
+        """
+        with self._lock:
+            self.revalidate()
+            names = list(self._names)
+        for name in names:
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is None:
+                    continue
+                content = self._read(name, entry)
+            yield {"filename": name, "xml": content}
+
+    def query(
+        self,
+        prefix: Optional[str] = None,
+        pattern: Optional[str] = None,
+        mtime_from_ns: Optional[int] = None,
+        mtime_to_ns: Optional[int] = None,
+        cursor: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        fields: str = "full",
+    ) -> tuple:
+        """
+        按条件分页查询（过滤只使用索引中的文件名、大小和修改时间，只读取结果页中需要内容的文件）
+
+        Args:
+            prefix: 文件名前缀
+            pattern: 文件名通配符（例如 "CEB311*.xml"）
+            mtime_from_ns / mtime_to_ns: 修改时间范围（纳秒，闭区间）
+            cursor: 上一页最后一个文件名，从其后开始返回
+            offset: 跳过的文件数（在 cursor 之后计算）
+            limit: 每页最多返回的文件数，None 表示不限
+            fields: "name" 只返回文件名；"meta" 返回文件名、大小、修改时间；"full" 另外返回内容
+
+        Returns:
+            tuple: (符合条件的文件总数, 当前页文件列表, 下一页游标或 None)
+        """
+        with self._lock:
+            self.revalidate()
+            names = self._names
+            start = bisect.bisect_left(names, prefix) if prefix else 0
+            matched = []
+            for name in itertools.islice(names, start, None):
+                if prefix and not name.startswith(prefix):
+                    break
+                if pattern and not fnmatch.fnmatch(name, pattern):
+                    continue
+                entry = self._entries[name]
+                if mtime_from_ns is not None and entry.mtime_ns < mtime_from_ns:
+                    continue
+                if mtime_to_ns is not None and entry.mtime_ns > mtime_to_ns:
+                    continue
+                matched.append(name)
+
+            begin = (bisect.bisect_right(matched, cursor) if cursor else 0) + offset
+            end = begin + limit if limit is not None else len(matched)
+            page = matched[begin:end]
+            next_cursor = page[-1] if page and end < len(matched) else None
+
+            items = []
+            for name in page:
+                item = {"filename": name}
+                if fields != "name":
+                    entry = self._entries[name]
+                    item["size"] = entry.size
+                    item["mtime"] = entry.mtime_ns // 1_000_000
+                    if fields == "full":
+                        item["xml"] = self._read(name, entry)
+                items.append(item)
+            return len(matched), items, next_cursor
+
+    def note_saved(self, name: str, content: str, stored: Optional[str] = None,
+                   written: Optional[os.stat_result] = None) -> None:
+        """
+        记录刚写入的文件（stored 为磁盘上的文件名，默认与 name 相同；written 为写入时的 os.fstat 结果，
+        磁盘上的文件仍是这次写入的文件时缓存 content，无需再次读取）
+        """
+        self.note_changes(saved=[(name, content, stored or name, written)])
+
+    def note_deleted(self, name: str) -> None:
+        """记录刚删除的文件"""
+        self.note_changes(deleted=[name])
+
+    def note_changes(self, saved: Iterable[tuple] = (), deleted: Iterable[str] = ()) -> None:
+        """
+        一次记录多个刚写入 / 删除的文件（批量接口只加锁、递增 version 一次）
+
+        大小与修改时间取自磁盘上当前的文件；只有它与写入时是同一个文件（inode 相同）时才缓存内容。
+        并发保存同名文件时，后写入者的文件可能已经替换了这次写入，此时缓存的内容与状态会不一致，
+        而状态与磁盘一致的条目不会再被重新校验纠正
+
+        Args:
+            saved: (文件名, 内容, 磁盘上的文件名, 写入的文件的 os.stat_result 或 None) 列表
+            deleted: 文件名列表
+        """
+        with self._lock:
+            for name, content, stored, written in saved:
+                self._remove_other_case(name)
+                file_path = self._path(name, stored)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    self._remove_entry(name)
+                    continue
+                cached = None
+                same_file = (written is not None and written.st_ino
+                             and (stat.st_ino, stat.st_dev) == (written.st_ino, written.st_dev))
+                if same_file:
+                    content = normalize_newlines(content)
+                    old = self._entries.get(name)
+                    budget = self._cached_bytes - (len(old.content) if old is not None and old.content is not None else 0)
+                    if budget + len(content) <= self.max_cached_bytes:
+                        cached = content
+                self._set_entry(name, _IndexEntry(stored, stat.st_size, stat.st_mtime_ns, cached))
+            for name in deleted:
+                self._remove_other_case(name)
+                self._remove_entry(name)
+            self.version += 1
+
+
+# 目录索引按最近使用顺序排列，超过 XML_INDEX_MAX_DIRECTORIES 时淘汰最久未使用的
+_indexes: "OrderedDict[str, DirectoryIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def max_directories() -> int:
+    """最多保留索引（以及基于索引的缓存）的目录数"""
+    return max(_config_value("XML_INDEX_MAX_DIRECTORIES", DEFAULT_MAX_DIRECTORIES), 1)
+
+
+def _index_key(directory: str) -> str:
+    return os.path.normcase(os.path.abspath(directory))
+
+
+def get_directory_index(directory: str) -> DirectoryIndex:
+    """获取（必要时创建）目录的索引"""
+    key = _index_key(directory)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = DirectoryIndex(directory)
+            while len(_indexes) > max_directories():
+                evicted_key, _ = _indexes.popitem(last=False)
+                logger.info("目录索引数量超过上限，淘汰最久未使用的目录索引: %s", evicted_key)
+        else:
+            _indexes.move_to_end(key)
+        return index
+
+
+def find_directory_index(directory: str) -> Optional[DirectoryIndex]:
+    """获取目录已有的索引，尚未建立索引时返回 None"""
+    with _indexes_lock:
+        return _indexes.get(_index_key(directory))
@@ -0,0 +1,356 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from services.xml_compression import logical_name
+from services.xml_writer import write_text_atomic
+
+logger = logging.getLogger(__name__)
+
+# 目录布局：
+# - flat：所有文件直接放在保存目录下（默认）
+# - sharded：按文件名哈希分到两级子目录（例如 3f/a2/CEB311_0001.xml），每个子目录只有少量文件；
+#            文件名列表记录在目录下的名称日志中，查询时不再扫描整个目录树
+LAYOUTS = ("flat", "sharded")
+
+# 默认的分片层数（每层两位十六进制，两层为 65536 个子目录）
+DEFAULT_SHARD_DEPTH = 2
+
+# 分片目录的标记文件（记录分片层数）与名称日志（每行一次新增 / 删除），都不以 .xml 结尾
+MARKER_NAME = ".xml-layout.json"
+JOURNAL_NAME = ".xml-names.jsonl"
+
+# 标记文件中 "names" 字段的取值：分片子目录按 os.path.normcase 后的文件名计算
+# （Windows 上不区分大小写，与平铺布局一致）；没有该字段的旧标记按原文件名计算，需用 to-sharded 重新分片
+NAMES_NORMCASE = "normcase"
+
+# 目录布局缓存：目录 -> (分片层数（0 表示平铺）, 是否按 normcase 后的文件名分片)
+_layouts: Dict[str, Tuple[int, bool]] = {}
+_layouts_lock = threading.Lock()
+_flat_warned: set = set()
+
+
+def _config_value(name: str, default):
+    """从 config 模块读取配置项，不存在时返回默认值"""
+    try:
+        import config
+        return getattr(config, name)
+    except (ImportError, AttributeError):
+        return default
+
+
+def _directory_key(directory: str) -> str:
+    return os.path.normcase(os.path.abspath(directory))
+
+
+def shard_path(name: str, depth: int, normcase: bool = True) -> str:
+    """
+    文件名对应的分片子目录（相对路径，例如 3f/a2）
+
+    默认按 os.path.normcase 后的文件名计算：Windows 上 A.xml 与 a.xml 是同一个文件，与平铺布局一致；
+    normcase 为 False 时按原文件名计算（旧标记文件的目录）
+    """
+    digest = hashlib.sha1((os.path.normcase(name) if normcase else name).encode("utf-8")).hexdigest()
+    return os.path.join(*[digest[2 * i:2 * i + 2] for i in range(depth)])
+
+
+def _read_marker(directory: str) -> Tuple[int, bool]:
+    """读取标记文件，返回 (分片层数, 是否按 normcase 后的文件名分片)，不是分片目录时层数为 0"""
+    try:
+        with open(os.path.join(directory, MARKER_NAME), "r", encoding="utf-8") as f:
+            marker = json.load(f)
+    except FileNotFoundError:
+        return 0, True
+    if not isinstance(marker, dict) or marker.get("layout") != "sharded":
+        raise ValueError(f"分片标记文件格式错误: {os.path.join(directory, MARKER_NAME)}")
+    depth = marker.get("depth")
+    if not isinstance(depth, int) or depth < 1:
+        raise ValueError(f"分片标记文件格式错误: {os.path.join(directory, MARKER_NAME)}")
+    return depth, marker.get("names") == NAMES_NORMCASE
+
+
+def _has_flat_xml_files(directory: str) -> bool:
+    try:
+        with os.scandir(directory) as it:
+            return any(logical_name(entry.name) is not None for entry in it)
+    except FileNotFoundError:
+        return False
+
+
+def write_marker(directory: str, depth: int) -> None:
+    """把目录标记为分片布局"""
+    os.makedirs(directory, exist_ok=True)
+    marker = json.dumps({"layout": "sharded", "depth": depth, "names": NAMES_NORMCASE}, ensure_ascii=False)
+    write_text_atomic(os.path.join(directory, MARKER_NAME), marker + "\n")
+
+
+def _layout(directory: str) -> Tuple[int, bool]:
+    """目录的 (分片层数, 是否按 normcase 后的文件名分片)，见 shard_depth"""
+    key = _directory_key(directory)
+    layout = _layouts.get(key)
+    if layout is not None:
+        return layout
+    with _layouts_lock:
+        layout = _layouts.get(key)
+        if layout is not None:
+            return layout
+        depth, normcase = _read_marker(directory)
+        if depth and not normcase and os.path.normcase("A") != "A":
+            logger.warning("分片目录的文件名区分大小写（旧版本创建），建议停止服务后执行 "
+                           "python migrate_xml_layout.py to-sharded 重新分片: %s", directory)
+        configured = _config_value("XML_STORAGE_LAYOUT", "flat")
+        if configured not in LAYOUTS:
+            raise ValueError(f"不支持的目录布局: {configured}（可选 {'/'.join(LAYOUTS)}）")
+        if not depth and configured == "sharded":
+            if _has_flat_xml_files(directory):
+                if key not in _flat_warned:
+                    _flat_warned.add(key)
+                    logger.warning("目录中已有平铺的XML文件，继续使用平铺布局（可用 migrate_xml_layout.py 迁移）: %s",
+                                   directory)
+            else:
+                depth = _config_value("XML_SHARD_DEPTH", DEFAULT_SHARD_DEPTH)
+                write_marker(directory, depth)
+                write_journal(directory, [])
+                logger.info("初始化分片目录（%d 层）: %s", depth, directory)
+        layout = _layouts[key] = (depth, normcase)
+        return layout
+
+
+def shard_depth(directory: str) -> int:
+    """
+    目录的分片层数，0 表示平铺
+
+    目录下有标记文件时为分片布局；config.XML_STORAGE_LAYOUT 为 "sharded" 且目录中还没有XML文件时
+    直接初始化为分片布局；已有平铺文件的目录保持平铺，需用 migrate_xml_layout.py 迁移
+    """
+    return _layout(directory)[0]
+
+
+def file_folder(directory: str, name: str) -> str:
+    """文件所在的目录：平铺布局为保存目录本身，分片布局为对应的分片子目录"""
+    depth, normcase = _layout(directory)
+    return os.path.join(directory, shard_path(name, depth, normcase)) if depth else directory
+
+
+def forget_layout(directory: str) -> None:
+    """清除目录布局缓存（迁移后调用）"""
+    with _layouts_lock:
+        _layouts.pop(_directory_key(directory), None)
+
+
+def _journal_line(record: list) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def append_journal(directory: str, saved: Iterable[Tuple[str, str, int, int]] = (),
+                   deleted: Iterable[str] = ()) -> None:
+    """
+    在名称日志末尾追加新增 / 删除记录（一次 write，多个进程同时追加不会交错）
+
+    Args:
+        saved: (文件名, 磁盘上的文件名, 大小, 修改时间纳秒) 列表
+        deleted: 文件名列表
+    """
+    lines = [_journal_line(["+", name, stored, size, mtime_ns]) for name, stored, size, mtime_ns in saved]
+    lines.extend(_journal_line(["-", name]) for name in deleted)
+    if not lines:
+        return
+    data = "".join(lines).encode("utf-8")
+    fd = os.open(os.path.join(directory, JOURNAL_NAME),
+                 os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        os.write(fd, data)
+        if _config_value("XML_WRITE_DURABILITY", "none") != "none":
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_journal(directory: str, offset: int = 0, file_id: Optional[tuple] = None) -> Tuple[List[list], int, tuple]:
+    """
+    从 offset 开始读取名称日志中完整的记录行（末尾正在写入的半行留到下次读取）；
+    日志已被重写（文件标识与 file_id 不同）时从头读取
+
+    Returns:
+        tuple: (记录列表, 下次读取的位置, 日志文件标识)
+
+    Raises:
+        FileNotFoundError: 名称日志不存在时
+    """
+    with open(os.path.join(directory, JOURNAL_NAME), "rb") as f:
+        stat = os.fstat(f.fileno())
+        current_id = (stat.st_dev, stat.st_ino)
+        if current_id != file_id:
+            offset = 0
+        if stat.st_size <= offset:
+            return [], offset, current_id
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    records = []
+    for line in data[:end].splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            logger.warning("忽略无法解析的名称日志记录: %s - %r", directory, line[:200])
+            continue
+        records.append(record)
+    return records, offset + end, current_id
+
+
+def write_journal(directory: str, entries: Iterable[Tuple[str, str, int, int]]) -> None:
+    """用当前文件列表重写名称日志（原子替换）"""
+    content = "".join(_journal_line(["+", name, stored, size, mtime_ns]) for name, stored, size, mtime_ns in entries)
+    write_text_atomic(os.path.join(directory, JOURNAL_NAME), content)
+
+
+def _shard_folders(directory: str, depth: int) -> Iterator[str]:
+    """逐个产出分片子目录"""
+    if not depth:
+        yield directory
+        return
+    try:
+        with os.scandir(directory) as it:
+            children = [entry.path for entry in it if not entry.name.startswith(".") and entry.is_dir()]
+    except FileNotFoundError:
+        return
+    for child in children:
+        yield from _shard_folders(child, depth - 1)
+
+
+def scan_xml_folder(folder: str, seen: Dict[str, Tuple[str, int, int]]) -> None:
+    """
+    用 os.scandir 扫描一个目录中的XML文件，写入 seen：文件名 -> (磁盘上的文件名, 大小, 修改时间纳秒)
+
+    同一文件同时有明文和压缩版本时（例如外部复制），使用最新的一个
+    """
+    with os.scandir(folder) as it:
+        for dir_entry in it:
+            name = logical_name(dir_entry.name)
+            if name is None:
+                continue
+            try:
+                if not dir_entry.is_file():
+                    continue
+                stat = dir_entry.stat()
+            except OSError:
+                continue
+            previous = seen.get(name)
+            if previous is None or stat.st_mtime_ns > previous[2]:
+                seen[name] = (dir_entry.name, stat.st_size, stat.st_mtime_ns)
+
+
+def scan_sharded_files(directory: str, depth: int) -> List[Tuple[str, str, int, int]]:
+    """
+    遍历分片目录树（名称日志丢失或需要重建时使用）
+
+    Returns:
+        list: [(文件名, 磁盘上的文件名, 大小, 修改时间纳秒)]，同一文件有多个存储版本时取最新的一个
+    """
+    seen: Dict[str, Tuple[str, int, int]] = {}
+    for folder in _shard_folders(directory, depth):
+        scan_xml_folder(folder, seen)
+    return sorted((name,) + entry for name, entry in seen.items())
+
+
+def rebuild_journal(directory: str) -> int:
+    """遍历分片目录树重写名称日志（同时去掉日志中累积的历史记录），返回文件数"""
+    depth = _read_marker(directory)[0]
+    if not depth:
+        raise ValueError(f"不是分片目录: {directory}")
+    entries = scan_sharded_files(directory, depth)
+    write_journal(directory, entries)
+    return len(entries)
+
+
+def _move(source: str, target_folder: str) -> bool:
+    """移动文件到目标目录，目标已存在同名文件时不移动"""
+    target = os.path.join(target_folder, os.path.basename(source))
+    if os.path.exists(target):
+        logger.warning("目标文件已存在，跳过: %s", target)
+        return False
+    os.makedirs(target_folder, exist_ok=True)
+    os.replace(source, target)
+    return True
+
+
+def migrate_to_sharded(directory: str, depth: Optional[int] = None) -> int:
+    """
+    把平铺目录迁移为分片布局（需在服务停止时执行；中断后可重复执行）
+
+    先移动文件，再重写名称日志，最后写入标记文件。旧版本创建的分片目录（按原文件名分片）
+    会把分片子目录与 normcase 后的文件名不一致的文件移到新的分片子目录（Windows 上大写文件名的文件）
+
+    Returns:
+        int: 本次移动的文件数
+    """
+    current = _read_marker(directory)[0]
+    depth = current or depth or _config_value("XML_SHARD_DEPTH", DEFAULT_SHARD_DEPTH)
+    moved = 0
+    with os.scandir(directory) as it:
+        files = [entry.path for entry in it if entry.is_file() and logical_name(entry.name) is not None]
+    if current:
+        for folder in list(_shard_folders(directory, depth)):
+            with os.scandir(folder) as it:
+                files.extend(entry.path for entry in it if entry.is_file() and logical_name(entry.name) is not None)
+    for path in files:
+        target_folder = os.path.join(directory, shard_path(logical_name(os.path.basename(path)), depth))
+        if os.path.normcase(os.path.dirname(path)) != os.path.normcase(target_folder) and _move(path, target_folder):
+            moved += 1
+    write_journal(directory, scan_sharded_files(directory, depth))
+    write_marker(directory, depth)
+    forget_layout(directory)
+    return moved
+
+
+def migrate_to_flat(directory: str) -> int:
+    """
+    把分片目录恢复为平铺布局（需在服务停止时执行；中断后可重复执行）
+
+    Returns:
+        int: 本次移动的文件数
+    """
+    depth = _read_marker(directory)[0]
+    if not depth:
+        raise ValueError(f"不是分片目录: {directory}")
+    moved = 0
+    for folder in list(_shard_folders(directory, depth)):
+        with os.scandir(folder) as it:
+            files = [entry.path for entry in it if entry.is_file() and logical_name(entry.name) is not None]
+        for path in files:
+            if _move(path, directory):
+                moved += 1
+    for folder in list(_shard_folders(directory, depth)):
+        # 只删除空的分片子目录（跳过的同名文件保留在原处）
+        while folder != directory:
+            try:
+                os.rmdir(folder)
+            except OSError:
+                break
+            folder = os.path.dirname(folder)
+    for name in (JOURNAL_NAME, MARKER_NAME):
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+    forget_layout(directory)
+    return moved
+
+
+__all__ = [
+    "LAYOUTS",
+    "shard_depth",
+    "shard_path",
+    "file_folder",
+    "append_journal",
+    "read_journal",
+    "write_journal",
+    "scan_xml_folder",
+    "scan_sharded_files",
+    "rebuild_journal",
+    "migrate_to_sharded",
+    "migrate_to_flat",
+]
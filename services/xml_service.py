@@ -1,16 +1,43 @@
 import os
 import json
 import logging
-from aes_util import mysql_adapter_decrypt, mysql_adapter_encrypt
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator, List, Optional, Union
+from aes_util import (
+    mysql_adapter_decrypt,
+    mysql_adapter_decrypt_stream,
+    mysql_adapter_encrypt,
+    mysql_adapter_encrypt_stream,
+)
+import json_util
+from log_util import log_payload
+from metrics_util import stage_timer
+from services.xml_changes import (
+    DEFAULT_CHANGES_LIMIT,
+    DEFAULT_MAX_WAIT_SECONDS,
+    POLL_SECONDS,
+    ChangeFeed,
+    change_feed_enabled,
+    get_change_feed,
+)
+from services.xml_index import max_directories
+from services.xml_storage import ensure_directory_exists, get_storage
 
 logger = logging.getLogger(__name__)
 
+# 默认的流式返回阈值（字节）：目录下XML文件总大小超过该值时 /xml-files/list 改为流式响应
+DEFAULT_LIST_STREAM_THRESHOLD = 32 * 1024 * 1024
 
-def ensure_directory_exists(directory_path: str):
-    """确保目录存在"""
-    if not os.path.exists(directory_path):
-        os.makedirs(directory_path)
-        logger.info("创建目录: %s", directory_path)
+
+def _config_value(name: str, default):
+    """从 config 模块读取配置项，不存在时返回默认值"""
+    try:
+        import config
+        return getattr(config, name)
+    except (ImportError, AttributeError):
+        return default
 
 
 def extract_directory(data: dict, default_dir: str) -> str:
@@ -40,15 +67,13 @@ def validate_request_data(data: dict) -> tuple[str, str]:
 
 
 def save_xml_file(filename: str, content: str, save_folder: str) -> str:
-    """保存XML文件"""
-    ensure_directory_exists(save_folder)
+    """保存XML文件（存储后端见 config.XML_STORAGE_BACKEND；文件存储时先写临时文件再原子重命名）"""
     safe_filename = os.path.basename(filename)
     if not safe_filename.endswith(".xml"):
         safe_filename += ".xml"
-    file_path = os.path.join(save_folder, safe_filename)
     try:
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(content)
+        with stage_timer("xml.save"):
+            file_path = get_storage(save_folder).save(safe_filename, content)
         logger.info("成功保存XML文件: %s", file_path)
         return file_path
     except OSError as e:
@@ -57,23 +82,164 @@ def save_xml_file(filename: str, content: str, save_folder: str) -> str:
 
 
 def list_xml_files(save_folder: str) -> list:
-    """列出目录下的XML文件及内容"""
+    """列出目录下的XML文件及内容（文件存储时基于目录索引，只重新读取有变化的文件）"""
     ensure_directory_exists(save_folder)
-    results = []
-    for name in sorted(os.listdir(save_folder)):
-        if not name.lower().endswith(".xml"):
-            continue
-        file_path = os.path.join(save_folder, name)
-        if not os.path.isfile(file_path):
-            continue
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            results.append({"filename": name, "xml": content})
-        except Exception as e:
-            logger.error("读取XML文件失败: %s - %s", file_path, e, exc_info=True)
-            raise IOError(f"读取文件失败: {name}")
-    return results
+    with stage_timer("xml.list"):
+        _, files = get_storage(save_folder).list_files()
+    return files
+
+
+# 列表查询支持的返回字段模式
+LIST_FIELDS = ("name", "meta", "full")
+
+# 表示使用分页/过滤查询的请求字段
+_LIST_OPTION_FIELDS = ("offset", "limit", "cursor", "prefix", "pattern", "mtimeFrom", "mtimeTo", "fields")
+
+
+def extract_list_options(data: dict) -> Optional[dict]:
+    """
+    从请求数据中提取分页/过滤选项，未使用任何选项时返回 None（保持原有的全量返回格式）
+
+    支持字段：offset、limit、cursor、prefix、pattern、mtimeFrom、mtimeTo（毫秒时间戳）、
+    fields（name / meta / full，默认 full）
+    """
+    if not isinstance(data, dict) or not any(field in data for field in _LIST_OPTION_FIELDS):
+        return None
+
+    def optional_int(field: str, minimum: int) -> Optional[int]:
+        value = data.get(field)
+        if value is None:
+            return None
+        if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+            raise ValueError(f"{field}必须是不小于{minimum}的整数")
+        return value
+
+    def optional_str(field: str) -> Optional[str]:
+        value = data.get(field)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{field}必须是字符串")
+        return value or None
+
+    if data.get("stream"):
+        raise ValueError("stream不能与分页/过滤字段同时使用")
+    fields = data.get("fields") or "full"
+    if fields not in LIST_FIELDS:
+        raise ValueError(f"fields必须是 {' / '.join(LIST_FIELDS)} 之一")
+    mtime_from = optional_int("mtimeFrom", 0)
+    mtime_to = optional_int("mtimeTo", 0)
+    return {
+        "offset": optional_int("offset", 0) or 0,
+        "limit": optional_int("limit", 1),
+        "cursor": optional_str("cursor"),
+        "prefix": optional_str("prefix"),
+        "pattern": optional_str("pattern"),
+        "mtime_from_ns": mtime_from * 1_000_000 if mtime_from is not None else None,
+        "mtime_to_ns": (mtime_to + 1) * 1_000_000 - 1 if mtime_to is not None else None,
+        "fields": fields,
+    }
+
+
+def list_xml_files_page(save_folder: str, **options) -> dict:
+    """
+    按分页/过滤选项列出目录下的XML文件（只读取结果页中需要内容的文件）
+
+    Returns:
+        dict: {"files": [...], "total": 符合条件的文件总数, "nextCursor": 下一页游标或 None}
+    """
+    ensure_directory_exists(save_folder)
+    with stage_timer("xml.list_page"):
+        total, files, next_cursor = get_storage(save_folder).query(**options)
+    return {"files": files, "total": total, "nextCursor": next_cursor}
+
+
+# 加密后的文件列表缓存：(目录, 密钥) -> (存储版本, 文件数量, 密文)
+# 按最近使用顺序排列，与目录索引使用同一个数量上限
+_encrypted_listing_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_encrypted_listing_lock = threading.Lock()
+
+
+def list_xml_files_encrypted(save_folder: str, key: str) -> tuple[int, str]:
+    """
+    列出目录下的XML文件并加密（目录内容没有变化时直接返回上次的密文）
+
+    先校验存储的版本（文件存储只扫描文件名、大小和修改时间，SQLite 只读版本号）再查缓存，
+    内容没有变化时不读取任何文档；文件存储有变化时也只重新读取新增或变化的文件。
+
+    Returns:
+        tuple: (文件数量, 密文)
+    """
+    ensure_directory_exists(save_folder)
+    storage = get_storage(save_folder)
+    cache_key = (storage.directory, key)
+    with stage_timer("xml.list"):
+        version = storage.current_version()
+    with _encrypted_listing_lock:
+        cached = _encrypted_listing_cache.get(cache_key)
+        if cached is not None and cached[0] == version:
+            _encrypted_listing_cache.move_to_end(cache_key)
+            return cached[1], cached[2]
+
+    with stage_timer("xml.list.read"):
+        version, files = storage.list_files(revalidate=False)
+    cipher_text = encrypt_response_data(files, key)
+    with _encrypted_listing_lock:
+        _encrypted_listing_cache[cache_key] = (version, len(files), cipher_text)
+        _encrypted_listing_cache.move_to_end(cache_key)
+        while len(_encrypted_listing_cache) > max_directories():
+            _encrypted_listing_cache.popitem(last=False)
+    return len(files), cipher_text
+
+
+def iter_xml_files_json(save_folder: str) -> Iterator[bytes]:
+    """
+    逐个文件产出XML文件列表的JSON文本片段
+
+    拼接后与 json.dumps(list_xml_files(save_folder), ensure_ascii=False) 完全一致（片段为 UTF-8 字节），
+    但文件内容在产出时才读取，适合配合流式加密输出很大的目录。
+    """
+    ensure_directory_exists(save_folder)
+    yield b"["
+    for i, item in enumerate(get_storage(save_folder).iter_files()):
+        yield (b", " if i else b"") + json_util.dumps(item)
+    yield b"]"
+
+
+def should_stream_listing(save_folder: str, request_data: dict) -> bool:
+    """
+    判断文件列表是否使用流式响应：请求中 stream 为 true，或目录下XML文件总大小超过 XML_LIST_STREAM_THRESHOLD
+    """
+    stream = request_data.get("stream") if isinstance(request_data, dict) else None
+    if stream is not None and not isinstance(stream, bool):
+        raise ValueError("stream必须是布尔值")
+    if stream is not None:
+        return stream
+    threshold = _config_value("XML_LIST_STREAM_THRESHOLD", DEFAULT_LIST_STREAM_THRESHOLD)
+    if not threshold or threshold <= 0:
+        return False
+    ensure_directory_exists(save_folder)
+    return get_storage(save_folder).total_size() > threshold
+
+
+def iter_encrypted_listing_response(save_folder: str, key: str, msg: str = "查询成功") -> Iterator[str]:
+    """
+    流式生成 /xml-files/list 的完整响应体
+
+    与 jsonify({"code": 200, "msg": msg, "data": 密文}) 的 JSON 内容一致，
+    文件逐个读取、按分组加密并以十六进制直接写出，内存占用与目录大小无关。
+
+    调用时就完成目录校验并生成第一段密文，这一步出错（例如目录不可读）时直接抛出异常，
+    调用方还没有发送响应头，可以返回正常的错误响应；其余内容在迭代时逐块生成。
+    """
+    ensure_directory_exists(save_folder)
+    encrypted = mysql_adapter_encrypt_stream(key, iter_xml_files_json(save_folder), encoding="UTF-8")
+    first = next(encrypted)
+    return _iter_listing_response(first, encrypted, msg)
+
+
+def _iter_listing_response(first: str, rest: Iterator[str], msg: str) -> Iterator[str]:
+    yield '{"code":200,"data":"' + first
+    yield from rest
+    yield '","msg":' + json.dumps(msg, ensure_ascii=False) + "}\n"
 
 
 def delete_xml_file(filename: str, save_folder: str):
@@ -83,30 +249,300 @@ def delete_xml_file(filename: str, save_folder: str):
     if not safe_name.lower().endswith(".xml"):
         safe_name += ".xml"
     file_path = os.path.join(save_folder, safe_name)
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"文件不存在: {safe_name}")
     try:
-        os.remove(file_path)
+        with stage_timer("xml.delete"):
+            get_storage(save_folder).delete(safe_name)
         logger.info("删除XML文件成功: %s", file_path)
+    except FileNotFoundError:
+        raise
     except Exception as e:
         logger.error("删除XML文件失败: %s - %s", file_path, e, exc_info=True)
         raise IOError(f"删除文件失败: {safe_name}")
 
 
+def make_etag(size: int, mtime_ns: int) -> str:
+    """由存储后的大小与修改时间（纳秒）生成 ETag（带引号，与 HTTP ETag 格式一致）"""
+    return f'"{mtime_ns:x}-{size:x}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """if_none_match（可为逗号分隔的多个 ETag 或 *，弱校验前缀 W/ 忽略）是否与 etag 相同"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag == etag:
+            return True
+    return False
+
+
+def extract_get_params(data: dict, if_none_match_header: Optional[str] = None) -> tuple[str, Optional[str]]:
+    """
+    校验并提取 /xml-files/get 的 filename 与 ifNoneMatch（也接受 if-none-match 字段，
+    请求中没有时使用 HTTP 请求头 If-None-Match）
+    """
+    if not isinstance(data, dict):
+        raise ValueError("请求数据必须是JSON对象")
+    filename = data.get("filename")
+    if not filename or not isinstance(filename, str):
+        raise ValueError("filename不能为空且必须是字符串")
+    if_none_match = data.get("ifNoneMatch", data.get("if-none-match"))
+    if if_none_match is not None and not isinstance(if_none_match, str):
+        raise ValueError("ifNoneMatch必须是字符串")
+    return filename, if_none_match or if_none_match_header or None
+
+
+def get_xml_file(filename: str, save_folder: str, if_none_match: Optional[str] = None) -> tuple[str, Optional[dict]]:
+    """
+    获取单个XML文件
+
+    if_none_match 与当前 ETag 相同时只查询大小和修改时间（文件存储为一次 stat），不读取内容
+
+    Returns:
+        tuple: (ETag, {"filename", "xml", "size", "mtime", "etag"})；未修改时文档为 None
+
+    Raises:
+        FileNotFoundError: 文件不存在时
+    """
+    safe_name = _xml_delete_name(filename)
+    storage = get_storage(save_folder)
+    with stage_timer("xml.get"):
+        if if_none_match:
+            stat = storage.stat(safe_name)
+            if stat is None:
+                raise FileNotFoundError(f"文件不存在: {safe_name}")
+            etag = make_etag(*stat)
+            if etag_matches(if_none_match, etag):
+                return etag, None
+        content, size, mtime_ns = storage.read(safe_name)
+    etag = make_etag(size, mtime_ns)
+    return etag, {"filename": safe_name, "xml": content, "size": size, "mtime": mtime_ns // 1_000_000, "etag": etag}
+
+
+def extract_changes_params(data: dict) -> tuple[Optional[int], int, float]:
+    """
+    校验并提取 /xml-files/changes 的 cursor（上次返回的 cursor，不传表示从当前位置开始订阅）、
+    limit（最多返回的事件数，不超过 config.XML_CHANGES_MAX_LIMIT）与
+    wait（没有新事件时最多等待的秒数，0 表示立即返回，不超过 config.XML_CHANGES_MAX_WAIT）
+    """
+    if not isinstance(data, dict):
+        raise ValueError("请求数据必须是JSON对象")
+    cursor = data.get("cursor")
+    if cursor is not None and (isinstance(cursor, bool) or not isinstance(cursor, int) or cursor < 0):
+        raise ValueError("cursor必须是不小于0的整数")
+    max_limit = _config_value("XML_CHANGES_MAX_LIMIT", DEFAULT_CHANGES_LIMIT)
+    limit = data.get("limit", max_limit)
+    if isinstance(limit, bool) or not isinstance(limit, int) or not 1 <= limit <= max_limit:
+        raise ValueError(f"limit必须是1到{max_limit}之间的整数")
+    max_wait = _config_value("XML_CHANGES_MAX_WAIT", DEFAULT_MAX_WAIT_SECONDS)
+    wait = data.get("wait", 0)
+    if isinstance(wait, bool) or not isinstance(wait, (int, float)) or wait < 0:
+        raise ValueError("wait必须是不小于0的数字")
+    return cursor, limit, min(wait, max_wait)
+
+
+def open_change_feed(save_folder: str) -> ChangeFeed:
+    """获取保存目录的变更订阅状态（平铺布局的文件存储同时开始扫描外部写入）"""
+    return get_change_feed(save_folder, get_storage(save_folder).watches_external_writes)
+
+
+def read_xml_changes(save_folder: str, cursor: Optional[int], limit: int) -> dict:
+    """读取 cursor 之后的变更事件（不等待），返回 {"events", "cursor", "more", "reset"}"""
+    with stage_timer("xml.changes"):
+        return get_storage(save_folder).changes(cursor, limit)
+
+
+def changes_ready(result: dict, cursor: Optional[int]) -> bool:
+    """长轮询是否可以返回：有新事件、需要客户端重新同步，或客户端刚开始订阅（只需要当前 cursor）"""
+    return bool(result["events"]) or result["reset"] or cursor is None
+
+
+def get_xml_changes(save_folder: str, cursor: Optional[int], limit: int, wait: float = 0) -> dict:
+    """
+    长轮询读取变更事件：没有新事件时最多等待 wait 秒（阻塞当前线程）；
+    本进程的写入立即唤醒，其他进程的写入每 POLL_SECONDS 秒检查一次
+    """
+    feed = open_change_feed(save_folder)
+    deadline = time.monotonic() + wait
+    while True:
+        version = feed.version
+        result = read_xml_changes(save_folder, cursor, limit)
+        remaining = deadline - time.monotonic()
+        if changes_ready(result, cursor) or remaining <= 0 or feed.closed:
+            return result
+        feed.wait(version, min(remaining, POLL_SECONDS))
+
+
+def extract_batch_xml_items(data, default_dir: str, max_items: int = 0,
+                            require_xml: bool = True) -> List[Union[tuple, ValueError]]:
+    """
+    校验批量新增 / 删除请求：JSON数组，或 {"items": [...], "directory": ...}（directory 为各项的默认目录）
+    新增时每项为 {"filename", "xml", 可选 "directory"}；删除时每项为 {"filename", 可选 "directory"} 或文件名字符串
+
+    整体格式错误时抛出 ValueError；单项格式错误不影响其他项，对应位置返回 ValueError
+
+    Returns:
+        list: 与请求数组一一对应，合法项为 (filename, xml 或 None, directory)，非法项为 ValueError
+    """
+    if isinstance(data, dict) and "items" in data:
+        default_dir = extract_directory(data, default_dir)
+        data = data["items"]
+    if not isinstance(data, list):
+        raise ValueError("请求数据必须是JSON数组")
+    if not data:
+        raise ValueError("批量请求不能为空")
+    if max_items and len(data) > max_items:
+        raise ValueError(f"批量请求最多 {max_items} 条，实际 {len(data)} 条")
+
+    items: List[Union[tuple, ValueError]] = []
+    for item in data:
+        try:
+            if require_xml:
+                filename, xml_content = validate_request_data(item)
+            else:
+                if isinstance(item, str):
+                    item = {"filename": item}
+                if not isinstance(item, dict):
+                    raise ValueError("每项必须是JSON对象或文件名字符串")
+                filename, xml_content = item.get("filename"), None
+                if not filename or not isinstance(filename, str):
+                    raise ValueError("filename不能为空且必须是字符串")
+            items.append((filename, xml_content, extract_directory(item, default_dir)))
+        except ValueError as e:
+            items.append(e)
+    return items
+
+
+def _run_batch(items: list, safe_name, deleting: bool) -> tuple:
+    """
+    按目录分组，交给各目录的存储后端批量保存 / 删除（文件存储在线程池中并行读写，SQLite 为一个事务）
+
+    同一批次中同一目录下的重复文件名只执行第一项，其余项返回 400
+
+    Returns:
+        tuple: (与 items 一一对应的结果列表, 成功项数)
+    """
+    results: List[Optional[dict]] = [None] * len(items)
+    by_directory: dict = {}
+    seen = set()
+    for i, item in enumerate(items):
+        if isinstance(item, ValueError):
+            results[i] = {"code": 400, "msg": str(item)}
+            continue
+        filename, xml_content, directory = item
+        name = safe_name(filename)
+        key = (os.path.normcase(os.path.abspath(directory)), name)
+        if key in seen:
+            results[i] = {"filename": name, "code": 400, "msg": f"同一批次中文件名重复: {name}"}
+            continue
+        seen.add(key)
+        by_directory.setdefault(directory, []).append((i, name, xml_content))
+
+    succeeded = 0
+    for directory, tasks in by_directory.items():
+        storage = get_storage(directory)
+        if deleting:
+            errors = storage.delete_many([name for _, name, _ in tasks])
+        else:
+            errors = storage.save_many([(name, xml_content) for _, name, xml_content in tasks])
+        for (i, name, _), error in zip(tasks, errors):
+            if error is None:
+                results[i] = {"filename": name, "code": 200}
+                succeeded += 1
+            elif isinstance(error, FileNotFoundError):
+                results[i] = {"filename": name, "code": 404, "msg": f"文件不存在: {name}"}
+            else:
+                logger.error("批量处理XML文件失败: %s - %s", os.path.join(directory, name), error)
+                results[i] = {"filename": name, "code": 500, "msg": f"文件读写失败: {name}"}
+    return results, succeeded
+
+
+def _xml_save_name(filename: str) -> str:
+    safe_filename = os.path.basename(filename)
+    return safe_filename if safe_filename.endswith(".xml") else safe_filename + ".xml"
+
+
+def _xml_delete_name(filename: str) -> str:
+    safe_name = os.path.basename(filename)
+    return safe_name if safe_name.lower().endswith(".xml") else safe_name + ".xml"
+
+
+def save_xml_files(items: list) -> List[dict]:
+    """
+    批量保存XML文件：按目录交给存储后端批量写入（文件存储在线程池中并行原子写入，写完后每个目录的索引只更新一次；
+    SQLite 存储为一个事务）
+
+    Args:
+        items: extract_batch_xml_items 的返回值
+
+    Returns:
+        list: 与 items 一一对应，成功为 {"filename", "code": 200}，失败为 {"filename", "code": 400/500, "msg"}
+    """
+    with stage_timer("xml.save_batch"):
+        results, succeeded = _run_batch(items, _xml_save_name, deleting=False)
+    logger.info("批量保存XML文件完成，总数=%d，成功=%d", len(items), succeeded)
+    return results
+
+
+def delete_xml_files(items: list) -> List[dict]:
+    """
+    批量删除XML文件：按目录交给存储后端批量删除（文件存储在线程池中并行删除，SQLite 存储为一个事务）
+
+    Args:
+        items: extract_batch_xml_items(require_xml=False) 的返回值
+
+    Returns:
+        list: 与 items 一一对应，成功为 {"filename", "code": 200}，失败为 {"filename", "code": 400/404/500, "msg"}
+    """
+    with stage_timer("xml.delete_batch"):
+        results, succeeded = _run_batch(items, _xml_delete_name, deleting=True)
+    logger.info("批量删除XML文件完成，总数=%d，成功=%d", len(items), succeeded)
+    return results
+
+
 def decrypt_request_body(raw_body: bytes, key: str, encoding: str = "UTF-8") -> dict:
     """将密文请求体解密并解析为JSON"""
     if not raw_body:
         raise ValueError("请求体不能为空")
     cipher_text = raw_body.decode(encoding).strip()
-    # 记录解密前的密文（只记录前200个字符，避免日志过长）
-    logger.info("收到密文（解密前），长度=%d，内容预览: %s", len(cipher_text), cipher_text[:200])
-    plain_text = mysql_adapter_decrypt(key, cipher_text, encoding=encoding)
+    logger.info("收到密文（解密前），长度=%d", len(cipher_text))
+    with stage_timer("decrypt_request_body.aes"):
+        plain_text = mysql_adapter_decrypt(key, cipher_text, encoding=encoding)
     if plain_text is None:
         raise ValueError("解密结果为空")
-    # 记录解密后的明文
-    logger.info("解密成功（解密后），长度=%d，内容: %s", len(plain_text), plain_text)
+    # 明文可能包含完整 XML 和签名密码，只按采样率记录截断并脱敏后的内容
+    log_payload(logger, "解密成功（解密后）", plain_text)
+    try:
+        with stage_timer("decrypt_request_body.json"):
+            return json_util.loads(plain_text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"解密后内容不是有效的JSON: {e}")
+
+
+def decrypt_request_stream(stream, content_length: Optional[int], key: str, encoding: str = "UTF-8") -> dict:
+    """
+    将密文请求体流式解密并解析为JSON（大请求体不整体读入内存）
+    未知请求体长度（例如分块传输）时退回到整体读取后解密
+    """
+    if content_length is None:
+        return decrypt_request_body(stream.read(), key, encoding=encoding)
+    if not content_length:
+        raise ValueError("请求体不能为空")
+    logger.info("收到密文（流式解密），长度=%d", content_length)
+    with stage_timer("decrypt_request_stream.aes"):
+        plain_bytes = mysql_adapter_decrypt_stream(key, stream, content_length, encoding=encoding)
+    try:
+        plain_text = plain_bytes.decode(encoding)
+    except UnicodeDecodeError as e:
+        raise ValueError(f"解密失败: {e}")
+    # 明文字节已转换为字符串，尽早释放缓冲区
+    del plain_bytes
+    log_payload(logger, "解密成功（流式解密）", plain_text)
     try:
-        return json.loads(plain_text)
+        with stage_timer("decrypt_request_stream.json"):
+            return json_util.loads(plain_text)
     except json.JSONDecodeError as e:
         raise ValueError(f"解密后内容不是有效的JSON: {e}")
 
@@ -114,12 +550,12 @@ def decrypt_request_body(raw_body: bytes, key: str, encoding: str = "UTF-8") ->
 def encrypt_response_data(data_obj, key: str) -> str:
     """若data是对象/数组，则加密为密文返回；否则原样"""
     if isinstance(data_obj, (dict, list)):
-        plaintext = json.dumps(data_obj, ensure_ascii=False)
-        # 记录加密前的明文
-        logger.info("准备加密响应数据（加密前），长度=%d，内容: %s", len(plaintext), plaintext[:500])
-        cipher_text = mysql_adapter_encrypt(key, plaintext, encoding="UTF-8")
-        # 记录加密后的密文（只记录前200个字符，避免日志过长）
-        logger.info("加密成功（加密后），长度=%d，内容预览: %s", len(cipher_text), cipher_text[:200])
+        with stage_timer("encrypt_response_data.json"):
+            plaintext = json_util.dumps(data_obj)
+        log_payload(logger, "准备加密响应数据（加密前）", plaintext)
+        with stage_timer("encrypt_response_data.aes"):
+            cipher_text = mysql_adapter_encrypt(key, plaintext, encoding="UTF-8")
+        logger.info("加密成功（加密后），长度=%d", len(cipher_text))
         return cipher_text
     return data_obj
 
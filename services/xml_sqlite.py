@@ -0,0 +1,347 @@
+import fnmatch
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from services.xml_changes import change_feed_enabled, make_event, notify_changes
+from services.xml_compression import compress, decode_xml_text, storage_format
+from services.xml_storage import XmlStorage, ensure_directory_exists
+
+logger = logging.getLogger(__name__)
+
+# 数据库文件名（放在保存目录下，不以 .xml 结尾；WAL 模式另有 -wal / -shm 文件）
+DATABASE_NAME = ".xml-store.sqlite3"
+
+# 默认的锁等待时间（毫秒）：多个线程 / 进程同时写入时等待对方提交
+DEFAULT_BUSY_TIMEOUT_MS = 5000
+
+# iter_files 每次从数据库读取的文档数
+ITER_CHUNK_SIZE = 100
+
+# 默认保留的变更事件数（更早的事件被清理，cursor 早于保留范围的客户端收到 reset）
+DEFAULT_CHANGES_RETAIN = 100000
+
+# 每写入多少次检查一次变更事件的保留数量
+_TRIM_EVERY = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    name TEXT NOT NULL UNIQUE,
+    content BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_mtime ON documents (mtime_ns);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER
+);
+"""
+
+_UPSERT = (
+    "INSERT INTO documents (name, content, size, mtime_ns) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (name) DO UPDATE SET content = excluded.content, size = excluded.size, mtime_ns = excluded.mtime_ns"
+)
+
+_BUMP_VERSION = "UPDATE meta SET value = value + 1 WHERE key = 'version'"
+
+# 变更事件：size 为 NULL 表示删除
+_LOG_CHANGE = "INSERT INTO changes (name, size, mtime_ns) VALUES (?, ?, ?)"
+
+
+def _config_value(name: str, default):
+    """从 config 模块读取配置项，不存在时返回默认值"""
+    try:
+        import config
+        return getattr(config, name)
+    except (ImportError, AttributeError):
+        return default
+
+
+def _prefix_upper_bound(prefix: str) -> Optional[str]:
+    """前缀范围查询的上界（name >= prefix AND name < 上界），前缀末尾为最大字符时返回 None"""
+    while prefix:
+        last = ord(prefix[-1])
+        if last < 0x10FFFF:
+            return prefix[:-1] + chr(last + 1)
+        prefix = prefix[:-1]
+    return None
+
+
+class SqliteStorage(XmlStorage):
+    """
+    保存目录下的 SQLite 数据库（WAL 模式）：文件名唯一索引、修改时间索引，批量写入为一个事务
+
+    - 每个线程使用自己的连接，读取互不阻塞，写入由 SQLite 串行化（busy_timeout 内等待）
+    - 内容按 config.XML_STORAGE_COMPRESSION 压缩后存储，size 为存储后的字节数
+    - 每次写入在同一事务中递增 meta.version，多个进程写入同一数据库时加密列表缓存同样能失效
+    - 开启变更订阅（config.XML_CHANGE_FEED）时在同一事务中写入 changes 表，序号为自增主键，
+      保留最近 XML_CHANGES_RETAIN 个事件
+    - 持久化：XML_WRITE_DURABILITY 为 none 时 synchronous=NORMAL（进程崩溃不丢数据，断电可能丢失最近的提交），
+      其他模式为 FULL（每次提交落盘）
+    """
+
+    def __init__(self, directory: str) -> None:
+        super().__init__(directory)
+        self.path = os.path.join(directory, DATABASE_NAME)
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        ensure_directory_exists(self.directory)
+        # isolation_level=None：不自动开启事务，写入显式 BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.path, isolation_level=None,
+                               timeout=_config_value("XML_SQLITE_BUSY_TIMEOUT_MS", DEFAULT_BUSY_TIMEOUT_MS) / 1000.0)
+        durability = _config_value("XML_WRITE_DURABILITY", "none")
+        conn.execute("PRAGMA synchronous = " + ("NORMAL" if durability == "none" else "FULL"))
+        # 检查点之后把 WAL 文件截断到该大小，批量写入后不长期占用双倍磁盘
+        conn.execute("PRAGMA journal_size_limit = %d" % (64 * 1024 * 1024))
+        # 与 DirectoryIndex.query 相同的通配符语义（fnmatch，Windows 上不区分大小写）
+        conn.create_function("fnmatch", 2, fnmatch.fnmatch, deterministic=True)
+        with self._init_lock:
+            if not self._initialized:
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.executescript(_SCHEMA)
+                self._initialized = True
+                logger.info("打开 SQLite 存储: %s", self.path)
+        self._local.conn = conn
+        return conn
+
+    def _write(self, statements) -> list:
+        """在一个写事务中执行 statements(conn)，返回其结果；失败时回滚并抛出 OSError"""
+        feed = change_feed_enabled()
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(conn)
+                conn.execute(_BUMP_VERSION)
+                if feed and self._writes % _TRIM_EVERY == 0:
+                    conn.execute("DELETE FROM changes WHERE seq <= (SELECT max(seq) FROM changes) - ?",
+                                 (_config_value("XML_CHANGES_RETAIN", DEFAULT_CHANGES_RETAIN),))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.error("SQLite 写入失败: %s - %s", self.path, e)
+            raise IOError(f"数据库写入失败: {e}")
+        self._writes += 1
+        if feed:
+            notify_changes(self.directory)
+        return result
+
+    def _read(self, statements):
+        """在一个读事务中执行 statements(conn)（多条查询看到同一份快照）"""
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                return statements(conn)
+            finally:
+                conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.error("SQLite 查询失败: %s - %s", self.path, e)
+            raise IOError(f"数据库查询失败: {e}")
+
+    @staticmethod
+    def _row(name: str, content: str, mtime_ns: int) -> tuple:
+        fmt = storage_format()
+        data = content.encode("utf-8")
+        if fmt:
+            data = compress(data, fmt)
+        return name, data, len(data), mtime_ns
+
+    @staticmethod
+    def _upsert(conn: sqlite3.Connection, rows: Sequence[tuple]) -> None:
+        conn.executemany(_UPSERT, rows)
+        if change_feed_enabled():
+            conn.executemany(_LOG_CHANGE, [(name, size, mtime_ns) for name, _, size, mtime_ns in rows])
+
+    @staticmethod
+    def _delete(conn: sqlite3.Connection, names: Sequence[str]) -> List[int]:
+        counts = [conn.execute("DELETE FROM documents WHERE name = ?", (name,)).rowcount for name in names]
+        if change_feed_enabled():
+            conn.executemany(_LOG_CHANGE, [(name, None, None) for name, count in zip(names, counts) if count])
+        return counts
+
+    def save(self, name: str, content: str) -> str:
+        row = self._row(name, content, time.time_ns())
+        self._write(lambda conn: self._upsert(conn, [row]))
+        return f"{self.path}#{name}"
+
+    def delete(self, name: str) -> None:
+        counts = self._write(lambda conn: self._delete(conn, [name]))
+        if not counts[0]:
+            raise FileNotFoundError(f"文件不存在: {name}")
+
+    def save_many(self, entries: Sequence[Tuple[str, str]]) -> List[Optional[OSError]]:
+        """一个事务写入整批文档（整批成功或整批失败）"""
+        mtime_ns = time.time_ns()
+        rows = [self._row(name, content, mtime_ns) for name, content in entries]
+        try:
+            self._write(lambda conn: self._upsert(conn, rows))
+        except OSError as e:
+            return [e] * len(entries)
+        return [None] * len(entries)
+
+    def delete_many(self, names: Sequence[str]) -> List[Optional[OSError]]:
+        """一个事务删除整批文档，不存在的文档对应 FileNotFoundError"""
+        try:
+            counts = self._write(lambda conn: self._delete(conn, names))
+        except OSError as e:
+            return [e] * len(names)
+        return [None if count else FileNotFoundError(f"文件不存在: {name}") for name, count in zip(names, counts)]
+
+    def stat(self, name: str) -> Optional[Tuple[int, int]]:
+        row = self._read(lambda conn: conn.execute(
+            "SELECT size, mtime_ns FROM documents WHERE name = ?", (name,)).fetchone())
+        return (row[0], row[1]) if row else None
+
+    def read(self, name: str) -> Tuple[str, int, int]:
+        row = self._read(lambda conn: conn.execute(
+            "SELECT content, size, mtime_ns FROM documents WHERE name = ?", (name,)).fetchone())
+        if row is None:
+            raise FileNotFoundError(f"文件不存在: {name}")
+        return decode_xml_text(row[0]), row[1], row[2]
+
+    @staticmethod
+    def _version(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def current_version(self) -> int:
+        return self._read(self._version)
+
+    def list_files(self, revalidate: bool = True) -> tuple:
+        def read(conn: sqlite3.Connection) -> tuple:
+            rows = conn.execute("SELECT name, content FROM documents ORDER BY name").fetchall()
+            return self._version(conn), [{"filename": name, "xml": decode_xml_text(data)} for name, data in rows]
+
+        return self._read(read)
+
+    def query(
+        self,
+        prefix: Optional[str] = None,
+        pattern: Optional[str] = None,
+        mtime_from_ns: Optional[int] = None,
+        mtime_to_ns: Optional[int] = None,
+        cursor: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        fields: str = "full",
+    ) -> tuple:
+        """参数与返回值同 DirectoryIndex.query：文件名范围与修改时间走索引，只读取结果页中需要内容的文档"""
+        conditions, params = [], []
+        if prefix:
+            conditions.append("name >= ?")
+            params.append(prefix)
+            upper = _prefix_upper_bound(prefix)
+            if upper is not None:
+                conditions.append("name < ?")
+                params.append(upper)
+        if pattern:
+            conditions.append("fnmatch(name, ?)")
+            params.append(pattern)
+        # 有文件名前缀时按文件名索引查找（+mtime_ns 使修改时间条件不走索引）：
+        # 没有统计信息时 SQLite 会优先使用修改时间索引，而修改时间范围通常覆盖大部分文档
+        mtime = "+mtime_ns" if prefix else "mtime_ns"
+        if mtime_from_ns is not None:
+            conditions.append(f"{mtime} >= ?")
+            params.append(mtime_from_ns)
+        if mtime_to_ns is not None:
+            conditions.append(f"{mtime} <= ?")
+            params.append(mtime_to_ns)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+
+        page_conditions, page_params = list(conditions), list(params)
+        if cursor:
+            page_conditions.append("name > ?")
+            page_params.append(cursor)
+        page_where = " WHERE " + " AND ".join(page_conditions) if page_conditions else ""
+        columns = "name, size, mtime_ns" + (", content" if fields == "full" else "")
+        # 多取一条判断是否还有下一页
+        page_sql = f"SELECT {columns} FROM documents{page_where} ORDER BY name LIMIT ? OFFSET ?"
+        page_params += [limit + 1 if limit is not None else -1, offset]
+
+        def read(conn: sqlite3.Connection) -> tuple:
+            total = conn.execute(f"SELECT count(*) FROM documents{where}", params).fetchone()[0]
+            return total, conn.execute(page_sql, page_params).fetchall()
+
+        total, rows = self._read(read)
+        has_more = limit is not None and len(rows) > limit
+        rows = rows[:limit] if limit is not None else rows
+
+        items = []
+        for row in rows:
+            item = {"filename": row[0]}
+            if fields != "name":
+                item["size"] = row[1]
+                item["mtime"] = row[2] // 1_000_000
+                if fields == "full":
+                    item["xml"] = decode_xml_text(row[3])
+            items.append(item)
+        next_cursor = items[-1]["filename"] if items and has_more else None
+        return total, items, next_cursor
+
+    def iter_files(self) -> Iterator[dict]:
+        """按文件名分段读取（每段 ITER_CHUNK_SIZE 个），不长时间占用读事务"""
+        last = None
+        while True:
+            if last is None:
+                sql, params = "SELECT name, content FROM documents ORDER BY name LIMIT ?", (ITER_CHUNK_SIZE,)
+            else:
+                sql, params = "SELECT name, content FROM documents WHERE name > ? ORDER BY name LIMIT ?", \
+                    (last, ITER_CHUNK_SIZE)
+            rows = self._read(lambda conn: conn.execute(sql, params).fetchall())
+            for name, data in rows:
+                yield {"filename": name, "xml": decode_xml_text(data)}
+            if len(rows) < ITER_CHUNK_SIZE:
+                return
+            last = rows[-1][0]
+
+    def total_size(self) -> int:
+        return self._read(lambda conn: conn.execute("SELECT coalesce(sum(size), 0) FROM documents").fetchone()[0])
+
+    def changes(self, since: Optional[int], limit: int) -> dict:
+        """按自增序号读取变更事件；since 早于保留范围（事件已被清理）或大于当前序号时返回 reset"""
+        def read(conn: sqlite3.Connection) -> tuple:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+            current = row[0] if row else 0
+            if since is None:
+                return current, None, []
+            oldest = conn.execute("SELECT min(seq) FROM changes").fetchone()[0]
+            rows = conn.execute("SELECT seq, name, size, mtime_ns FROM changes WHERE seq > ? ORDER BY seq LIMIT ?",
+                                (since, limit + 1)).fetchall()
+            return current, oldest, rows
+
+        current, oldest, rows = self._read(read)
+        if since is None:
+            return {"events": [], "cursor": current, "more": False, "reset": False}
+        first = oldest if oldest is not None else current + 1
+        if since > current or since < first - 1:
+            return {"events": [], "cursor": current, "more": False, "reset": True}
+        events = [make_event(*row) for row in rows[:limit]]
+        return {
+            "events": events,
+            "cursor": events[-1]["seq"] if events else since,
+            "more": len(rows) > limit,
+            "reset": False,
+        }
+
+
+__all__ = ["DATABASE_NAME", "SqliteStorage"]
@@ -0,0 +1,372 @@
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from services.xml_compression import (
+    compress,
+    decode_xml_text,
+    remove_stored_variants,
+    storage_format,
+    stored_name,
+    stored_names,
+)
+from services.xml_changes import append_changes, change_feed_enabled, read_changes
+from services.xml_index import find_directory_index, get_directory_index, max_directories
+from services.xml_layout import append_journal, file_folder, shard_depth
+from services.xml_writer import write_bytes_atomic, write_text_atomic
+
+logger = logging.getLogger(__name__)
+
+# 存储后端：
+# - filesystem：每个文档一个文件（默认，支持压缩存储与分片布局）
+# - sqlite：保存目录下的一个 SQLite 数据库（WAL 模式），按文件名、修改时间建索引，批量写入为一个事务
+BACKENDS = ("filesystem", "sqlite")
+
+# 默认的存储后端
+DEFAULT_BACKEND = "filesystem"
+
+# 批量新增 / 删除时并行读写文件的默认线程数
+DEFAULT_BATCH_WORKERS = 8
+
+
+def _config_value(name: str, default):
+    """从 config 模块读取配置项，不存在时返回默认值"""
+    try:
+        import config
+        return getattr(config, name)
+    except (ImportError, AttributeError):
+        return default
+
+
+def ensure_directory_exists(directory_path: str):
+    """确保目录存在"""
+    if not os.path.exists(directory_path):
+        os.makedirs(directory_path, exist_ok=True)
+        logger.info("创建目录: %s", directory_path)
+
+
+class XmlStorage(ABC):
+    """
+    XML 文档存储后端接口（每个保存目录一个实例，由 get_storage 创建）
+
+    文档以文件名（a.xml）标识，内容为字符串；查询结果按文件名排序。
+    写入 / 删除失败时抛出 OSError，删除不存在的文档时抛出 FileNotFoundError。
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    @abstractmethod
+    def save(self, name: str, content: str) -> str:
+        """保存文档，返回存储位置（日志用）"""
+
+    @abstractmethod
+    def delete(self, name: str) -> None:
+        """删除文档"""
+
+    @abstractmethod
+    def save_many(self, entries: Sequence[Tuple[str, str]]) -> List[Optional[OSError]]:
+        """批量保存 (文件名, 内容)，返回与 entries 一一对应的错误（成功为 None）"""
+
+    @abstractmethod
+    def delete_many(self, names: Sequence[str]) -> List[Optional[OSError]]:
+        """批量删除，返回与 names 一一对应的错误（成功为 None，不存在为 FileNotFoundError）"""
+
+    @abstractmethod
+    def current_version(self):
+        """返回当前版本（可比较相等，内容没有变化时不变），不读取文档内容"""
+
+    @abstractmethod
+    def stat(self, name: str) -> Optional[Tuple[int, int]]:
+        """返回文档的 (存储后的字节数, 修改时间纳秒)，不存在时返回 None（不读取内容）"""
+
+    @abstractmethod
+    def read(self, name: str) -> Tuple[str, int, int]:
+        """读取单个文档，返回 (内容, 存储后的字节数, 修改时间纳秒)，不存在时抛出 FileNotFoundError"""
+
+    @abstractmethod
+    def list_files(self, revalidate: bool = True) -> tuple:
+        """
+        返回 (version, [{"filename": ..., "xml": ...}, ...])，version 与 current_version 相同
+
+        revalidate: 调用方刚通过 current_version 校验过时可传 False，避免重复扫描
+        """
+
+    @abstractmethod
+    def query(self, **options) -> tuple:
+        """按分页/过滤选项查询（参数同 DirectoryIndex.query），返回 (总数, 当前页, 下一页游标或 None)"""
+
+    @abstractmethod
+    def iter_files(self) -> Iterator[dict]:
+        """逐个产出 {"filename": ..., "xml": ...}（按文件名排序，内容在产出时才读取）"""
+
+    @abstractmethod
+    def total_size(self) -> int:
+        """文档的总字节数（存储后的大小）"""
+
+    def changes(self, since: Optional[int], limit: int) -> dict:
+        """
+        序号大于 since 的变更事件（需要开启 config.XML_CHANGE_FEED），返回格式同 xml_changes.read_changes：
+        {"events", "cursor", "more", "reset"}
+        """
+        raise NotImplementedError
+
+    @property
+    def watches_external_writes(self) -> bool:
+        """是否需要扫描目录发现外部程序直接写入的变化"""
+        return False
+
+
+_batch_executor: Optional[ThreadPoolExecutor] = None
+_batch_executor_lock = threading.Lock()
+
+
+def _get_batch_executor() -> ThreadPoolExecutor:
+    """批量新增 / 删除共用的文件读写线程池（惰性创建）"""
+    global _batch_executor
+    if _batch_executor is None:
+        with _batch_executor_lock:
+            if _batch_executor is None:
+                _batch_executor = ThreadPoolExecutor(
+                    max_workers=_config_value("XML_BATCH_WORKERS", DEFAULT_BATCH_WORKERS),
+                    thread_name_prefix="xml-batch",
+                )
+    return _batch_executor
+
+
+# 已确认存在的保存目录（写入时不再逐次检查；目录被外部删除时写入失败后重新创建）
+_known_directories: set = set()
+
+
+class FilesystemStorage(XmlStorage):
+    """每个文档一个文件（压缩存储见 xml_compression，分片布局见 xml_layout，查询使用 xml_index 的目录索引）"""
+
+    def _write(self, name: str, content: str) -> tuple:
+        """
+        写入XML文件（不更新目录索引），返回 (磁盘上的文件路径, 写入的文件的 os.stat_result)
+
+        配置了压缩存储（config.XML_STORAGE_COMPRESSION）时写入 a.xml.gz / a.xml.zst，
+        写入成功后删除同名的其他存储版本（例如切换格式前写入的明文 a.xml）；
+        分片布局的目录写入文件名对应的分片子目录
+        """
+        fmt = storage_format()
+        data = compress(content.encode("utf-8"), fmt) if fmt else None
+
+        def write() -> os.stat_result:
+            if data is not None:
+                return write_bytes_atomic(file_path, data)
+            return write_text_atomic(file_path, content)
+
+        if self.directory not in _known_directories:
+            ensure_directory_exists(self.directory)
+            _known_directories.add(self.directory)
+        folder = file_folder(self.directory, name)
+        file_path = os.path.join(folder, stored_name(name, fmt))
+        try:
+            written = write()
+        except FileNotFoundError:
+            ensure_directory_exists(folder)
+            written = write()
+        remove_stored_variants(folder, name, keep=os.path.basename(file_path))
+        return file_path, written
+
+    def _remove(self, name: str) -> None:
+        """删除XML文件的所有存储版本（明文与压缩），都不存在时抛出 FileNotFoundError"""
+        if not remove_stored_variants(file_folder(self.directory, name), name):
+            raise FileNotFoundError(f"文件不存在: {name}")
+
+    def _record_changes(self, saved: Sequence[tuple] = (), deleted: Sequence[str] = ()) -> None:
+        """
+        记录刚写入 / 删除的文件：分片目录追加名称日志，开启变更订阅时追加变更日志，已建立索引的目录更新索引
+
+        Args:
+            saved: (文件名, 内容, 磁盘上的文件路径, 写入的文件的 os.stat_result) 列表
+            deleted: 文件名列表
+        """
+        sharded = shard_depth(self.directory)
+        feed = change_feed_enabled()
+        if sharded or feed:
+            records = []
+            for name, _, file_path, _ in saved:
+                try:
+                    stat = os.stat(file_path)
+                except FileNotFoundError:
+                    continue
+                records.append((name, os.path.basename(file_path), stat.st_size, stat.st_mtime_ns))
+            if sharded:
+                append_journal(self.directory, saved=records, deleted=deleted)
+            if feed:
+                append_changes(self.directory, saved=[(name, size, mtime_ns) for name, _, size, mtime_ns in records],
+                               deleted=deleted)
+        index = find_directory_index(self.directory)
+        if index is not None:
+            index.note_changes(
+                saved=[
+                    (name, content, os.path.basename(file_path), written)
+                    for name, content, file_path, written in saved
+                ],
+                deleted=deleted,
+            )
+
+    def save(self, name: str, content: str) -> str:
+        file_path, written = self._write(name, content)
+        self._record_changes(saved=[(name, content, file_path, written)])
+        return file_path
+
+    def delete(self, name: str) -> None:
+        self._remove(name)
+        self._record_changes(deleted=[name])
+
+    def _candidates(self, name: str) -> List[str]:
+        """文档在磁盘上可能的路径，当前压缩格式优先"""
+        folder = file_folder(self.directory, name)
+        preferred = stored_name(name, storage_format())
+        return [os.path.join(folder, candidate)
+                for candidate in [preferred] + [c for c in stored_names(name) if c != preferred]]
+
+    def stat(self, name: str) -> Optional[Tuple[int, int]]:
+        for file_path in self._candidates(name):
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            return stat.st_size, stat.st_mtime_ns
+        return None
+
+    def read(self, name: str) -> Tuple[str, int, int]:
+        for file_path in self._candidates(name):
+            try:
+                f = open(file_path, "rb")
+            except FileNotFoundError:
+                continue
+            with f:
+                # 大小与修改时间取自已打开的文件，与读到的内容一致
+                stat = os.fstat(f.fileno())
+                data = f.read()
+            return decode_xml_text(data), stat.st_size, stat.st_mtime_ns
+        raise FileNotFoundError(f"文件不存在: {name}")
+
+    def _run_parallel(self, operation, args: Sequence) -> tuple:
+        """在线程池中并行执行 operation，返回 (结果列表, 错误列表)"""
+        def run(arg):
+            try:
+                return operation(*arg), None
+            except OSError as e:
+                return None, e
+
+        outcomes = list(_get_batch_executor().map(run, args))
+        return [result for result, _ in outcomes], [error for _, error in outcomes]
+
+    def save_many(self, entries: Sequence[Tuple[str, str]]) -> List[Optional[OSError]]:
+        """在线程池中并行写入（原子写入，与 save 相同），写完后名称日志与索引只更新一次"""
+        results, errors = self._run_parallel(self._write, entries)
+        self._record_changes(saved=[
+            (name, content, file_path, written)
+            for (name, content), (file_path, written), error in zip(entries, results, errors) if error is None
+        ])
+        return errors
+
+    def delete_many(self, names: Sequence[str]) -> List[Optional[OSError]]:
+        """在线程池中并行删除，删除后名称日志与索引只更新一次"""
+        _, errors = self._run_parallel(self._remove, [(name,) for name in names])
+        self._record_changes(deleted=[name for name, error in zip(names, errors) if error is None])
+        return errors
+
+    def current_version(self) -> tuple:
+        # 索引被淘汰后重建时版本号从头计数，版本中带上索引对象本身（按对象比较）
+        index = get_directory_index(self.directory)
+        return index, index.current_version()
+
+    def list_files(self, revalidate: bool = True) -> tuple:
+        index = get_directory_index(self.directory)
+        version, files = index.list_files(revalidate=revalidate)
+        return (index, version), files
+
+    def query(self, **options) -> tuple:
+        return get_directory_index(self.directory).query(**options)
+
+    def iter_files(self) -> Iterator[dict]:
+        return get_directory_index(self.directory).iter_files()
+
+    def total_size(self) -> int:
+        return get_directory_index(self.directory).total_size()
+
+    def changes(self, since: Optional[int], limit: int) -> dict:
+        return read_changes(self.directory, since, limit)
+
+    @property
+    def watches_external_writes(self) -> bool:
+        # 分片目录的文件列表只来自名称日志，外部写入本来就需要 rebuild-index，不扫描
+        return not shard_depth(self.directory)
+
+
+# 保存目录 -> 存储实例，按最近使用顺序排列，与目录索引使用同一个数量上限
+# （淘汰的实例不再被引用后，SQLite 的各线程连接随之关闭）
+_storages: "OrderedDict[str, XmlStorage]" = OrderedDict()
+_storages_lock = threading.Lock()
+
+
+def create_storage(directory: str, backend: Optional[str] = None) -> XmlStorage:
+    """创建指定后端的存储实例（backend 为 None 时读取 config.XML_STORAGE_BACKEND）"""
+    backend = backend or _config_value("XML_STORAGE_BACKEND", DEFAULT_BACKEND)
+    if backend == "filesystem":
+        return FilesystemStorage(directory)
+    if backend == "sqlite":
+        from services.xml_sqlite import SqliteStorage
+        return SqliteStorage(directory)
+    raise ValueError(f"不支持的存储后端: {backend}（可选 {'/'.join(BACKENDS)}）")
+
+
+def get_storage(directory: str) -> XmlStorage:
+    """获取（必要时创建）保存目录的存储后端（config.XML_STORAGE_BACKEND）"""
+    key = os.path.normcase(os.path.abspath(directory))
+    with _storages_lock:
+        storage = _storages.get(key)
+        if storage is None:
+            storage = _storages[key] = create_storage(directory)
+            while len(_storages) > max_directories():
+                _storages.popitem(last=False)
+        else:
+            _storages.move_to_end(key)
+    return storage
+
+
+def copy_documents(source: XmlStorage, target: XmlStorage, chunk_size: int = 1000) -> int:
+    """
+    把 source 中的全部文档写入 target（每 chunk_size 个批量写入一次），返回文档数
+
+    Raises:
+        OSError: 任一文档写入失败时
+    """
+    copied = 0
+    chunk: List[Tuple[str, str]] = []
+
+    def flush() -> None:
+        for (name, _), error in zip(chunk, target.save_many(chunk)):
+            if error is not None:
+                raise OSError(f"写入失败: {name} - {error}")
+        chunk.clear()
+
+    for item in source.iter_files():
+        chunk.append((item["filename"], item["xml"]))
+        copied += 1
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return copied
+
+
+__all__ = [
+    "BACKENDS",
+    "XmlStorage",
+    "FilesystemStorage",
+    "ensure_directory_exists",
+    "create_storage",
+    "get_storage",
+    "copy_documents",
+]
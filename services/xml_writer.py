@@ -0,0 +1,280 @@
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from metrics_util import stage_timer
+
+logger = logging.getLogger(__name__)
+
+# 写入持久化模式：
+# - none：写临时文件后原子重命名，不调用 fsync（进程崩溃不会留下半截文件，断电可能丢失最近写入）
+# - fsync：每个文件重命名前 fsync，重命名后 fsync 所在目录，返回时已落盘
+# - group：组提交，各写入者并行 fdatasync 自己的临时文件，XML_GROUP_COMMIT_MS 毫秒窗口内并发的写入合并为一批
+#          重命名，每个目录每批只 fsync 一次，返回时同样已落盘；没有其他写入者正在写入时立即提交，不额外等待
+DURABILITY_MODES = ("none", "fsync", "group")
+
+# 默认的写入持久化模式
+DEFAULT_DURABILITY = "none"
+
+# 默认的组提交（group）等待窗口（毫秒）
+DEFAULT_GROUP_COMMIT_MS = 2
+
+# 临时文件后缀（不以 .xml 结尾，目录索引和列表查询不会返回未完成的写入）
+TEMP_SUFFIX = ".tmp"
+
+_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+
+
+# fdatasync 不落盘与读取无关的元数据（访问时间等），不可用的系统（Windows、macOS）使用 fsync
+_fdatasync = getattr(os, "fdatasync", os.fsync)
+
+
+def _config_value(name: str, default):
+    """从 config 模块读取配置项，不存在时返回默认值"""
+    try:
+        import config
+        return getattr(config, name)
+    except (ImportError, AttributeError):
+        return default
+
+
+def _fsync_directory(directory: str) -> None:
+    """fsync 目录，使重命名本身落盘（Windows 不支持打开目录，跳过）"""
+    if sys.platform == "win32":
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        logger.warning("fsync 目录失败: %s - %s", directory, e)
+
+
+def _discard(fd: Optional[int], temp_path: str) -> None:
+    """关闭并删除未提交的临时文件"""
+    if fd is not None:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+    try:
+        os.remove(temp_path)
+    except OSError:
+        pass
+
+
+def _commit(fd: int, temp_path: str, file_path: str, sync: bool) -> None:
+    """（可选 fsync 后）关闭临时文件并原子替换目标文件"""
+    try:
+        if sync:
+            os.fsync(fd)
+        os.close(fd)
+        fd = None
+        os.replace(temp_path, file_path)
+    except BaseException:
+        _discard(fd, temp_path)
+        raise
+
+
+def _write_temp(temp_path: str, write) -> tuple:
+    """
+    创建临时文件并调用 write(fd) 写入内容，返回 (未关闭的文件描述符, 文件状态)（失败时临时文件已删除）
+    重命名不改变 inode、大小与修改时间，返回的状态即目标文件写入后的状态
+    """
+    # 与 open(path, "w") 相同的文件权限（受 umask 影响）
+    fd = os.open(temp_path, _OPEN_FLAGS, 0o666)
+    try:
+        write(fd)
+        written = os.fstat(fd)
+    except BaseException:
+        _discard(fd, temp_path)
+        raise
+    return fd, written
+
+
+class _PendingWrite:
+    __slots__ = ("temp_path", "file_path", "done", "error")
+
+    def __init__(self, temp_path: str, file_path: str) -> None:
+        self.temp_path = temp_path
+        self.file_path = file_path
+        self.done = False
+        self.error: Optional[BaseException] = None
+
+
+class GroupCommitter:
+    """
+    组提交：写入者各自 fdatasync 自己的临时文件（并行落盘），再交给提交者批量重命名，每个目录只 fsync 一次。
+    到达时没有批次正在提交的写入者成为提交者：还有其他写入者正在写入 / 落盘时最多等待一个窗口（window_ms）
+    让它们加入本批，没有时立即提交；提交进行期间到达的写入者由下一个提交者合并为一批
+    """
+
+    def __init__(self, window_ms: float = DEFAULT_GROUP_COMMIT_MS) -> None:
+        self.window = max(window_ms, 0) / 1000.0
+        self.batches = 0
+        self.committed = 0
+        self._pending: List[_PendingWrite] = []
+        self._writing = 0
+        self._cond = threading.Condition()
+        self._flushing = False
+
+    def begin(self) -> None:
+        """登记一个开始写入临时文件的写入者（之后必须调用 commit 或 cancel）"""
+        with self._cond:
+            self._writing += 1
+
+    def cancel(self) -> None:
+        """写入失败时注销写入者，提交者不再等待它"""
+        with self._cond:
+            self._writing -= 1
+            self._cond.notify_all()
+
+    def commit(self, temp_path: str, file_path: str) -> None:
+        """
+        提交一个已落盘并关闭的临时文件，阻塞到它所在的批次重命名并落盘
+
+        Raises:
+            OSError: 重命名失败时（临时文件已删除）
+        """
+        pending = _PendingWrite(temp_path, file_path)
+        batch = None
+        with self._cond:
+            self._writing -= 1
+            self._pending.append(pending)
+            self._cond.notify_all()
+            while self._flushing and not pending.done:
+                self._cond.wait()
+            if not pending.done:
+                # 成为提交者：等待仍在写入的写入者（最多一个窗口），然后带走所有待提交的写入
+                self._flushing = True
+                deadline = time.monotonic() + self.window
+                while self._writing > 0:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, []
+        if batch is not None:
+            try:
+                self._flush(batch)
+            finally:
+                with self._cond:
+                    self._flushing = False
+                    self._cond.notify_all()
+        if pending.error is not None:
+            raise pending.error
+
+    def _flush(self, batch: List[_PendingWrite]) -> None:
+        try:
+            with stage_timer("xml.group_commit"):
+                directories: Dict[str, None] = {}
+                for pending in batch:
+                    try:
+                        os.replace(pending.temp_path, pending.file_path)
+                        directories[os.path.dirname(pending.file_path)] = None
+                    except OSError as e:
+                        pending.error = e
+                        _discard(None, pending.temp_path)
+                for directory in directories:
+                    _fsync_directory(directory)
+            self.batches += 1
+            self.committed += len(batch)
+        except BaseException as e:
+            for pending in batch:
+                if pending.error is None:
+                    pending.error = e
+            raise
+        finally:
+            for pending in batch:
+                pending.done = True
+
+
+_group_committer: Optional[GroupCommitter] = None
+_group_committer_lock = threading.Lock()
+
+
+def _get_group_committer() -> GroupCommitter:
+    global _group_committer
+    if _group_committer is None:
+        with _group_committer_lock:
+            if _group_committer is None:
+                _group_committer = GroupCommitter(_config_value("XML_GROUP_COMMIT_MS", DEFAULT_GROUP_COMMIT_MS))
+    return _group_committer
+
+
+def _write_atomic(file_path: str, write, durability: Optional[str]) -> os.stat_result:
+    """
+    写入同目录下的临时文件（write(fd) 负责写入内容），按持久化模式落盘后原子替换目标文件，
+    返回写入的文件的状态（重命名不改变 inode、大小与修改时间）
+    """
+    durability = durability or _config_value("XML_WRITE_DURABILITY", DEFAULT_DURABILITY)
+    if durability not in DURABILITY_MODES:
+        raise ValueError(f"不支持的写入持久化模式: {durability}（可选 {'/'.join(DURABILITY_MODES)}）")
+
+    directory, name = os.path.split(file_path)
+    temp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex[:12]}{TEMP_SUFFIX}")
+    if durability == "group":
+        committer = _get_group_committer()
+        committer.begin()
+        try:
+            fd, written = _write_temp(temp_path, write)
+            try:
+                _fdatasync(fd)
+            finally:
+                os.close(fd)
+        except BaseException:
+            _discard(None, temp_path)
+            committer.cancel()
+            raise
+        committer.commit(temp_path, file_path)
+        return written
+
+    fd, written = _write_temp(temp_path, write)
+    _commit(fd, temp_path, file_path, sync=durability == "fsync")
+    if durability == "fsync":
+        _fsync_directory(directory)
+    return written
+
+
+def write_text_atomic(file_path: str, content: str, durability: Optional[str] = None) -> os.stat_result:
+    """
+    原子写入文本文件（UTF-8）：先写同目录下的临时文件，再用 os.replace 替换目标文件，
+    读取方只会看到旧文件或完整的新文件
+
+    Args:
+        file_path: 目标文件路径
+        content: 文件内容
+        durability: none / fsync / group，为 None 时读取 config.XML_WRITE_DURABILITY
+
+    Returns:
+        os.stat_result: 写入的文件的状态（os.fstat）。其他写入者随后可能又替换了目标文件，
+        调用方可比较 st_ino / st_dev 确认目标文件仍是本次写入的文件
+
+    Raises:
+        OSError: 写入、落盘或重命名失败时（临时文件已删除）
+        ValueError: 持久化模式不合法时
+    """
+    def write(fd: int) -> None:
+        # 与 open(path, "w") 相同的换行符转换
+        with open(fd, "w", encoding="utf-8", closefd=False) as f:
+            f.write(content)
+
+    return _write_atomic(file_path, write, durability)
+
+
+def write_bytes_atomic(file_path: str, data: bytes, durability: Optional[str] = None) -> os.stat_result:
+    """原子写入二进制文件（例如压缩存储的XML），参数、返回值与异常同 write_text_atomic"""
+    def write(fd: int) -> None:
+        with open(fd, "wb", closefd=False) as f:
+            f.write(data)
+
+    return _write_atomic(file_path, write, durability)
+
+
+__all__ = ["DURABILITY_MODES", "GroupCommitter", "write_text_atomic", "write_bytes_atomic"]
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+签名结果缓存
+
+重试的报关单经常再次提交相同的 str，而每次签名都要占用一次操作员卡（每秒只能签名几次）。
+缓存以 (数据的 SHA-256, 证书号) 为键保存签名结果：
+
+- 有界 LRU + TTL：超过最大条目数时淘汰最久未使用的条目，超过有效期的条目不再返回
+- 不保存密码：键中只包含带进程内随机盐的密码摘要，用于保证错误的密码不会命中他人的签名结果
+- 单飞（single-flight）：相同数据和密码的并发请求合并为一次签名调用
+- 按证书号区分：只有当前健康端点所插卡片的证书号对应的条目才会命中，换卡后旧结果自动失效
+
+所有方法都只在 WebSocketWrapper 的后台事件循环线程中调用，无需加锁。
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 默认缓存有效期（秒）
+DEFAULT_TTL_SECONDS = 300
+
+
+class SignCache:
+    """签名结果的 LRU/TTL 缓存（带单飞合并）"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float = DEFAULT_TTL_SECONDS) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries 必须大于等于 1")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # (数据摘要, 密码摘要, 证书号) -> (过期时间, 签名结果)
+        self._entries: "OrderedDict[Tuple[bytes, bytes, str], Tuple[float, dict]]" = OrderedDict()
+        # (数据摘要, 密码摘要) -> 进行中的签名
+        self._inflight: Dict[Tuple[bytes, bytes], asyncio.Future] = {}
+        self._salt = os.urandom(16)
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _make_key(self, data: str, passwd: str) -> Tuple[bytes, bytes]:
+        data_digest = hashlib.sha256(data.encode("utf-8")).digest()
+        passwd_digest = hashlib.sha256(self._salt + passwd.encode("utf-8")).digest()
+        return data_digest, passwd_digest
+
+    def _lookup(self, key: Tuple[bytes, bytes], certs: Iterable[str]) -> Optional[dict]:
+        now = time.monotonic()
+        for cert_no in certs:
+            entry_key = key + (cert_no,)
+            entry = self._entries.get(entry_key)
+            if entry is None:
+                continue
+            expires_at, result = entry
+            if expires_at <= now:
+                del self._entries[entry_key]
+                continue
+            self._entries.move_to_end(entry_key)
+            return dict(result)
+        return None
+
+    def _store(self, key: Tuple[bytes, bytes], result: dict) -> None:
+        cert_no = result.get("cert_no")
+        if not result.get("sign") or not cert_no:
+            return
+        entry_key = key + (cert_no,)
+        self._entries[entry_key] = (time.monotonic() + self.ttl_seconds, dict(result))
+        self._entries.move_to_end(entry_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_sign(
+        self,
+        data: str,
+        passwd: str,
+        certs: Iterable[str],
+        sign: Callable[[], Awaitable[dict]],
+    ) -> dict:
+        """
+        返回缓存的签名结果；未命中时调用 sign()，相同请求的并发调用共享同一次签名
+
+        Args:
+            data: 待签名的数据字符串
+            passwd: 密码（只用于计算摘要，不会被保存）
+            certs: 当前可用端点的证书号，只有这些证书对应的缓存条目会命中
+            sign: 实际执行签名的协程函数，返回包含 sign、cert_no 的字典
+        """
+        key = self._make_key(data, passwd)
+        cached = self._lookup(key, certs)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return dict(await asyncio.shield(inflight))
+
+        self.misses += 1
+        # 签名在独立任务中执行：发起签名的调用方被取消时，签名继续进行，合并等待的请求仍能拿到结果
+        task = asyncio.ensure_future(self._sign_shared(sign))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._finish(key, t))
+        return dict(await asyncio.shield(task))
+
+    @staticmethod
+    async def _sign_shared(sign: Callable[[], Awaitable[dict]]) -> dict:
+        try:
+            return await sign()
+        except asyncio.CancelledError:
+            # 签名本身被取消时不把取消传给合并等待的请求（否则它们会被当作自身被取消），改为普通异常
+            raise RuntimeError("签名请求已取消") from None
+
+    def _finish(self, key: Tuple[bytes, bytes], task: asyncio.Future) -> None:
+        """签名任务结束：移出进行中列表，成功时写入缓存（同时取走异常，避免 "exception was never retrieved" 警告）"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._store(key, task.result())
+
+    def clear(self) -> None:
+        """清空缓存（进行中的签名不受影响）"""
+        self._entries.clear()
+
+    def status(self) -> dict:
+        """缓存统计（用于健康检查）"""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+
+__all__ = ["SignCache"]
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+签名守护进程客户端
+
+提供与 WebSocketWrapper 相同的接口（get_code / get_code_async / get_codes / get_codes_async、
+is_available、endpoint_status、cache_status、queue_status、start、stop），
+把签名请求通过本机 IPC 转发给 signer_daemon，HTTP 路由无需修改。
+
+每个客户端只维护一条连接：多个线程（或协程）的请求带唯一 id 并发写入，
+由后台读取线程按 id 把响应分发给对应的等待者；连接断开时等待中的请求立即失败，下一次调用自动重连。
+异步接口在线程池中建立连接和发送请求，守护进程无响应时不会阻塞调用方的事件循环。
+"""
+import asyncio
+import functools
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing.connection import Client, Connection
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from signer_daemon import decode_error, decode_message, encode_message, signer_address, signer_authkey
+from websocket_wrapper import WebSocketError, WebSocketConnectionError, WebSocketTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# 默认的等待守护进程响应的超时时间（秒），需大于签名排队时间与签名响应超时之和
+DEFAULT_CALL_TIMEOUT = 60.0
+
+# 查询守护进程状态（/health、/metrics）的超时时间（秒）
+STATUS_TIMEOUT = 2.0
+
+# 状态查询结果的复用时间（秒）：一次 /health 或 /metrics 读取多项状态只查询一次守护进程
+STATUS_TTL = 1.0
+
+
+def _config_value(name: str, default):
+    """从 config 模块读取配置项，不存在时返回默认值"""
+    try:
+        import config
+        return getattr(config, name)
+    except (ImportError, AttributeError):
+        return default
+
+
+class SignerClient:
+    """签名守护进程的客户端（接口与 WebSocketWrapper 一致）"""
+
+    def __init__(
+        self,
+        address: Optional[str] = None,
+        authkey: Optional[bytes] = None,
+        call_timeout: Optional[float] = None,
+    ) -> None:
+        self.address = address or signer_address()
+        self.authkey = authkey if authkey is not None else signer_authkey()
+        self.call_timeout = call_timeout or _config_value("SIGNER_CALL_TIMEOUT", DEFAULT_CALL_TIMEOUT)
+        self.lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._conn: Optional[Connection] = None
+        # 当前连接上等待响应的请求：id -> Future
+        self._pending: Dict[int, Future] = {}
+        self._ids = itertools.count(1)
+        # 最近一次状态查询：(查询时间, 结果或 None)
+        self._status_cache: Optional[Tuple[float, Optional[dict]]] = None
+        self._status_lock = threading.Lock()
+        logger.info(f"SignerClient 初始化，签名守护进程地址: {self.address}")
+
+    def is_available(self) -> bool:
+        """
+        检查签名服务是否可用
+
+        Returns:
+            bool: 配置了守护进程地址即返回 True（连接在调用时创建）
+        """
+        return bool(self.address)
+
+    def _connect(self) -> Connection:
+        """建立到守护进程的连接并启动读取线程（需持有 self.lock）"""
+        try:
+            conn = Client(self.address, authkey=self.authkey)
+        except Exception as e:
+            raise WebSocketConnectionError(f"连接签名守护进程失败（{self.address}）: {e}")
+        self._conn = conn
+        threading.Thread(target=self._read_loop, args=(conn,), name="signer-client-reader", daemon=True).start()
+        logger.info(f"已连接签名守护进程: {self.address}")
+        return conn
+
+    def _read_loop(self, conn: Connection) -> None:
+        """读取连接上的响应，按 id 分发给等待者；连接断开后让所有等待中的请求失败"""
+        error: Exception = WebSocketConnectionError("签名守护进程连接已断开")
+        try:
+            while True:
+                try:
+                    message = decode_message(conn.recv_bytes())
+                except (EOFError, OSError) as e:
+                    error = WebSocketConnectionError(f"签名守护进程连接已断开: {e!r}")
+                    break
+                with self.lock:
+                    future = self._pending.pop(message.get("id"), None)
+                if future is None:
+                    continue
+                if "error" in message:
+                    future.set_exception(decode_error(message["error"]))
+                else:
+                    future.set_result(message.get("result"))
+        except Exception as e:
+            logger.error(f"读取签名守护进程响应失败: {e}", exc_info=True)
+            error = WebSocketConnectionError(f"读取签名守护进程响应失败: {e}")
+        finally:
+            self._discard_connection(conn, error)
+
+    def _discard_connection(self, conn: Connection, error: Exception) -> None:
+        """关闭连接，并让该连接上等待中的请求失败"""
+        with self.lock:
+            if self._conn is not conn:
+                return
+            self._conn = None
+            pending, self._pending = self._pending, {}
+        try:
+            conn.close()
+        except OSError:
+            pass
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    def _call(self, op: str, **params) -> Future:
+        """发送一个请求，返回等待响应的 Future"""
+        future: Future = Future()
+        with self.lock:
+            conn = self._conn or self._connect()
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+        params.update(id=request_id, op=op)
+        try:
+            with self._send_lock:
+                conn.send_bytes(encode_message(params))
+        except (OSError, ValueError) as e:
+            self._discard_connection(conn, WebSocketConnectionError(f"发送签名请求失败: {e!r}"))
+        return future
+
+    async def _call_async(self, op: str, **params) -> Future:
+        """_call 的异步版本：在线程池中建立连接和发送请求（连接、认证与写管道都可能阻塞）"""
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(self._call, op, **params))
+
+    def _wait(self, future: Future, timeout: Optional[float] = None):
+        timeout = timeout or self.call_timeout
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self._forget(future)
+            raise WebSocketTimeoutError(f"等待签名守护进程响应超时（{timeout} 秒）")
+
+    async def _wait_async(self, future: Future):
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.call_timeout)
+        except asyncio.TimeoutError:
+            self._forget(future)
+            raise WebSocketTimeoutError(f"等待签名守护进程响应超时（{self.call_timeout} 秒）")
+        except asyncio.CancelledError:
+            self._forget(future)
+            raise
+
+    def _forget(self, future: Future) -> None:
+        """放弃等待一个请求（之后到达的响应会被丢弃）"""
+        with self.lock:
+            for request_id, pending in list(self._pending.items()):
+                if pending is future:
+                    del self._pending[request_id]
+                    break
+
+    def _status(self) -> Optional[dict]:
+        """
+        守护进程中签名服务的状态，守护进程不可用时返回 None
+
+        最多等待 STATUS_TIMEOUT 秒；结果（包括失败）复用 STATUS_TTL 秒，
+        endpoint_status / cache_status / queue_status 在同一次 /health、/metrics 中只查询一次
+        """
+        with self._status_lock:
+            cached = self._status_cache
+            if cached is not None and time.monotonic() - cached[0] < STATUS_TTL:
+                return cached[1]
+            try:
+                status = self._wait(self._call("status"), STATUS_TIMEOUT)
+            except WebSocketError as e:
+                logger.warning(f"获取签名守护进程状态失败: {e}")
+                status = None
+            self._status_cache = (time.monotonic(), status)
+            return status
+
+    def endpoint_status(self) -> List[dict]:
+        """各签名端点的连接与健康状态（守护进程不可用时为空列表）"""
+        status = self._status()
+        return status["endpoints"] if status else []
+
+    def cache_status(self) -> Optional[dict]:
+        """签名结果缓存的命中统计，未启用缓存或守护进程不可用时返回 None"""
+        status = self._status()
+        return status["cache"] if status else None
+
+    def queue_status(self) -> dict:
+        """签名排队状态（守护进程不可用时为空字典）"""
+        status = self._status()
+        return status["queue"] if status else {}
+
+    def start(self):
+        """预先连接守护进程（连接失败不会抛出异常，调用时会自动重连）"""
+        try:
+            with self.lock:
+                if self._conn is None:
+                    self._connect()
+        except WebSocketError as e:
+            logger.warning(f"预先连接签名守护进程未完成: {e}")
+
+    def stop(self):
+        """关闭到守护进程的连接"""
+        with self.lock:
+            conn = self._conn
+        if conn is not None:
+            self._discard_connection(conn, WebSocketConnectionError("签名客户端已停止"))
+
+    @staticmethod
+    def _batch_results(results: list) -> List[Union[str, WebSocketError]]:
+        return [decode_error(result["error"]) if isinstance(result, dict) else result for result in results]
+
+    def get_code(self, data: str, pwdstr: str, priority: int = 0, timeout: Optional[float] = None) -> str:
+        """
+        通过签名守护进程获取签名，参数、返回值与异常同 WebSocketWrapper.get_code
+
+        Returns:
+            str: "签名字符串||证书序列号" 格式的字符串
+
+        Raises:
+            WebSocketError: 签名失败或无法连接守护进程时
+        """
+        return self._wait(self._call("sign", data=data, pwdstr=pwdstr, priority=priority, timeout=timeout))
+
+    async def get_code_async(self, data: str, pwdstr: str, priority: int = 0,
+                             timeout: Optional[float] = None) -> str:
+        """get_code 的异步版本，可在任意事件循环中 await"""
+        future = await self._call_async("sign", data=data, pwdstr=pwdstr, priority=priority, timeout=timeout)
+        return await self._wait_async(future)
+
+    def get_codes(self, items: Sequence[Tuple[str, str]], priority: int = 0,
+                  timeout: Optional[float] = None) -> List[Union[str, WebSocketError]]:
+        """
+        批量签名，参数、返回值同 WebSocketWrapper.get_codes（整批只占用一次往返）
+
+        Returns:
+            list: 与 items 一一对应，成功为 "签名字符串||证书序列号"，失败为 WebSocketError
+        """
+        future = self._call("sign_batch", items=[list(item) for item in items], priority=priority, timeout=timeout)
+        return self._batch_results(self._wait(future))
+
+    async def get_codes_async(self, items: Sequence[Tuple[str, str]], priority: int = 0,
+                              timeout: Optional[float] = None) -> List[Union[str, WebSocketError]]:
+        """get_codes 的异步版本，可在任意事件循环中 await"""
+        future = await self._call_async(
+            "sign_batch", items=[list(item) for item in items], priority=priority, timeout=timeout
+        )
+        return self._batch_results(await self._wait_async(future))
+
+
+__all__ = ["SignerClient"]
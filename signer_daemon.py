@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+签名守护进程
+
+操作员卡同一时间只允许一个会话，因此 WebSocketWrapper 只能由一个进程持有。
+签名守护进程独占 WebSocket 连接（连接复用、多路复用、排队与缓存都在这里完成），
+HTTP 工作进程通过本机 IPC（Linux 为 Unix 域套接字，Windows 为命名管道）连接守护进程，
+由 signer_client.SignerClient 以与 WebSocketWrapper 相同的 get_code 接口调用签名。
+这样解密、JSON 与 XML 读写可以分散到多个工作进程，签名仍然只有一个进程持有连接。
+
+通信协议：每条消息是一个长度前缀帧（multiprocessing.connection：4 字节长度 + 内容），内容为 UTF-8 JSON：
+
+- 请求：{"id": 请求编号, "op": "sign" | "sign_batch" | "status", ...参数}
+- 响应：{"id": 请求编号, "result": ...} 或 {"id": 请求编号, "error": {"type": 异常类名, "msg": 错误信息}}
+
+同一连接上的多个请求可以并发（按 id 匹配响应，响应顺序不保证与请求一致）。
+签名请求不占用线程：收到后直接以协程提交到 WebSocketWrapper 的后台事件循环，与进程内调用一样经过
+优先级、队列深度与截止时间的准入控制（timeout 从守护进程收到请求时开始计算），完成后由每个连接的写线程写回响应。
+
+运行方式：
+    python signer_daemon.py
+    python signer_daemon.py --address /run/sign-server/signer.sock
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import signal
+import socket
+import sys
+import tempfile
+import threading
+from concurrent.futures import Future, wait
+from multiprocessing.connection import Connection, Listener
+from multiprocessing import AuthenticationError
+from typing import Callable, Optional, Set
+
+from websocket_wrapper import (
+    WebSocketWrapper,
+    WebSocketError,
+    WebSocketConnectionError,
+    WebSocketTimeoutError,
+    SignResponseError,
+    SignOverloadedError,
+)
+
+logger = logging.getLogger(__name__)
+
+# 默认的 IPC 地址：Windows 为命名管道，其他系统为临时目录下的 Unix 域套接字
+if sys.platform == "win32":
+    DEFAULT_ADDRESS = r"\\.\pipe\sign-server-signer"
+else:
+    DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), "sign-server-signer.sock")
+
+# 可以通过 IPC 传递的异常类型（按类名还原为同一异常，HTTP 路由的错误处理保持不变）
+ERROR_TYPES = {
+    cls.__name__: cls
+    for cls in (
+        WebSocketError,
+        WebSocketConnectionError,
+        WebSocketTimeoutError,
+        SignResponseError,
+        SignOverloadedError,
+    )
+}
+
+
+def _config_value(name: str, default):
+    """从 config 模块读取配置项，不存在时返回默认值"""
+    try:
+        import config
+        return getattr(config, name)
+    except (ImportError, AttributeError):
+        return default
+
+
+def signer_address() -> str:
+    """守护进程监听（客户端连接）的 IPC 地址：config.SIGNER_ADDRESS，未配置时使用默认地址"""
+    return _config_value("SIGNER_ADDRESS", "") or DEFAULT_ADDRESS
+
+
+def signer_authkey() -> Optional[bytes]:
+    """连接认证密钥：config.SIGNER_AUTHKEY，未配置时不做认证"""
+    authkey = _config_value("SIGNER_AUTHKEY", "")
+    return authkey.encode("utf-8") if authkey else None
+
+
+def encode_message(message: dict) -> bytes:
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode_message(payload: bytes) -> dict:
+    message = json.loads(payload.decode("utf-8"))
+    if not isinstance(message, dict):
+        raise ValueError("消息必须是 JSON 对象")
+    return message
+
+
+def encode_error(error: Exception) -> dict:
+    """将异常编码为 {"type", "msg"}，不在 ERROR_TYPES 中的异常按 WebSocketError 传递"""
+    error_type = type(error).__name__
+    if error_type not in ERROR_TYPES:
+        error_type = WebSocketError.__name__
+    return {"type": error_type, "msg": str(error)}
+
+
+def decode_error(error: dict) -> WebSocketError:
+    """将 {"type", "msg"} 还原为对应的 WebSocketError 子类"""
+    cls = ERROR_TYPES.get(error.get("type"), WebSocketError)
+    return cls(error.get("msg") or "签名守护进程返回未知错误")
+
+
+def _remove_stale_socket(address: str) -> None:
+    """
+    删除上次异常退出遗留的 Unix 域套接字文件
+
+    Raises:
+        RuntimeError: 已有守护进程在该地址上监听时（操作员卡只能由一个进程持有）
+    """
+    if sys.platform == "win32" or not os.path.exists(address):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(address)
+    except OSError:
+        os.unlink(address)
+    else:
+        raise RuntimeError(f"签名守护进程已在运行: {address}")
+    finally:
+        probe.close()
+
+
+class SignerDaemon:
+    """在本机 IPC 地址上对外提供 WebSocketWrapper 签名的守护进程"""
+
+    def __init__(
+        self,
+        sign_service: WebSocketWrapper,
+        address: Optional[str] = None,
+        authkey: Optional[bytes] = None,
+    ) -> None:
+        self.sign_service = sign_service
+        self.address = address or signer_address()
+        self.authkey = authkey if authkey is not None else signer_authkey()
+        self.listener: Optional[Listener] = None
+        self._stopping = False
+        # 已提交到签名服务事件循环、尚未完成的请求
+        self._active: Set[Future] = set()
+        self._active_lock = threading.Lock()
+
+    def serve_forever(self) -> None:
+        """监听 IPC 地址并处理客户端请求，直到 stop() 被调用或进程被中断"""
+        _remove_stale_socket(self.address)
+        self.listener = Listener(self.address, authkey=self.authkey)
+        if sys.platform != "win32":
+            # 只允许同一用户的进程连接
+            os.chmod(self.address, 0o600)
+        logger.info(f"签名守护进程已启动，监听地址: {self.address}")
+        try:
+            while not self._stopping:
+                try:
+                    conn = self.listener.accept()
+                except AuthenticationError as e:
+                    logger.warning(f"拒绝未通过认证的连接: {e}")
+                    continue
+                except OSError:
+                    if self._stopping:
+                        break
+                    raise
+                threading.Thread(
+                    target=self._serve_connection, args=(conn,), name="signer-conn", daemon=True
+                ).start()
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """停止监听并等待处理中的请求完成"""
+        self._stopping = True
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            try:
+                listener.close()
+            except OSError:
+                pass
+        # 等待已提交的签名请求完成（响应由各连接的写线程写回）
+        with self._active_lock:
+            active = list(self._active)
+        if active:
+            wait(active)
+
+    def _serve_connection(self, conn: Connection) -> None:
+        """读取一个客户端连接上的请求并提交处理，响应交给该连接的写线程按完成顺序写回"""
+        responses: queue.SimpleQueue = queue.SimpleQueue()
+        threading.Thread(
+            target=self._write_responses, args=(conn, responses), name="signer-conn-writer", daemon=True
+        ).start()
+        logger.debug("签名客户端已连接")
+        try:
+            while not self._stopping:
+                try:
+                    payload = conn.recv_bytes()
+                except (EOFError, OSError):
+                    break
+                self._handle(payload, responses.put)
+        finally:
+            responses.put(None)
+            logger.debug("签名客户端已断开")
+
+    @staticmethod
+    def _write_responses(conn: Connection, responses: queue.SimpleQueue) -> None:
+        """写线程：依次写回响应，直到收到 None（连接断开后丢弃剩余的响应）"""
+        closed = False
+        while True:
+            response = responses.get()
+            if response is None:
+                break
+            if closed:
+                continue
+            try:
+                conn.send_bytes(encode_message(response))
+            except OSError as e:
+                logger.debug(f"写回签名响应失败（客户端已断开）: {e}")
+                closed = True
+
+    @staticmethod
+    def _error_response(request_id, error: BaseException) -> dict:
+        if not isinstance(error, WebSocketError):
+            logger.error(f"处理签名请求失败: {error!r}")
+            error = WebSocketError(f"签名守护进程处理请求失败: {error!r}")
+        return {"id": request_id, "error": encode_error(error)}
+
+    def _handle(self, payload: bytes, reply: Callable[[dict], None]) -> None:
+        """
+        处理一个请求：status 直接返回；签名请求以协程提交到签名服务的事件循环，不阻塞读取线程，
+        完成时（在事件循环线程中）把响应交给 reply
+        """
+        request_id = None
+        try:
+            request = decode_message(payload)
+            request_id = request.get("id")
+            if request.get("op") == "status":
+                reply({"id": request_id, "result": self._status()})
+                return
+            future = self.sign_service.run_in_loop(self._dispatch(request))
+        except Exception as e:
+            reply(self._error_response(request_id, e))
+            return
+
+        with self._active_lock:
+            self._active.add(future)
+
+        def done(finished: Future) -> None:
+            with self._active_lock:
+                self._active.discard(finished)
+            if finished.cancelled():
+                reply(self._error_response(request_id, WebSocketConnectionError("签名服务已停止")))
+            elif finished.exception() is not None:
+                reply(self._error_response(request_id, finished.exception()))
+            else:
+                reply({"id": request_id, "result": finished.result()})
+
+        future.add_done_callback(done)
+
+    def _status(self) -> dict:
+        return {
+            "available": self.sign_service.is_available(),
+            "endpoints": self.sign_service.endpoint_status(),
+            "cache": self.sign_service.cache_status(),
+            "queue": self.sign_service.queue_status(),
+        }
+
+    async def _dispatch(self, request: dict):
+        """在签名服务的事件循环中执行签名请求（经过与进程内调用相同的排队与准入控制）"""
+        op = request.get("op")
+        if op == "sign":
+            return await self.sign_service.get_code_async(
+                request.get("data"), request.get("pwdstr"), request.get("priority", 0), request.get("timeout")
+            )
+        if op == "sign_batch":
+            items = [tuple(item) for item in request.get("items") or []]
+            results = await self.sign_service.get_codes_async(
+                items, request.get("priority", 0), request.get("timeout")
+            )
+            return [result if isinstance(result, str) else {"error": encode_error(result)} for result in results]
+        raise WebSocketError(f"未知的签名守护进程操作: {op!r}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="签名守护进程（独占操作员卡连接，通过本机 IPC 提供签名）")
+    parser.add_argument("--address", default=signer_address(), help="IPC 监听地址（Unix 域套接字路径或命名管道名）")
+    args = parser.parse_args()
+
+    from log_util import setup_logging
+    setup_logging()
+
+    sign_service = WebSocketWrapper()
+    daemon = SignerDaemon(sign_service, address=args.address)
+
+    def handle_sigterm(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    try:
+        sign_service.start()
+    except Exception as e:
+        logger.error(f"启动 WebSocket 连接失败: {e}", exc_info=True)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+        sign_service.stop()
+        logger.info("签名守护进程已停止")
+
+
+__all__ = [
+    "DEFAULT_ADDRESS",
+    "SignerDaemon",
+    "signer_address",
+    "signer_authkey",
+]
+
+
+if __name__ == '__main__':
+    main()
+
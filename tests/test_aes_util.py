@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""AES 加解密测试（流式与一次性结果一致）"""
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from aes_util import (
+    mysql_adapter_decrypt,
+    mysql_adapter_decrypt_stream,
+    mysql_adapter_encrypt,
+    mysql_adapter_encrypt_stream,
+)
+
+KEY = "test-key-0123456789"
+
+
+@pytest.mark.parametrize("size", [0, 1, 15, 16, 17, 100, 4096, 70000])
+@pytest.mark.parametrize("chunk_size", [16, 100, 4096])
+def test_encrypt_stream_matches_one_shot(size, chunk_size):
+    plaintext = "签名报文<x/>" * (size // 16) + "a" * (size % 16)
+    pieces = [plaintext[i:i + 7] for i in range(0, len(plaintext), 7)]
+    expected = mysql_adapter_encrypt(KEY, plaintext)
+    assert "".join(mysql_adapter_encrypt_stream(KEY, pieces, chunk_size=chunk_size)) == expected
+    assert "".join(mysql_adapter_encrypt_stream(KEY, [plaintext.encode("utf-8")], chunk_size=chunk_size)) == expected
+    assert mysql_adapter_decrypt(KEY, expected) == plaintext
+
+
+@pytest.mark.parametrize("size", [1, 16, 100, 70000])
+@pytest.mark.parametrize("chunk_size", [7, 32, 4096])
+def test_decrypt_stream_matches_one_shot(size, chunk_size):
+    plaintext = "x" * size
+    body = ("  " + mysql_adapter_encrypt(KEY, plaintext) + "\n").encode("ascii")
+    decrypted = mysql_adapter_decrypt_stream(KEY, io.BytesIO(body), len(body), chunk_size=chunk_size)
+    assert bytes(decrypted) == plaintext.encode("utf-8")
+    # 一次性解密由调用方（decrypt_request_body）去掉首尾空白
+    assert mysql_adapter_decrypt(KEY, body.decode("ascii").strip()) == plaintext
+
+
+def test_decrypt_stream_rejects_bad_ciphertext():
+    body = mysql_adapter_encrypt(KEY, "abc")[:-2].encode("ascii")
+    with pytest.raises(Exception):
+        mysql_adapter_decrypt_stream(KEY, io.BytesIO(body), len(body))
+
+
+def test_encrypt_stream_resumed_on_other_threads():
+    # 流式响应的生成器可能在线程池的不同线程中依次恢复执行
+    plaintext = "".join(f"<doc>{i}</doc>" for i in range(20000))
+    stream = mysql_adapter_encrypt_stream(KEY, [plaintext[i:i + 1000] for i in range(0, len(plaintext), 1000)],
+                                          chunk_size=4096)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        parts = []
+        while True:
+            part = executor.submit(next, stream, None).result()
+            if part is None:
+                break
+            parts.append(part)
+            executor.submit(mysql_adapter_encrypt, KEY, "other").result()
+    assert "".join(parts) == mysql_adapter_encrypt(KEY, plaintext)
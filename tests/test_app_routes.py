@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""HTTP 接口测试：Flask（app.py）与 ASGI（asgi_app.py）两个版本使用同一组用例，响应必须一致"""
+import hashlib
+import json
+
+import pytest
+from starlette.testclient import TestClient
+
+import app as flask_app
+import asgi_app
+import config
+from aes_util import mysql_adapter_decrypt, mysql_adapter_encrypt
+from benchmarks.fake_signer_server import FakeSignerServer
+from websocket_wrapper import WebSocketWrapper
+
+
+def encrypt(data) -> str:
+    return mysql_adapter_encrypt(config.AES_KEY, json.dumps(data, ensure_ascii=False))
+
+
+def decrypt(cipher_text: str):
+    return json.loads(mysql_adapter_decrypt(config.AES_KEY, cipher_text))
+
+
+@pytest.fixture(scope="module")
+def signer():
+    server = FakeSignerServer(latency=0.001, workers=4).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(scope="module")
+def sign_service(signer):
+    wrapper = WebSocketWrapper(signer.url)
+    wrapper.start()
+    yield wrapper
+    wrapper.stop()
+
+
+@pytest.fixture(params=["flask", "asgi"])
+def client(request, sign_service, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SAVE_FOLDER", str(tmp_path))
+    if request.param == "flask":
+        monkeypatch.setattr(flask_app, "sign_service", sign_service)
+        return flask_app.app.test_client()
+    # 不进入 lifespan：签名服务由 fixture 启动和关闭
+    monkeypatch.setattr(asgi_app, "sign_service", sign_service)
+    return TestClient(asgi_app.app)
+
+
+def body_of(response) -> dict:
+    # Flask 测试客户端的响应用 get_json()，Starlette（httpx）的响应用 json()
+    return response.get_json() if hasattr(response, "get_json") else response.json()
+
+
+def post_raw(client, path: str, body: str):
+    # httpx 上传原始请求体用 content=，Flask 测试客户端用 data=
+    if isinstance(client, TestClient):
+        return client.post(path, content=body)
+    return client.post(path, data=body)
+
+
+def post(client, path: str, data):
+    response = post_raw(client, path, encrypt(data))
+    return response.status_code, body_of(response)
+
+
+def test_add_list_delete(client, tmp_path):
+    assert post(client, "/xml-files/add", {"filename": "a.xml", "xml": "<a>中文</a>"}) == (
+        200, {"code": 200, "msg": "新增成功", "data": True}
+    )
+    assert (tmp_path / "a.xml").read_text(encoding="utf-8") == "<a>中文</a>"
+
+    status, body = post(client, "/xml-files/list", {})
+    assert status == 200 and body["code"] == 200
+    assert decrypt(body["data"]) == [{"filename": "a.xml", "xml": "<a>中文</a>"}]
+
+    assert post(client, "/xml-files/delete", {"filename": "a.xml"}) == (
+        200, {"code": 200, "msg": "删除成功", "data": True}
+    )
+    assert not (tmp_path / "a.xml").exists()
+
+
+def test_xml_request_errors(client):
+    assert post(client, "/xml-files/add", {"filename": "a.xml"})[0] == 400
+    assert post(client, "/xml-files/delete", {"filename": "missing.xml"})[0] == 404
+    status, body = post(client, "/xml-files/delete", {"filename": ""})
+    assert (status, body["code"]) == (400, 500)
+
+    response = post_raw(client, "/xml-files/list", "not-hex")
+    assert response.status_code == 500
+    assert body_of(response)["msg"].startswith("查询失败")
+
+
+def test_getcode(client):
+    status, body = post(client, "/getCode", {"str": "data", "pwdstr": "00000000"})
+    assert (status, body["code"], body["msg"]) == (200, 200, "成功")
+    assert decrypt(body["data"]) == {
+        "sign": hashlib.sha256(b"data").hexdigest(),
+        "certNo": "FAKE-CERT-0001",
+    }
+
+
+def test_getcode_invalid_request(client):
+    status, body = post(client, "/getCode", {"str": "data"})
+    assert (status, body["code"], body["data"]) == (400, 400, False)
+
+
+def test_getcode_sign_service_unavailable(client, monkeypatch, sign_service):
+    monkeypatch.setattr(sign_service, "is_available", lambda: False)
+    status, body = post(client, "/getCode", {"str": "data", "pwdstr": "00000000"})
+    assert (status, body["code"], body["msg"]) == (500, 500, "WebSocket 签名服务未正确初始化")
+
+
+def test_health_and_root(client, sign_service):
+    response = client.get("/health")
+    assert response.status_code == 200
+    body = body_of(response)
+    assert body["sign_status"] == "healthy"
+    assert [endpoint["url"] for endpoint in body["endpoints"]] == sign_service.ws_urls
+    response = client.get("/")
+    assert response.status_code == 200
+    assert body_of(response)["status"] == "running"
+
+
+def test_both_apps_return_the_same_responses(sign_service, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SAVE_FOLDER", str(tmp_path))
+    monkeypatch.setattr(flask_app, "sign_service", sign_service)
+    monkeypatch.setattr(asgi_app, "sign_service", sign_service)
+    clients = [flask_app.app.test_client(), TestClient(asgi_app.app)]
+    requests = [
+        ("/xml-files/add", {"filename": "b.xml", "xml": "<b/>"}),
+        ("/xml-files/add", {"xml": "<b/>"}),
+        ("/xml-files/list", {}),
+        ("/xml-files/delete", {"filename": "missing.xml"}),
+        ("/getCode", {"str": "same", "pwdstr": "00000000"}),
+        ("/getCode", {"pwdstr": "00000000"}),
+    ]
+    for path, data in requests:
+        flask_result, asgi_result = (post(client, path, data) for client in clients)
+        assert flask_result == asgi_result, path
+
+
+def test_add_large_file_decrypts_request_stream(client, tmp_path, monkeypatch):
+    import services.http_handlers as http_handlers
+
+    def buffered_decrypt(*args, **kwargs):
+        raise AssertionError("/xml-files/add 不应整体读取请求体后解密")
+
+    monkeypatch.setattr(http_handlers, "decrypt_request_body", buffered_decrypt)
+    xml = "<root>" + "<item>数据</item>" * 20000 + "</root>"
+    assert post(client, "/xml-files/add", {"filename": "big.xml", "xml": xml})[0] == 200
+    assert (tmp_path / "big.xml").read_text(encoding="utf-8") == xml
+
+
+def test_asgi_add_chunked_request_body(sign_service, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SAVE_FOLDER", str(tmp_path))
+    body = encrypt({"filename": "chunked.xml", "xml": "<a/>" * 10000}).encode("ascii")
+    chunks = (body[i:i + 4096] for i in range(0, len(body), 4096))
+    # 分块传输：没有 Content-Length，整体读取后解密
+    response = TestClient(asgi_app.app).post("/xml-files/add", content=chunks)
+    assert response.status_code == 200 and response.json()["data"] is True
+    assert (tmp_path / "chunked.xml").read_text(encoding="utf-8") == "<a/>" * 10000
+
+
+def test_list_pagination(client, tmp_path):
+    for i in range(5):
+        (tmp_path / f"{i}.xml").write_text(f"<a>{i}</a>", encoding="utf-8")
+    status, body = post(client, "/xml-files/list", {"limit": 2, "fields": "name"})
+    assert status == 200
+    assert decrypt(body["data"]) == {
+        "files": [{"filename": "0.xml"}, {"filename": "1.xml"}],
+        "total": 5,
+        "nextCursor": "1.xml",
+    }
+    status, body = post(client, "/xml-files/list", {"limit": 0})
+    assert (status, body["code"]) == (400, 500)
+
+
+def test_list_stream_matches_buffered_listing(client, tmp_path):
+    for i in range(50):
+        (tmp_path / f"{i:02d}.xml").write_text(f"<a>{'数据' * 200}{i}</a>", encoding="utf-8")
+    status, buffered = post(client, "/xml-files/list", {})
+    status_stream, streamed = post(client, "/xml-files/list", {"stream": True})
+    assert (status, status_stream) == (200, 200)
+    assert streamed == buffered
+    assert len(decrypt(streamed["data"])) == 50
+
+
+def test_list_stream_failure_before_response_returns_error(client, tmp_path, monkeypatch):
+    import services.xml_storage as xml_storage
+
+    def broken_index(save_folder):
+        raise PermissionError("目录不可读")
+
+    (tmp_path / "a.xml").write_text("<a/>", encoding="utf-8")
+    monkeypatch.setattr(xml_storage, "get_directory_index", broken_index)
+    status, body = post(client, "/xml-files/list", {"stream": True})
+    assert status == 500
+    assert body == {"code": 500, "msg": "查询失败: 目录不可读", "data": False}
+
+
+def test_xml_batch_add_and_delete(client, tmp_path):
+    status, body = post(client, "/xml-files/add-batch", [
+        {"filename": "a.xml", "xml": "<a/>"},
+        {"filename": "b", "xml": "<b/>"},
+        {"filename": "a.xml", "xml": "<dup/>"},
+    ])
+    assert status == 200 and body["code"] == 200
+    assert [item["code"] for item in decrypt(body["data"])] == [200, 200, 400]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.xml", "b.xml"]
+
+    status, body = post(client, "/xml-files/delete-batch", {"items": ["a.xml", "missing.xml"]})
+    assert status == 200
+    assert decrypt(body["data"]) == [
+        {"filename": "a.xml", "code": 200},
+        {"filename": "missing.xml", "code": 404, "msg": "文件不存在: missing.xml"},
+    ]
+    assert post(client, "/xml-files/add-batch", [])[0] == 400
+
+
+def test_getcode_batch(client):
+    status, body = post(client, "/getCode/batch", [
+        {"str": "a", "pwdstr": "00000000"},
+        {"str": "b"},
+        {"str": "", "pwdstr": "00000000"},
+        {"str": "c", "pwdstr": "00000000"},
+    ])
+    assert (status, body["code"], body["msg"]) == (200, 200, "成功")
+    items = decrypt(body["data"])
+    assert [item["code"] for item in items] == [200, 400, 500, 200]
+    assert items[0] == {"code": 200, "sign": hashlib.sha256(b"a").hexdigest(), "certNo": "FAKE-CERT-0001"}
+    assert items[3]["sign"] == hashlib.sha256(b"c").hexdigest()
+
+
+def test_getcode_batch_invalid_request(client, monkeypatch):
+    monkeypatch.setattr(config, "SIGN_BATCH_MAX_ITEMS", 2)
+    for data in ({"str": "a", "pwdstr": "00000000"}, [], [{"str": "a", "pwdstr": "0"}] * 3):
+        status, body = post(client, "/getCode/batch", data)
+        assert (status, body["code"], body["data"]) == (400, 400, False)
+
+
+def test_getcode_overloaded_returns_503(client, monkeypatch, sign_service):
+    from websocket_wrapper import SignOverloadedError
+
+    def overloaded(*args, **kwargs):
+        raise SignOverloadedError("签名队列已满（256）")
+
+    async def overloaded_async(*args, **kwargs):
+        overloaded()
+
+    monkeypatch.setattr(sign_service, "get_code", overloaded)
+    monkeypatch.setattr(sign_service, "get_code_async", overloaded_async)
+    status, body = post(client, "/getCode", {"str": "data", "pwdstr": "00000000", "priority": 1, "timeout": 2})
+    assert (status, body) == (503, {"code": 503, "msg": "签名队列已满（256）", "data": False})
+
+    status, body = post(client, "/getCode", {"str": "data", "pwdstr": "00000000", "timeout": -1})
+    assert (status, body["code"]) == (400, 400)
+
+
+def test_metrics_report_stage_timings(client):
+    import metrics_util
+
+    assert post(client, "/getCode", {"str": "metrics", "pwdstr": "00000000"})[0] == 200
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.get_data(as_text=True) if hasattr(response, "get_data") else response.text
+    for stage in ("getcode", "getcode.sign", "decrypt_request_body.aes", "ws.sign"):
+        assert f'sign_server_stage_seconds_count{{stage="{stage}"}}' in text
+
+
+def test_metrics_disabled(client, monkeypatch):
+    import metrics_util
+
+    monkeypatch.setattr(metrics_util, "_enabled", False)
+    response = client.get("/metrics")
+    assert (response.status_code, body_of(response)["msg"]) == (404, "监控指标未开启")
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""JSON 编解码测试（各实现的输出与标准库逐字节一致）"""
+import importlib.util
+import json
+
+import pytest
+
+import json_util
+
+XML = '<?xml version="1.0" encoding="UTF-8"?>\n<ceb:Order>婴儿奶粉 "A&B" \\   \U0001f600</ceb:Order>' * 40
+
+OBJECTS = [
+    [{"filename": f"CEB311_{i}.xml", "xml": XML, "size": i, "ok": True, "etag": None} for i in range(5)],
+    {"total": 2, "items": [{"filename": "a.xml", "xml": XML, "mtime": 1.5}], "cursor": None},
+    {"filename": "a.xml", "xml": XML, 1: "非字符串键", "tags": ("x", "y")},
+    {"code": 200, "msg": "成功", "data": "ABCDEF" * 100, "big": 2 ** 70, "neg": -2 ** 64, "nan": float("nan")},
+    {"str": json_util._PROBE, "pwdstr": "88888888", "priority": 3, "timeout": 0.25},
+    [],
+    "纯字符串",
+]
+
+LOADS = [
+    '{"str": "<a/>", "pwdstr": "1"}',
+    '{"id": 123456789012345678901234567890, "neg": -18446744073709551616, "max": 18446744073709551615}',
+    '{"timeout": 0.1, "limit": 1e3, "tiny": 5e-324}',
+    '{"x": NaN, "y": [Infinity, -Infinity]}',
+    '["\\u4e2d\\u6587", "\\ud83d\\ude00", null, true, false]',
+]
+
+
+@pytest.fixture(params=["json", "orjson", "msgspec"])
+def codec(request, monkeypatch):
+    if request.param != "json" and importlib.util.find_spec(request.param) is None:
+        pytest.skip(f"未安装 {request.param}")
+    monkeypatch.setattr(json_util, "_codec", json_util._create_codec(request.param))
+    assert json_util.codec_name() == request.param
+    return request.param
+
+
+@pytest.mark.parametrize("obj", OBJECTS)
+def test_dumps_matches_stdlib(codec, obj):
+    assert json_util.dumps(obj) == json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+@pytest.mark.parametrize("obj", OBJECTS)
+@pytest.mark.parametrize("sort_keys", [False, True])
+def test_dumps_compact_matches_stdlib(codec, obj, sort_keys):
+    if sort_keys and isinstance(obj, dict) and 1 in obj:
+        pytest.skip("标准库不能对混合类型的键排序")
+    expected = json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys).encode("utf-8")
+    assert json_util.dumps_compact(obj, sort_keys=sort_keys) == expected
+
+
+@pytest.mark.parametrize("data", LOADS)
+def test_loads_matches_stdlib(codec, data):
+    expected = json.loads(data)
+    for value in (data, data.encode("utf-8")):
+        result = json_util.loads(value)
+        assert json.dumps(result) == json.dumps(expected)
+
+
+def test_loads_keeps_big_integers_exact(codec):
+    result = json_util.loads('{"id": 123456789012345678901234567890}')
+    assert result["id"] == 123456789012345678901234567890 and type(result["id"]) is int
+
+
+def test_loads_rejects_invalid_json(codec):
+    with pytest.raises(json.JSONDecodeError):
+        json_util.loads('{"str": ')
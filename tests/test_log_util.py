@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""log_util 报文日志测试：脱敏、截断与采样"""
+import json
+import logging
+
+import config
+from log_util import PayloadPreview, log_payload, redact
+
+
+def test_redact_masks_password_fields():
+    payload = json.dumps({"str": "data", "pwdstr": "12345678", "Password": "secret"})
+    text = redact(payload)
+    assert "12345678" not in text and "secret" not in text
+    assert '"pwdstr": "***"' in text and '"str": "data"' in text
+
+
+def test_preview_redacts_before_truncating():
+    # 超长的密码字段跨过截断位置：先截断再脱敏会漏出密码的前半段
+    payload = '{"str": "data", "pwdstr": "' + "S" * 500 + '"}'
+    text = str(PayloadPreview(payload, max_chars=60))
+    assert "S" not in text
+    assert text.startswith('{"str": "data", "pwdstr": "***"}')
+
+
+def test_preview_truncates_long_payload():
+    text = str(PayloadPreview("x" * 300, max_chars=100))
+    assert text == "x" * 100 + "...(已截断)"
+
+
+def test_log_payload_respects_sample_rate(caplog, monkeypatch):
+    log = logging.getLogger("test_log_util")
+    payload = json.dumps({"pwdstr": "12345678"})
+    with caplog.at_level(logging.INFO, logger="test_log_util"):
+        monkeypatch.setattr(config, "LOG_PAYLOAD_SAMPLE_RATE", 0)
+        log_payload(log, "请求报文", payload)
+        assert not caplog.records
+        monkeypatch.setattr(config, "LOG_PAYLOAD_SAMPLE_RATE", 1)
+        log_payload(log, "请求报文", payload)
+    assert len(caplog.records) == 1
+    message = caplog.records[0].getMessage()
+    assert "12345678" not in message and '"***"' in message
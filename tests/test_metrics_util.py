@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""监控指标测试：直方图分桶、Prometheus 文本输出与关闭采集"""
+import asyncio
+
+import metrics_util
+from metrics_util import Histogram, Registry
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram("demo_seconds", stage="x")
+    for value in (0.001, 0.02, 0.02, 3.0, 100.0):
+        histogram.observe(value)
+    lines = registry.render().splitlines()
+    assert 'demo_seconds_bucket{stage="x",le="0.001"} 1' in lines
+    assert 'demo_seconds_bucket{stage="x",le="0.025"} 3' in lines
+    assert 'demo_seconds_bucket{stage="x",le="5"} 4' in lines
+    assert 'demo_seconds_bucket{stage="x",le="+Inf"} 5' in lines
+    assert 'demo_seconds_count{stage="x"} 5' in lines
+
+
+def test_counters_and_callbacks_render():
+    registry = Registry()
+    registry.counter("connects_total", endpoint="ws://a").inc()
+    registry.counter("connects_total", endpoint="ws://a").inc()
+    registry.register_callback("queue_depth", "gauge", "排队数", lambda: [({}, 3)])
+    registry.register_callback("broken", "gauge", "出错的回调不影响其他指标", lambda: 1 / 0)
+    text = registry.render()
+    assert 'connects_total{endpoint="ws://a"} 2' in text
+    assert "# TYPE queue_depth gauge\nqueue_depth 3\n" in text
+    assert "broken" not in text
+
+
+def test_timed_records_sync_and_async_functions():
+    @metrics_util.timed("test.sync")
+    def sync():
+        return 1
+
+    @metrics_util.timed("test.async")
+    async def coroutine():
+        return 2
+
+    assert sync() == 1 and asyncio.run(coroutine()) == 2
+    text = metrics_util.render()
+    assert 'sign_server_stage_seconds_count{stage="test.sync"}' in text
+    assert 'sign_server_stage_seconds_count{stage="test.async"}' in text
+
+
+def test_disabled_metrics_record_nothing(monkeypatch):
+    monkeypatch.setattr(metrics_util, "_enabled", False)
+    metrics_util.observe_stage("test.disabled", 0.1)
+    assert "test.disabled" not in metrics_util.render()
+    assert not isinstance(metrics_util._stage_histograms.get("test.disabled"), Histogram)
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""生产环境启动入口测试：工作进程数固定为 1、默认服务器选择与 gunicorn 参数"""
+import sys
+
+import pytest
+
+import config
+import serve
+
+
+def test_workers_are_pinned_to_one(caplog):
+    assert serve._single_owner_workers(1) == 1
+    with caplog.at_level("WARNING", logger="serve"):
+        assert serve._single_owner_workers(4) == 1
+    assert "工作进程数 4 已改为 1" in caplog.text
+
+
+@pytest.mark.parametrize("platform, expected", [("win32", "waitress"), ("linux", "gunicorn")])
+def test_auto_server_depends_on_platform(monkeypatch, platform, expected):
+    monkeypatch.setattr(config, "SERVER", "auto", raising=False)
+    monkeypatch.setattr(sys, "platform", platform)
+    assert serve._default_server() == expected
+
+
+def test_configured_server_is_used(monkeypatch):
+    monkeypatch.setattr(config, "SERVER", "waitress", raising=False)
+    monkeypatch.setattr(sys, "platform", "linux")
+    assert serve._default_server() == "waitress"
+
+
+def test_gunicorn_runs_one_gthread_worker(monkeypatch):
+    base = pytest.importorskip("gunicorn.app.base")
+    captured = {}
+
+    def fake_run(self):
+        captured.update(self.options)
+
+    monkeypatch.setattr(base.BaseApplication, "run", fake_run)
+    serve.run_gunicorn("127.0.0.1", 8801, workers=8, threads=32, keepalive=75)
+    assert captured["workers"] == 1
+    assert (captured["worker_class"], captured["threads"], captured["keepalive"]) == ("gthread", 32, 75)
+    assert captured["bind"] == "127.0.0.1:8801"
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""签名结果缓存测试：单飞合并、LRU/TTL、按证书号失效，以及接入 WebSocketWrapper 后的行为"""
+import asyncio
+
+import pytest
+
+import websocket_wrapper
+from benchmarks.fake_signer_server import FakeSignerServer
+from sign_cache import SignCache
+from websocket_wrapper import WebSocketWrapper
+
+
+class CountingSigner:
+    """记录调用次数的签名协程，返回固定证书号"""
+
+    def __init__(self, cert_no: str = "CERT-A", delay: float = 0.0) -> None:
+        self.cert_no = cert_no
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self, data: str):
+        async def sign() -> dict:
+            self.calls += 1
+            await asyncio.sleep(self.delay)
+            return {"sign": f"sign-{data}", "cert_no": self.cert_no}
+        return sign
+
+
+def test_concurrent_calls_share_one_signing():
+    async def main():
+        cache = SignCache(16)
+        signer = CountingSigner(delay=0.05)
+        results = await asyncio.gather(*(
+            cache.get_or_sign("data", "pwd", [], signer("data")) for _ in range(5)
+        ))
+        assert signer.calls == 1
+        assert results == [{"sign": "sign-data", "cert_no": "CERT-A"}] * 5
+        assert (cache.misses, cache.coalesced) == (1, 4)
+
+        # 已缓存：当前证书号下再次请求直接命中
+        assert await cache.get_or_sign("data", "pwd", ["CERT-A"], signer("data")) == results[0]
+        assert (signer.calls, cache.hits) == (1, 1)
+
+    asyncio.run(main())
+
+
+def test_different_password_does_not_hit():
+    async def main():
+        cache = SignCache(16)
+        signer = CountingSigner()
+        await cache.get_or_sign("data", "pwd", [], signer("data"))
+        await cache.get_or_sign("data", "other", ["CERT-A"], signer("data"))
+        assert signer.calls == 2
+
+    asyncio.run(main())
+
+
+def test_entries_expire_after_ttl():
+    async def main():
+        cache = SignCache(16, ttl_seconds=0.05)
+        signer = CountingSigner()
+        await cache.get_or_sign("data", "pwd", [], signer("data"))
+        await cache.get_or_sign("data", "pwd", ["CERT-A"], signer("data"))
+        assert signer.calls == 1
+        await asyncio.sleep(0.1)
+        await cache.get_or_sign("data", "pwd", ["CERT-A"], signer("data"))
+        assert signer.calls == 2
+
+    asyncio.run(main())
+
+
+def test_least_recently_used_entry_is_evicted():
+    async def main():
+        cache = SignCache(2)
+        signer = CountingSigner()
+        for data in ("a", "b"):
+            await cache.get_or_sign(data, "pwd", [], signer(data))
+        await cache.get_or_sign("a", "pwd", ["CERT-A"], signer("a"))  # a 变为最近使用
+        await cache.get_or_sign("c", "pwd", ["CERT-A"], signer("c"))  # 淘汰 b
+        assert (signer.calls, cache.evictions) == (3, 1)
+        await cache.get_or_sign("a", "pwd", ["CERT-A"], signer("a"))
+        assert signer.calls == 3
+        await cache.get_or_sign("b", "pwd", ["CERT-A"], signer("b"))
+        assert signer.calls == 4
+
+    asyncio.run(main())
+
+
+def test_changed_certificate_invalidates_entries():
+    async def main():
+        cache = SignCache(16)
+        old_card = CountingSigner("CERT-OLD")
+        await cache.get_or_sign("data", "pwd", [], old_card("data"))
+        new_card = CountingSigner("CERT-NEW")
+        result = await cache.get_or_sign("data", "pwd", ["CERT-NEW"], new_card("data"))
+        assert new_card.calls == 1 and result["cert_no"] == "CERT-NEW"
+
+    asyncio.run(main())
+
+
+def test_failed_signing_is_not_cached_and_reaches_every_waiter():
+    async def main():
+        cache = SignCache(16)
+        calls = 0
+
+        async def failing():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.02)
+            raise RuntimeError("卡片错误")
+
+        results = await asyncio.gather(
+            *(cache.get_or_sign("data", "pwd", [], failing) for _ in range(3)), return_exceptions=True
+        )
+        assert calls == 1
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert cache.status()["entries"] == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_caller_does_not_cancel_coalesced_waiters():
+    async def main():
+        cache = SignCache(16)
+        signer = CountingSigner(delay=0.05)
+        first = asyncio.ensure_future(cache.get_or_sign("data", "pwd", [], signer("data")))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(cache.get_or_sign("data", "pwd", [], signer("data")))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == {"sign": "sign-data", "cert_no": "CERT-A"}
+        assert first.cancelled()
+        assert signer.calls == 1
+
+    asyncio.run(main())
+
+
+def test_cancelled_signing_is_not_propagated_as_cancellation():
+    async def main():
+        cache = SignCache(16)
+
+        async def cancelled_sign():
+            await asyncio.sleep(0.01)
+            raise asyncio.CancelledError()
+
+        waiters = [asyncio.ensure_future(cache.get_or_sign("data", "pwd", [], cancelled_sign)) for _ in range(2)]
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert not any(waiter.cancelled() for waiter in waiters)
+
+    asyncio.run(main())
+
+
+@pytest.fixture
+def signer():
+    server = FakeSignerServer(latency=0.02, workers=8).start()
+    yield server
+    server.stop()
+
+
+def test_wrapper_uses_cache_when_enabled(signer, monkeypatch):
+    monkeypatch.setattr(websocket_wrapper, "_config_value", lambda name, default: {
+        "SIGN_CACHE_MAX_ENTRIES": 16,
+    }.get(name, default))
+    wrapper = WebSocketWrapper(signer.url)
+    try:
+        results = wrapper.get_codes([("same", "00000000")] * 4)
+        assert len(set(results)) == 1
+        assert wrapper.get_code("same", "00000000") == results[0]
+        status = wrapper.cache_status()
+        assert (status["misses"], status["hits"] + status["coalesced"]) == (1, 4)
+        assert wrapper.endpoint_status()[0]["cert_no"] == "FAKE-CERT-0001"
+    finally:
+        wrapper.stop()
+
+
+def test_wrapper_cache_disabled_by_default(signer):
+    wrapper = WebSocketWrapper(signer.url)
+    try:
+        assert wrapper.get_code("same", "00000000")
+        assert wrapper.cache is None and wrapper.cache_status() is None
+    finally:
+        wrapper.stop()
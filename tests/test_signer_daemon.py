@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""签名守护进程与客户端测试（本机 IPC + 本地模拟签名服务）"""
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+from benchmarks.fake_signer_server import FakeSignerServer
+from signer_client import SignerClient
+from signer_daemon import SignerDaemon
+from websocket_wrapper import SignOverloadedError, WebSocketWrapper
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="测试使用 Unix 域套接字")
+
+
+@pytest.fixture
+def signer():
+    server = FakeSignerServer(latency=0.001, workers=8).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def daemon(signer, tmp_path):
+    wrapper = WebSocketWrapper(signer.url)
+    wrapper.start()
+    daemon = SignerDaemon(wrapper, address=str(tmp_path / "signer.sock"), authkey=b"secret")
+    # 监听线程阻塞在 accept 中，随测试进程退出
+    threading.Thread(target=daemon.serve_forever, daemon=True).start()
+    while not os.path.exists(daemon.address):
+        pass
+    yield daemon
+    daemon.stop()
+    wrapper.stop()
+
+
+@pytest.fixture
+def client(daemon):
+    client = SignerClient(daemon.address, authkey=b"secret")
+    yield client
+    client.stop()
+
+
+def test_sign_through_daemon(client):
+    assert client.get_code("data", "00000000").endswith("||FAKE-CERT-0001")
+    results = client.get_codes([(f"data-{i}", "00000000") for i in range(500)] + [("", "00000000")])
+    assert all(isinstance(r, str) for r in results[:-1])
+    assert not isinstance(results[-1], str)
+
+
+def test_async_calls(client):
+    async def main():
+        return await asyncio.gather(*(client.get_code_async(f"data-{i}", "00000000") for i in range(100)))
+
+    assert all(r.endswith("||FAKE-CERT-0001") for r in asyncio.run(main()))
+
+
+def test_daemon_requests_go_through_admission(client, daemon, signer):
+    # 守护进程中的请求与进程内调用一样受队列深度限制，而不是在守护进程中无限排队
+    signer.latency = 0.05
+    wrapper = daemon.sign_service
+    wrapper.max_in_flight = 1
+    wrapper.queue_max_depth = 2
+
+    async def burst():
+        return await asyncio.gather(
+            *(client.get_code_async(f"data-{i}", "00000000") for i in range(100)), return_exceptions=True
+        )
+
+    results = asyncio.run(burst())
+    assert sum(isinstance(r, SignOverloadedError) for r in results) >= 90
+    assert client.queue_status()["shed"] >= 90
+
+
+def test_status_is_shared_and_bounded(client, tmp_path):
+    assert client.endpoint_status()[0]["healthy"]
+    first = client._status_cache
+    client.cache_status()
+    client.queue_status()
+    assert client._status_cache is first
+
+    unreachable = SignerClient(str(tmp_path / "missing.sock"))
+    assert unreachable.endpoint_status() == []
+    assert unreachable.queue_status() == {}
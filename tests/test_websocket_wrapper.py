@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+"""WebSocketWrapper 签名与准入控制测试（使用 benchmarks 中的本地模拟签名服务）"""
+import asyncio
+import hashlib
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import config
+import websocket_wrapper
+from benchmarks.fake_signer_server import FakeSignerServer
+from websocket_wrapper import SignOverloadedError, WebSocketError, WebSocketTimeoutError, WebSocketWrapper
+
+
+class DelayedSigner(FakeSignerServer):
+    """按待签名数据额外延迟响应的模拟签名服务（用于制造乱序与迟到的响应）"""
+
+    def __init__(self, delays: dict, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.delays = delays
+
+    async def _sign(self, websocket, request: dict) -> None:
+        await asyncio.sleep(self.delays.get(request.get("args", {}).get("inData"), 0))
+        await super()._sign(websocket, request)
+
+
+def expected_sign(data: str) -> str:
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+@pytest.fixture
+def signer():
+    server = FakeSignerServer(latency=0.001, workers=8).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def wrapper(signer):
+    wrapper = WebSocketWrapper(signer.url)
+    wrapper.start()
+    yield wrapper
+    wrapper.stop()
+
+
+def test_get_code(wrapper):
+    sign, cert_no = wrapper.get_code("data", "00000000").split("||")
+    assert sign == expected_sign("data") and cert_no == "FAKE-CERT-0001"
+
+
+def test_concurrent_requests_share_one_connection(signer):
+    signer.latency = 0.1
+    wrapper = WebSocketWrapper(signer.url, max_in_flight=8)
+    try:
+        wrapper.get_code("warm-up", "00000000")
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda i: wrapper.get_code(f"data-{i}", "00000000"), range(8)))
+        elapsed = time.monotonic() - started
+    finally:
+        wrapper.stop()
+    # 8 个请求在同一连接上同时在途，总耗时接近一次签名而不是八次
+    assert elapsed < 0.5
+    assert [result.split("||")[0] for result in results] == [expected_sign(f"data-{i}") for i in range(8)]
+
+
+def test_out_of_order_responses_go_to_their_requests():
+    server = DelayedSigner({"first": 0.2}, latency=0.001, workers=8).start()
+    wrapper = WebSocketWrapper(server.url)
+    try:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            first = executor.submit(wrapper.get_code, "first", "00000000")
+            time.sleep(0.05)
+            others = [executor.submit(wrapper.get_code, f"other-{i}", "00000000") for i in range(3)]
+            assert [f.result().split("||")[0] for f in others] == [expected_sign(f"other-{i}") for i in range(3)]
+            assert first.result().split("||")[0] == expected_sign("first")
+    finally:
+        wrapper.stop()
+        server.stop()
+
+
+def test_late_reply_for_timed_out_request_is_dropped(monkeypatch):
+    monkeypatch.setattr(websocket_wrapper, "RESPONSE_TIMEOUT", 0.5)
+    server = DelayedSigner({"slow": 0.7, "other": 0.35}, latency=0.001, workers=8).start()
+    wrapper = WebSocketWrapper(server.url)
+    try:
+        with pytest.raises(WebSocketTimeoutError, match="超时"):
+            wrapper.get_code("slow", "00000000")
+        # "slow" 的响应在 "other" 等待期间迟到，不能被当作 "other" 的签名
+        assert wrapper.get_code("other", "00000000").split("||")[0] == expected_sign("other")
+    finally:
+        wrapper.stop()
+        server.stop()
+
+
+def test_max_in_flight_limits_requests_on_the_connection(signer):
+    signer.latency = 0.05
+    wrapper = WebSocketWrapper(signer.url, max_in_flight=2)
+    active = []
+    peak = []
+    lock = threading.Lock()
+    original = wrapper._get_sign_with_connection
+
+    async def counted(*args, **kwargs):
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        try:
+            return await original(*args, **kwargs)
+        finally:
+            with lock:
+                active.pop()
+
+    wrapper._get_sign_with_connection = counted
+    try:
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            results = list(executor.map(lambda i: wrapper.get_code(f"data-{i}", "00000000"), range(6)))
+    finally:
+        wrapper.stop()
+    assert len(results) == 6 and max(peak) == 2
+
+
+class ClosingSigner(FakeSignerServer):
+    """可以从服务端主动关闭所有连接的模拟签名服务"""
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.connections = set()
+
+    async def _handler(self, websocket) -> None:
+        self.connections.add(websocket)
+        try:
+            await super()._handler(websocket)
+        finally:
+            self.connections.discard(websocket)
+
+    def close_connections(self) -> None:
+        async def close_all():
+            for websocket in list(self.connections):
+                await websocket.close()
+        asyncio.run_coroutine_threadsafe(close_all(), self._loop).result(timeout=5)
+
+
+def test_loop_thread_persists_between_requests(wrapper):
+    wrapper.get_code("first", "00000000")
+    endpoint = wrapper.endpoints[0]
+    loop, thread, websocket = wrapper.loop, wrapper._loop_thread, endpoint.websocket
+    wrapper.get_code("second", "00000000")
+    assert wrapper.loop is loop and wrapper._loop_thread is thread and thread.is_alive()
+    # 连接在请求之间复用
+    assert endpoint.websocket is websocket and endpoint.connected
+
+
+def test_stop_joins_loop_thread_and_get_code_restarts_it(signer):
+    wrapper = WebSocketWrapper(signer.url)
+    wrapper.start()
+    wrapper.get_code("data", "00000000")
+    thread = wrapper._loop_thread
+    wrapper.stop()
+    assert not thread.is_alive() and wrapper.loop is None and not wrapper.endpoints[0].connected
+    try:
+        # 未调用 start() 时自动启动后台事件循环
+        assert wrapper.get_code("again", "00000000").split("||")[0] == expected_sign("again")
+        assert wrapper._loop_thread is not thread and wrapper._loop_thread.is_alive()
+    finally:
+        wrapper.stop()
+
+
+def test_idle_connection_closed_by_server_is_noticed():
+    server = ClosingSigner(latency=0.001, workers=8).start()
+    wrapper = WebSocketWrapper(server.url)
+    wrapper.start()
+    try:
+        wrapper.get_code("first", "00000000")
+        server.close_connections()
+        # 事件循环在请求间隙继续运行，关闭帧无需等到下一次请求就被处理
+        deadline = time.monotonic() + 2
+        while wrapper.endpoints[0].connected and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not wrapper.endpoints[0].connected
+        assert wrapper.get_code("second", "00000000").split("||")[0] == expected_sign("second")
+    finally:
+        wrapper.stop()
+        server.stop()
+
+
+def unused_url() -> str:
+    """一个没有服务监听的本地地址（模拟无法连接的签名端点）"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"ws://127.0.0.1:{port}"
+
+
+def test_requests_spread_across_endpoints():
+    servers = [FakeSignerServer(latency=0.1, workers=8).start() for _ in range(2)]
+    wrapper = WebSocketWrapper([server.url for server in servers], max_in_flight=2)
+    try:
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda i: wrapper.get_code(f"data-{i}", "00000000"), range(4)))
+        elapsed = time.monotonic() - started
+        status = wrapper.endpoint_status()
+    finally:
+        wrapper.stop()
+        for server in servers:
+            server.stop()
+    assert [result.split("||")[0] for result in results] == [expected_sign(f"data-{i}") for i in range(4)]
+    # 每个端点最多 2 个在途请求，4 个请求同时分布在两个端点上
+    assert [endpoint["signed"] for endpoint in status] == [2, 2]
+    assert elapsed < 0.35
+
+
+def test_failed_endpoint_is_ejected_and_readmitted(signer):
+    dead_url = unused_url()
+    wrapper = WebSocketWrapper([dead_url, signer.url])
+    wrapper.eject_seconds = 0.3
+    try:
+        # 第一个请求先选中无法连接的端点，重试时换到另一个端点
+        for i in range(3):
+            assert wrapper.get_code(f"data-{i}", "00000000").split("||")[0] == expected_sign(f"data-{i}")
+        dead, alive = wrapper.endpoint_status()
+        assert dead["url"] == dead_url and not dead["healthy"] and dead["failures"] == 1 and dead["last_error"]
+        assert alive["healthy"] and alive["signed"] == 3
+        time.sleep(0.35)
+        # 冷却结束后重新接纳
+        assert wrapper.endpoint_status()[0]["healthy"]
+    finally:
+        wrapper.stop()
+
+
+def test_only_endpoint_unreachable_raises():
+    wrapper = WebSocketWrapper(unused_url())
+    try:
+        with pytest.raises(WebSocketError):
+            wrapper.get_code("data", "00000000")
+        assert not wrapper.endpoint_status()[0]["healthy"]
+    finally:
+        wrapper.stop()
+
+
+def test_start_warms_up_every_endpoint():
+    servers = [FakeSignerServer(latency=0.001, workers=8).start() for _ in range(2)]
+    dead_url = unused_url()
+    wrapper = WebSocketWrapper([server.url for server in servers] + [dead_url])
+    try:
+        # start() 返回前完成连接和握手；无法连接的端点被剔除，但不会让 start() 失败
+        wrapper.start()
+        status = wrapper.endpoint_status()
+        assert [endpoint["connected"] for endpoint in status] == [True, True, False]
+        assert [endpoint["healthy"] for endpoint in status] == [True, True, False]
+        assert all(endpoint["signed"] == 0 for endpoint in status)
+    finally:
+        wrapper.stop()
+        for server in servers:
+            server.stop()
+
+
+def test_heartbeat_replaces_dropped_connection_without_a_request():
+    server = ClosingSigner(latency=0.001, workers=8).start()
+    wrapper = WebSocketWrapper(server.url)
+    wrapper.heartbeat_interval = 0.1
+    try:
+        wrapper.start()
+        endpoint = wrapper.endpoints[0]
+        websocket = endpoint.websocket
+        assert websocket is not None
+        server.close_connections()
+        deadline = time.monotonic() + 2
+        while not (endpoint.connected and endpoint.websocket is not websocket) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        # 心跳任务在空闲时发现连接关闭并重新建立连接，签名请求直接使用新连接
+        assert endpoint.connected and endpoint.websocket is not websocket
+        assert len(server.connections) == 1
+        assert wrapper.get_code("data", "00000000").split("||")[0] == expected_sign("data")
+    finally:
+        wrapper.stop()
+        server.stop()
+
+
+def test_full_size_batch_is_not_shed(wrapper):
+    items = [(f"data-{i}", "00000000") for i in range(config.SIGN_BATCH_MAX_ITEMS)]
+    assert config.SIGN_BATCH_MAX_ITEMS > wrapper.queue_max_depth
+
+    results = wrapper.get_codes(items)
+
+    assert [r for r in results if not isinstance(r, str)] == []
+    assert wrapper.queue_status()["shed"] == 0
+
+
+def test_full_size_batch_async(wrapper):
+    items = [(f"data-{i}", "00000000") for i in range(config.SIGN_BATCH_MAX_ITEMS)]
+
+    results = asyncio.run(wrapper.get_codes_async(items))
+
+    assert all(isinstance(r, str) for r in results)
+    assert wrapper.queue_status()["shed"] == 0
+
+
+def test_batch_timeout_starts_when_item_is_submitted(signer):
+    # 卡片较慢：整个批次的耗时远超 timeout，但每条从提交到获得名额都不需要等待
+    signer.latency = 0.02
+    wrapper = WebSocketWrapper(signer.url, max_in_flight=2)
+    wrapper.start()
+    try:
+        results = wrapper.get_codes([(f"data-{i}", "00000000") for i in range(40)], timeout=0.1)
+    finally:
+        wrapper.stop()
+    assert all(isinstance(r, str) for r in results)
+
+
+def test_queue_full_is_shed(signer):
+    signer.latency = 0.05
+    wrapper = WebSocketWrapper(signer.url, max_in_flight=1)
+    wrapper.queue_max_depth = 2
+    wrapper.start()
+    try:
+        async def burst():
+            return await asyncio.gather(
+                *(wrapper.get_code_async(f"data-{i}", "00000000") for i in range(6)),
+                return_exceptions=True,
+            )
+        results = asyncio.run(burst())
+    finally:
+        wrapper.stop()
+    assert sum(isinstance(r, SignOverloadedError) for r in results) == 3
+    assert sum(isinstance(r, str) for r in results) == 3
+
+
+def test_all_endpoints_ejected_tries_least_recently_ejected(signer):
+    other = FakeSignerServer(latency=0.001, workers=4).start()
+    wrapper = WebSocketWrapper([other.url, signer.url])
+    try:
+        now = time.monotonic()
+        wrapper.endpoints[0].ejected_until = now + 60
+        wrapper.endpoints[1].ejected_until = now + 30
+        assert wrapper.get_code("data", "00000000").split("||")[0] == expected_sign("data")
+        first, second = wrapper.endpoint_status()
+        # 最早被剔除（冷却最先结束）的端点被试用，签名成功后立即恢复接纳
+        assert second["signed"] == 1 and second["healthy"]
+        assert first["signed"] == 0 and not first["healthy"]
+    finally:
+        wrapper.stop()
+        other.stop()
+
+
+def test_queued_request_moves_to_endpoint_when_cooldown_ends():
+    slow = DelayedSigner({"slow": 1.0}, latency=0.001, workers=4).start()
+    fast = FakeSignerServer(latency=0.001, workers=4).start()
+    wrapper = WebSocketWrapper([slow.url, fast.url], max_in_flight=1)
+    try:
+        wrapper.start()
+        wrapper.endpoints[1].ejected_until = time.monotonic() + 0.2
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            blocked = executor.submit(wrapper.get_code, "slow", "00000000")
+            time.sleep(0.05)
+            started = time.monotonic()
+            # 唯一未被剔除的端点满载，请求排队；另一个端点冷却结束时排队的请求被唤醒并改用它
+            assert executor.submit(wrapper.get_code, "quick", "00000000").result().split("||")[0] == \
+                expected_sign("quick")
+            assert time.monotonic() - started < 0.6
+            blocked.result()
+    finally:
+        wrapper.stop()
+        slow.stop()
+        fast.stop()
+
+
+def test_evicted_waiter_leaves_queue_count_in_the_same_step(signer):
+    wrapper = WebSocketWrapper(signer.url, max_in_flight=1)
+    wrapper.queue_max_depth = 1
+
+    async def scenario():
+        endpoint = await wrapper._acquire_endpoint()
+        low = asyncio.ensure_future(wrapper._acquire_endpoint(priority=0))
+        await asyncio.sleep(0)
+        high = asyncio.ensure_future(wrapper._acquire_endpoint(priority=5))
+        await asyncio.sleep(0)
+        # high 挤出 low：low 还没有恢复执行，排队数也不超过上限
+        depth = wrapper.queue_status()["queued"]
+        with pytest.raises(SignOverloadedError):
+            await low
+        await wrapper._release_endpoint(endpoint)
+        await wrapper._release_endpoint(await high)
+        return depth, wrapper.queue_status()["queued"]
+
+    try:
+        loop = wrapper._get_or_create_loop()
+        assert asyncio.run_coroutine_threadsafe(scenario(), loop).result(timeout=5) == (1, 0)
+    finally:
+        wrapper.stop()
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""变更订阅测试（cursor 续读、分页与 reset，日志在线压缩，订阅状态的数量上限与关闭）"""
+import os
+import threading
+import time
+
+import pytest
+
+import config
+from services import xml_changes
+from services.xml_changes import CHANGES_NAME, close_change_feeds, compact_changes, get_change_feed, trim_changes
+from services.xml_storage import create_storage
+
+
+@pytest.fixture(params=["filesystem", "sqlite"])
+def storage(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "XML_CHANGE_FEED", True, raising=False)
+    return create_storage(str(tmp_path), request.param)
+
+
+def _changes(storage, since, limit=100):
+    result = storage.changes(since, limit)
+    return result, [(event["op"], event["filename"]) for event in result["events"]]
+
+
+def test_cursor_resumes_after_last_event(storage):
+    start = storage.changes(None, 100)
+    assert start["events"] == [] and not start["reset"] and not start["more"]
+
+    storage.save("a.xml", "<a/>")
+    storage.save_many([("b.xml", "<b/>"), ("c.xml", "<c/>")])
+    storage.delete("a.xml")
+    result, events = _changes(storage, start["cursor"])
+    assert events == [("save", "a.xml"), ("save", "b.xml"), ("save", "c.xml"), ("delete", "a.xml")]
+    assert result["cursor"] == result["events"][-1]["seq"] and not result["more"] and not result["reset"]
+    assert [event["seq"] for event in result["events"]] == sorted({event["seq"] for event in result["events"]})
+    assert result["events"][0]["size"] > 0 and "size" not in result["events"][-1]
+
+    # 没有新事件时 cursor 不变
+    assert _changes(storage, result["cursor"]) == ({"events": [], "cursor": result["cursor"], "more": False,
+                                                    "reset": False}, [])
+    storage.save("d.xml", "<d/>")
+    assert _changes(storage, result["cursor"])[1] == [("save", "d.xml")]
+
+
+def test_limit_pages_through_events(storage):
+    cursor = storage.changes(None, 100)["cursor"]
+    storage.save_many([(f"doc_{i}.xml", "<doc/>") for i in range(5)])
+    names = []
+    while True:
+        result, events = _changes(storage, cursor, limit=2)
+        names += [name for _, name in events]
+        cursor = result["cursor"]
+        if not result["more"]:
+            break
+    assert names == [f"doc_{i}.xml" for i in range(5)]
+
+
+def test_unknown_cursor_resets(storage):
+    storage.save("a.xml", "<a/>")
+    current = storage.changes(None, 100)["cursor"]
+    result = storage.changes(current + 10 ** 6, 100)
+    assert result["reset"] and result["events"] == [] and result["cursor"] == current
+    assert not storage.changes(current, 100)["reset"]
+
+
+def test_trimmed_log_resets_old_cursors(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "XML_CHANGE_FEED", True, raising=False)
+    storage = create_storage(str(tmp_path), "filesystem")
+    start = storage.changes(None, 100)["cursor"]
+    storage.save("a.xml", "<a/>")
+    current = storage.changes(None, 100)["cursor"]
+    # since 不在某一行的结束位置
+    assert storage.changes(current - 1, 100)["reset"]
+
+    trim_changes(str(tmp_path))
+    assert storage.changes(start, 100)["reset"]
+    result = storage.changes(current, 100)
+    assert not result["reset"] and result["events"] == []
+    storage.save("b.xml", "<b/>")
+    assert _changes(storage, current)[1] == [("save", "b.xml")]
+
+
+def test_log_is_compacted_online_keeping_sequence(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "XML_CHANGE_FEED", True, raising=False)
+    monkeypatch.setattr(config, "XML_CHANGES_MAX_BYTES", 2000, raising=False)
+    monkeypatch.setattr(config, "XML_CHANGES_RETAIN", 5, raising=False)
+    storage = create_storage(str(tmp_path), "filesystem")
+    start = storage.changes(None, 100)["cursor"]
+    cursors = []
+    for i in range(60):
+        storage.save(f"doc_{i:02d}.xml", "<doc/>")
+        cursors.append(storage.changes(None, 100)["cursor"])
+    assert os.path.getsize(tmp_path / CHANGES_NAME) <= 2000
+
+    # 保留范围内的 cursor 继续有效，序号不变；更早的 cursor 收到 reset
+    assert storage.changes(start, 100)["reset"]
+    result, events = _changes(storage, cursors[-3])
+    assert not result["reset"] and events == [("save", "doc_58.xml"), ("save", "doc_59.xml")]
+    assert [event["seq"] for event in result["events"]] == cursors[-2:]
+
+
+def test_compact_keeps_latest_events(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "XML_CHANGE_FEED", True, raising=False)
+    storage = create_storage(str(tmp_path), "filesystem")
+    storage.save_many([(f"doc_{i}.xml", "<doc/>") for i in range(10)])
+    before = storage.changes(0, 100)
+    assert compact_changes(str(tmp_path), retain=3) > 0
+    result = storage.changes(before["events"][6]["seq"], 100)
+    assert result["events"] == before["events"][7:]
+    assert storage.changes(before["events"][5]["seq"], 100)["reset"]
+    # 没有超过大小上限时不压缩
+    assert compact_changes(str(tmp_path)) == 0
+
+
+def test_feeds_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(xml_changes, "_feeds", type(xml_changes._feeds)())
+    monkeypatch.setattr(config, "XML_INDEX_MAX_DIRECTORIES", 2, raising=False)
+    first = get_change_feed(str(tmp_path / "a"))
+    get_change_feed(str(tmp_path / "b"))
+    assert get_change_feed(str(tmp_path / "a")) is first
+    get_change_feed(str(tmp_path / "c"))
+    assert len(xml_changes._feeds) == 2
+    assert get_change_feed(str(tmp_path / "a")) is first
+
+
+def test_close_stops_watcher_and_wakes_waiters(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "XML_CHANGES_WATCH_SECONDS", 0.01, raising=False)
+    feed = get_change_feed(str(tmp_path), watch_external=True)
+    watcher = xml_changes._watcher
+    assert watcher is not None and watcher.is_alive()
+
+    waiter = threading.Thread(target=feed.wait, args=(feed.version, 30))
+    waiter.start()
+    started = time.monotonic()
+    close_change_feeds()
+    waiter.join(5)
+    assert not waiter.is_alive() and time.monotonic() - started < 5
+    assert not watcher.is_alive() and xml_changes._watcher is None
+    assert feed.closed and not xml_changes._feeds
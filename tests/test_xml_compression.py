@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""XML 压缩存储测试：各格式往返、按文件头识别、切换格式与删除所有存储版本"""
+import json
+import os
+
+import pytest
+
+import config
+from aes_util import mysql_adapter_decrypt
+from services import xml_compression, xml_index, xml_service
+from services.xml_compression import compress, decompress, logical_name, read_xml_text, stored_name
+
+KEY = "1234567887654321"
+XML = "<CEB311Message>\r\n  <OrderNo>中文-001</OrderNo>\n</CEB311Message>"
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(xml_index, "_indexes", type(xml_index._indexes)())
+    monkeypatch.setattr(xml_service, "_encrypted_listing_cache", type(xml_service._encrypted_listing_cache)())
+
+
+def use_format(monkeypatch, fmt: str) -> None:
+    monkeypatch.setattr(config, "XML_STORAGE_COMPRESSION", fmt, raising=False)
+
+
+def listing(directory) -> list:
+    _, cipher_text = xml_service.list_xml_files_encrypted(str(directory), KEY)
+    return json.loads(mysql_adapter_decrypt(KEY, cipher_text))
+
+
+@pytest.mark.parametrize("fmt", ["gzip", "zstd"])
+def test_compress_round_trip(fmt):
+    data = XML.encode("utf-8") * 50
+    compressed = compress(data, fmt)
+    assert len(compressed) < len(data)
+    assert decompress(compressed) == data
+
+
+def test_plain_data_is_returned_unchanged():
+    assert decompress(XML.encode("utf-8")) == XML.encode("utf-8")
+    assert decompress(b"") == b""
+
+
+@pytest.mark.parametrize("fmt", ["gzip", "zstd"])
+def test_format_is_detected_from_header_not_extension(tmp_path, fmt):
+    # 扩展名与实际格式不符时仍按文件头解压，换行与明文读取一样统一为 \n
+    path = tmp_path / "a.xml"
+    path.write_bytes(compress(XML.encode("utf-8"), fmt))
+    assert read_xml_text(str(path)) == XML.replace("\r\n", "\n")
+
+
+def test_logical_and_stored_names():
+    assert logical_name("a.xml") == "a.xml"
+    assert logical_name("a.XML.gz") == "a.XML"
+    assert logical_name("a.xml.zst") == "a.xml"
+    assert logical_name("a.txt.gz") is None and logical_name("a.gz") is None
+    assert stored_name("a.xml", "gzip") == "a.xml.gz"
+    assert stored_name("a.xml", None) == "a.xml"
+
+
+@pytest.mark.parametrize("fmt", ["gzip", "zstd"])
+def test_save_list_delete_round_trip(tmp_path, monkeypatch, fmt):
+    use_format(monkeypatch, fmt)
+    listing(tmp_path)
+    xml_service.save_xml_file("order", XML, str(tmp_path))
+    assert os.listdir(tmp_path) == [stored_name("order.xml", fmt)]
+    expected = [{"filename": "order.xml", "xml": XML.replace("\r\n", "\n")}]
+    assert listing(tmp_path) == expected
+
+    # 重新建立索引（缓存为空）时从磁盘解压，结果相同
+    monkeypatch.setattr(xml_index, "_indexes", type(xml_index._indexes)())
+    monkeypatch.setattr(xml_service, "_encrypted_listing_cache", type(xml_service._encrypted_listing_cache)())
+    assert listing(tmp_path) == expected
+    assert "".join(xml_service.iter_encrypted_listing_response(str(tmp_path), KEY))
+
+    xml_service.delete_xml_file("order.xml", str(tmp_path))
+    assert os.listdir(tmp_path) == [] and listing(tmp_path) == []
+    with pytest.raises(FileNotFoundError):
+        xml_service.delete_xml_file("order.xml", str(tmp_path))
+
+
+def test_switching_format_replaces_previous_variant(tmp_path, monkeypatch):
+    xml_service.save_xml_file("a.xml", "<plain/>", str(tmp_path))
+    use_format(monkeypatch, "gzip")
+    xml_service.save_xml_file("a.xml", "<gzip/>", str(tmp_path))
+    assert os.listdir(tmp_path) == ["a.xml.gz"]
+    use_format(monkeypatch, "")
+    assert listing(tmp_path) == [{"filename": "a.xml", "xml": "<gzip/>"}]
+    xml_service.save_xml_file("a.xml", "<plain again/>", str(tmp_path))
+    assert os.listdir(tmp_path) == ["a.xml"]
+    assert listing(tmp_path) == [{"filename": "a.xml", "xml": "<plain again/>"}]
+
+
+def test_batch_save_and_delete_compressed(tmp_path, monkeypatch):
+    use_format(monkeypatch, "gzip")
+    listing(tmp_path)
+    items = xml_service.extract_batch_xml_items(
+        [{"filename": f"{i}.xml", "xml": f"<a>{i}</a>"} for i in range(3)], str(tmp_path)
+    )
+    assert [item["code"] for item in xml_service.save_xml_files(items)] == [200] * 3
+    assert sorted(os.listdir(tmp_path)) == ["0.xml.gz", "1.xml.gz", "2.xml.gz"]
+    assert listing(tmp_path) == [{"filename": f"{i}.xml", "xml": f"<a>{i}</a>"} for i in range(3)]
+
+    items = xml_service.extract_batch_xml_items(["0.xml", "missing.xml"], str(tmp_path), require_xml=False)
+    assert [item["code"] for item in xml_service.delete_xml_files(items)] == [200, 404]
+    assert sorted(os.listdir(tmp_path)) == ["1.xml.gz", "2.xml.gz"]
+
+
+def test_zstd_falls_back_to_gzip_when_unavailable(tmp_path, monkeypatch):
+    use_format(monkeypatch, "zstd")
+    monkeypatch.setattr(xml_compression, "_zstd", None)
+    assert xml_compression.storage_format() == "gzip"
+    xml_service.save_xml_file("a.xml", "<a/>", str(tmp_path))
+    assert os.listdir(tmp_path) == ["a.xml.gz"]
+
+
+def test_unknown_format_is_rejected(monkeypatch):
+    use_format(monkeypatch, "bzip2")
+    with pytest.raises(ValueError):
+        xml_compression.storage_format()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""单文件查询测试（ETag 条件请求，Flask 与 ASGI 两个版本行为一致）"""
+import json
+import os
+import time
+
+import pytest
+
+import config
+from aes_util import mysql_adapter_decrypt, mysql_adapter_encrypt
+
+
+@pytest.fixture(params=["flask", "asgi"])
+def post(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SAVE_FOLDER", str(tmp_path))
+    if request.param == "flask":
+        import app as app_module
+        client = app_module.app.test_client()
+    else:
+        from starlette.testclient import TestClient
+        import asgi_app
+        # 不进入 lifespan：这些接口不需要签名服务
+        client = TestClient(asgi_app.app)
+
+    def post(path, obj, headers=None):
+        body = mysql_adapter_encrypt(config.AES_KEY, json.dumps(obj), "UTF-8").encode()
+        if request.param == "flask":
+            response = client.post(path, data=body, headers=headers or {})
+            payload = response.get_json()
+        else:
+            response = client.post(path, content=body, headers=headers or {})
+            payload = response.json()
+        return response.status_code, response.headers.get("ETag"), payload
+
+    return post
+
+
+def _document(payload):
+    return json.loads(mysql_adapter_decrypt(config.AES_KEY, payload["data"]))
+
+
+def test_get_returns_document_and_etag(post):
+    assert post("/xml-files/add", {"filename": "a", "xml": "<a/>"})[0] == 200
+    status, etag, payload = post("/xml-files/get", {"filename": "a.xml"})
+    document = _document(payload)
+    assert status == 200 and payload["code"] == 200 and etag and document["etag"] == etag
+    assert document["filename"] == "a.xml" and document["xml"] == "<a/>" and document["size"] == 4
+
+
+def test_matching_etag_returns_304(post):
+    post("/xml-files/add", {"filename": "a", "xml": "<a/>"})
+    etag = post("/xml-files/get", {"filename": "a"})[1]
+
+    for request, headers in [
+        ({"filename": "a", "ifNoneMatch": etag}, None),
+        ({"filename": "a", "if-none-match": "W/" + etag}, None),
+        ({"filename": "a"}, {"If-None-Match": etag}),
+        ({"filename": "a", "ifNoneMatch": '"other", ' + etag}, None),
+        ({"filename": "a", "ifNoneMatch": "*"}, None),
+    ]:
+        status, response_etag, payload = post("/xml-files/get", request, headers)
+        assert status == 200 and payload == {"code": 304, "msg": "未修改", "data": False}, request
+        assert response_etag == etag
+
+    status, _, payload = post("/xml-files/get", {"filename": "a", "ifNoneMatch": '"other"'})
+    assert payload["code"] == 200 and _document(payload)["xml"] == "<a/>"
+
+
+def test_changed_document_gets_new_etag(post, tmp_path):
+    post("/xml-files/add", {"filename": "a", "xml": "<a/>"})
+    etag = post("/xml-files/get", {"filename": "a"})[1]
+    time.sleep(0.01)
+    post("/xml-files/add", {"filename": "a", "xml": "<a>2</a>"})
+    status, new_etag, payload = post("/xml-files/get", {"filename": "a", "ifNoneMatch": etag})
+    assert payload["code"] == 200 and new_etag != etag and _document(payload)["xml"] == "<a>2</a>"
+
+    # 外部程序修改文件（大小不变、修改时间变化）同样改变 ETag
+    path = os.path.join(str(tmp_path), "a.xml")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert post("/xml-files/get", {"filename": "a", "ifNoneMatch": new_etag})[2]["code"] == 200
+
+
+def test_missing_document(post):
+    # 与删除接口一致：HTTP 状态码 404 / 400，响应体 code 为 500
+    assert post("/xml-files/get", {"filename": "nope"})[0] == 404
+    assert post("/xml-files/get", {"filename": "nope", "ifNoneMatch": "*"})[0] == 404
+    assert post("/xml-files/get", {"filename": 1})[0] == 400
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""XML 目录索引与加密列表缓存测试"""
+import builtins
+import json
+import os
+
+import pytest
+
+import config
+from aes_util import mysql_adapter_decrypt
+from services import xml_compression, xml_index, xml_service
+from services.xml_service import delete_xml_file, list_xml_files_encrypted, save_xml_file
+from services.xml_writer import write_text_atomic
+
+KEY = "1234567887654321"
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(xml_index, "_indexes", type(xml_index._indexes)())
+    monkeypatch.setattr(xml_service, "_encrypted_listing_cache", type(xml_service._encrypted_listing_cache)())
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    """记录目录索引读取过的文件名"""
+    names = []
+
+    def counting_open(path, *args, **kwargs):
+        names.append(path.replace("\\", "/").rsplit("/", 1)[-1])
+        return builtins.open(path, *args, **kwargs)
+
+    monkeypatch.setattr(xml_compression, "open", counting_open, raising=False)
+    return names
+
+
+def listing(directory) -> list:
+    count, cipher_text = list_xml_files_encrypted(str(directory), KEY)
+    files = json.loads(mysql_adapter_decrypt(KEY, cipher_text))
+    assert count == len(files)
+    return files
+
+
+def test_unchanged_directory_reads_no_files(tmp_path, opened):
+    for i in range(3):
+        (tmp_path / f"{i}.xml").write_text(f"<a>{i}</a>", encoding="utf-8")
+    first = list_xml_files_encrypted(str(tmp_path), KEY)
+    assert sorted(opened) == ["0.xml", "1.xml", "2.xml"]
+    opened.clear()
+    assert list_xml_files_encrypted(str(tmp_path), KEY) == first
+    assert opened == []
+
+
+def test_uncached_files_are_not_read_when_directory_is_unchanged(tmp_path, opened, monkeypatch):
+    # 内容缓存预算为 0 时每次都要读磁盘，但目录没有变化时直接复用密文，不应读取任何文件
+    monkeypatch.setattr(config, "XML_INDEX_MAX_CACHED_BYTES", 0, raising=False)
+    (tmp_path / "a.xml").write_text("<a/>", encoding="utf-8")
+    listing(tmp_path)
+    opened.clear()
+    listing(tmp_path)
+    assert opened == []
+
+
+def test_only_changed_files_are_read_again(tmp_path, opened):
+    for name in ("a.xml", "b.xml", "c.xml"):
+        (tmp_path / name).write_text(f"<{name}/>", encoding="utf-8")
+    listing(tmp_path)
+    opened.clear()
+    # 外部写入：大小变化，重新校验时发现
+    (tmp_path / "b.xml").write_text("<b>changed</b>", encoding="utf-8")
+    (tmp_path / "c.xml").unlink()
+    (tmp_path / "d.xml").write_text("<d/>", encoding="utf-8")
+    assert listing(tmp_path) == [
+        {"filename": "a.xml", "xml": "<a.xml/>"},
+        {"filename": "b.xml", "xml": "<b>changed</b>"},
+        {"filename": "d.xml", "xml": "<d/>"},
+    ]
+    assert sorted(opened) == ["b.xml", "d.xml"]
+
+
+def test_save_and_delete_update_index_without_reading(tmp_path, opened):
+    listing(tmp_path)
+    save_xml_file("new.xml", "<new/>", str(tmp_path))
+    assert listing(tmp_path) == [{"filename": "new.xml", "xml": "<new/>"}]
+    delete_xml_file("new.xml", str(tmp_path))
+    assert listing(tmp_path) == []
+    assert opened == []
+
+
+def test_directory_count_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "XML_INDEX_MAX_DIRECTORIES", 2, raising=False)
+    directories = [tmp_path / f"d{i}" for i in range(4)]
+    for i, directory in enumerate(directories):
+        directory.mkdir()
+        (directory / "a.xml").write_text(f"<d{i}/>", encoding="utf-8")
+        listing(directory)
+    assert len(xml_index._indexes) == 2
+    assert len(xml_service._encrypted_listing_cache) == 2
+    # 被淘汰的目录重新建立索引，结果与磁盘一致
+    (directories[0] / "a.xml").write_text("<d0>changed</d0>", encoding="utf-8")
+    assert listing(directories[0]) == [{"filename": "a.xml", "xml": "<d0>changed</d0>"}]
+
+
+def make_files(directory, names):
+    for name in names:
+        (directory / name).write_text(f"<{name}/>", encoding="utf-8")
+
+
+def test_page_reads_only_returned_files(tmp_path, opened):
+    make_files(tmp_path, [f"CEB311_{i:03d}.xml" for i in range(10)] + ["OTHER.xml"])
+    page = xml_service.list_xml_files_page(str(tmp_path), prefix="CEB311", limit=3, offset=2)
+    assert [item["filename"] for item in page["files"]] == ["CEB311_002.xml", "CEB311_003.xml", "CEB311_004.xml"]
+    assert page["total"] == 10 and page["nextCursor"] == "CEB311_004.xml"
+    assert page["files"][0]["xml"] == "<CEB311_002.xml/>"
+    assert sorted(opened) == ["CEB311_002.xml", "CEB311_003.xml", "CEB311_004.xml"]
+
+
+def test_cursor_walks_every_page(tmp_path):
+    names = [f"{i:02d}.xml" for i in range(7)]
+    make_files(tmp_path, names)
+    seen, cursor = [], None
+    while True:
+        page = xml_service.list_xml_files_page(str(tmp_path), cursor=cursor, limit=3, fields="name")
+        seen += [item["filename"] for item in page["files"]]
+        cursor = page["nextCursor"]
+        if cursor is None:
+            break
+    assert seen == names
+
+
+def test_metadata_mode_and_filters_read_no_files(tmp_path, opened):
+    make_files(tmp_path, ["a1.xml", "a2.xml", "b1.xml"])
+    old = tmp_path / "a1.xml"
+    os.utime(old, ns=(1_000_000_000_000, 1_000_000_000_000))
+    page = xml_service.list_xml_files_page(str(tmp_path), pattern="a*.xml", mtime_from_ns=2_000_000_000_000, fields="meta")
+    assert page["files"] == [{"filename": "a2.xml", "size": len("<a2.xml/>"), "mtime": page["files"][0]["mtime"]}]
+    assert page["total"] == 1 and page["nextCursor"] is None
+    assert opened == []
+
+
+def test_extract_list_options():
+    assert xml_service.extract_list_options({"directory": "x"}) is None
+    options = xml_service.extract_list_options({"limit": 5, "mtimeFrom": 1000, "mtimeTo": 2000})
+    assert options["limit"] == 5 and options["offset"] == 0 and options["fields"] == "full"
+    assert options["mtime_from_ns"] == 1_000_000_000 and options["mtime_to_ns"] == 2_000_999_999
+    for bad in ({"limit": 0}, {"offset": -1}, {"limit": True}, {"fields": "all"}, {"prefix": 1}):
+        with pytest.raises(ValueError):
+            xml_service.extract_list_options(bad)
+
+
+def test_concurrent_saves_do_not_cache_stale_content(tmp_path):
+    # 写入者 A、B 先后保存同一文件，A 的索引更新晚于 B 的写入（内容长度与修改时间都相同）
+    path = str(tmp_path / "doc.xml")
+    index = xml_index.get_directory_index(str(tmp_path))
+    written_a = write_text_atomic(path, "<doc>A</doc>")
+    write_text_atomic(path, "<doc>B</doc>")
+    os.utime(path, ns=(written_a.st_mtime_ns, written_a.st_mtime_ns))
+
+    index.note_saved("doc.xml", "<doc>A</doc>", written=written_a)
+
+    assert index.list_files(revalidate=False)[1] == [{"filename": "doc.xml", "xml": "<doc>B</doc>"}]
+    index.revalidate(force=True)
+    assert index.list_files()[1] == [{"filename": "doc.xml", "xml": "<doc>B</doc>"}]
+
+
+def test_own_write_is_cached(tmp_path, opened):
+    index = xml_index.get_directory_index(str(tmp_path))
+    path = str(tmp_path / "doc.xml")
+    index.note_saved("doc.xml", "<doc>new</doc>", written=write_text_atomic(path, "<doc>new</doc>"))
+    assert index.list_files(revalidate=False)[1] == [{"filename": "doc.xml", "xml": "<doc>new</doc>"}]
+    assert opened == []
+
+
+def test_batch_save_and_delete(tmp_path, opened):
+    listing(tmp_path)
+    items = xml_service.extract_batch_xml_items(
+        {"directory": str(tmp_path), "items": [
+            {"filename": "a", "xml": "<a/>"},
+            {"filename": "b.xml", "xml": "<b/>"},
+            {"filename": "a.xml", "xml": "<dup/>"},
+            {"filename": ""},
+        ]}, config.SAVE_FOLDER)
+    assert [item["code"] for item in xml_service.save_xml_files(items)] == [200, 200, 400, 400]
+    assert listing(tmp_path) == [{"filename": "a.xml", "xml": "<a/>"}, {"filename": "b.xml", "xml": "<b/>"}]
+    assert opened == []
+
+    items = xml_service.extract_batch_xml_items(["a.xml", "missing"], str(tmp_path), require_xml=False)
+    assert [item["code"] for item in xml_service.delete_xml_files(items)] == [200, 404]
+    assert listing(tmp_path) == [{"filename": "b.xml", "xml": "<b/>"}]
+    with pytest.raises(ValueError):
+        xml_service.extract_batch_xml_items([{"filename": "a", "xml": "<a/>"}] * 3, str(tmp_path), max_items=2)
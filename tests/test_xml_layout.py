@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""分片目录布局测试（不区分大小写的文件名、旧分片目录迁移、分页查询）"""
+import json
+import os
+
+import pytest
+
+from services import xml_index, xml_layout
+from services.xml_index import DirectoryIndex
+from services.xml_layout import (
+    MARKER_NAME,
+    append_journal,
+    file_folder,
+    forget_layout,
+    migrate_to_sharded,
+    shard_path,
+)
+from services.xml_writer import write_text_atomic
+
+
+@pytest.fixture
+def case_insensitive(monkeypatch):
+    """模拟 Windows：os.path.normcase 转为小写"""
+    monkeypatch.setattr(os.path, "normcase", lambda path: path.lower())
+    monkeypatch.setattr(xml_index, "_CASE_INSENSITIVE", True)
+
+
+def _sharded_index(directory: str) -> DirectoryIndex:
+    migrate_to_sharded(directory, 2)
+    index = DirectoryIndex(directory)
+    index.revalidate()
+    return index
+
+
+def _save(directory: str, index: DirectoryIndex, name: str, content: str) -> None:
+    file_path = os.path.join(file_folder(directory, name), name)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    written = write_text_atomic(file_path, content)
+    append_journal(directory, saved=[(name, name, written.st_size, written.st_mtime_ns)])
+    index.note_changes(saved=[(name, content, name, written)])
+
+
+def test_shard_path_ignores_case_when_names_are_case_insensitive(case_insensitive):
+    assert shard_path("CEB311_A.xml", 2) == shard_path("ceb311_a.xml", 2)
+    assert shard_path("CEB311_A.xml", 2, normcase=False) != shard_path("ceb311_a.xml", 2, normcase=False)
+
+
+def test_migrate_reshards_legacy_directory(case_insensitive, tmp_path):
+    directory = str(tmp_path)
+    (tmp_path / MARKER_NAME).write_text(json.dumps({"layout": "sharded", "depth": 2}), encoding="utf-8")
+    legacy = tmp_path / shard_path("CEB311_A.xml", 2, normcase=False)
+    legacy.mkdir(parents=True)
+    (legacy / "CEB311_A.xml").write_text("<a/>", encoding="utf-8")
+    forget_layout(directory)
+    assert file_folder(directory, "CEB311_A.xml") == str(legacy)
+
+    assert migrate_to_sharded(directory) == 1
+    assert migrate_to_sharded(directory) == 0
+    folder = file_folder(directory, "ceb311_a.xml")
+    assert folder == file_folder(directory, "CEB311_A.xml") != str(legacy)
+    assert os.listdir(folder) == ["CEB311_A.xml"]
+    assert json.loads((tmp_path / MARKER_NAME).read_text(encoding="utf-8"))["names"] == xml_layout.NAMES_NORMCASE
+
+
+def test_index_keeps_one_entry_per_case_insensitive_name(case_insensitive, tmp_path):
+    directory = str(tmp_path)
+    index = _sharded_index(directory)
+    _save(directory, index, "Doc.xml", "<doc>1</doc>")
+    _save(directory, index, "doc.xml", "<doc>2</doc>")
+    total, page, _ = index.query()
+    assert total == 1 and [(f["filename"], f["xml"]) for f in page] == [("doc.xml", "<doc>2</doc>")]
+
+    # 其他进程按名称日志回放时同样只保留一条
+    other = DirectoryIndex(directory)
+    other.revalidate()
+    assert [f["filename"] for f in other.query()[1]] == ["doc.xml"]
+
+    append_journal(directory, deleted=["DOC.xml"])
+    other.revalidate(force=True)
+    assert other.query()[0] == 0
+    index.note_changes(deleted=["DOC.xml"])
+    assert index.query()[0] == 0
+
+
+def test_sharded_query_paging(tmp_path):
+    directory = str(tmp_path)
+    index = _sharded_index(directory)
+    for i in range(7):
+        _save(directory, index, f"doc_{i}.xml", f"<doc>{i}</doc>")
+    forget_layout(directory)
+    index = DirectoryIndex(directory)
+    index.revalidate()
+    names = []
+    total, page, cursor = index.query(limit=3, fields="name")
+    names += [f["filename"] for f in page]
+    while cursor:
+        _, page, cursor = index.query(cursor=cursor, limit=3)
+        names += [f["filename"] for f in page]
+    assert total == 7 and names == [f"doc_{i}.xml" for i in range(7)]
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""存储后端测试（文件系统平铺 / 分片与 SQLite 的分页查询结果一致）"""
+import os
+
+import pytest
+
+import config
+from services import xml_storage
+from services.xml_layout import migrate_to_sharded
+from services.xml_storage import XmlStorage, create_storage, get_storage
+
+
+@pytest.fixture(params=["flat", "sharded", "sqlite"])
+def storage(request, tmp_path):
+    directory = str(tmp_path / request.param)
+    if request.param == "sharded":
+        os.makedirs(directory)
+        migrate_to_sharded(directory, 2)
+    storage = create_storage(directory, "sqlite" if request.param == "sqlite" else "filesystem")
+    errors = storage.save_many([(f"doc_{i:02d}.xml", f"<doc>{i}</doc>") for i in range(10)]
+                               + [(f"other_{i}.xml", f"<other>{i}</other>") for i in range(3)])
+    assert errors == [None] * 13
+    return storage
+
+
+def _all_pages(storage, **options):
+    names = []
+    total, page, cursor = storage.query(**options)
+    names += [f["filename"] for f in page]
+    while cursor:
+        _, page, cursor = storage.query(cursor=cursor, **options)
+        names += [f["filename"] for f in page]
+    return total, names
+
+
+def test_query_pages_by_cursor(storage):
+    total, names = _all_pages(storage, limit=4, fields="name")
+    assert total == 13
+    assert names == [f"doc_{i:02d}.xml" for i in range(10)] + [f"other_{i}.xml" for i in range(3)]
+
+    total, names = _all_pages(storage, prefix="doc_", limit=3)
+    assert total == 10 and names == [f"doc_{i:02d}.xml" for i in range(10)]
+
+
+def test_query_filters_and_fields(storage):
+    total, page, cursor = storage.query(prefix="doc_0", offset=2, limit=2)
+    assert total == 10 and cursor == "doc_03.xml"
+    assert [(f["filename"], f["xml"]) for f in page] == [("doc_02.xml", "<doc>2</doc>"), ("doc_03.xml", "<doc>3</doc>")]
+
+    total, page, cursor = storage.query(pattern="other_[12].xml", fields="meta")
+    assert total == 2 and cursor is None
+    assert [f["filename"] for f in page] == ["other_1.xml", "other_2.xml"]
+    assert all(set(f) == {"filename", "size", "mtime"} and f["size"] > 0 for f in page)
+
+    storage.delete("doc_05.xml")
+    total, names = _all_pages(storage, prefix="doc_", limit=4)
+    assert total == 9 and "doc_05.xml" not in names
+
+
+def test_storage_interface_is_abstract(tmp_path):
+    class Incomplete(XmlStorage):
+        def save(self, name, content):
+            return name
+
+    with pytest.raises(TypeError):
+        Incomplete(str(tmp_path))
+
+
+def test_storage_instances_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(xml_storage, "_storages", type(xml_storage._storages)())
+    monkeypatch.setattr(config, "XML_INDEX_MAX_DIRECTORIES", 2, raising=False)
+    first = get_storage(str(tmp_path / "a"))
+    get_storage(str(tmp_path / "b"))
+    assert get_storage(str(tmp_path / "a")) is first
+    get_storage(str(tmp_path / "c"))  # 淘汰最久未使用的 b
+    assert len(xml_storage._storages) == 2
+    assert get_storage(str(tmp_path / "a")) is first
+    assert os.path.normcase(os.path.abspath(tmp_path / "b")) not in xml_storage._storages
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""XML 原子写入与组提交测试"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services import xml_writer
+
+
+def _temp_file(directory, name: str) -> str:
+    """模拟写入者：写好并关闭一个临时文件"""
+    temp_path = str(directory / f".{name}.tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write("<a/>")
+    return temp_path
+
+
+@pytest.mark.parametrize("durability", xml_writer.DURABILITY_MODES)
+def test_write_atomic_leaves_no_temp_files(tmp_path, durability):
+    target = str(tmp_path / "a.xml")
+    xml_writer.write_text_atomic(target, "<a>中文</a>", durability)
+    xml_writer.write_bytes_atomic(target, "<a>2</a>".encode("utf-8"), durability)
+    assert open(target, encoding="utf-8").read() == "<a>2</a>"
+    assert os.listdir(tmp_path) == ["a.xml"]
+
+
+def test_group_commit_single_writer_does_not_wait_for_window(tmp_path):
+    committer = xml_writer.GroupCommitter(window_ms=1000)
+    started = time.monotonic()
+    for i in range(5):
+        committer.begin()
+        committer.commit(_temp_file(tmp_path, str(i)), str(tmp_path / f"{i}.xml"))
+    assert time.monotonic() - started < 0.5
+    assert committer.batches == 5
+    assert sorted(os.listdir(tmp_path)) == [f"{i}.xml" for i in range(5)]
+
+
+def test_group_commit_waits_for_writers_in_progress(tmp_path):
+    committer = xml_writer.GroupCommitter(window_ms=5000)
+    committer.begin()
+    committer.begin()
+    first = threading.Thread(target=committer.commit, args=(_temp_file(tmp_path, "a"), str(tmp_path / "a.xml")))
+    first.start()
+    time.sleep(0.05)
+    # 第一个写入者在等待第二个写入者完成，还没有重命名
+    assert first.is_alive() and not os.path.exists(tmp_path / "a.xml")
+    committer.commit(_temp_file(tmp_path, "b"), str(tmp_path / "b.xml"))
+    first.join(5)
+    assert (committer.batches, committer.committed) == (1, 2)
+    assert sorted(os.listdir(tmp_path)) == ["a.xml", "b.xml"]
+
+
+def test_group_commit_window_bounds_the_wait(tmp_path):
+    committer = xml_writer.GroupCommitter(window_ms=50)
+    committer.begin()
+    committer.begin()  # 一直没有完成的写入者
+    started = time.monotonic()
+    committer.commit(_temp_file(tmp_path, "a"), str(tmp_path / "a.xml"))
+    assert 0.04 <= time.monotonic() - started < 2
+    committer.cancel()
+    assert os.listdir(tmp_path) == ["a.xml"]
+
+
+def test_group_commit_batches_writers_arriving_during_flush(tmp_path, monkeypatch):
+    committer = xml_writer.GroupCommitter(window_ms=0)
+    monkeypatch.setattr(xml_writer, "_group_committer", committer)
+    first_flush = threading.Event()
+    release = threading.Event()
+    flush = committer._flush
+
+    def slow_flush(batch):
+        # 第一批提交期间到达的写入应合并为下一批
+        if not first_flush.is_set():
+            first_flush.set()
+            release.wait(5)
+        flush(batch)
+
+    monkeypatch.setattr(committer, "_flush", slow_flush)
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        first = pool.submit(xml_writer.write_text_atomic, str(tmp_path / "first.xml"), "<a/>", "group")
+        first_flush.wait(5)
+        rest = [pool.submit(xml_writer.write_text_atomic, str(tmp_path / f"{i}.xml"), "<a/>", "group")
+                for i in range(15)]
+        deadline = time.monotonic() + 5
+        while len(committer._pending) < 15 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        release.set()
+        for future in [first] + rest:
+            future.result()
+    assert committer.committed == 16
+    assert committer.batches == 2
+    assert len(os.listdir(tmp_path)) == 16
+
+
+def test_group_commit_reports_rename_failure(tmp_path):
+    committer = xml_writer.GroupCommitter()
+    committer.begin()
+    with pytest.raises(OSError):
+        committer.commit(_temp_file(tmp_path, "a"), str(tmp_path / "missing" / "a.xml"))
+    assert os.listdir(tmp_path) == []
+
+
+def test_failed_group_write_does_not_hold_up_other_writers(tmp_path, monkeypatch):
+    committer = xml_writer.GroupCommitter(window_ms=5000)
+    monkeypatch.setattr(xml_writer, "_group_committer", committer)
+    with pytest.raises(OSError):
+        xml_writer.write_text_atomic(str(tmp_path / "missing" / "a.xml"), "<a/>", "group")
+    started = time.monotonic()
+    xml_writer.write_text_atomic(str(tmp_path / "b.xml"), "<b/>", "group")
+    assert time.monotonic() - started < 1
+    assert os.listdir(tmp_path) == ["b.xml"]
@@ -3,54 +3,215 @@
 WebSocket 签名服务封装
 
 提供与 Sign64Wrapper 相同的接口，但使用 WebSocket 方式获取签名和证书序列号。
-使用连接复用策略：维护一个连接，可用时复用，不可用时创建新连接。
+使用连接复用策略：每个签名端点维护一个连接，可用时复用，不可用时创建新连接。
+同一连接上的多个签名请求以多路复用方式并发发送：每个请求使用唯一的 _id，
+由后台读取任务按 _id 将响应分发给对应的等待者。
+可配置多个签名端点（多台主机 / 多张操作员卡），请求分发给最空闲的健康端点，
+连接失败的端点会被暂时剔除，冷却时间过后自动重新接纳。
+可选的签名结果缓存（sign_cache.SignCache）让重复提交的相同数据直接返回已有签名。
 """
 import asyncio
+import concurrent.futures
+import heapq
+import itertools
 import json
 import logging
 import threading
+import time
 import websockets
-from typing import Optional
+import metrics_util
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from log_util import PayloadPreview
+from sign_cache import SignCache, DEFAULT_TTL_SECONDS as DEFAULT_SIGN_CACHE_TTL
 
 logger = logging.getLogger(__name__)
 
+# 默认的最大并发（在途）签名请求数（每个端点）
+DEFAULT_MAX_IN_FLIGHT = 8
+
+# 单个签名请求等待响应的超时时间（秒）
+RESPONSE_TIMEOUT = 30.0
+
+# 已放弃等待（超时或取消）的请求 _id 的保留时间（秒）与最多保留的个数：
+# 这些请求迟到的响应直接丢弃，不会被当作其他请求的响应
+ABANDONED_ID_TTL = 120.0
+_MAX_ABANDONED_IDS = 4096
+
+# 默认的心跳（ping）间隔与超时时间（秒）
+DEFAULT_PING_INTERVAL = 20.0
+DEFAULT_PING_TIMEOUT = 20.0
+
+# 端点连接失败后被剔除的默认冷却时间（秒）
+DEFAULT_EJECT_SECONDS = 10.0
+
+# 默认的后台健康检查间隔（秒），0 表示不做后台健康检查
+DEFAULT_HEARTBEAT_INTERVAL = 10.0
+
+# start() 预先建立连接（预热）的最长等待时间（秒）
+WARM_UP_TIMEOUT = 15.0
+
+# stop() 等待连接关闭和事件循环线程退出的最长时间（秒）
+STOP_TIMEOUT = 5.0
+
+# 默认的签名排队上限（所有端点都满载时最多排队等待的请求数），0 表示不限
+DEFAULT_QUEUE_MAX_DEPTH = 256
+
+# 默认的最长排队等待时间（秒），0 表示不限
+DEFAULT_QUEUE_MAX_WAIT = 10.0
+
+# 签名耗时移动平均的平滑系数（用于估算排队时间）
+_LATENCY_SMOOTHING = 0.2
+
+
+def _config_value(name: str, default):
+    """从 config 模块读取配置项，不存在时返回默认值"""
+    try:
+        import config
+        return getattr(config, name)
+    except (ImportError, AttributeError):
+        return default
+
 
 class WebSocketError(RuntimeError):
     """WebSocket 相关错误"""
 
 
+class WebSocketConnectionError(WebSocketError):
+    """连接错误（建立连接、握手失败或连接中断），可换端点或重建连接后重试"""
+
+
+class WebSocketTimeoutError(WebSocketError):
+    """等待签名响应超时"""
+
+
+class SignResponseError(WebSocketError):
+    """签名服务返回失败结果或无法识别的响应"""
+
+
+class SignOverloadedError(WebSocketError):
+    """签名队列已满、排队超时或预计无法在截止时间前完成，请求被快速拒绝（可稍后重试）"""
+
+    code = 503
+
+
+class _SignerEndpoint:
+    """单个签名端点（一张操作员卡）的连接与健康状态"""
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.websocket: Optional[websockets.WebSocketClientProtocol] = None
+        self.connected = False
+        # 当前连接上等待响应的请求：_id -> Future（每个连接一个独立的字典）
+        self.pending: Dict[str, asyncio.Future] = {}
+        self.reader_task: Optional[asyncio.Task] = None
+        self.connect_lock: Optional[asyncio.Lock] = None  # 在事件循环线程中惰性创建
+        self.in_flight = 0
+        self.signed = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.last_error: Optional[str] = None
+        # 最近一次签名返回的证书号（标识端点上插的卡，用于签名结果缓存）
+        self.cert_no: Optional[str] = None
+
+    def is_ejected(self, now: float) -> bool:
+        """是否处于剔除冷却期内"""
+        return now < self.ejected_until
+
+    def status(self) -> dict:
+        """端点状态（用于健康检查）"""
+        now = time.monotonic()
+        return {
+            "url": self.url,
+            "healthy": not self.is_ejected(now),
+            "connected": self.connected,
+            "in_flight": self.in_flight,
+            "signed": self.signed,
+            "failures": self.failures,
+            "ejected_for": round(max(self.ejected_until - now, 0.0), 1),
+            "last_error": self.last_error,
+            "cert_no": self.cert_no,
+        }
+
+
 class WebSocketWrapper:
-    """WebSocket 签名服务的 Python 封装（连接复用）"""
+    """WebSocket 签名服务的 Python 封装（连接复用 + 多路复用 + 多端点）"""
 
-    def __init__(self, ws_url: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        ws_url: Optional[Union[str, Sequence[str]]] = None,
+        max_in_flight: Optional[int] = None
+    ) -> None:
         """
         初始化 WebSocket 包装器
         
         Args:
-            ws_url: WebSocket 服务器地址，如果为 None 则从 config 导入
+            ws_url: WebSocket 服务器地址或地址列表（多个签名端点），
+                如果为 None 则从 config 导入（优先 WS_URLS，其次 WS_URL）
+            max_in_flight: 每个端点连接上最多同时在途的签名请求数，如果为 None 则从 config 导入
         """
         if ws_url is None:
-            try:
-                import config
-                ws_url = config.WS_URL
-            except (ImportError, AttributeError):
-                ws_url = "ws://127.0.0.1:61232/"
+            ws_url = _config_value("WS_URLS", None) or _config_value("WS_URL", "ws://127.0.0.1:61232/")
+        ws_urls = [ws_url] if isinstance(ws_url, str) else list(ws_url)
+        if max_in_flight is None:
+            max_in_flight = _config_value("WS_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT)
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight 必须大于等于 1")
         
-        self.ws_url = ws_url
-        self.websocket: Optional[websockets.WebSocketClientProtocol] = None
-        self.connected = False
+        self.ws_urls: List[str] = [url for url in ws_urls if url]
+        self.ws_url = self.ws_urls[0] if self.ws_urls else ""
+        self.endpoints = [_SignerEndpoint(url) for url in self.ws_urls]
+        self.max_in_flight = max_in_flight
+        # 心跳由后台事件循环在请求间隙持续处理，及时发现失效连接
+        self.ping_interval = _config_value("WS_PING_INTERVAL", DEFAULT_PING_INTERVAL)
+        self.ping_timeout = _config_value("WS_PING_TIMEOUT", DEFAULT_PING_TIMEOUT)
+        self.eject_seconds = _config_value("WS_EJECT_SECONDS", DEFAULT_EJECT_SECONDS)
+        self.heartbeat_interval = _config_value("WS_HEARTBEAT_INTERVAL", DEFAULT_HEARTBEAT_INTERVAL)
         self.loop: Optional[asyncio.AbstractEventLoop] = None
-        self.lock = threading.Lock()  # 用于保护 get_code 方法的并发访问
-        logger.info(f"WebSocketWrapper 初始化，服务器地址: {self.ws_url}")
+        self.lock = threading.Lock()  # 用于保护事件循环线程的启动和停止
+        self._loop_thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._heartbeat = None  # 后台健康检查任务（concurrent.futures.Future）
+        self._id_counter = itertools.count(1)
+        # 已放弃等待的请求：_id -> 保留截止时间（time.monotonic()），只在事件循环线程中访问
+        self._abandoned: "OrderedDict[str, float]" = OrderedDict()
+        # 等待端点空闲容量的请求（堆）：(-优先级, 截止时间, 序号, Future)，只在事件循环线程中访问
+        self._waiters: List[tuple] = []
+        self._waiter_seq = itertools.count()
+        # 排队中的请求序号（进入排队、被挤出与离开排队都在事件循环线程中同步更新）
+        self._queued: set = set()
+        self.queue_max_depth = _config_value("WS_QUEUE_MAX_DEPTH", DEFAULT_QUEUE_MAX_DEPTH)
+        self.queue_max_wait = _config_value("WS_QUEUE_MAX_WAIT", DEFAULT_QUEUE_MAX_WAIT)
+        self.shed = 0  # 因排队已满、超时或截止时间被拒绝的请求数
+        self._sign_latency = 0.0  # 单次签名耗时的移动平均（秒）
+        # 签名结果缓存（SIGN_CACHE_MAX_ENTRIES 为 0 时关闭）
+        cache_size = _config_value("SIGN_CACHE_MAX_ENTRIES", 0)
+        self.cache: Optional[SignCache] = (
+            SignCache(cache_size, _config_value("SIGN_CACHE_TTL_SECONDS", DEFAULT_SIGN_CACHE_TTL))
+            if cache_size > 0 else None
+        )
+        logger.info(
+            f"WebSocketWrapper 初始化，服务器地址: {', '.join(self.ws_urls)}，"
+            f"每个端点最大在途请求数: {self.max_in_flight}"
+        )
 
     def is_available(self) -> bool:
         """
         检查 WebSocket 服务是否可用
         
         Returns:
-            bool: 总是返回 True（连接在调用时创建）
+            bool: 配置了签名端点即返回 True（连接在调用时创建）
+        """
+        return bool(self.endpoints)
+
+    def endpoint_status(self) -> List[dict]:
+        """
+        各签名端点的连接与健康状态
+        
+        Returns:
+            list: 每个端点一项，包含 url、healthy、connected、in_flight 等字段
         """
-        return bool(self.ws_url)
+        return [endpoint.status() for endpoint in self.endpoints]
 
     async def _handle_handshake(self, websocket) -> bool:
         """
@@ -64,7 +225,7 @@ class WebSocketWrapper:
         """
         try:
             handshake_json = await websocket.recv()
-            logger.debug(f"收到握手消息: {handshake_json}")
+            logger.debug("收到握手消息: %s", PayloadPreview(handshake_json))
             
             # 解析握手消息
             handshake = json.loads(handshake_json)
@@ -73,34 +234,267 @@ class WebSocketWrapper:
                 logger.debug("握手成功")
                 return True
             else:
-                logger.warning(f"收到非预期的握手消息，方法: {method}")
+                logger.warning("收到非预期的握手消息，方法: %s", method)
                 return False
         except Exception as e:
             logger.error(f"处理握手消息失败: {e}")
             return False
 
+    def _start_loop_thread(self) -> asyncio.AbstractEventLoop:
+        """
+        启动后台事件循环线程（已在运行时直接返回现有循环）
+        
+        事件循环常驻运行，连接的心跳和关闭帧在请求间隙也能得到处理；
+        调用线程通过 run_coroutine_threadsafe 向该循环提交请求。
+        
+        Returns:
+            asyncio.AbstractEventLoop: 事件循环对象
+        """
+        with self.lock:
+            if self.loop is not None and self._loop_thread is not None and self._loop_thread.is_alive():
+                return self.loop
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+            thread = threading.Thread(
+                target=self._run_loop,
+                args=(loop, started),
+                name="WebSocketWrapperLoop",
+                daemon=True,
+            )
+            thread.start()
+            started.wait()
+            self.loop = loop
+            self._loop_thread = thread
+            self._stopping = False
+            return loop
+
     def _get_or_create_loop(self) -> asyncio.AbstractEventLoop:
         """
-        获取或创建事件循环
+        获取后台事件循环，未调用 start() 时自动启动（保持接口兼容）
         
         Returns:
             asyncio.AbstractEventLoop: 事件循环对象
         """
+        loop = self.loop
+        if loop is not None and loop.is_running():
+            return loop
+        logger.warning("WebSocketWrapper 尚未启动，自动启动后台事件循环")
+        return self._start_loop_thread()
+
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop, started: threading.Event) -> None:
+        """事件循环线程入口：运行直到 stop()，退出前清理残留任务并关闭循环"""
+        asyncio.set_event_loop(loop)
+        loop.call_soon(started.set)
+        try:
+            loop.run_forever()
+        finally:
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    def _ensure_primitives(self) -> None:
+        """在事件循环线程中创建异步原语（避免绑定到错误的事件循环）"""
+        for endpoint in self.endpoints:
+            if endpoint.connect_lock is None:
+                endpoint.connect_lock = asyncio.Lock()
+
+    def _pick_endpoint(self, exclude: Sequence[_SignerEndpoint]) -> tuple:
+        """
+        选择有空闲容量的可用端点中最空闲的一个
+        
+        可用端点指未被剔除且不在 exclude 中的端点；没有其他可用端点时，
+        允许回到 exclude 中的端点（在刚失败的端点上重建连接重试）；
+        所有端点都被剔除时，试用最早被剔除的端点。
+        
+        Returns:
+            tuple: (选中的端点或 None, 是否存在可用端点)
+        """
+        now = time.monotonic()
+        usable = [
+            endpoint for endpoint in self.endpoints
+            if endpoint not in exclude and not endpoint.is_ejected(now)
+        ]
+        if not usable:
+            usable = list(exclude)
+        if not usable and self.endpoints:
+            # 所有端点都在剔除冷却期：不直接失败，试用最早被剔除的端点（签名成功后立即恢复接纳）
+            usable = [min(self.endpoints, key=lambda endpoint: endpoint.ejected_until)]
+        if not usable:
+            return None, False
+        candidates = [endpoint for endpoint in usable if endpoint.in_flight < self.max_in_flight]
+        if not candidates:
+            return None, True
+        return min(candidates, key=lambda endpoint: endpoint.in_flight), True
+
+    def _overloaded(self, msg: str) -> SignOverloadedError:
+        self.shed += 1
+        logger.warning("签名请求被拒绝: %s", msg)
+        return SignOverloadedError(msg)
+
+    def _admit(self, seq: int, priority: int, deadline: Optional[float]) -> None:
+        """
+        判断请求能否进入排队，可以时登记为排队中
+        
+        - 预计排队时间（签名耗时移动平均 × 前面的轮次）超过截止时间时直接拒绝，不等到超时
+        - 队列已满时，比队列中最低优先级更高的请求挤掉该请求，否则直接拒绝；
+          被挤出的请求在这里同时移出排队计数，排队数不会短暂超过上限
+        
+        Raises:
+            SignOverloadedError: 请求不能进入排队时
+        """
+        now = time.monotonic()
+        live = [waiter for waiter in self._waiters if not waiter[3].done()]
+        if deadline is not None:
+            if deadline <= now:
+                raise self._overloaded("请求已超过截止时间")
+            if self._sign_latency:
+                ahead = sum(1 for waiter in live if -waiter[0] >= priority)
+                usable = sum(1 for endpoint in self.endpoints if not endpoint.is_ejected(now)) or 1
+                estimated = self._sign_latency * (ahead // (usable * self.max_in_flight) + 1)
+                if now + estimated > deadline:
+                    raise self._overloaded(f"预计排队 {estimated:.1f} 秒，超过请求的截止时间")
+        if self.queue_max_depth and len(self._queued) >= self.queue_max_depth:
+            victim = max(live, default=None)
+            if victim is None or -victim[0] >= priority:
+                raise self._overloaded(f"签名队列已满（{self.queue_max_depth}）")
+            self._queued.discard(victim[2])
+            victim[3].set_exception(self._overloaded("签名队列已满，被更高优先级的请求挤出"))
+        self._queued.add(seq)
+
+    def _wake_next(self) -> None:
+        """唤醒排队中优先级最高的一个请求"""
+        while self._waiters:
+            future = heapq.heappop(self._waiters)[3]
+            if not future.done():
+                future.set_result(None)
+                return
+
+    def _wake_all(self) -> None:
+        """端点剔除状态变化时唤醒所有排队的请求，按优先级顺序重新选择端点"""
+        while self._waiters:
+            future = heapq.heappop(self._waiters)[3]
+            if not future.done():
+                future.set_result(None)
+
+    def _next_readmission(self, now: float) -> Optional[float]:
+        """剔除冷却期最早结束的时间（time.monotonic()），没有被剔除的端点时返回 None"""
+        return min((endpoint.ejected_until for endpoint in self.endpoints if endpoint.is_ejected(now)), default=None)
+
+    async def _acquire_endpoint(
+        self,
+        exclude: Sequence[_SignerEndpoint] = (),
+        priority: int = 0,
+        deadline: Optional[float] = None,
+    ) -> _SignerEndpoint:
+        """
+        获取一个端点并占用其一个在途名额；所有可用端点都已满载时按优先级排队等待
+        
+        已有请求排队时新请求不插队；优先级高（数值大）的先被唤醒，同优先级按截止时间、到达顺序。
+        
+        Args:
+            exclude: 优先避开的端点（刚失败的端点）
+            priority: 优先级，数值越大越优先
+            deadline: 截止时间（time.monotonic()），None 表示只受 queue_max_wait 限制
+        
+        Raises:
+            WebSocketConnectionError: 没有配置任何端点时
+            SignOverloadedError: 队列已满、排队超时或预计无法在截止时间前获得名额时
+        """
+        self._ensure_primitives()
+        seq = next(self._waiter_seq)
+        queued = False
+        started = time.monotonic()
+        acquired = False
         try:
-            # 尝试获取当前运行的事件循环
-            loop = asyncio.get_running_loop()
-            # 如果已有运行中的循环，不能使用 run_until_complete
-            # 这种情况下需要抛出异常，提示使用异步方式
-            raise RuntimeError("当前线程已有运行中的事件循环，无法使用 run_until_complete")
-        except RuntimeError:
-            # 没有运行中的循环，可以创建或使用现有循环
-            if self.loop is None or self.loop.is_closed():
-                self.loop = asyncio.new_event_loop()
-            return self.loop
+            while True:
+                if queued or not self._queued:
+                    endpoint, has_usable = self._pick_endpoint(exclude)
+                    if endpoint is not None:
+                        endpoint.in_flight += 1
+                        acquired = True
+                        metrics_util.observe_stage("ws.queue_wait", time.monotonic() - started)
+                        return endpoint
+                    if not has_usable:
+                        raise WebSocketConnectionError("没有可用的签名服务连接（所有端点均已被剔除）")
+                if not queued:
+                    self._admit(seq, priority, deadline)
+                    queued = True
+
+                now = time.monotonic()
+                timeout = self.queue_max_wait - (now - started) if self.queue_max_wait else None
+                if deadline is not None:
+                    timeout = deadline - now if timeout is None else min(timeout, deadline - now)
+                if timeout is not None and timeout <= 0:
+                    raise self._overloaded("排队等待签名超时")
+                # 有端点处于剔除冷却期时，最迟在冷却结束时醒来重新选择端点
+                wait = timeout
+                readmit_at = self._next_readmission(now)
+                if readmit_at is not None and (wait is None or readmit_at - now < wait):
+                    wait = readmit_at - now
+                future = asyncio.get_running_loop().create_future()
+                heapq.heappush(self._waiters, (-priority, deadline or float("inf"), seq, future))
+                try:
+                    await asyncio.wait_for(future, wait)
+                except asyncio.TimeoutError:
+                    if wait == timeout:
+                        raise self._overloaded("排队等待签名超时")
+        finally:
+            if queued:
+                self._queued.discard(seq)
+                if not acquired and self._pick_endpoint(())[0] is not None:
+                    # 被唤醒后没有用上名额（超时、取消或出错），把名额让给下一个排队的请求
+                    self._wake_next()
+
+    async def _release_endpoint(self, endpoint: _SignerEndpoint) -> None:
+        """释放端点的在途名额，并唤醒一个排队的请求"""
+        endpoint.in_flight -= 1
+        self._wake_next()
+
+    def queue_status(self) -> dict:
+        """签名排队状态（用于健康检查）"""
+        return {
+            "queued": len(self._queued),
+            "max_depth": self.queue_max_depth,
+            "max_wait": self.queue_max_wait,
+            "shed": self.shed,
+            "sign_latency": round(self._sign_latency, 3),
+        }
+
+    def _mark_success(self, endpoint: _SignerEndpoint, result: dict) -> None:
+        """记录端点签名成功及其证书号，清除失败计数与剔除状态"""
+        endpoint.signed += 1
+        if result.get("cert_no"):
+            endpoint.cert_no = result["cert_no"]
+        self._mark_healthy(endpoint)
 
-    async def _ensure_connection(self) -> websockets.WebSocketClientProtocol:
+    def _mark_healthy(self, endpoint: _SignerEndpoint) -> None:
+        """清除端点的失败计数与剔除状态；端点提前恢复接纳时唤醒排队的请求"""
+        readmitted = endpoint.is_ejected(time.monotonic())
+        endpoint.failures = 0
+        endpoint.ejected_until = 0.0
+        if readmitted:
+            self._wake_all()
+
+    def _mark_failure(self, endpoint: _SignerEndpoint, error: Exception) -> None:
+        """记录端点连接失败，并在冷却时间内将其剔除（冷却结束后自动重新接纳）"""
+        endpoint.failures += 1
+        endpoint.last_error = str(error)
+        endpoint.ejected_until = time.monotonic() + self.eject_seconds
+        logger.warning(f"签名端点 {endpoint.url} 已被剔除 {self.eject_seconds:g} 秒: {error}")
+        # 可用端点减少：排队的请求重新选择端点（所有端点都被剔除时改为试用最早被剔除的端点）
+        self._wake_all()
+
+    async def _ensure_connection(self, endpoint: _SignerEndpoint) -> websockets.WebSocketClientProtocol:
         """
-        确保连接可用，如果不可用则创建新连接
+        确保端点连接可用，如果不可用则创建新连接
+        
+        Args:
+            endpoint: 签名端点
         
         Returns:
             websockets.WebSocketClientProtocol: WebSocket 连接对象
@@ -108,60 +502,231 @@ class WebSocketWrapper:
         Raises:
             WebSocketError: 当连接失败时
         """
+        if self._stopping:
+            raise WebSocketError("WebSocket 签名服务已停止")
+        
         # 检查现有连接是否可用（简单检查，实际使用时如果不可用会抛出异常）
-        if self.connected and self.websocket:
-            return self.websocket
+        if endpoint.connected and endpoint.websocket:
+            return endpoint.websocket
         
-        # 连接不存在或不可用，需要创建新连接
-        self.connected = False
-        self.websocket = None
+        self._ensure_primitives()
+        async with endpoint.connect_lock:
+            # 等待锁期间其他请求可能已经建立了连接
+            if endpoint.connected and endpoint.websocket:
+                return endpoint.websocket
+            
+            # 连接不存在或不可用，需要创建新连接
+            endpoint.connected = False
+            endpoint.websocket = None
+            
+            # 创建新连接
+            started = time.perf_counter()
+            try:
+                logger.debug(f"正在连接 WebSocket 服务器: {endpoint.url}")
+                # 根据 URL 判断是否需要 SSL（ws:// 不需要，wss:// 需要）
+                if endpoint.url.startswith("wss://"):
+                    # wss:// 需要 SSL
+                    websocket = await websockets.connect(
+                        endpoint.url,
+                        ssl=True,
+                        ping_interval=self.ping_interval,
+                        ping_timeout=self.ping_timeout
+                    )
+                else:
+                    # ws:// 不需要 SSL，不传递 ssl 参数
+                    websocket = await websockets.connect(
+                        endpoint.url,
+                        ping_interval=self.ping_interval,
+                        ping_timeout=self.ping_timeout
+                    )
+                logger.debug("WebSocket 连接成功")
+                
+                # 接收握手消息，如果握手失败则抛出异常
+                handshake_success = await self._handle_handshake(websocket)
+                if not handshake_success:
+                    await websocket.close()
+                    raise WebSocketConnectionError("WebSocket 握手失败")
+                
+                # 保存连接（只有在握手成功后才保存），并为该连接启动响应读取任务
+                endpoint.websocket = websocket
+                endpoint.connected = True
+                endpoint.pending = {}
+                endpoint.reader_task = asyncio.get_running_loop().create_task(
+                    self._read_responses(endpoint, websocket, endpoint.pending)
+                )
+                logger.debug("连接已建立并准备就绪")
+                metrics_util.observe_stage("ws.connect", time.perf_counter() - started)
+                metrics_util.inc(metrics_util.WS_CONNECTS, endpoint=endpoint.url)
+                
+                return websocket
+            except Exception as e:
+                metrics_util.inc(metrics_util.WS_CONNECT_FAILURES, endpoint=endpoint.url)
+                endpoint.connected = False
+                endpoint.websocket = None
+                error_msg = f"连接 WebSocket 失败: {e}"
+                logger.error(error_msg)
+                raise WebSocketConnectionError(error_msg)
+
+    async def _read_responses(
+        self,
+        endpoint: _SignerEndpoint,
+        websocket: websockets.WebSocketClientProtocol,
+        pending: Dict[str, asyncio.Future]
+    ) -> None:
+        """
+        后台读取任务：持续接收连接上的响应，并按 _id 分发给等待中的请求
         
-        # 创建新连接
+        只有响应中没有 _id（直接格式）时才按发送顺序交给最早的等待者；
+        _id 无法匹配的响应（例如已超时请求迟到的响应）直接丢弃，不会交给其他请求。
+        连接关闭时，该连接上所有未完成的请求都会收到连接错误。
+        
+        Args:
+            endpoint: 连接所属的签名端点
+            websocket: WebSocket 连接对象
+            pending: 该连接上等待响应的请求（_id -> Future）
+        """
+        error: WebSocketError = WebSocketConnectionError("WebSocket 连接已关闭")
         try:
-            logger.debug(f"正在连接 WebSocket 服务器: {self.ws_url}")
-            # 根据 URL 判断是否需要 SSL（ws:// 不需要，wss:// 需要）
-            if self.ws_url.startswith("wss://"):
-                # wss:// 需要 SSL
-                websocket = await websockets.connect(
-                    self.ws_url,
-                    ssl=True
-                )
-            else:
-                # ws:// 不需要 SSL，不传递 ssl 参数
-                websocket = await websockets.connect(
-                    self.ws_url
-                )
-            logger.debug("WebSocket 连接成功")
+            async for message in websocket:
+                try:
+                    response = json.loads(message)
+                except json.JSONDecodeError as e:
+                    logger.error(f"JSON 解析错误: {e}")
+                    continue
+                if not isinstance(response, dict):
+                    logger.warning(f"忽略无法识别的消息: {message!r}")
+                    continue
+                
+                request_id = response.get("_id")
+                if request_id is None:
+                    if not pending:
+                        logger.warning("收到无人等待的响应（没有 _id），已忽略")
+                        continue
+                    # 没有 _id 时交给最早发送的请求
+                    oldest_id = next(iter(pending))
+                    future = pending.pop(oldest_id)
+                    logger.debug("响应没有 _id，按顺序分发给 _id=%s", oldest_id)
+                else:
+                    future = pending.pop(str(request_id), None)
+                    if future is None:
+                        if self._abandoned.pop(str(request_id), None) is not None:
+                            logger.info("收到已放弃等待的请求的迟到响应，已丢弃: _id=%s", request_id)
+                        else:
+                            logger.warning("收到无法匹配的响应，已丢弃: _id=%s", request_id)
+                        continue
+                if not future.done():
+                    future.set_result(response)
+        except websockets.exceptions.ConnectionClosed as e:
+            logger.warning(f"连接已关闭: {e}")
+            error = WebSocketConnectionError(f"WebSocket 连接已关闭: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"WebSocket 连接错误: {e}", exc_info=True)
+            error = WebSocketConnectionError(f"WebSocket 连接错误: {e}")
+        finally:
+            self._discard_connection(endpoint, websocket)
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            pending.clear()
+
+    @staticmethod
+    def _parse_sign_response(response: dict) -> dict:
+        """
+        解析签名响应（支持嵌套格式和直接格式）
+        
+        Args:
+            response: 已解析的响应 JSON
             
-            # 接收握手消息，如果握手失败则抛出异常
-            handshake_success = await self._handle_handshake(websocket)
-            if not handshake_success:
-                await websocket.close()
-                raise WebSocketError("WebSocket 握手失败")
+        Returns:
+            dict: 包含 sign (签名) 和 cert_no (证书序列号) 的字典
             
-            # 保存连接（只有在握手成功后才保存）
-            self.websocket = websocket
-            self.connected = True
-            logger.debug("连接已建立并准备就绪")
+        Raises:
+            WebSocketError: 当响应表示失败或格式无法识别时
+        """
+        if "_args" in response:
+            # 嵌套格式：{"_id":1,"_method":"...","_status":"00","_args":{"Result":true,"Data":["签名","证书序列号"],"Error":[]}}
+            args = response.get("_args", {})
+            result = args.get("Result")
+            data = args.get("Data", [])
+            errors = args.get("Error", [])
+            status = response.get("_status")
             
-            return websocket
-        except Exception as e:
-            self.connected = False
-            self.websocket = None
-            error_msg = f"连接 WebSocket 失败: {e}"
-            logger.error(error_msg)
-            raise WebSocketError(error_msg)
+            if status and status != "00":
+                error_msg = f"响应状态错误: {status}, 错误信息: {errors}"
+                logger.error(error_msg)
+                raise SignResponseError(error_msg)
+            
+            if not result:
+                error_msg = f"签名失败，错误信息: {errors}"
+                logger.error(error_msg)
+                raise SignResponseError(error_msg)
+            
+            if data and len(data) >= 2:
+                sign = data[0]  # 签名字符串
+                cert_no = data[1]  # 证书序列号
+                logger.debug("签名成功，签名长度: %d, 证书序列号: %s", len(sign), cert_no)
+                return {
+                    "sign": sign,
+                    "cert_no": cert_no
+                }
+            elif data and len(data) == 1:
+                sign = data[0]
+                logger.warning("签名成功（无证书序列号），签名长度: %d", len(sign))
+                return {
+                    "sign": sign,
+                    "cert_no": None
+                }
+            else:
+                error_msg = "响应中未找到 Data 字段或 Data 为空"
+                logger.error(f"{error_msg}: {response}")
+                raise SignResponseError(error_msg)
+        elif "Result" in response:
+            # 直接格式：{"Result":true,"Data":["签名","证书序列号"],"Error":[]}
+            result = response.get("Result")
+            data = response.get("Data", [])
+            errors = response.get("Error", [])
+            
+            if not result:
+                error_msg = f"签名失败，错误信息: {errors}"
+                logger.error(error_msg)
+                raise SignResponseError(error_msg)
+            
+            if data and len(data) >= 2:
+                sign = data[0]
+                cert_no = data[1]
+                return {
+                    "sign": sign,
+                    "cert_no": cert_no
+                }
+            elif data and len(data) == 1:
+                sign = data[0]
+                return {
+                    "sign": sign,
+                    "cert_no": None
+                }
+            else:
+                error_msg = "响应中未找到 Data 字段或 Data 为空"
+                raise SignResponseError(error_msg)
+        else:
+            error_msg = "无法识别的响应格式"
+            logger.error(f"{error_msg}: {response}")
+            raise SignResponseError(error_msg)
+
 
     async def _get_sign_with_connection(
         self, 
+        endpoint: _SignerEndpoint,
         websocket: websockets.WebSocketClientProtocol,
         in_data: str, 
         passwd: str
     ) -> dict:
         """
-        使用指定连接获取签名和证书序列号
+        使用指定端点的连接获取签名和证书序列号
         
         Args:
+            endpoint: 签名端点
             websocket: WebSocket 连接对象
             in_data: 待签名的数据字符串
             passwd: 密码
@@ -172,10 +737,18 @@ class WebSocketWrapper:
         Raises:
             WebSocketError: 当 WebSocket 调用失败时
         """
+        if websocket is not endpoint.websocket:
+            raise WebSocketConnectionError("WebSocket 连接已失效")
+        
+        # 每个请求使用唯一的 _id，先登记等待者再发送，避免响应先于登记到达
+        request_id = str(next(self._id_counter))
+        pending = endpoint.pending
+        future = asyncio.get_running_loop().create_future()
+        pending[request_id] = future
         try:
             # 构建获取签名的请求报文
             request = {
-                "_id": "1",
+                "_id": request_id,
                 "_method": "cus-sec_SpcSignDataAsPEM",
                 "args": {
                     "inData": in_data,
@@ -184,148 +757,205 @@ class WebSocketWrapper:
             }
             request_json = json.dumps(request)
             
-            logger.debug(f"发送签名请求")
+            logger.debug("发送签名请求，_id=%s，端点=%s", request_id, endpoint.url)
             
             # 发送请求
             await websocket.send(request_json)
             
-            # 接收签名响应（设置30秒超时）
+            # 等待后台读取任务分发的响应（设置超时）
             try:
-                response_json = await asyncio.wait_for(websocket.recv(), timeout=30.0)
-                logger.debug(f"收到响应")
+                response = await asyncio.wait_for(future, timeout=RESPONSE_TIMEOUT)
+                logger.debug("收到响应，_id=%s", request_id)
             except asyncio.TimeoutError:
-                raise WebSocketError("接收响应超时（30秒）")
-            
-            # 解析响应
-            response = json.loads(response_json)
-            
-            # 检查响应格式（支持嵌套格式）
-            if "_args" in response:
-                # 嵌套格式：{"_id":1,"_method":"...","_status":"00","_args":{"Result":true,"Data":["签名","证书序列号"],"Error":[]}}
-                args = response.get("_args", {})
-                result = args.get("Result")
-                data = args.get("Data", [])
-                errors = args.get("Error", [])
-                status = response.get("_status")
-                
-                if status and status != "00":
-                    error_msg = f"响应状态错误: {status}, 错误信息: {errors}"
-                    logger.error(error_msg)
-                    raise WebSocketError(error_msg)
-                
-                if not result:
-                    error_msg = f"签名失败，错误信息: {errors}"
-                    logger.error(error_msg)
-                    raise WebSocketError(error_msg)
-                
-                if data and len(data) >= 2:
-                    sign = data[0]  # 签名字符串
-                    cert_no = data[1]  # 证书序列号
-                    logger.debug(f"签名成功，签名长度: {len(sign)}, 证书序列号: {cert_no}")
-                    return {
-                        "sign": sign,
-                        "cert_no": cert_no
-                    }
-                elif data and len(data) == 1:
-                    sign = data[0]
-                    logger.warning(f"签名成功（无证书序列号），签名长度: {len(sign)}")
-                    return {
-                        "sign": sign,
-                        "cert_no": None
-                    }
-                else:
-                    error_msg = "响应中未找到 Data 字段或 Data 为空"
-                    logger.error(f"{error_msg}: {response}")
-                    raise WebSocketError(error_msg)
-            elif "Result" in response:
-                # 直接格式：{"Result":true,"Data":["签名","证书序列号"],"Error":[]}
-                result = response.get("Result")
-                data = response.get("Data", [])
-                errors = response.get("Error", [])
-                
-                if not result:
-                    error_msg = f"签名失败，错误信息: {errors}"
-                    logger.error(error_msg)
-                    raise WebSocketError(error_msg)
-                
-                if data and len(data) >= 2:
-                    sign = data[0]
-                    cert_no = data[1]
-                    return {
-                        "sign": sign,
-                        "cert_no": cert_no
-                    }
-                elif data and len(data) == 1:
-                    sign = data[0]
-                    return {
-                        "sign": sign,
-                        "cert_no": None
-                    }
-                else:
-                    error_msg = "响应中未找到 Data 字段或 Data 为空"
-                    raise WebSocketError(error_msg)
-            else:
-                error_msg = "无法识别的响应格式"
-                logger.error(f"{error_msg}: {response}")
-                raise WebSocketError(error_msg)
+                raise WebSocketTimeoutError(f"接收响应超时（{RESPONSE_TIMEOUT:g}秒）")
+            
+            return self._parse_sign_response(response)
                 
         except websockets.exceptions.ConnectionClosed as e:
             # 连接关闭，标记为不可用
             logger.warning(f"连接已关闭: {e}")
-            self.connected = False
-            self.websocket = None
-            raise WebSocketError(f"WebSocket 连接已关闭: {e}")
+            self._discard_connection(endpoint, websocket)
+            raise WebSocketConnectionError(f"WebSocket 连接已关闭: {e}")
         except websockets.exceptions.WebSocketException as e:
             error_msg = f"WebSocket 连接错误: {e}"
             logger.error(error_msg)
-            self.connected = False
-            self.websocket = None
-            raise WebSocketError(error_msg)
-        except json.JSONDecodeError as e:
-            error_msg = f"JSON 解析错误: {e}"
-            logger.error(error_msg)
-            raise WebSocketError(error_msg)
+            self._discard_connection(endpoint, websocket)
+            raise WebSocketConnectionError(error_msg)
         except WebSocketError:
             raise
         except Exception as e:
             error_msg = f"获取签名失败: {e}"
             logger.error(error_msg, exc_info=True)
-            self.connected = False
-            self.websocket = None
+            self._discard_connection(endpoint, websocket)
             raise WebSocketError(error_msg)
+        finally:
+            if pending.pop(request_id, None) is not None:
+                # 没有收到响应就放弃等待（超时或取消）：记下 _id，迟到的响应到达时直接丢弃
+                self._abandon(request_id)
+
+    def _abandon(self, request_id: str) -> None:
+        """登记已放弃等待的请求 _id，同时清理过期的记录"""
+        now = time.monotonic()
+        self._abandoned[request_id] = now + ABANDONED_ID_TTL
+        while self._abandoned and (
+            len(self._abandoned) > _MAX_ABANDONED_IDS or next(iter(self._abandoned.values())) <= now
+        ):
+            self._abandoned.popitem(last=False)
+
+    @staticmethod
+    def _discard_connection(endpoint: _SignerEndpoint, websocket: websockets.WebSocketClientProtocol) -> None:
+        """将端点的指定连接标记为不可用（仅当它仍是当前连接时）"""
+        if endpoint.websocket is websocket:
+            endpoint.connected = False
+            endpoint.websocket = None
+
+    async def _check_endpoint(self, endpoint: _SignerEndpoint) -> None:
+        """
+        检查端点连接：已连接时发送 ping 并等待 pong，失败则关闭该连接；
+        未连接（且不在剔除冷却期内）时预先建立连接并完成握手，失败则剔除该端点。
+        
+        这样失效的连接会在被签名请求使用之前就被发现和替换。
+        
+        Args:
+            endpoint: 签名端点
+        """
+        websocket = endpoint.websocket
+        if endpoint.connected and websocket is not None:
+            try:
+                pong_waiter = await websocket.ping()
+                await asyncio.wait_for(pong_waiter, timeout=self.ping_timeout)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"签名端点 {endpoint.url} 心跳失败，重建连接: {e!r}")
+                self._discard_connection(endpoint, websocket)
+                try:
+                    await websocket.close()
+                except Exception:
+                    pass
+        
+        if self._stopping or endpoint.is_ejected(time.monotonic()):
+            return
+        try:
+            await self._ensure_connection(endpoint)
+            self._mark_healthy(endpoint)
+        except WebSocketConnectionError as e:
+            self._mark_failure(endpoint, e)
+        except WebSocketError:
+            pass
+
+    async def _check_all_endpoints(self) -> None:
+        """并发检查所有端点"""
+        await asyncio.gather(
+            *(self._check_endpoint(endpoint) for endpoint in self.endpoints),
+            return_exceptions=True
+        )
+
+    async def _heartbeat_loop(self) -> None:
+        """后台健康检查任务：按固定间隔检查所有端点，直到 stop()"""
+        while not self._stopping:
+            await asyncio.sleep(self.heartbeat_interval)
+            await self._check_all_endpoints()
 
     def start(self):
-        """启动方法（保持接口兼容，但不需要做任何事）"""
-        logger.info("WebSocketWrapper 已准备就绪（使用连接复用模式）")
-        pass
+        """
+        启动方法：启动后台事件循环线程，预先建立所有端点的连接并完成握手，
+        然后启动后台健康检查任务（连接失败不会抛出异常，失败的端点会被暂时剔除）
+        """
+        loop = self._start_loop_thread()
+        try:
+            warm_up = asyncio.run_coroutine_threadsafe(self._check_all_endpoints(), loop)
+            warm_up.result(timeout=WARM_UP_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"预先建立签名服务连接未完成: {e!r}")
+        if self.heartbeat_interval and self.heartbeat_interval > 0:
+            if self._heartbeat is None or self._heartbeat.done():
+                self._heartbeat = asyncio.run_coroutine_threadsafe(self._heartbeat_loop(), loop)
+        connected = sum(1 for endpoint in self.endpoints if endpoint.connected)
+        logger.info(
+            f"WebSocketWrapper 已启动（后台事件循环 + 连接复用模式），"
+            f"已连接端点 {connected}/{len(self.endpoints)}"
+        )
+
+    def run_in_loop(self, coroutine) -> concurrent.futures.Future:
+        """
+        把协程提交到后台事件循环执行，不等待结果（未调用 start() 时自动启动事件循环）
+        
+        供签名守护进程等调用方使用：请求在事件循环中排队，不为每个等待中的请求占用一个线程。
+        
+        Returns:
+            concurrent.futures.Future: 协程的结果
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._get_or_create_loop())
 
     def stop(self):
-        """停止方法（关闭现有连接）"""
-        if self.websocket:
+        """停止方法：在后台事件循环中关闭所有端点的连接，然后停止并回收事件循环线程"""
+        with self.lock:
+            loop, thread = self.loop, self._loop_thread
+            self.loop = None
+            self._loop_thread = None
+            self._stopping = True
+            heartbeat, self._heartbeat = self._heartbeat, None
+        if heartbeat is not None:
+            heartbeat.cancel()
+        if loop is not None and loop.is_running():
             try:
-                asyncio.run(self._close_connection())
+                future = asyncio.run_coroutine_threadsafe(self._close_all_connections(), loop)
+                future.result(timeout=STOP_TIMEOUT)
             except Exception as e:
                 logger.error(f"关闭连接时出错: {e}")
+            loop.call_soon_threadsafe(loop.stop)
+            if thread is not None:
+                thread.join(timeout=STOP_TIMEOUT)
+                if thread.is_alive():
+                    logger.warning("事件循环线程未能在规定时间内退出")
+        # 异步原语绑定在旧的事件循环上，下次使用时重新创建
+        self._waiters = []
+        self._queued = set()
+        for endpoint in self.endpoints:
+            endpoint.connect_lock = None
+            endpoint.in_flight = 0
         logger.info("WebSocketWrapper 已停止")
 
-    async def _close_connection(self):
-        """关闭连接"""
-        if self.websocket:
+    async def _close_all_connections(self):
+        """拒绝所有排队中的请求并关闭所有端点的连接"""
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter[3].done():
+                waiter[3].set_exception(WebSocketConnectionError("签名服务已停止"))
+        await asyncio.gather(
+            *(self._close_connection(endpoint) for endpoint in self.endpoints),
+            return_exceptions=True
+        )
+
+    async def _close_connection(self, endpoint: _SignerEndpoint):
+        """关闭端点连接，并等待该连接的响应读取任务结束（未完成的请求会收到连接错误）"""
+        websocket, reader_task = endpoint.websocket, endpoint.reader_task
+        endpoint.websocket = None
+        endpoint.connected = False
+        endpoint.reader_task = None
+        if websocket:
             try:
-                await self.websocket.close()
+                await websocket.close()
             except Exception:
                 pass
-            finally:
-                self.websocket = None
-                self.connected = False
+        if reader_task is not None and not reader_task.done():
+            try:
+                await asyncio.wait_for(reader_task, timeout=STOP_TIMEOUT)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
 
-    async def _get_sign_async(self, in_data: str, passwd: str) -> dict:
+    async def _get_sign_async(self, in_data: str, passwd: str, priority: int = 0,
+                              deadline: Optional[float] = None) -> dict:
         """
-        异步方法：获取签名（使用连接复用）
+        异步方法：获取签名（选择最空闲的健康端点，使用连接复用，受每个端点的最大在途请求数限制）
         
         Args:
             in_data: 待签名的数据字符串
             passwd: 密码
+            priority: 排队优先级，数值越大越优先
+            deadline: 排队截止时间（time.monotonic()）
             
         Returns:
             dict: 包含 sign (签名) 和 cert_no (证书序列号) 的字典
@@ -333,41 +963,128 @@ class WebSocketWrapper:
         Raises:
             WebSocketError: 当 WebSocket 调用失败时
         """
-        # 最多重试1次（失败时重新创建连接）
+        # 最多重试1次（连接失败时优先换一个端点重试，没有其他可用端点时在原端点重新创建连接）
         max_retries = 1
+        failed: List[_SignerEndpoint] = []
         
         for retry in range(max_retries + 1):
+            endpoint = await self._acquire_endpoint(failed, priority, deadline)
+            connecting = True
             try:
-                # 确保连接可用
-                websocket = await self._ensure_connection()
+                # 确保连接可用（建立连接失败的端点会被暂时剔除）
+                with metrics_util.stage_timer("ws.ensure_connection"):
+                    websocket = await self._ensure_connection(endpoint)
+                connecting = False
                 
-                # 使用连接获取签名
-                return await self._get_sign_with_connection(websocket, in_data, passwd)
+                # 使用连接获取签名（记录耗时的移动平均，用于估算排队时间）
+                started = time.monotonic()
+                result = await self._get_sign_with_connection(endpoint, websocket, in_data, passwd)
+                elapsed = time.monotonic() - started
+                metrics_util.observe_stage("ws.sign", elapsed)
+                if self._sign_latency:
+                    self._sign_latency += _LATENCY_SMOOTHING * (elapsed - self._sign_latency)
+                else:
+                    self._sign_latency = elapsed
+                self._mark_success(endpoint, result)
+                return result
                 
-            except WebSocketError as e:
-                # 如果是连接错误且还有重试机会，清除连接状态后重试
-                if "连接" in str(e) and retry < max_retries:
+            except WebSocketConnectionError as e:
+                # 连接错误：建立连接失败的端点被剔除；还有重试机会时换端点或重建连接后重试
+                if self._stopping:
+                    raise
+                if connecting:
+                    self._mark_failure(endpoint, e)
+                if endpoint not in failed:
+                    failed.append(endpoint)
+                if retry < max_retries:
                     logger.debug(f"连接失败，重试 {retry + 1}/{max_retries + 1}")
-                    self.connected = False
-                    self.websocket = None
                     continue
-                else:
-                    raise
+                raise
+            except WebSocketError:
+                raise
             except Exception as e:
                 # 其他错误直接抛出
                 raise WebSocketError(f"获取签名失败: {e}")
+            finally:
+                await self._release_endpoint(endpoint)
+
+    async def _sign_async(self, in_data: str, passwd: str, priority: int = 0,
+                          timeout: Optional[float] = None) -> dict:
+        """
+        异步方法：获取签名，启用缓存时先查缓存，并将相同请求的并发调用合并为一次签名
+        
+        timeout 为排队的最长等待时间（秒），从请求到达事件循环时开始计算
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        if self.cache is None:
+            return await self._get_sign_async(in_data, passwd, priority, deadline)
+        now = time.monotonic()
+        certs = [
+            endpoint.cert_no for endpoint in self.endpoints
+            if endpoint.cert_no and not endpoint.is_ejected(now)
+        ]
+        return await self.cache.get_or_sign(
+            in_data, passwd, certs, lambda: self._get_sign_async(in_data, passwd, priority, deadline)
+        )
 
-    def get_code(self, data: str, pwdstr: str) -> str:
+    def cache_status(self) -> Optional[dict]:
+        """签名结果缓存的命中统计，未启用缓存时返回 None"""
+        return self.cache.status() if self.cache is not None else None
+
+    def _validate_sign_args(self, data: str, pwdstr: str) -> None:
+        """
+        校验签名参数
+        
+        Raises:
+            WebSocketError: 参数不合法或服务未初始化时
+        """
+        if not isinstance(data, str):
+            raise WebSocketError("参数 'data' 必须是字符串类型")
+        if not isinstance(pwdstr, str):
+            raise WebSocketError("参数 'pwdstr' 必须是字符串类型")
+        if not data:
+            raise WebSocketError("参数 'data' 不能为空")
+        if not pwdstr:
+            raise WebSocketError("参数 'pwdstr' 不能为空")
+        
+        if not self.is_available():
+            raise WebSocketError("WebSocket 服务未正确初始化")
+
+    @staticmethod
+    def _format_sign_result(result: dict) -> str:
+        """
+        将签名结果格式化为 "签名字符串||证书序列号"
+        
+        Raises:
+            WebSocketError: 签名或证书序列号为空时
+        """
+        sign = result.get("sign")
+        cert_no = result.get("cert_no")
+        
+        if not sign:
+            raise SignResponseError("签名结果为空")
+        
+        if not cert_no:
+            raise SignResponseError("证书序列号为空")
+        
+        # 返回与 Sign64Wrapper 相同的格式
+        return f"{sign}||{cert_no}"
+
+    def get_code(self, data: str, pwdstr: str, priority: int = 0, timeout: Optional[float] = None) -> str:
         """
         等价于 Sign64Wrapper.get_code 的行为：
         
         - 通过 WebSocket 获取签名和证书序列号（使用连接复用）
         - 返回 "签名字符串||证书序列号"
-        - 使用锁保护，确保同一时间只有一个请求在执行
+        - 多个线程可同时调用，请求在同一连接上多路复用，在途数量受 max_in_flight 限制
+        
+        在事件循环中请使用 get_code_async，避免阻塞调用方的事件循环。
         
         Args:
             data: 待签名的数据字符串
             pwdstr: 密码
+            priority: 排队优先级，数值越大越优先（过载时低优先级请求先被拒绝）
+            timeout: 最长排队等待时间（秒），预计等不到时直接失败；None 表示只受 WS_QUEUE_MAX_WAIT 限制
             
         Returns:
             str: "签名字符串||证书序列号" 格式的字符串
@@ -375,53 +1092,215 @@ class WebSocketWrapper:
         Raises:
             WebSocketError: 当 WebSocket 调用失败时
         """
-        # 输入验证
-        if not isinstance(data, str):
-            raise WebSocketError("参数 'data' 必须是字符串类型")
-        if not isinstance(pwdstr, str):
-            raise WebSocketError("参数 'pwdstr' 必须是字符串类型")
-        if not data:
-            raise WebSocketError("参数 'data' 不能为空")
-        if not pwdstr:
-            raise WebSocketError("参数 'pwdstr' 不能为空")
+        self._validate_sign_args(data, pwdstr)
+
+        try:
+            # 获取后台事件循环
+            loop = self._get_or_create_loop()
+            if threading.current_thread() is self._loop_thread:
+                raise WebSocketError("当前环境不支持同步调用异步函数，请使用异步接口 get_code_async")
+            
+            # 提交到后台事件循环执行并等待结果
+            future = asyncio.run_coroutine_threadsafe(self._sign_async(data, pwdstr, priority, timeout), loop)
+            return self._format_sign_result(future.result())
+            
+        except WebSocketError:
+            raise
+        except Exception as e:
+            error_msg = f"调用 WebSocket 签名服务失败: {e}"
+            logger.error(error_msg, exc_info=True)
+            raise WebSocketError(error_msg)
+
+    async def get_code_async(self, data: str, pwdstr: str, priority: int = 0,
+                             timeout: Optional[float] = None) -> str:
+        """
+        get_code 的异步版本，可在任意事件循环中 await
         
-        # 使用锁保护，确保同一时间只有一个请求在执行
-        with self.lock:
-            if not self.is_available():
-                raise WebSocketError("WebSocket 服务未正确初始化")
+        - 调用方就在后台事件循环中时，直接执行签名协程
+        - 否则将签名协程提交到后台事件循环，并以非阻塞方式等待结果
+        
+        大量并发调用方只占用事件循环中的协程，而不是各占一个线程。
+        
+        Args:
+            data: 待签名的数据字符串
+            pwdstr: 密码
+            priority: 排队优先级，数值越大越优先（过载时低优先级请求先被拒绝）
+            timeout: 最长排队等待时间（秒），预计等不到时直接失败；None 表示只受 WS_QUEUE_MAX_WAIT 限制
+            
+        Returns:
+            str: "签名字符串||证书序列号" 格式的字符串
+            
+        Raises:
+            WebSocketError: 当 WebSocket 调用失败时
+        """
+        self._validate_sign_args(data, pwdstr)
+
+        try:
+            loop = self._get_or_create_loop()
+            if asyncio.get_running_loop() is loop:
+                result = await self._sign_async(data, pwdstr, priority, timeout)
+            else:
+                future = asyncio.run_coroutine_threadsafe(self._sign_async(data, pwdstr, priority, timeout), loop)
+                result = await asyncio.wrap_future(future)
+            return self._format_sign_result(result)
+            
+        except WebSocketError:
+            raise
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error_msg = f"调用 WebSocket 签名服务失败: {e}"
+            logger.error(error_msg, exc_info=True)
+            raise WebSocketError(error_msg)
+
+    async def _get_signs_async(self, items: Sequence[Tuple[str, str]], priority: int = 0,
+                               timeout: Optional[float] = None) -> list:
+        """
+        异步方法：批量获取签名，在各端点的连接上多路复用
+        
+        同时提交的条数不超过所有端点的在途上限之和，其余条目在批次内部等待：
+        一个批次不会占满签名队列而拒绝自己的条目，每条的 timeout 和 WS_QUEUE_MAX_WAIT
+        也从轮到该条提交时开始计算，而不是从批次到达时开始。
+        
+        Returns:
+            list: 与 items 一一对应，成功为签名结果字典，失败为异常对象
+        """
+        results: list = [None] * len(items)
+        remaining = iter(enumerate(items))
+
+        async def worker() -> None:
+            for index, (data, pwdstr) in remaining:
+                try:
+                    results[index] = await self._sign_async(data, pwdstr, priority, timeout)
+                except Exception as e:
+                    results[index] = e
 
+        workers = min(len(items), max(len(self.endpoints), 1) * self.max_in_flight)
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        return results
+
+    def _batch_results(self, results: list) -> List[Union[str, WebSocketError]]:
+        """将批量签名的原始结果格式化为 "签名字符串||证书序列号" 或 WebSocketError"""
+        formatted: List[Union[str, WebSocketError]] = []
+        for result in results:
+            if isinstance(result, BaseException):
+                if not isinstance(result, WebSocketError):
+                    logger.error("批量签名中的单条请求失败: %s", result)
+                    result = WebSocketError(f"调用 WebSocket 签名服务失败: {result}")
+                formatted.append(result)
+                continue
             try:
-                # 获取或创建事件循环
-                loop = self._get_or_create_loop()
-                
-                # 运行异步函数（使用连接复用）
-                result = loop.run_until_complete(self._get_sign_async(data, pwdstr))
-                
-                sign = result.get("sign")
-                cert_no = result.get("cert_no")
-                
-                if not sign:
-                    raise WebSocketError("签名结果为空")
-                
-                if not cert_no:
-                    raise WebSocketError("证书序列号为空")
-                
-                # 返回与 Sign64Wrapper 相同的格式
-                return f"{sign}||{cert_no}"
-                
-            except WebSocketError:
-                raise
-            except RuntimeError as e:
-                # 处理事件循环冲突的情况
-                if "运行中的事件循环" in str(e):
-                    error_msg = "当前环境不支持同步调用异步函数，请使用异步接口"
-                    logger.error(error_msg)
-                    raise WebSocketError(error_msg)
-                raise
-            except Exception as e:
-                error_msg = f"调用 WebSocket 签名服务失败: {e}"
-                logger.error(error_msg, exc_info=True)
-                raise WebSocketError(error_msg)
+                formatted.append(self._format_sign_result(result))
+            except WebSocketError as e:
+                formatted.append(e)
+        return formatted
+
+    def _split_batch_args(self, items: Sequence[Tuple[str, str]]) -> tuple:
+        """
+        逐条校验批量签名参数
+        
+        Returns:
+            tuple: (合法请求列表, 与 items 等长的错误列表；合法的位置为 None)
+        """
+        if not self.is_available():
+            raise WebSocketError("WebSocket 服务未正确初始化")
+        valid = []
+        errors: List[Optional[WebSocketError]] = []
+        for data, pwdstr in items:
+            try:
+                self._validate_sign_args(data, pwdstr)
+            except WebSocketError as e:
+                errors.append(e)
+            else:
+                errors.append(None)
+                valid.append((data, pwdstr))
+        return valid, errors
+
+    @staticmethod
+    def _merge_batch_results(errors: list, results: list) -> list:
+        it = iter(results)
+        return [error if error is not None else next(it) for error in errors]
+
+    def get_codes(self, items: Sequence[Tuple[str, str]], priority: int = 0,
+                  timeout: Optional[float] = None) -> List[Union[str, WebSocketError]]:
+        """
+        批量签名：把整个批次提交到后台事件循环，在连接上流水线式发送
+        
+        单条请求失败不影响其他请求；在途数量仍受每个端点的 max_in_flight 限制，
+        批次中尚未提交的条目不计入签名队列（不会因批次本身的大小被拒绝）。
+        
+        Args:
+            items: (待签名的数据字符串, 密码) 列表
+            priority: 排队优先级，数值越大越优先
+            timeout: 每条请求最长排队等待时间（秒，从轮到该条提交时开始计算），预计等不到时直接失败
+            
+        Returns:
+            list: 与 items 一一对应，成功为 "签名字符串||证书序列号"，失败为 WebSocketError
+            
+        Raises:
+            WebSocketError: 服务未初始化或批量调用整体失败时
+        """
+        valid, errors = self._split_batch_args(items)
+        if not valid:
+            return errors
+
+        try:
+            loop = self._get_or_create_loop()
+            if threading.current_thread() is self._loop_thread:
+                raise WebSocketError("当前环境不支持同步调用异步函数，请使用异步接口 get_codes_async")
+            
+            future = asyncio.run_coroutine_threadsafe(self._get_signs_async(valid, priority, timeout), loop)
+            results = self._batch_results(future.result())
+            return self._merge_batch_results(errors, results)
+            
+        except WebSocketError:
+            raise
+        except Exception as e:
+            error_msg = f"调用 WebSocket 签名服务失败: {e}"
+            logger.error(error_msg, exc_info=True)
+            raise WebSocketError(error_msg)
+
+    async def get_codes_async(self, items: Sequence[Tuple[str, str]], priority: int = 0,
+                              timeout: Optional[float] = None) -> List[Union[str, WebSocketError]]:
+        """
+        get_codes 的异步版本，可在任意事件循环中 await
+        
+        Args:
+            items: (待签名的数据字符串, 密码) 列表
+            priority: 排队优先级，数值越大越优先
+            timeout: 每条请求最长排队等待时间（秒，从轮到该条提交时开始计算）
+            
+        Returns:
+            list: 与 items 一一对应，成功为 "签名字符串||证书序列号"，失败为 WebSocketError
+        """
+        valid, errors = self._split_batch_args(items)
+        if not valid:
+            return errors
+
+        try:
+            loop = self._get_or_create_loop()
+            if asyncio.get_running_loop() is loop:
+                raw = await self._get_signs_async(valid, priority, timeout)
+            else:
+                future = asyncio.run_coroutine_threadsafe(self._get_signs_async(valid, priority, timeout), loop)
+                raw = await asyncio.wrap_future(future)
+            return self._merge_batch_results(errors, self._batch_results(raw))
+            
+        except WebSocketError:
+            raise
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error_msg = f"调用 WebSocket 签名服务失败: {e}"
+            logger.error(error_msg, exc_info=True)
+            raise WebSocketError(error_msg)
 
 
-__all__ = ["WebSocketWrapper", "WebSocketError"]
+__all__ = [
+    "WebSocketWrapper",
+    "WebSocketError",
+    "WebSocketConnectionError",
+    "WebSocketTimeoutError",
+    "SignResponseError",
+    "SignOverloadedError",
+]